@@ -0,0 +1,450 @@
+"""Stage-level benchmarks with regression baselines.
+
+``run_benchmarks`` times the processing stages of pyptv one at a time, on a
+copy of an experiment (by default ``tests/test_cavity``) and on synthetic
+experiments with a given number of particles per frame
+(``pyptv.synthetic_experiment``):
+
+- parameters: ``ParameterManager.from_yaml``, ``py_start_proc_c``;
+- images: ``read_sequence_image`` (``imread``), ``simple_highpass``, the
+  ``FramePreprocessor`` chain (``preprocess``), ``target_recognition`` of the
+  first camera;
+- 3D: ``correspondences`` (with ``MatchedCoords``) and ``point_positions``
+  of the first frame;
+- files: ``write_targets`` and ``read_targets`` of all cameras;
+- tracking: ``Tracker.full_forward`` over all frames, after a sequence run;
+- calibration, on a second copy of the source experiment: ``calib_dumbbell`` on
+  synthetic dumbbell targets and ``full_scipy_calibration`` on the
+  calibration target points.
+
+Every benchmark runs once to warm up and is then timed ``repeat`` times;
+the results, with the median and minimum, are saved to a JSON file. Files
+changed by a benchmark are restored before every repetition, outside the
+timed region. Output of the benchmarked functions is discarded.
+
+``compare_results`` flags the benchmarks whose median time grew by more
+than a threshold relative to a baseline.
+
+Example:
+    python -m pyptv.benchmark run --particles 1000 10000 --output benchmark.json
+    python -m pyptv.benchmark compare benchmark_baseline.json benchmark.json --threshold 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pyptv import ptv
+from pyptv.parameter_manager import ParameterManager
+from pyptv.processing_context import ProcessingContext
+
+DEFAULT_YAML = (
+    Path(__file__).resolve().parent.parent / "tests" / "test_cavity" / "parameters_Run1.yaml"
+)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+# Frames of the synthetic experiments
+SYNTHETIC_FRAMES = 3
+
+
+@dataclass
+class _Case:
+    """A benchmark: ``run`` is timed, ``reset`` runs untimed before it."""
+
+    run: Callable[[], object]
+    reset: Optional[Callable[[], None]] = None
+
+
+def _snapshot(paths: Sequence[Path]) -> Callable[[], None]:
+    """Function restoring the current content of files and removing new ones."""
+    saved = {}
+    for path in paths:
+        if path.is_dir():
+            saved.update({p: p.read_bytes() for p in path.rglob("*") if p.is_file()})
+        elif path.exists():
+            saved[path] = path.read_bytes()
+    dirs = [path for path in paths if path.is_dir()]
+
+    def restore() -> None:
+        for directory in dirs:
+            for p in directory.rglob("*"):
+                if p.is_file() and p not in saved:
+                    p.unlink()
+        for p, content in saved.items():
+            p.write_bytes(content)
+
+    return restore
+
+
+def _stage_cases(yaml_file: Path) -> Dict[str, _Case]:
+    """Benchmarks of the processing stages of the experiment of ``yaml_file``."""
+    exp = ProcessingContext(yaml_file)
+    pm = exp.pm
+    first, last = exp.spar.get_first(), exp.spar.get_last()
+    num_cams = exp.num_cams
+    ptv_params = pm.get_parameter("ptv")
+    masking = ptv.resolved_masking(pm.get_parameter("masking"), exp.root)
+
+    images = [
+        ptv.read_sequence_image(exp.spar.get_img_base_name(cam) % first)
+        for cam in range(num_cams)
+    ]
+    high_pass = ptv.simple_highpass(images[0], exp.cpar)
+    preprocessor = ptv.FramePreprocessor(exp.cpar, ptv_params, masking)
+    detections = [
+        ptv.detect_camera_targets(img, cam, exp.cpar, exp.tpar, ptv_params, masking)
+        for cam, img in enumerate(images)
+    ]
+    for targs in detections:
+        targs.sort_y()
+    corrected = [
+        ptv.MatchedCoords(targs, exp.cpar, cal) for targs, cal in zip(detections, exp.cals)
+    ]
+    _, sorted_corresp, _ = ptv.correspondences(
+        detections, corrected, exp.cals, exp.vpar, exp.cpar
+    )
+    sorted_corresp = np.concatenate(sorted_corresp, axis=1)
+    flat = np.array(
+        [corr.get_by_pnrs(corresp) for corr, corresp in zip(corrected, sorted_corresp)]
+    ).transpose(1, 0, 2)
+
+    def correspond():
+        matched = [
+            ptv.MatchedCoords(targs, exp.cpar, cal) for targs, cal in zip(detections, exp.cals)
+        ]
+        return ptv.correspondences(detections, matched, exp.cals, exp.vpar, exp.cpar)
+
+    def write_targets():
+        for cam in range(num_cams):
+            ptv.write_targets(detections[cam], exp.target_filenames[cam], first)
+
+    def read_targets():
+        return [ptv.read_targets(exp.target_filenames[cam], first) for cam in range(num_cams)]
+
+    write_targets()
+    ptv.py_sequence_loop(exp)
+    tracking_files = [exp.output_root / "res"] + [
+        Path(ptv.target_filename(base, frame))
+        for base in exp.target_filenames
+        for frame in range(first, last + 1)
+    ]
+
+    def track():
+        tracker = ptv.py_trackcorr_init(exp)
+        tracker.full_forward()
+
+    return {
+        "from_yaml": _Case(lambda: ParameterManager().from_yaml(yaml_file)),
+        "py_start_proc_c": _Case(lambda: ptv.py_start_proc_c(pm, root=exp.root)),
+        "imread": _Case(
+            lambda: ptv.read_sequence_image(exp.spar.get_img_base_name(0) % first)
+        ),
+        "simple_highpass": _Case(lambda: ptv.simple_highpass(images[0], exp.cpar)),
+        "preprocess": _Case(lambda: preprocessor(images[0], 0)),
+        "target_recognition": _Case(
+            lambda: ptv.target_recognition(high_pass, exp.tpar, 0, exp.cpar)
+        ),
+        "correspondences": _Case(correspond),
+        "point_positions": _Case(
+            lambda: ptv.point_positions(flat, exp.cpar, exp.cals, exp.vpar)
+        ),
+        "write_targets": _Case(write_targets),
+        "read_targets": _Case(read_targets),
+        "tracking": _Case(track, reset=_snapshot(tracking_files)),
+    }
+
+
+def _calibration_cases(yaml_file: Path) -> Dict[str, _Case]:
+    """Benchmarks of the calibration routines on synthetic targets."""
+    from pyptv.dumbbell_ground_truth import DumbbellGTSpec, generate_dumbbell_target_files
+    from pyptv.ground_truth import generate_ground_truth
+
+    pm = ParameterManager()
+    pm.from_yaml(yaml_file)
+    cases = {}
+
+    # Dumbbell targets of the sequence frames, with a displaced camera 2
+    dumbbell = pm.get_parameter("dumbbell")
+    sequence = pm.get_parameter("sequence")
+    if dumbbell and sequence:
+        generate_dumbbell_target_files(
+            yaml_file,
+            spec=DumbbellGTSpec(
+                first=int(sequence["first"]),
+                last=int(sequence["last"]),
+                length=float(dumbbell["dumbbell_scale"]),
+                seed=0,
+                max_tries_per_frame=2000,
+            ),
+        )
+        exp = ProcessingContext(yaml_file)
+        cal = exp.cals[1]
+        cal.set_pos(cal.get_pos() + np.array([2.0, -1.0, 1.5]))
+        cal.set_angles(cal.get_angles() + np.array([0.01, -0.005, 0.008]))
+        base = exp.path(exp.cpar.get_cal_img_base_name(1))
+        cal.write(f"{base}.ori".encode("utf-8"), f"{base}.addpar".encode("utf-8"))
+        cal_files = [
+            exp.path(f"{exp.cpar.get_cal_img_base_name(cam)}{ext}")
+            for cam in range(exp.num_cams)
+            for ext in (".ori", ".addpar")
+        ]
+        gui = SimpleNamespace(experiment=exp)
+        cases["calib_dumbbell"] = _Case(
+            lambda: ptv.calib_dumbbell(gui), reset=_snapshot(cal_files)
+        )
+
+    # Calibration target points seen by camera 1, with distortion to recover
+    if pm.get_parameter("cal_ori").get("fixp_name"):
+        gt = generate_ground_truth(yaml_file)
+        arr = np.zeros(len(gt.pnr), dtype=ptv.TARGET_DTYPE)
+        arr["pnr"] = gt.pnr
+        arr["x"], arr["y"] = gt.xy[0, :, 0], gt.xy[0, :, 1]
+        targs = ptv.array_to_targets(arr)
+        exp = ProcessingContext(yaml_file)
+        start = ptv.clone_calibration(exp.cals[0])
+        start.set_radial_distortion(np.array([1e-5, 0.0, 0.0]))
+        start.set_decentering(np.array([1e-5, 0.0]))
+
+        cases["full_scipy_calibration"] = _Case(
+            lambda: ptv.full_scipy_calibration(
+                ptv.clone_calibration(start), gt.xyz, targs, exp.cpar,
+                flags=["k1", "p1", "p2"],
+            )
+        )
+    return cases
+
+
+def time_case(case: _Case, repeat: int) -> List[float]:
+    """Run a benchmark once to warm up and return ``repeat`` timings in seconds."""
+    timings = []
+    for i in range(repeat + 1):
+        if case.reset is not None:
+            case.reset()
+        start = time.perf_counter()
+        case.run()
+        if i > 0:
+            timings.append(time.perf_counter() - start)
+    if case.reset is not None:
+        case.reset()
+    return timings
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Discard the output of Python and of liboptv (file descriptor 1)."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def _dataset_results(
+    name: str,
+    yaml_file: Path,
+    cases: Callable[[Path], Dict[str, _Case]],
+    repeat: int,
+    only: Sequence[str],
+) -> Dict[str, dict]:
+    """Time the benchmarks ``cases(yaml_file)``."""
+    def selected(stage: str) -> bool:
+        return not only or any(fnmatch.fnmatch(f"{name}/{stage}", p) for p in only)
+
+    results = {}
+    with _quiet():
+        benchmarks = cases(yaml_file)
+    for stage, case in benchmarks.items():
+        if not selected(stage):
+            continue
+        with _quiet():
+            timings = time_case(case, repeat)
+        key = f"{name}/{stage}"
+        results[key] = {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "repeat": repeat,
+        }
+        print(f"{key:<40} {1000 * results[key]['median']:>10.2f} ms")
+    return results
+
+
+def _environment() -> dict:
+    import optv
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "optv": getattr(optv, "__version__", "unknown"),
+    }
+
+
+def run_benchmarks(
+    source_yaml: Path = DEFAULT_YAML,
+    particles: Sequence[int] = (),
+    repeat: int = DEFAULT_REPEAT,
+    only: Sequence[str] = (),
+    work_dir: Optional[Path] = None,
+) -> dict:
+    """Run the benchmarks on a copy of ``source_yaml``'s experiment and on
+    synthetic experiments with ``particles`` particles per frame.
+
+    Args:
+        source_yaml: Parameters of the source experiment
+        particles: Particles per frame of the synthetic experiments
+        repeat: Timed repetitions of every benchmark
+        only: fnmatch patterns of the benchmarks to run, e.g. ``"*/tracking"``
+        work_dir: Directory for the copies (default: a temporary directory)
+
+    Returns:
+        ``{"environment": {...}, "results": {"<dataset>/<stage>": {"median":
+        seconds, "min": seconds, "repeat": n}}}``
+    """
+    from pyptv.synthetic_experiment import SyntheticSpec, generate_synthetic_experiment
+
+    source_yaml = Path(source_yaml).resolve()
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(work_dir) if work_dir is not None else Path(tmp)
+        name = source_yaml.parent.name
+        # The calibration benchmarks write their own targets, in a second copy
+        for suffix, cases in (("", _stage_cases), ("-calibration", _calibration_cases)):
+            exp_dir = root / f"{name}{suffix}"
+            shutil.copytree(
+                source_yaml.parent, exp_dir, ignore=shutil.ignore_patterns("res", "*_targets")
+            )
+            (exp_dir / "res").mkdir(exist_ok=True)
+            results.update(
+                _dataset_results(name, exp_dir / source_yaml.name, cases, repeat, only)
+            )
+
+        for num in particles:
+            name = f"synthetic-{num}"
+            with _quiet():
+                summary = generate_synthetic_experiment(
+                    source_yaml,
+                    root / name,
+                    SyntheticSpec(num_particles=num, num_frames=SYNTHETIC_FRAMES),
+                )
+            results.update(
+                _dataset_results(name, Path(summary["yaml"]), _stage_cases, repeat, only)
+            )
+    return {"environment": _environment(), "results": results}
+
+
+def save_results(path: Path, results: dict) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+def load_results(path: Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare_results(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> List[dict]:
+    """Compare the median times of the benchmarks in both results.
+
+    Returns:
+        Per benchmark in both: name, baseline and current median in seconds,
+        their ratio and whether it is a regression (ratio > 1 + threshold).
+    """
+    rows = []
+    for name, base in baseline["results"].items():
+        if name not in current["results"]:
+            continue
+        median = current["results"][name]["median"]
+        ratio = median / base["median"] if base["median"] > 0 else float("inf")
+        rows.append(
+            {
+                "name": name,
+                "baseline": base["median"],
+                "current": median,
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def format_comparison(rows: List[dict], threshold: float) -> str:
+    lines = [f"{'benchmark':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['name']:<40} {1000 * row['baseline']:>12.2f} "
+            f"{1000 * row['current']:>12.2f} {row['ratio']:>7.2f}{flag}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    lines.append(
+        f"{regressions} of {len(rows)} benchmarks slower than the baseline by more than "
+        f"{100 * threshold:.0f}%"
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks of pyptv.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmarks and save the results")
+    run.add_argument("--yaml", type=Path, default=DEFAULT_YAML, help="Parameters of the source experiment (default: tests/test_cavity)")
+    run.add_argument("--particles", type=int, nargs="*", default=[], help="Particles per frame of synthetic experiments, e.g. 1000 10000 50000")
+    run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Timed repetitions (default: {DEFAULT_REPEAT})")
+    run.add_argument("--only", nargs="*", default=[], help="Run only benchmarks matching these patterns, e.g. '*/tracking'")
+    run.add_argument("--output", type=Path, default=Path("benchmark.json"), help="Results file (default: benchmark.json)")
+    run.add_argument("--baseline", type=Path, default=None, help="Compare the results with this baseline")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Allowed slowdown (default: {DEFAULT_THRESHOLD})")
+
+    compare = commands.add_parser("compare", help="Compare results with a baseline")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Allowed slowdown (default: {DEFAULT_THRESHOLD})")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        current = run_benchmarks(args.yaml, args.particles, args.repeat, args.only)
+        save_results(args.output, current)
+        print(f"Results saved to {args.output}")
+        if args.baseline is None:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print(format_comparison(rows, args.threshold))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -12,8 +12,6 @@ from pathlib import Path
 from typing import Union
 import numpy as np
 from imageio.v3 import imread
-from skimage.util import img_as_ubyte
-from skimage.color import rgb2gray
 
 from traits.api import HasTraits, Str, Int, Bool, Instance, Button
 from traitsui.api import View, Item, HGroup, VGroup, ListEditor
@@ -42,6 +40,7 @@ from optv.tracking_framebuf import TargetArray
 
 from pyptv import ptv
 from pyptv.experiment import Experiment
+from pyptv.preprocessing import as_uint8_gray
 
 
 # recognized names for the flags:
@@ -456,28 +455,23 @@ class CalibrationGUI(HasTraits):
             imname = self.get_parameter('cal_ori')['img_cal_name'][0]
             if Path(imname).exists():
                 print(f"Splitting calibration image: {imname}")
-                temp_img = imread(imname)
-                if temp_img.ndim > 2:
-                    im = rgb2gray(temp_img)
+                temp_img = as_uint8_gray(imread(imname))
                 splitted_images = ptv.image_split(temp_img)
                 for split_img in splitted_images:
-                    self.cal_images.append(img_as_ubyte(split_img))
+                    self.cal_images.append(split_img)
             else:
                 print(f"Calibration image not found: {imname}")
                 # Create zero images for each camera when calibration image not found
                 for _ in range(len(self.camera)):
-                    self.cal_images.append(img_as_ubyte(np.zeros((ptv_params['imy'], ptv_params['imx']), dtype=np.uint8)))
+                    self.cal_images.append(np.zeros((ptv_params['imy'], ptv_params['imx']), dtype=np.uint8))
         else:
             for i, cam in enumerate(self.camera):
                 imname = self.get_parameter('cal_ori')['img_cal_name'][i]
                 if Path(imname).exists():
-                    im = imread(imname)
-                    if im.ndim > 2:
-                        im = rgb2gray(im[:, :, :3])
-                    self.cal_images.append(img_as_ubyte(im))
+                    self.cal_images.append(as_uint8_gray(imread(imname)))
                 else:
                     print(f"Calibration image not found: {imname}")
-                    self.cal_images.append(img_as_ubyte(np.zeros((ptv_params['imy'], ptv_params['imx']), dtype=np.uint8)))
+                    self.cal_images.append(np.zeros((ptv_params['imy'], ptv_params['imx']), dtype=np.uint8))
 
         self.reset_show_images()
 
@@ -965,7 +959,7 @@ class CalibrationGUI(HasTraits):
                     temp_img = []
                     for seq in range(seq_first, seq_last):
                         _ = imread(base_names[i_cam] % seq)
-                        temp_img.append(img_as_ubyte(_))
+                        temp_img.append(as_uint8_gray(_))
 
                     temp_img = np.array(temp_img)
                     temp_img = np.max(temp_img, axis=0)
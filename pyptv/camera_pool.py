@@ -0,0 +1,225 @@
+"""Concurrent per-camera detection within a frame.
+
+The cameras of a frame are independent until correspondences, so their
+pre-processing (negative, mask subtraction, highpass) and target recognition
+can run side by side. ``CameraDetectionPool`` fans this work out to a pool and
+joins before the caller builds ``MatchedCoords`` and runs correspondences.
+
+liboptv does not release the GIL, so the "thread" pool only overlaps image
+decoding; the "process" pool is the one that scales with the number of
+cameras. Process workers rebuild ``ControlParams``/``TargetParams`` and the
+``FramePreprocessor`` from the YAML sections once, at start-up, and send
+targets back as plain structured arrays because the optv objects cannot be
+pickled. Every camera always goes to the same worker process, which keeps its
+buffers and, with ``masking.rolling_frames``, its rolling background. With
+timing enabled the workers also send back the records of their stages, see
+``pyptv.timing``.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from optv.parameters import ControlParams, TargetParams
+from optv.tracking_framebuf import TargetArray
+
+from pyptv import ptv
+from pyptv.timing import NULL_TIMER, StageTimer, make_timer
+
+CAMERA_POOL_KINDS = ("process", "thread")
+
+# Per-process state of the detection workers, set by _init_worker
+_worker_state: dict = {}
+
+
+def _init_worker(
+    ptv_params: dict,
+    targ_rec_params: dict,
+    masking_params: Optional[dict],
+    num_cams: int,
+) -> None:
+    _worker_state["cpar"] = ptv._populate_cpar(ptv_params, num_cams)
+    _worker_state["tpar"] = ptv._populate_tpar({"targ_rec": targ_rec_params}, num_cams)
+    _worker_state["ptv_params"] = ptv_params
+    _worker_state["masking_params"] = masking_params
+    _worker_state["preprocessor"] = ptv.FramePreprocessor(
+        _worker_state["cpar"], ptv_params, masking_params
+    )
+
+
+def _detect_in_worker(
+    i_cam: int, image: Union[str, np.ndarray], timing: bool = False
+) -> Tuple[np.ndarray, List[dict]]:
+    timer = make_timer(timing)
+    if not isinstance(image, np.ndarray):
+        with timer.stage("imread", cam=i_cam):
+            image = ptv.read_sequence_image(image)
+    targs = ptv.detect_camera_targets(
+        image,
+        i_cam,
+        _worker_state["cpar"],
+        _worker_state["tpar"],
+        _worker_state["ptv_params"],
+        _worker_state["masking_params"],
+        timer,
+        _worker_state["preprocessor"],
+    )
+    return ptv.targets_to_array(targs), timer.records
+
+
+def _warm_up_in_worker(i_cam: int, image: Union[str, np.ndarray], reset: bool) -> None:
+    if reset:
+        _worker_state["preprocessor"].reset(i_cam)
+    if image is not None:
+        if not isinstance(image, np.ndarray):
+            image = ptv.read_sequence_image(image)
+        _worker_state["preprocessor"].warm_up(image, i_cam)
+
+
+class CameraDetectionPool:
+    """Run ``detect_camera_targets`` for all cameras of a frame concurrently.
+
+    Args:
+        num_workers: Number of worker threads or processes.
+        kind: "process" (default) or "thread".
+        cpar, tpar: Parameter objects used by the thread pool.
+        ptv_params, targ_rec_params, masking_params: YAML sections used to
+            build the parameter objects in process workers.
+        num_cams: Number of cameras.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        kind: str = "process",
+        *,
+        cpar: ControlParams,
+        tpar: TargetParams,
+        ptv_params: dict,
+        targ_rec_params: dict,
+        masking_params: Optional[dict],
+        num_cams: int,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"Number of camera workers must be >= 1, got {num_workers}")
+        if kind not in CAMERA_POOL_KINDS:
+            raise ValueError(
+                f"Unknown camera pool kind: {kind}. Use one of {', '.join(CAMERA_POOL_KINDS)}"
+            )
+
+        self.kind = kind
+        self.num_cams = num_cams
+        self._cpar = cpar
+        self._tpar = tpar
+        self._ptv_params = ptv_params
+        self._masking_params = masking_params
+        # Per-camera buffers; the cameras of a frame never share one
+        self._preprocessor = ptv.FramePreprocessor(cpar, ptv_params, masking_params)
+
+        self._executors: List[Executor]
+        if kind == "process":
+            # One single-process executor per worker, camera i on worker
+            # i % num_workers: the per-camera state stays in one process
+            self._executors = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    initializer=_init_worker,
+                    initargs=(ptv_params, targ_rec_params, masking_params, num_cams),
+                )
+                for _ in range(min(num_workers, num_cams))
+            ]
+        else:
+            self._executors = [
+                ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="pyptv-camera")
+            ]
+
+    def _executor(self, i_cam: int) -> Executor:
+        return self._executors[i_cam % len(self._executors)]
+
+    def _detect_in_thread(
+        self, i_cam: int, image: Union[str, np.ndarray], timing: bool = False
+    ) -> Tuple[TargetArray, List[dict]]:
+        timer = make_timer(timing)
+        if not isinstance(image, np.ndarray):
+            with timer.stage("imread", cam=i_cam):
+                image = ptv.read_sequence_image(image)
+        targs = ptv.detect_camera_targets(
+            image, i_cam, self._cpar, self._tpar, self._ptv_params, self._masking_params,
+            timer, self._preprocessor,
+        )
+        return targs, timer.records
+
+    def _warm_up_in_thread(
+        self, i_cam: int, image: Union[str, np.ndarray, None], reset: bool
+    ) -> None:
+        if reset:
+            self._preprocessor.reset(i_cam)
+        if image is not None:
+            if not isinstance(image, np.ndarray):
+                image = ptv.read_sequence_image(image)
+            self._preprocessor.warm_up(image, i_cam)
+
+    def warm_up(
+        self, images: Sequence[Union[str, np.ndarray, None]], reset: bool = False
+    ) -> None:
+        """Add a frame preceding the detected ones to the rolling backgrounds.
+
+        Args:
+            images: One decoded image, image path or None (nothing to add)
+                per camera.
+            reset: Forget the frames added before, e.g. after a gap.
+        """
+        target = _warm_up_in_worker if self.kind == "process" else self._warm_up_in_thread
+        futures = [
+            self._executor(i_cam).submit(target, i_cam, image, reset)
+            for i_cam, image in enumerate(images)
+        ]
+        for future in futures:
+            future.result()
+
+    def detect(
+        self, images: Sequence[Union[str, np.ndarray]], timer: StageTimer = NULL_TIMER
+    ) -> List[TargetArray]:
+        """Detect targets in one frame.
+
+        Args:
+            images: One decoded image or image path per camera.
+            timer: Receives the stage records of the workers, for the
+                timer's current frame.
+
+        Returns:
+            One TargetArray per camera, in camera order.
+        """
+        if len(images) != self.num_cams:
+            raise ValueError(
+                f"Number of images ({len(images)}) must match number of cameras ({self.num_cams})"
+            )
+
+        target = _detect_in_worker if self.kind == "process" else self._detect_in_thread
+        futures = [
+            self._executor(i_cam).submit(target, i_cam, image, timer.enabled)
+            for i_cam, image in enumerate(images)
+        ]
+
+        detections = []
+        for future in futures:
+            targs, records = future.result()
+            timer.extend(records)
+            detections.append(
+                ptv.array_to_targets(targs) if self.kind == "process" else targs
+            )
+        return detections
+
+    def close(self) -> None:
+        """Shut the worker pool down."""
+        for executor in self._executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "CameraDetectionPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,110 @@
+"""Convert the _targets files of an experiment between text and .npy.
+
+The text files (``img/cam1.10000_targets``) are what liboptv's tracker reads;
+the binary files (``img/cam1.10000_targets.npy``) hold the same targets as a
+``ptv.TARGET_DTYPE`` array, are smaller and faster to read and write, and keep
+the full precision of the target positions. Select the format the sequence
+step writes with ``pft_version.targets_format`` (``text`` or ``npy``) in the
+YAML file.
+
+Example:
+    python -m pyptv.convert_targets tests/test_cavity/parameters_Run1.yaml --to npy
+    python -m pyptv.convert_targets parameters_Run1.yaml --to text 10000 10004 --keep
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
+
+from pyptv import ptv
+from pyptv.parameter_manager import ParameterManager
+
+
+def convert_targets(
+    short_file_bases: Sequence[Union[str, Path]],
+    first_frame: int,
+    last_frame: int,
+    to: str,
+    keep_source: bool = False,
+) -> Tuple[int, int]:
+    """Convert the targets files of a frame range to another format.
+
+    Args:
+        short_file_bases: Targets file bases, one per camera (e.g. img/cam1)
+        first_frame: First frame to convert
+        last_frame: Last frame to convert
+        to: Target format, "text" or "npy"
+        keep_source: Keep the files in the original format
+
+    Returns:
+        Tuple of (converted files, frames/cameras without any targets file)
+    """
+    if to not in ptv.TARGET_FORMATS:
+        raise ValueError(f"Unknown targets format '{to}', use one of {ptv.TARGET_FORMATS}")
+    converted = missing = 0
+    for frame in range(first_frame, last_frame + 1):
+        for short_file_base in short_file_bases:
+            source = ptv.stored_target_format(short_file_base, frame)
+            if source is None:
+                missing += 1
+                continue
+            if source == to:
+                continue
+            arr = ptv.read_target_array(short_file_base, frame, source)
+            ptv.write_target_array(
+                arr, short_file_base, frame, to, keep_other=keep_source
+            )
+            converted += 1
+    return converted, missing
+
+
+def convert_experiment_targets(
+    yaml_file: Union[str, Path],
+    to: str,
+    first: Optional[int] = None,
+    last: Optional[int] = None,
+    keep_source: bool = False,
+) -> Tuple[int, int]:
+    """Convert the targets files of the experiment described by a YAML file.
+
+    The frame range defaults to sequence.first..sequence.last.
+    """
+    yaml_file = Path(yaml_file).resolve()
+    pm = ParameterManager()
+    pm.from_yaml(yaml_file)
+    sequence = pm.get_parameter('sequence')
+    first = sequence['first'] if first is None else first
+    last = sequence['last'] if last is None else last
+    bases = [yaml_file.parent / base for base in pm.get_target_filenames()]
+    return convert_targets(bases, first, last, to, keep_source=keep_source)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("yaml_file", type=Path, help="YAML parameter file")
+    parser.add_argument("first_frame", type=int, nargs="?", help="First frame (default: sequence.first)")
+    parser.add_argument("last_frame", type=int, nargs="?", help="Last frame (default: sequence.last)")
+    parser.add_argument("--to", choices=ptv.TARGET_FORMATS, required=True, help="Format to convert to")
+    parser.add_argument("--keep", action="store_true", help="Keep the files in the original format")
+    args = parser.parse_args(argv)
+
+    try:
+        converted, missing = convert_experiment_targets(
+            args.yaml_file, args.to, args.first_frame, args.last_frame, args.keep
+        )
+    except (OSError, ValueError) as e:
+        print(f"Conversion failed: {e}")
+        return 1
+    print(f"Converted {converted} targets files to {args.to}")
+    if missing:
+        print(f"{missing} frame/camera combinations have no targets file")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
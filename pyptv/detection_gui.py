@@ -26,11 +26,10 @@ from chaco.tools.image_inspector_tool import ImageInspectorTool
 from chaco.tools.better_zoom import BetterZoom as SimpleZoom
 
 from skimage.io import imread
-from skimage.util import img_as_ubyte
-from skimage.color import rgb2gray
 
 from optv.segmentation import target_recognition
 from pyptv import ptv
+from pyptv.preprocessing import as_uint8_gray
 from pyptv.text_box_overlay import TextBoxOverlay
 from pyptv.quiverplot import QuiverPlot
 
@@ -328,12 +327,8 @@ class DetectionGUI(HasTraits):
                 self.raw_image = imread(self.image_name)
                 print("Image loaded successfully")
 
-                if self.raw_image.ndim > 2:
-                    print("Converting image to grayscale")
-                    self.raw_image = rgb2gray(self.raw_image) 
-                
-                print("Converting image to 8-bit unsigned integer format")
-                self.raw_image = img_as_ubyte(self.raw_image)
+                print("Converting image to 8-bit grayscale")
+                self.raw_image = as_uint8_gray(self.raw_image)
                 print(f"self.raw_image.shape: {self.raw_image.shape}")
 
 
@@ -1,8 +1,40 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
 import numpy as np
 from optv.imgcoord import image_coordinates
 from optv.transforms import convert_arr_metric_to_pixel
 from flowtracks.io import trajectories_ptvis  # Expose for testing/monkeypatching
 
+@contextmanager
+def ptv_is_files(ptv_is_pattern="res/ptv_is.%d", run_store=None):
+    """
+    Yield the ptv_is file pattern to read with flowtracks.
+    With a run store (pyptv.run_store.RunStore), its linkage arrays are written to
+    ptv_is files in a temporary directory that is removed afterwards.
+    """
+    if run_store is None:
+        yield ptv_is_pattern
+        return
+    from pyptv.run_store import write_legacy_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for frame in run_store.frames("linkage"):
+            write_legacy_file(
+                "linkage", os.path.join(tmp, f"ptv_is.{frame}"), run_store.read("linkage", frame)
+            )
+        yield os.path.join(tmp, "ptv_is.%d")
+
+def _gui_run_store(guiobj):
+    """Read-only run store of the GUI's experiment, None if it does not use one."""
+    from pyptv.run_store import STORE_FILE, RunStore, run_store_enabled
+
+    pm = getattr(getattr(guiobj, "exp1", None), "pm", None)
+    if pm is None or not run_store_enabled(pm) or not STORE_FILE.exists():
+        return None
+    return RunStore(STORE_FILE)
+
 def compute_flowtracks_trajectories_from_guiobj(guiobj):
     """
     Compute 2D projected trajectories for each camera from a flowtracks dataset, using info.object from GUI.
@@ -16,9 +48,13 @@ def compute_flowtracks_trajectories_from_guiobj(guiobj):
     # Optionally: guiobj.overlay_set_images(base_names, seq_first, seq_last) # GUI should handle display
 
     from flowtracks.io import trajectories_ptvis
-    dataset = trajectories_ptvis(
-        "res/ptv_is.%d", first=seq_first, last=seq_last, xuap=False, traj_min_len=3
-    )
+    run_store = _gui_run_store(guiobj)
+    with ptv_is_files(run_store=run_store) as ptv_is_pattern:
+        dataset = trajectories_ptvis(
+            ptv_is_pattern, first=seq_first, last=seq_last, xuap=False, traj_min_len=3
+        )
+    if run_store is not None:
+        run_store.close()
     cals = guiobj.cals
     cpar = guiobj.cpar
     num_cams = guiobj.num_cams
@@ -58,14 +94,16 @@ def compute_flowtracks_trajectories_from_guiobj(guiobj):
         ends_x=ends_x, ends_y=ends_y
     )
 
-def export_ptv_is_to_paraview(ptv_is_pattern="res/ptv_is.%d", output_dir="./res", xuap=False):
+def export_ptv_is_to_paraview(ptv_is_pattern="res/ptv_is.%d", output_dir="./res", xuap=False, run_store=None):
     """
     Reads ptv_is.# files and exports per-frame CSVs for Paraview visualization.
     Each output file is named ptv_<frame>.txt and contains columns:
     particle, x, y, z, dx, dy, dz
+    With run_store (a pyptv.run_store.RunStore) the linkage is read from the store.
     """
     import pandas as pd
-    dataset = trajectories_ptvis(ptv_is_pattern, xuap=xuap)
+    with ptv_is_files(ptv_is_pattern, run_store) as pattern:
+        dataset = trajectories_ptvis(pattern, xuap=xuap)
     dataframes = []
     for traj in dataset:
         dataframes.append(
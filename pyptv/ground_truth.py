@@ -17,6 +17,7 @@ from pathlib import Path
 import numpy as np
 
 from optv.calibration import Calibration
+from optv.parameters import ControlParams
 from optv.imgcoord import image_coordinates
 from optv.transforms import convert_arr_metric_to_pixel
 
@@ -61,6 +62,48 @@ def _load_calibration_pair(base_dir: Path, ori_rel_or_abs: str) -> Calibration:
     return cal
 
 
+def load_ground_truth_cameras(
+    yaml_path: Path, pm: ParameterManager | None = None
+) -> tuple[ControlParams, list[Calibration]]:
+    """Load `cpar` and the `cal_ori.img_ori` calibrations of a YAML.
+
+    Calibration paths are relative to the YAML directory.
+    """
+    yaml_path = Path(yaml_path)
+    if pm is None:
+        pm = ParameterManager()
+        pm.from_yaml(yaml_path)
+
+    params = pm.parameters
+    cal_ori = params.get("cal_ori")
+    if not isinstance(cal_ori, dict):
+        raise KeyError("YAML must contain 'cal_ori'")
+
+    num_cams = int(pm.num_cams or params.get("num_cams") or 0)
+    if num_cams <= 0:
+        raise ValueError("num_cams must be > 0")
+
+    img_ori = cal_ori.get("img_ori")
+    if not img_ori or len(img_ori) < num_cams:
+        raise ValueError("cal_ori.img_ori must list one .ori path per camera")
+
+    # Build cpar from YAML
+    cpar, *_rest = ptv.py_start_proc_c(pm, root=yaml_path.resolve().parent)
+    cals = [_load_calibration_pair(yaml_path.parent, img_ori[cam]) for cam in range(num_cams)]
+    return cpar, cals
+
+
+def project_points(xyz: np.ndarray, cpar: ControlParams, cals: list[Calibration]) -> np.ndarray:
+    """Project (N,3) points into every camera; returns (C,N,2) pixel coordinates."""
+    xyz = np.asarray(xyz, dtype=float)
+    xy = np.zeros((len(cals), xyz.shape[0], 2), dtype=float)
+    for cam, cal in enumerate(cals):
+        projected_metric = image_coordinates(xyz, cal, cpar.get_multimedia_params())
+        pix = convert_arr_metric_to_pixel(projected_metric, cpar)
+        xy[cam] = np.asarray(pix, dtype=float).reshape(-1, 2)
+    return xy
+
+
 def generate_ground_truth(
     yaml_path: Path,
     *,
@@ -83,17 +126,8 @@ def generate_ground_truth(
     pm = ParameterManager()
     pm.from_yaml(yaml_path)
 
-    params = pm.parameters
-    cal_ori = params.get("cal_ori")
-    if not isinstance(cal_ori, dict):
-        raise KeyError("YAML must contain 'cal_ori'")
-
-    num_cams = int(pm.num_cams or params.get("num_cams") or 0)
-    if num_cams <= 0:
-        raise ValueError("num_cams must be > 0")
-
-    # Build cpar from YAML
-    cpar, *_rest = ptv.py_start_proc_c(pm)
+    cpar, cals = load_ground_truth_cameras(yaml_path, pm)
+    cal_ori = pm.parameters["cal_ori"]
 
     if xyz is None:
         if not use_fixp_if_xyz_missing:
@@ -112,27 +146,11 @@ def generate_ground_truth(
 
     pnr = np.arange(xyz.shape[0], dtype=int)
 
-    img_ori = cal_ori.get("img_ori")
-    if not img_ori or len(img_ori) < num_cams:
-        raise ValueError("cal_ori.img_ori must list one .ori path per camera")
-
     rng = np.random.default_rng(seed)
-    xy = np.zeros((num_cams, xyz.shape[0], 2), dtype=float)
-
-    for cam in range(num_cams):
-        cal = _load_calibration_pair(yaml_path.parent, img_ori[cam])
-        projected_metric = image_coordinates(
-            np.asarray(xyz, dtype=float),
-            cal,
-            cpar.get_multimedia_params(),
-        )
-        pix = convert_arr_metric_to_pixel(projected_metric, cpar)
-        pix = np.asarray(pix, dtype=float).reshape(-1, 2)
-
-        if noise_sigma_px > 0:
-            pix = pix + rng.normal(0.0, noise_sigma_px, size=pix.shape)
-
-        xy[cam] = pix
+    xy = project_points(xyz, cpar, cals)
+    if noise_sigma_px > 0:
+        for cam in range(len(cals)):
+            xy[cam] = xy[cam] + rng.normal(0.0, noise_sigma_px, size=xy[cam].shape)
 
     return GroundTruthData(xyz=xyz, xy=xy, pnr=pnr)
 
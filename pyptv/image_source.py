@@ -0,0 +1,300 @@
+"""Sources of the sequence images: one file per frame, or image stacks.
+
+``sequence.base_name`` lists one entry per camera. An entry with a frame
+number pattern (``img/cam1.%d``) names one image file per frame, as before.
+An entry naming a file with one of the ``STACK_EXTENSIONS`` and no pattern
+is an image stack holding all frames of the camera:
+
+- ``.npy``: an array of shape (frames, height, width);
+- ``.tif``/``.tiff``: a multi-page TIFF, one page per frame;
+- ``.raw``: headerless 8-bit frames of ``ptv.imx`` x ``ptv.imy`` pixels, after
+  ``sequence.raw_header_bytes`` (default 0) bytes of file header.
+
+Page ``i`` of a stack is frame ``sequence.stack_first_frame + i``
+(``stack_first_frame`` defaults to 0). The stacks are memory-mapped and
+``read`` returns views into the mapped buffer, so serving a frame costs
+neither an open nor a decode and the OS page cache keeps the hot data.
+Compressed TIFFs cannot be mapped; they are decoded into memory once, when
+opened.
+
+With ``ptv.splitter`` all cameras are the quadrants of one composite image
+of 2 ``imx`` x 2 ``imy`` pixels, named by the first ``base_name`` entry (a
+file pattern or a stack). The composite is read once per frame and the
+cameras get views of its quadrants, see ``image_split``.
+
+Example:
+    >>> names = ["img/cam1.npy", "img/cam2.npy"]
+    >>> with open_image_source(names, seq_params, ptv_params, read_sequence_image) as source:
+    ...     images = source.frame_images(10000)
+"""
+
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+STACK_EXTENSIONS = (".npy", ".raw", ".tif", ".tiff")
+# Quadrants of cameras 1-4 in a splitter image: top left, top right,
+# bottom right, bottom left
+SPLITTER_ORDER = (0, 1, 3, 2)
+
+
+def image_split(img: np.ndarray, order: Sequence[int] = SPLITTER_ORDER) -> List[np.ndarray]:
+    """Split image into four quadrants.
+
+    Returns views of ``img``, listed in ``order`` of the quadrants top
+    left, top right, bottom left and bottom right.
+    """
+    list_of_images = [
+        img[: img.shape[0] // 2, : img.shape[1] // 2],
+        img[: img.shape[0] // 2, img.shape[1] // 2:],
+        img[img.shape[0] // 2:, : img.shape[1] // 2],
+        img[img.shape[0] // 2:, img.shape[1] // 2:],
+    ]
+    return [list_of_images[i] for i in order]
+
+
+class ImageSource(ABC):
+    """The image of every camera and frame of a sequence."""
+
+    num_cams: int
+
+    @abstractmethod
+    def paths(self, frame: int) -> List[str]:
+        """Files holding the images of ``frame``, one per camera."""
+
+    @abstractmethod
+    def read(self, cam: int, frame: int) -> np.ndarray:
+        """The 8-bit image of camera ``cam`` in ``frame``."""
+
+    def frame_images(self, frame: int) -> List[np.ndarray]:
+        """The images of all cameras in ``frame``."""
+        return [self.read(cam, frame) for cam in range(self.num_cams)]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ImageSource":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class FileImageSource(ImageSource):
+    """One image file per camera and frame.
+
+    Args:
+        base_names: Per camera, a file name pattern with the frame number,
+            e.g. ``img/cam1.%d``.
+        loader: Callable decoding an image file into an 8-bit array.
+    """
+
+    def __init__(self, base_names: Sequence[str], loader: Callable[[str], np.ndarray]):
+        self.base_names = list(base_names)
+        self.num_cams = len(self.base_names)
+        self._loader = loader
+
+    def paths(self, frame: int) -> List[str]:
+        return [base_name % frame for base_name in self.base_names]
+
+    def read(self, cam: int, frame: int) -> np.ndarray:
+        return self._loader(self.base_names[cam] % frame)
+
+
+def open_stack(
+    path: os.PathLike | str,
+    image_size: Optional[Sequence[int]] = None,
+    header_bytes: int = 0,
+) -> np.ndarray:
+    """Memory-map an image stack as an array of shape (frames, height, width).
+
+    Args:
+        path: ``.npy``, ``.raw`` or multi-page ``.tif``/``.tiff`` file.
+        image_size: (width, height) of the frames of a ``.raw`` stack.
+        header_bytes: Bytes to skip at the start of a ``.raw`` stack.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file is not a stack of 2D 8-bit frames.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} does not exist")
+    suffix = path.suffix.lower()
+
+    if suffix == ".npy":
+        stack = np.load(path, mmap_mode="r")
+    elif suffix == ".raw":
+        if image_size is None:
+            raise ValueError(f"The image size of the raw stack {path} is needed")
+        width, height = (int(v) for v in image_size)
+        data_bytes = path.stat().st_size - header_bytes
+        if data_bytes <= 0 or data_bytes % (width * height):
+            raise ValueError(
+                f"Size of {path} is not a whole number of {width}x{height} 8-bit frames "
+                f"after {header_bytes} header bytes"
+            )
+        stack = np.memmap(
+            path, dtype=np.uint8, mode="r", offset=header_bytes,
+            shape=(data_bytes // (width * height), height, width),
+        )
+    elif suffix in (".tif", ".tiff"):
+        import tifffile
+
+        try:
+            stack = tifffile.memmap(path, mode="r")
+        except ValueError:
+            # Compressed or scattered pages cannot be mapped
+            stack = tifffile.imread(path)
+    else:
+        raise ValueError(f"Unknown image stack type: {path}. Use one of {', '.join(STACK_EXTENSIONS)}")
+
+    if stack.ndim == 2:
+        stack = stack[np.newaxis]
+    if stack.ndim != 3:
+        raise ValueError(f"{path} is not a stack of 2D frames, its shape is {stack.shape}")
+    if stack.dtype != np.uint8:
+        raise ValueError(f"{path} must hold 8-bit frames, not {stack.dtype}")
+    return stack
+
+
+class StackImageSource(ImageSource):
+    """Frames served as views into memory-mapped image stacks.
+
+    Args:
+        paths: One stack file per camera, see ``open_stack``.
+        first_frame: Frame number of the first page of the stacks.
+        image_size: (width, height) of the frames of ``.raw`` stacks.
+        header_bytes: Bytes to skip at the start of ``.raw`` stacks.
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[os.PathLike | str],
+        first_frame: int = 0,
+        image_size: Optional[Sequence[int]] = None,
+        header_bytes: int = 0,
+    ):
+        self.stack_paths = [str(path) for path in paths]
+        self.num_cams = len(self.stack_paths)
+        self.first_frame = int(first_frame)
+        self.stacks = [open_stack(path, image_size, header_bytes) for path in self.stack_paths]
+
+    def paths(self, frame: int) -> List[str]:
+        return list(self.stack_paths)
+
+    def read(self, cam: int, frame: int) -> np.ndarray:
+        stack = self.stacks[cam]
+        index = frame - self.first_frame
+        if not 0 <= index < len(stack):
+            raise FileNotFoundError(
+                f"Frame {frame} is not in {self.stack_paths[cam]}, which holds frames "
+                f"{self.first_frame} to {self.first_frame + len(stack) - 1}"
+            )
+        return stack[index]
+
+    def close(self) -> None:
+        # The maps are released with the last view into them
+        self.stacks = []
+
+
+class SplitterImageSource(ImageSource):
+    """Cameras served as quadrant views of one composite image per frame.
+
+    Args:
+        composite: One-camera source of the composite images.
+        num_cams: Number of cameras, at most 4.
+        order: Quadrant of every camera, see ``image_split``.
+    """
+
+    def __init__(
+        self,
+        composite: ImageSource,
+        num_cams: int,
+        order: Sequence[int] = SPLITTER_ORDER,
+    ):
+        if not 1 <= num_cams <= len(order):
+            raise ValueError(f"A splitter image holds 1 to {len(order)} cameras, not {num_cams}")
+        self.composite = composite
+        self.num_cams = num_cams
+        self.order = list(order)
+        self._frame: Optional[int] = None
+        self._views: List[np.ndarray] = []
+
+    def paths(self, frame: int) -> List[str]:
+        return self.composite.paths(frame) * self.num_cams
+
+    def split(self, image: np.ndarray) -> List[np.ndarray]:
+        """Quadrant views of a composite image, one per camera."""
+        return image_split(image, self.order)[: self.num_cams]
+
+    def frame_images(self, frame: int) -> List[np.ndarray]:
+        # The cameras of a frame share one read of the composite
+        if frame != self._frame:
+            self._views = self.split(self.composite.read(0, frame))
+            self._frame = frame
+        return list(self._views)
+
+    def read(self, cam: int, frame: int) -> np.ndarray:
+        return self.frame_images(frame)[cam]
+
+    def close(self) -> None:
+        self._frame, self._views = None, []
+        self.composite.close()
+
+
+def sequence_base_names(base_names: Sequence[str], ptv_params: dict) -> List[str]:
+    """The ``sequence.base_name`` entries naming images: only the first in splitter mode."""
+    if ptv_params.get("splitter", False):
+        return list(base_names[:1])
+    return list(base_names)
+
+
+def is_stack(base_name: str) -> bool:
+    """Whether a ``sequence.base_name`` entry names an image stack."""
+    return "%" not in base_name and Path(base_name).suffix.lower() in STACK_EXTENSIONS
+
+
+def image_paths(base_names: Sequence[str], frame: int) -> List[str]:
+    """Files holding the images of ``frame``: the stacks, or one file per camera."""
+    return [name if is_stack(name) else name % frame for name in base_names]
+
+
+def open_image_source(
+    base_names: Sequence[str],
+    seq_params: dict,
+    ptv_params: dict,
+    loader: Callable[[str], np.ndarray],
+) -> ImageSource:
+    """Image source of the ``sequence.base_name`` entries of all cameras.
+
+    Raises:
+        ValueError: If stacks and per-frame files are mixed.
+    """
+    if ptv_params.get("splitter", False):
+        composite_params = dict(
+            ptv_params, splitter=False, imx=2 * ptv_params["imx"], imy=2 * ptv_params["imy"]
+        )
+        composite = open_image_source(
+            sequence_base_names(base_names, ptv_params), seq_params, composite_params, loader
+        )
+        return SplitterImageSource(composite, len(base_names))
+
+    stacks = [is_stack(base_name) for base_name in base_names]
+    if not any(stacks):
+        return FileImageSource(base_names, loader)
+    if not all(stacks):
+        raise ValueError(
+            "sequence.base_name must name image stacks for all cameras or for none"
+        )
+    return StackImageSource(
+        base_names,
+        first_frame=int(seq_params.get("stack_first_frame", 0)),
+        image_size=(ptv_params["imx"], ptv_params["imy"]),
+        header_bytes=int(seq_params.get("raw_header_bytes", 0)),
+    )
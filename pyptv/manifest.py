@@ -0,0 +1,260 @@
+"""Run manifest for incremental and resumable sequence processing.
+
+Every frame written by the sequence step is recorded in ``res/sequence_manifest.jsonl``
+together with
+
+- a hash of the parameters that determine its output: the ``ptv`` (except the
+  GUI's ``img_name``), ``targ_rec``, ``criteria``, ``masking`` and
+  ``pft_version`` sections, the image base names, stack first frame and raw
+  header size of the ``sequence`` section and the contents of the
+  calibration (``.ori``/``.addpar``), background mask and mask polygon files;
+- the size and modification time of its input images;
+- a hash of the rows of its output files (``_targets`` of every camera and
+  ``res/rt_is.<frame>``) without the ``tnr`` column of the targets.
+
+A frame is up to date when its latest record has the current parameter hash,
+its input files did not change since and its output files still start with the
+recorded rows. Records are appended one line
+per frame, so interrupted runs keep the frames they finished and parallel
+workers can share one manifest. Runs that do not resume start by compacting the
+file to the latest record of every frame (``compact_manifest``), so it does not
+grow with every run.
+
+Tracking rewrites the output files: it sets the ``tnr`` of the targets it
+links and appends the particles it adds to ``rt_is``. Neither changes the
+recorded rows, so the sequence output stays valid after tracking, and
+tracking parameters are not part of the hash either.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from pyptv.preprocessing import background_filename
+
+MANIFEST_FILE = Path("res") / "sequence_manifest.jsonl"
+HASHED_SECTIONS = ("ptv", "targ_rec", "criteria", "masking", "pft_version")
+# Keys of the sequence section that decide which pixels a frame number reads
+HASHED_SEQUENCE_KEYS = ("base_name", "stack_first_frame", "raw_header_bytes")
+
+PathLike = Union[str, os.PathLike]
+
+
+def parameter_files(pm) -> List[Path]:
+    """Return the calibration, background and mask polygon files used by the
+    sequence step, as named in the parameters."""
+    files = []
+    for base_name in pm.get_parameter('ptv').get('img_cal', []):
+        if base_name:
+            files += [Path(base_name + ".ori"), Path(base_name + ".addpar")]
+    masking = pm.parameters.get('masking') or {}
+    if masking.get('mask_flag', False):
+        files += [
+            Path(background_filename(masking['mask_base_name'], i_cam))
+            for i_cam in range(pm.num_cams)
+        ]
+    if masking.get('polygon_base_name'):
+        files += [
+            Path(background_filename(masking['polygon_base_name'], i_cam))
+            for i_cam in range(pm.num_cams)
+        ]
+    return files
+
+
+def sequence_parameter_hash(pm, root: Optional[Path] = None) -> str:
+    """Hash of everything in the parameters that changes the sequence output.
+
+    Relative file paths are resolved against ``root``, the experiment
+    directory, or the working directory if it is None. The hash covers the
+    file names as written in the parameters, so it does not change when the
+    experiment directory moves.
+    """
+    digest = hashlib.sha256()
+    sections = {name: pm.parameters.get(name) for name in HASHED_SECTIONS}
+    sections["ptv"] = {
+        key: value for key, value in (sections["ptv"] or {}).items()
+        if key != "img_name"
+    }
+    sequence = pm.parameters.get("sequence") or {}
+    sections["sequence"] = {key: sequence.get(key) for key in HASHED_SEQUENCE_KEYS}
+    digest.update(json.dumps(sections, sort_keys=True, default=str).encode())
+    for filename in parameter_files(pm):
+        digest.update(str(filename).encode())
+        if root is not None and not filename.is_absolute():
+            filename = Path(root) / filename
+        try:
+            digest.update(filename.read_bytes())
+        except FileNotFoundError:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+
+def read_records(path: PathLike) -> Dict[int, dict]:
+    """Latest record of every frame in a manifest file."""
+    records = {}
+    if Path(path).exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records[int(record["frame"])] = record
+                except (ValueError, KeyError, TypeError):
+                    # A run killed mid-write may leave a truncated line
+                    continue
+    return records
+
+
+def compact_manifest(path: PathLike) -> None:
+    """Rewrite a manifest file with only the latest record of every frame.
+
+    Must not run while workers append to the file.
+    """
+    path = Path(path)
+    if not path.exists():
+        return
+    records = read_records(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for frame in sorted(records):
+            f.write(json.dumps(records[frame]) + "\n")
+    os.replace(tmp_path, path)
+
+
+def file_signature(path: PathLike) -> Optional[List[int]]:
+    """Return [size, mtime_ns] of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def output_signature(path: PathLike, rows: Optional[int] = None) -> Optional[list]:
+    """Return [rows, sha256] of the first ``rows`` rows of an output file.
+
+    All rows are hashed if ``rows`` is None. The ``tnr`` column of ``_targets``
+    files, which tracking fills in, is left out. Returns None if the file does
+    not exist or has fewer rows.
+    """
+    path = Path(path)
+    targets = path.name.endswith(("_targets", "_targets.npy"))
+    try:
+        if path.suffix == ".npy":
+            data = np.load(path)
+            if targets:
+                data["tnr"] = 0
+        else:
+            with open(path, "rb") as f:
+                # The first line holds the number of rows
+                data = f.read().splitlines()[1:]
+    except FileNotFoundError:
+        return None
+    if rows is not None:
+        if len(data) < rows:
+            return None
+        data = data[:rows]
+    if isinstance(data, np.ndarray):
+        payload = data.tobytes()
+    elif targets:
+        payload = b"\n".join(line.rsplit(None, 1)[0] for line in data)
+    else:
+        payload = b"\n".join(data)
+    return [len(data), hashlib.sha256(payload).hexdigest()]
+
+
+class RunManifest:
+    """Per-frame record of the sequence output of an experiment.
+
+    Args:
+        path: Manifest file (JSON lines), usually ``res/sequence_manifest.jsonl``
+        params_hash: Hash of the current parameters, see ``sequence_parameter_hash``
+        root: Experiment directory; the files of a record are keyed by their
+            path relative to it, so records of runs with and without an
+            explicit root match
+    """
+
+    def __init__(self, path: PathLike, params_hash: str, root: Optional[PathLike] = None):
+        self.path = Path(path)
+        self.params_hash = params_hash
+        self.root = Path(root) if root is not None else None
+        self._records: Optional[Dict[int, dict]] = None
+
+    @classmethod
+    def for_experiment(
+        cls, pm, path: PathLike = MANIFEST_FILE, root: Optional[PathLike] = None
+    ) -> "RunManifest":
+        """Manifest of an experiment; relative paths are resolved against ``root``."""
+        path = Path(path)
+        if root is not None and not path.is_absolute():
+            path = Path(root) / path
+        return cls(path, sequence_parameter_hash(pm, root), root)
+
+    def _key(self, path: PathLike) -> str:
+        """Key of a file in a record: its path relative to the root."""
+        if self.root is not None:
+            try:
+                return str(Path(path).relative_to(self.root))
+            except ValueError:
+                pass
+        return str(path)
+
+    @property
+    def records(self) -> Dict[int, dict]:
+        """Latest record of every frame in the manifest file."""
+        if self._records is None:
+            self._records = read_records(self.path)
+        return self._records
+
+    def is_valid(
+        self, frame: int, inputs: Sequence[PathLike], outputs: Sequence[PathLike]
+    ) -> bool:
+        """Whether the recorded output of a frame is still up to date."""
+        record = self.records.get(frame)
+        if record is None or record.get("params") != self.params_hash:
+            return False
+        recorded = record.get("inputs", {})
+        for path in inputs:
+            signature = file_signature(path)
+            if signature is None or recorded.get(self._key(path)) != signature:
+                return False
+        recorded = record.get("outputs", {})
+        for path in outputs:
+            expected = recorded.get(self._key(path))
+            if expected is None or output_signature(path, expected[0]) != expected:
+                return False
+        return True
+
+    def pending(
+        self,
+        frames: Iterable[int],
+        inputs_of,
+        outputs_of,
+    ) -> List[int]:
+        """Frames that are missing or stale and have to be processed."""
+        return [
+            frame for frame in frames
+            if not self.is_valid(frame, inputs_of(frame), outputs_of(frame))
+        ]
+
+    def record(
+        self, frame: int, inputs: Sequence[PathLike], outputs: Sequence[PathLike]
+    ) -> None:
+        """Append the record of a frame whose output was just written."""
+        record = {
+            "frame": frame,
+            "params": self.params_hash,
+            "inputs": {self._key(p): file_signature(p) for p in inputs},
+            "outputs": {self._key(p): output_signature(p) for p in outputs},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One write per line in append mode, so concurrent workers do not interleave
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        if self._records is not None:
+            self._records[frame] = record
@@ -112,7 +112,7 @@ def _(num_cams, params, pm):
 
 @app.cell
 def _(cpar, images, pm):
-    images_8bit = [ptv.img_as_ubyte(im) for im in images]
+    images_8bit = [ptv.as_uint8_gray(im) for im in images]
 
     # # Check if negative flag is set, if so, invert the 8-bit images
     is_negative = pm.parameters.get('ptv', {}).get('negative', False)
@@ -29,21 +29,19 @@ def _():
     from pathlib import Path
     import sys
 
-    from skimage.color import rgb2gray
     from skimage.io import imread
-    from skimage.util import img_as_ubyte
 
     from optv.segmentation import target_recognition
+    from pyptv.preprocessing import as_uint8_gray
 
     return (
         Path,
-        img_as_ubyte,
+        as_uint8_gray,
         imread,
         mo,
         np,
         pd,
         plt,
-        rgb2gray,
         sys,
         target_recognition,
     )
@@ -155,13 +153,12 @@ def _(mo):
 @app.cell
 def _(
     Path,
+    as_uint8_gray,
     hp_flag,
     image_name,
-    img_as_ubyte,
     imread,
     inverse_flag,
     mo,
-    rgb2gray,
     working_dir,
 ):
     wd = Path(working_dir.value).expanduser().resolve()
@@ -179,10 +176,7 @@ def _(
     if not img_path.exists():
         mo.stop(f"Image not found: {img_path}")
 
-    raw_image = imread(img_path)
-    if raw_image.ndim > 2:
-        raw_image = rgb2gray(raw_image)
-    raw_image = img_as_ubyte(raw_image)
+    raw_image = as_uint8_gray(imread(img_path))
 
     # Process image (inverse/highpass are applied in next cell)
     info = mo.md(
@@ -9,8 +9,6 @@ import os
 from pathlib import Path
 import numpy as np
 from skimage.io import imread
-from skimage.util import img_as_ubyte
-from skimage.color import rgb2gray
 
 from traits.api import HasTraits, Str, Int, Bool, Instance, Button
 from traitsui.api import View, Item, HGroup, VGroup, ListEditor
@@ -29,6 +27,7 @@ from chaco.tools.better_zoom import BetterZoom as SimpleZoom
 from pyptv.text_box_overlay import TextBoxOverlay
 from pyptv import ptv
 from pyptv.experiment import Experiment
+from pyptv.preprocessing import as_uint8_gray
 
 
 # recognized names for the flags:
@@ -328,11 +327,7 @@ class MaskGUI(HasTraits):
         ptv_params = self.experiment.get_parameter('ptv')
         for i, cam in enumerate(self.camera):
             imname = ptv_params['img_name'][i] if ptv_params else ""
-            im = imread(imname)
-            if im.ndim > 2:
-                im = rgb2gray(im[:, :, :3])
-
-            self.images.append(img_as_ubyte(im))
+            self.images.append(as_uint8_gray(imread(imname)))
 
         self.reset_show_images()
         self.pass_init = True
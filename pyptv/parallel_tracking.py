@@ -0,0 +1,647 @@
+"""Parallel tracking of overlapping frame windows, stitched into one run.
+
+liboptv's ``Tracker`` steps through the frames one after the other, so on
+long runs ``full_forward`` is the longest single step of a batch run.
+``run_parallel_tracking`` splits first..last into windows that worker processes
+track at the same time, each with its own ``Tracker`` over its own frames,
+and stitches the windows back together.
+
+Every window owns a block of consecutive frames and is tracked from
+``overlap`` frames before the block to ``overlap`` frames after it (within
+first..last). The frames before it let the tracker build up the links and
+velocities that lead into the block; the frames after it are the lookahead
+the tracker uses for the last frames of the block. Only the owned frames of
+a window are kept.
+
+At the boundary between two windows, the ``next`` links of the last owned
+frame of the first window are kept: they were chosen with the same history
+and lookahead as in a serial run. They point into the first window's
+version of the following frame, so they are mapped to the rows of the second
+window's version of it, matched on position and correspondences (the
+tracker appends the particles it adds to a frame, so row numbers can
+differ). The ``prev`` links of that frame are rewritten to agree, which
+gives one consistent ``ptv_is`` numbering.
+
+The tracker reads and writes files, so every window is tracked in its own
+frame buffer (``pipeline.FrameBuffer``) that holds a few frames at a time.
+The output is written once, to the ``_targets`` and ``res/`` files or to the
+run store: by the workers for the frames no other window reads, and after
+stitching for the frames around the boundaries.
+
+The stitched links equal those of serial tracking once the overlap is long
+enough for the tracker to settle on the same links. ``compare`` tracks an
+experiment both ways, without touching its output, and reports the
+differences::
+
+    python -m pyptv.parallel_tracking compare tests/test_cavity/parameters_Run1.yaml 10000 10004 --window 2 --overlap 2
+    python -m pyptv.parallel_tracking run tests/test_cavity/parameters_Run1.yaml 10000 10004 -n 2
+
+``pyptv_batch_parallel --parallel-tracking`` uses it for its tracking step.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from optv.parameters import SequenceParams
+from optv.tracker import Tracker
+
+from pyptv import ptv
+from pyptv.pipeline import TRACKER_LOOKAHEAD, FrameBuffer
+from pyptv.processing_context import ProcessingContext
+from pyptv.profiling import optv_call, profiled
+from pyptv.run_store import (
+    STORE_FILE,
+    RunStore,
+    legacy_filename,
+    read_legacy_file,
+    run_store_enabled,
+    write_legacy_file,
+)
+
+# Link values of liboptv for particles without a predecessor / successor
+PREV_NONE = -1
+NEXT_NONE = -2
+# The last owned frame of a window needs the tracker's lookahead frames
+MIN_OVERLAP = TRACKER_LOOKAHEAD - 1
+DEFAULT_OVERLAP = 10
+
+PathLike = Union[str, os.PathLike]
+_RowKey = Tuple[float, float, float, int, int, int, int]
+
+
+class TrackingWindow(NamedTuple):
+    """Frames first..last tracked by one worker, of which it owns own_first..own_last."""
+
+    first: int
+    last: int
+    own_first: int
+    own_last: int
+
+
+class TrackedFrame(NamedTuple):
+    """Tracker output of one frame.
+
+    ``targets`` holds the targets of every camera (None where the tracker
+    wrote no file), the other fields the rt_is, ptv_is and added arrays, in
+    the dtypes of ``pyptv.run_store.KIND_DTYPES``.
+    """
+
+    targets: List[Optional[np.ndarray]]
+    correspondences: np.ndarray
+    linkage: np.ndarray
+    added: Optional[np.ndarray]
+
+
+class WindowResult(NamedTuple):
+    """Owned frames of a tracked window, as returned by track_window.
+
+    ``next_correspondences`` is the window's rt_is of the frame after its
+    owned ones (None for the last window): the rows its last ``next`` links
+    point to.
+    """
+
+    window: TrackingWindow
+    frames: Dict[int, TrackedFrame]
+    next_correspondences: Optional[np.ndarray]
+    pid: int
+    seconds: float
+
+
+class TrackingComparison(NamedTuple):
+    """Differences between two trackings of the same frames, see compare_tracking."""
+
+    frames: int
+    serial_particles: int
+    stitched_particles: int
+    serial_links: int
+    stitched_links: int
+    common_links: int
+    differing_frames: List[int]
+
+    @property
+    def agreement(self) -> float:
+        """Share of the links found by both, relative to the larger link count."""
+        links = max(self.serial_links, self.stitched_links)
+        return self.common_links / links if links else 1.0
+
+
+def tracking_windows(
+    first: int, last: int, window_size: int, overlap: int = DEFAULT_OVERLAP
+) -> List[TrackingWindow]:
+    """Split first..last into windows owning window_size frames each.
+
+    Raises:
+        ValueError: If window_size < 1 or overlap < MIN_OVERLAP
+    """
+    if window_size < 1:
+        raise ValueError(f"Tracking window size must be >= 1, got {window_size}")
+    if overlap < MIN_OVERLAP:
+        raise ValueError(f"Tracking overlap must be >= {MIN_OVERLAP} frames, got {overlap}")
+    windows = []
+    for own_first in range(first, last + 1, window_size):
+        own_last = min(own_first + window_size - 1, last)
+        windows.append(
+            TrackingWindow(
+                max(first, own_first - overlap), min(last, own_last + overlap), own_first, own_last
+            )
+        )
+    return windows
+
+
+def _stage_frame(
+    context: ProcessingContext, store: Optional[RunStore], buffer: FrameBuffer, frame: int
+) -> None:
+    """Write the targets and rt_is of a frame into the buffer, as text.
+
+    The run store, if the experiment uses one, takes precedence over the
+    files, as in ptv.py_trackcorr_init.
+    """
+    for cam, short_file_base in enumerate(context.target_filenames):
+        short_file_base = str(short_file_base)
+        if store is not None and store.has("targets", frame, cam):
+            arr = store.read("targets", frame, cam)
+        elif ptv.stored_target_format(short_file_base, frame) is not None:
+            arr = ptv.read_target_array(short_file_base, frame)
+        else:
+            continue
+        ptv.write_target_array(arr, buffer.target_bases[cam], frame, "text")
+
+    buffer_file = buffer.filename("correspondences", frame)
+    if store is not None and store.has("correspondences", frame):
+        write_legacy_file("correspondences", buffer_file, store.read("correspondences", frame))
+    else:
+        source = legacy_filename("correspondences", frame, root=context.output_root)
+        if os.path.exists(source):
+            shutil.copyfile(source, buffer_file)
+
+
+def _read_frame(buffer: FrameBuffer, frame: int) -> TrackedFrame:
+    targets = []
+    for buffer_base in buffer.target_bases:
+        if os.path.exists(ptv.target_filename(buffer_base, frame)):
+            targets.append(ptv.read_target_array(buffer_base, frame, "text"))
+        else:
+            targets.append(None)
+    added_file = buffer.filename("added", frame)
+    return TrackedFrame(
+        targets,
+        read_legacy_file("correspondences", buffer.filename("correspondences", frame)),
+        read_legacy_file("linkage", buffer.filename("linkage", frame)),
+        read_legacy_file("added", added_file) if os.path.exists(added_file) else None,
+    )
+
+
+def _remove_frame(buffer: FrameBuffer, frame: int) -> None:
+    for buffer_base in buffer.target_bases:
+        ptv._remove_file(ptv.target_filename(buffer_base, frame))
+    for kind in ("correspondences", "linkage", "added"):
+        ptv._remove_file(buffer.filename(kind, frame))
+
+
+def track_window(
+    yaml_file: PathLike,
+    window: TrackingWindow,
+    overlap: int = DEFAULT_OVERLAP,
+    buffer_root: Optional[str] = None,
+    profile_dir: Optional[PathLike] = None,
+    write: bool = True,
+) -> WindowResult:
+    """Track one window in a frame buffer.
+
+    Runs in a worker process. As in run_pipeline, every frame is copied into
+    the buffer just before the tracker reads it and taken out as soon as the
+    tracker has written it, so the buffer holds a few frames only.
+
+    Args:
+        yaml_file: YAML parameter file of the experiment
+        window: Frames to track and to keep
+        overlap: Overlap of the windows, see tracking_windows
+        buffer_root: Directory for the frame buffer (default: /dev/shm if
+            available)
+        profile_dir: Directory receiving the profile of the tracking, or None
+        write: Write the owned frames to the experiment's output, except the
+            ones other windows read or stitch to, which are returned.
+            Otherwise all owned frames are returned and nothing is written.
+    """
+    start = time.perf_counter()
+    context = ProcessingContext(yaml_file, window.first, window.last)
+
+    def shared(frame: int) -> bool:
+        """Whether another window reads the frame: it is written after stitching."""
+        return (window.own_first > window.first and frame < window.own_first + overlap) or (
+            window.own_last < window.last and frame > window.own_last - overlap
+        )
+
+    frames: Dict[int, TrackedFrame] = {}
+    next_correspondences = None
+    buffer = FrameBuffer(context.num_cams, buffer_root)
+    store_file = ptv.resolve_path(context.output_root, STORE_FILE)
+    store = None
+    if run_store_enabled(context.pm) and (write or store_file.exists()):
+        store = RunStore(store_file, "a" if write else "r")
+
+    def collect(frame: int) -> None:
+        nonlocal next_correspondences
+        if window.own_first <= frame <= window.own_last:
+            tracked = _read_frame(buffer, frame)
+            if write and not shared(frame):
+                write_tracked_frames(context, [(frame, tracked)], store)
+            else:
+                frames[frame] = tracked
+        elif frame == window.own_last + 1:
+            next_correspondences = read_legacy_file(
+                "correspondences", buffer.filename("correspondences", frame)
+            )
+        _remove_frame(buffer, frame)
+
+    profile_path = None
+    if profile_dir is not None:
+        profile_path = Path(profile_dir) / f"tracking-{window.own_first}-{window.own_last}.pstats"
+    try:
+        # The Tracker is built inside profiled() so that its C calls are timed
+        with profiled(profile_path):
+            tracker_spar = SequenceParams(num_cams=context.num_cams)
+            tracker_spar.set_first(window.first)
+            tracker_spar.set_last(window.last)
+            for i_cam, buffer_base in enumerate(buffer.target_bases):
+                tracker_spar.set_img_base_name(i_cam, buffer_base + ".")
+            tracker = optv_call(
+                "Tracker", Tracker,
+                context.cpar, context.vpar, context.track_par, tracker_spar, context.cals, buffer.naming,
+            )
+            # restart() reads the first frames, every step one more
+            staged = min(window.first + TRACKER_LOOKAHEAD - 1, window.last)
+            for frame in range(window.first, staged + 1):
+                _stage_frame(context, store, buffer, frame)
+            optv_call("Tracker.restart", tracker.restart)
+            collected = window.first
+            while True:
+                while staged < min(tracker.current_step() + TRACKER_LOOKAHEAD, window.last):
+                    staged += 1
+                    _stage_frame(context, store, buffer, staged)
+                if not optv_call("Tracker.step_forward", tracker.step_forward):
+                    break
+                # Frames before the current step are written and never read again
+                for done in range(collected, tracker.current_step()):
+                    collect(done)
+                collected = max(collected, tracker.current_step())
+            optv_call("Tracker.finalize", tracker.finalize)
+            for done in range(collected, window.last + 1):
+                collect(done)
+    finally:
+        buffer.close()
+        if store is not None:
+            store.close()
+    return WindowResult(
+        window, frames, next_correspondences, os.getpid(), time.perf_counter() - start
+    )
+
+
+def _row_key(row) -> _RowKey:
+    return (
+        float(row["x"]), float(row["y"]), float(row["z"]),
+        int(row["p1"]), int(row["p2"]), int(row["p3"]), int(row["p4"]),
+    )
+
+
+def match_rows(source: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Index in target of every row of source, -1 where there is none.
+
+    Both are rt_is arrays of the same frame; rows match on position and
+    correspondences.
+    """
+    rows = {}
+    for index, row in enumerate(target):
+        rows.setdefault(_row_key(row), index)
+    return np.array([rows.get(_row_key(row), -1) for row in source], dtype=np.int64)
+
+
+def link_frames(
+    before: TrackedFrame, seen_next: np.ndarray, after: TrackedFrame
+) -> Tuple[TrackedFrame, TrackedFrame]:
+    """Join the last owned frame of one window to the first owned frame of the next.
+
+    Args:
+        before: Last owned frame of the first window
+        seen_next: The first window's rt_is of the frame after it
+        after: That frame, as tracked by the second window
+
+    Returns:
+        before with its next links mapped into after's rows, and after with
+        its prev links rewritten to agree. Links of several rows of before
+        that map to one row of after are dropped.
+    """
+    rows = match_rows(seen_next, after.correspondences)
+    linkage = before.linkage.copy()
+    next_links = linkage["next"]
+    linked = np.flatnonzero(next_links >= 0)
+    mapped = np.full(len(linked), NEXT_NONE, dtype=next_links.dtype)
+    known = next_links[linked] < len(rows)
+    mapped[known] = rows[next_links[linked][known]]
+    mapped[mapped < 0] = NEXT_NONE
+    next_links[linked] = mapped
+    # Rows mapped onto the same row of after: no link can be trusted
+    targets, counts = np.unique(next_links[next_links >= 0], return_counts=True)
+    next_links[np.isin(next_links, targets[counts > 1])] = NEXT_NONE
+
+    after_linkage = after.linkage.copy()
+    after_linkage["prev"] = PREV_NONE
+    linked = np.flatnonzero(next_links >= 0)
+    after_linkage["prev"][next_links[linked]] = linked
+
+    before_added, after_added = before.added, after.added
+    if before_added is not None and len(before_added) == len(linkage):
+        before_added = before_added.copy()
+        before_added["next"] = linkage["next"]
+    if after_added is not None and len(after_added) == len(after_linkage):
+        after_added = after_added.copy()
+        after_added["prev"] = after_linkage["prev"]
+    return (
+        before._replace(linkage=linkage, added=before_added),
+        after._replace(linkage=after_linkage, added=after_added),
+    )
+
+
+def stitch(results: Sequence[WindowResult]) -> Dict[int, TrackedFrame]:
+    """Owned frames of all windows, with the links across the boundaries joined."""
+    results = sorted(results, key=lambda result: result.window.own_first)
+    frames: Dict[int, TrackedFrame] = {}
+    for result in results:
+        frames.update(result.frames)
+    for result in results[:-1]:
+        boundary = result.window.own_last
+        if result.next_correspondences is None or boundary + 1 not in frames:
+            continue
+        frames[boundary], frames[boundary + 1] = link_frames(
+            frames[boundary], result.next_correspondences, frames[boundary + 1]
+        )
+    return frames
+
+
+def _tracking_windows(
+    first: int, last: int, n_processes: int, window_size: Optional[int], overlap: int
+) -> List[TrackingWindow]:
+    if n_processes < 1:
+        raise ValueError(f"Number of processes must be >= 1, got {n_processes}")
+    if window_size is None:
+        window_size = math.ceil((last - first + 1) / n_processes)
+    return tracking_windows(first, last, window_size, overlap)
+
+
+def _track_windows(
+    yaml_file: Path,
+    windows: Sequence[TrackingWindow],
+    overlap: int,
+    n_processes: int,
+    buffer_root: Optional[str],
+    profile_dir: Optional[PathLike],
+    write: bool,
+) -> List[WindowResult]:
+    with ProcessPoolExecutor(max_workers=min(n_processes, len(windows))) as executor:
+        futures = [
+            executor.submit(
+                track_window, yaml_file, window, overlap, buffer_root, profile_dir, write
+            )
+            for window in windows
+        ]
+        return [future.result() for future in futures]
+
+
+def write_tracked_frames(
+    context: ProcessingContext,
+    frames: Iterable[Tuple[int, TrackedFrame]],
+    store: Optional[RunStore] = None,
+) -> int:
+    """Write tracked frames where serial tracking leaves its output.
+
+    Targets go to the ``_targets`` files in ``pft_version.targets_format``,
+    the rt_is, ptv_is and added arrays to ``res/``. With a run store
+    everything is appended to it instead; ``store`` is the open store, if the
+    caller has one.
+
+    Returns:
+        Number of frames written.
+    """
+    targets_format = ptv.configured_targets_format(context.pm.get_parameter('pft_version'))
+    own_store = store is None and run_store_enabled(context.pm)
+    if own_store:
+        store = RunStore(ptv.resolve_path(context.output_root, STORE_FILE), "a")
+    written = 0
+    try:
+        for frame, tracked in frames:
+            for cam, targets in enumerate(tracked.targets):
+                if targets is None:
+                    continue
+                if store is not None:
+                    store.append("targets", frame, targets, cam)
+                else:
+                    ptv.write_target_array(
+                        targets, str(context.target_filenames[cam]), frame, targets_format
+                    )
+            for kind in ("correspondences", "linkage", "added"):
+                arr = getattr(tracked, kind)
+                if arr is None:
+                    continue
+                if store is not None:
+                    store.append(kind, frame, arr)
+                else:
+                    write_legacy_file(kind, legacy_filename(kind, frame, root=context.output_root), arr)
+            written += 1
+    finally:
+        if own_store:
+            store.close()
+    return written
+
+
+def run_parallel_tracking(
+    yaml_file: PathLike,
+    first: int,
+    last: int,
+    n_processes: int = 2,
+    window_size: Optional[int] = None,
+    overlap: int = DEFAULT_OVERLAP,
+    buffer_root: Optional[str] = None,
+    profile_dir: Optional[PathLike] = None,
+) -> List[WindowResult]:
+    """Track frames first..last in overlapping windows and write the stitched output.
+
+    The output goes where serial tracking leaves it (see
+    write_tracked_frames). The workers write the owned frames that no other
+    window reads themselves; the ``overlap`` frames at either side of every
+    boundary are written by this process once all windows are done.
+
+    Args:
+        yaml_file: YAML parameter file of the experiment
+        first, last: Frame range to track
+        n_processes: Number of worker processes
+        window_size: Frames owned by every window (default: the range split
+            evenly over the processes)
+        overlap: Frames tracked before and after the owned ones
+        buffer_root: Directory for the frame buffers (default: /dev/shm if
+            available)
+        profile_dir: Directory receiving the profile of every window, or None
+
+    Returns:
+        The result of every window, for reporting.
+    """
+    yaml_file = Path(yaml_file).resolve()
+    windows = _tracking_windows(first, last, n_processes, window_size, overlap)
+    results = _track_windows(
+        yaml_file, windows, overlap, n_processes, buffer_root, profile_dir, True
+    )
+    write_tracked_frames(ProcessingContext(yaml_file, first, last), sorted(stitch(results).items()))
+    return results
+
+
+def track_parallel(
+    yaml_file: PathLike,
+    first: int,
+    last: int,
+    n_processes: int = 2,
+    window_size: Optional[int] = None,
+    overlap: int = DEFAULT_OVERLAP,
+    buffer_root: Optional[str] = None,
+) -> Dict[int, TrackedFrame]:
+    """Track frames first..last in overlapping windows and return the stitched frames.
+
+    Nothing is written and every frame is held in memory: this is meant for
+    validation (see compare_tracking). Arguments as in run_parallel_tracking.
+    """
+    yaml_file = Path(yaml_file).resolve()
+    windows = _tracking_windows(first, last, n_processes, window_size, overlap)
+    return stitch(
+        _track_windows(yaml_file, windows, overlap, n_processes, buffer_root, None, False)
+    )
+
+
+def track_serial(
+    yaml_file: PathLike, first: int, last: int, buffer_root: Optional[str] = None
+) -> Dict[int, TrackedFrame]:
+    """Track frames first..last with one Tracker and return them; nothing is written."""
+    window = TrackingWindow(first, last, first, last)
+    return track_window(
+        Path(yaml_file).resolve(), window, buffer_root=buffer_root, write=False
+    ).frames
+
+
+def _links(frames: Dict[int, TrackedFrame]) -> Set[Tuple[int, _RowKey, _RowKey]]:
+    """Every link of the frames, with the particles identified by their rt_is rows."""
+    links = set()
+    for frame, tracked in frames.items():
+        following = frames.get(frame + 1)
+        if following is None:
+            continue
+        for index in np.flatnonzero(tracked.linkage["next"] >= 0):
+            target = tracked.linkage["next"][index]
+            if index < len(tracked.correspondences) and target < len(following.correspondences):
+                links.add(
+                    (
+                        frame,
+                        _row_key(tracked.correspondences[index]),
+                        _row_key(following.correspondences[target]),
+                    )
+                )
+    return links
+
+
+def compare_tracking(
+    serial: Dict[int, TrackedFrame], stitched: Dict[int, TrackedFrame]
+) -> TrackingComparison:
+    """Compare the particles and links of two trackings of the same frames."""
+    serial_links, stitched_links = _links(serial), _links(stitched)
+    differing = {frame for frame, _, _ in serial_links ^ stitched_links}
+    for frame in serial.keys() & stitched.keys():
+        serial_rows = {_row_key(row) for row in serial[frame].correspondences}
+        stitched_rows = {_row_key(row) for row in stitched[frame].correspondences}
+        if serial_rows != stitched_rows:
+            differing.add(frame)
+    return TrackingComparison(
+        frames=len(serial.keys() | stitched.keys()),
+        serial_particles=sum(len(tracked.linkage) for tracked in serial.values()),
+        stitched_particles=sum(len(tracked.linkage) for tracked in stitched.values()),
+        serial_links=len(serial_links),
+        stitched_links=len(stitched_links),
+        common_links=len(serial_links & stitched_links),
+        differing_frames=sorted(differing),
+    )
+
+
+def format_comparison(comparison: TrackingComparison) -> str:
+    """Text report of a comparison of serial and stitched tracking."""
+    lines = [
+        f"{'':<12} {'serial':>10} {'stitched':>10}",
+        f"{'particles':<12} {comparison.serial_particles:>10} {comparison.stitched_particles:>10}",
+        f"{'links':<12} {comparison.serial_links:>10} {comparison.stitched_links:>10}",
+        f"Common links: {comparison.common_links} ({comparison.agreement:.2%})",
+    ]
+    if comparison.differing_frames:
+        shown = ", ".join(str(frame) for frame in comparison.differing_frames[:20])
+        more = len(comparison.differing_frames) - 20
+        lines.append(
+            f"Frames that differ ({len(comparison.differing_frames)} of {comparison.frames}): "
+            f"{shown}{f' and {more} more' if more > 0 else ''}"
+        )
+    else:
+        lines.append(f"All {comparison.frames} frames are identical")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("yaml_file", type=Path, help="YAML parameter file")
+    parser.add_argument("first_frame", type=int, nargs="?", help="First frame (default: sequence.first)")
+    parser.add_argument("last_frame", type=int, nargs="?", help="Last frame (default: sequence.last)")
+    parser.add_argument("-n", "--processes", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--window", type=int, default=None, metavar="N", help="Frames owned by every window (default: the range split evenly over the processes)")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP, metavar="N", help=f"Frames tracked before and after the owned ones (default: {DEFAULT_OVERLAP})")
+    parser.add_argument("--buffer-dir", default=None, help="Directory for the frame buffers (default: /dev/shm if available)")
+    parser.add_argument("--min-agreement", type=float, default=1.0, metavar="FRACTION", help="compare: exit with 1 if fewer links agree (default: 1.0, identical)")
+    args = parser.parse_args(argv)
+
+    yaml_file = args.yaml_file.resolve()
+    try:
+        context = ProcessingContext(yaml_file)
+        first = context.spar.get_first() if args.first_frame is None else args.first_frame
+        last = context.spar.get_last() if args.last_frame is None else args.last_frame
+
+        start = time.perf_counter()
+        if args.command == "run":
+            results = run_parallel_tracking(
+                yaml_file, first, last, args.processes, args.window, args.overlap, args.buffer_dir
+            )
+            print(
+                f"Tracked frames {first}..{last} in {len(results)} windows "
+                f"in {time.perf_counter() - start:.2f} s"
+            )
+            return 0
+
+        stitched = track_parallel(
+            yaml_file, first, last, args.processes, args.window, args.overlap, args.buffer_dir
+        )
+        print(f"Tracked frames {first}..{last} in windows in {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        serial = track_serial(yaml_file, first, last, args.buffer_dir)
+        print(f"Tracked frames {first}..{last} serially in {time.perf_counter() - start:.2f} s")
+        comparison = compare_tracking(serial, stitched)
+        print(format_comparison(comparison))
+    except (OSError, ValueError) as e:
+        print(f"Parallel tracking {args.command} failed: {e}")
+        return 1
+    return 0 if comparison.agreement >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
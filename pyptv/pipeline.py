@@ -0,0 +1,222 @@
+"""Sequence and tracking in one pass over the frames.
+
+``pyptv_batch --mode both`` first runs the sequence step over all frames,
+writing the targets and rt_is file of every frame, and then builds a
+``Tracker`` that reads all of them back. In pipeline mode (``--pipeline``)
+each frame is handed to the tracker as soon as detection and
+correspondences are done, and the tracker's output of a frame is moved to
+its final place as soon as the tracker has finished with it.
+
+liboptv's ``Tracker`` reads and writes files through the file bases it is
+given, so the hand-off goes through a frame buffer directory, on a tmpfs
+(``/dev/shm``) when there is one. Tracking frame ``s`` reads frame
+``s + TRACKER_LOOKAHEAD`` and writes frame ``s``, so the buffer never holds
+more than ``TRACKER_LOOKAHEAD + 2`` frames. The final output -- the
+``_targets`` files in ``pft_version.targets_format``, the ``res/rt_is``,
+``ptv_is`` and ``added`` files, or the run store -- is written once, in
+frame order.
+
+Example:
+    python -m pyptv.pyptv_batch tests/test_cavity/parameters_Run1.yaml 10000 10004 --pipeline
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from optv.parameters import SequenceParams
+from optv.tracker import Tracker
+
+from pyptv import ptv
+from pyptv.profiling import optv_call
+from pyptv.run_store import (
+    STORE_FILE,
+    RunStore,
+    legacy_filename,
+    read_legacy_file,
+    run_store_enabled,
+)
+from pyptv.timing import NULL_TIMER, StageTimer
+
+# liboptv's tracker reads frame step + 3 while tracking frame step
+TRACKER_LOOKAHEAD = 3
+TMPFS_ROOT = Path("/dev/shm")
+
+_RES_KINDS = ("correspondences", "linkage", "added")
+
+
+def default_buffer_root() -> Optional[str]:
+    """Directory for frame buffers: /dev/shm if usable, else the system default."""
+    if TMPFS_ROOT.is_dir() and os.access(TMPFS_ROOT, os.W_OK):
+        return str(TMPFS_ROOT)
+    return None
+
+
+class FrameBuffer:
+    """Temporary directory holding the per-frame files of the tracker.
+
+    Args:
+        num_cams: Number of cameras
+        root: Parent directory; None uses default_buffer_root()
+    """
+
+    def __init__(self, num_cams: int, root: Optional[str] = None):
+        if root is None:
+            root = default_buffer_root()
+        self.path = Path(tempfile.mkdtemp(prefix="pyptv_frames_", dir=root))
+        self.target_bases = [str(self.path / f"cam{i + 1}") for i in range(num_cams)]
+        self.res_bases = {
+            "correspondences": str(self.path / "rt_is"),
+            "linkage": str(self.path / "ptv_is"),
+            "added": str(self.path / "added"),
+        }
+        # File bases for the Tracker, see optv.tracker.default_naming. The
+        # Tracker keeps pointers into these bytes: they must outlive it.
+        self.naming: Dict[str, bytes] = {
+            "corres": self.res_bases["correspondences"].encode(),
+            "linkage": self.res_bases["linkage"].encode(),
+            "prio": self.res_bases["added"].encode(),
+        }
+
+    def filename(self, kind: str, frame: int) -> str:
+        return f"{self.res_bases[kind]}.{frame}"
+
+    def close(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _export_frame(
+    buffer: FrameBuffer,
+    frame: int,
+    short_file_bases: List[str],
+    targets_format: str,
+    run_store: Optional[RunStore],
+    root: Optional[Path] = None,
+) -> None:
+    """Move the tracker's output of a frame from the buffer to its final place.
+
+    res/ files are moved under the experiment directory ``root``, if given.
+    """
+    for cam, buffer_base in enumerate(buffer.target_bases):
+        buffer_file = ptv.target_filename(buffer_base, frame)
+        if run_store is not None:
+            run_store.append("targets", frame, ptv.read_target_array(buffer_base, frame, "text"), cam)
+            os.remove(buffer_file)
+        elif targets_format == "text":
+            output_path = ptv._prepare_output_path(ptv.target_filename(short_file_bases[cam], frame))
+            shutil.move(buffer_file, output_path)
+            ptv._remove_file(ptv.target_filename(short_file_bases[cam], frame, "npy"))
+        else:
+            arr = ptv.read_target_array(buffer_base, frame, "text")
+            ptv.write_target_array(arr, short_file_bases[cam], frame, targets_format)
+            os.remove(buffer_file)
+
+    for kind in _RES_KINDS:
+        buffer_file = buffer.filename(kind, frame)
+        if not os.path.exists(buffer_file):
+            continue
+        if run_store is not None:
+            run_store.append(kind, frame, read_legacy_file(kind, buffer_file))
+            os.remove(buffer_file)
+        else:
+            shutil.move(
+                buffer_file, ptv._prepare_output_path(legacy_filename(kind, frame, root=root))
+            )
+
+
+def run_pipeline(
+    exp,
+    prefetch_depth: int = 0,
+    prefetch_max_bytes: Optional[int] = None,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    buffer_root: Optional[str] = None,
+    timer: StageTimer = NULL_TIMER,
+) -> int:
+    """Run sequence and forward tracking of frames first..last in one pass.
+
+    The output is the same as that of py_sequence_loop followed by
+    py_trackcorr_init(exp).full_forward() (and py_trackcorr_finish with a
+    run store).
+
+    Args:
+        exp: Experiment-like object with pm, cpar, spar, vpar, track_par,
+            tpar, cals, num_cams and target_filenames
+        prefetch_depth, prefetch_max_bytes, camera_workers, camera_pool:
+            Detection options, see py_sequence_loop
+        buffer_root: Directory for the frame buffer (default: /dev/shm if
+            available)
+        timer: Optional ``pyptv.timing.StageTimer``; tracking steps are
+            timed as stage "tracking" of the frame they track
+
+    Returns:
+        Number of frames processed.
+    """
+    pm, num_cams, cpar, spar, vpar, _, cals = ptv._processing_params(exp)
+    targets_format = ptv.configured_targets_format(pm.get_parameter('pft_version'))
+    first_frame, last_frame = spar.get_first(), spar.get_last()
+    short_file_bases = [str(base) for base in exp.target_filenames]
+    ptv._ensure_target_output_writable(short_file_bases)
+
+    buffer = FrameBuffer(num_cams, buffer_root)
+    tracker_spar = SequenceParams(num_cams=num_cams)
+    tracker_spar.set_first(first_frame)
+    tracker_spar.set_last(last_frame)
+    for i_cam, buffer_base in enumerate(buffer.target_bases):
+        tracker_spar.set_img_base_name(i_cam, buffer_base + ".")
+    tracker = optv_call(
+        "Tracker", Tracker, cpar, vpar, exp.track_par, tracker_spar, cals, buffer.naming
+    )
+
+    root = ptv.output_root(exp)
+    run_store = (
+        RunStore(ptv.resolve_path(root, STORE_FILE), "a") if run_store_enabled(pm) else None
+    )
+    detections_iter = ptv.iter_frame_detections(
+        exp,
+        range(first_frame, last_frame + 1),
+        prefetch_depth=prefetch_depth,
+        prefetch_max_bytes=prefetch_max_bytes,
+        camera_workers=camera_workers,
+        camera_pool=camera_pool,
+        run_store=run_store,
+        timer=timer,
+    )
+    started = tracking_done = False
+    exported = first_frame
+    try:
+        for frame, detections in detections_iter:
+            ptv.correspond_and_write_frame(
+                frame, detections, cpar, vpar, cals, buffer.target_bases,
+                corres_file_base=buffer.res_bases["correspondences"],
+                timer=timer,
+            )
+            # restart() reads the first frames, every step one more
+            if not started:
+                if frame < min(first_frame + TRACKER_LOOKAHEAD - 1, last_frame):
+                    continue
+                optv_call("Tracker.restart", tracker.restart)
+                started = True
+            while not tracking_done and min(
+                tracker.current_step() + TRACKER_LOOKAHEAD, last_frame
+            ) <= frame:
+                with timer.stage("tracking", frame=tracker.current_step()):
+                    tracking_done = not optv_call("Tracker.step_forward", tracker.step_forward)
+                # Frames before the current step are written and never read again
+                for done in range(exported, tracker.current_step()):
+                    _export_frame(buffer, done, short_file_bases, targets_format, run_store, root)
+                exported = max(exported, tracker.current_step())
+
+        optv_call("Tracker.finalize", tracker.finalize)
+        for done in range(exported, last_frame + 1):
+            _export_frame(buffer, done, short_file_bases, targets_format, run_store, root)
+    finally:
+        detections_iter.close()
+        buffer.close()
+        if run_store is not None:
+            run_store.close()
+    return last_frame - first_frame + 1
@@ -0,0 +1,129 @@
+"""Bounded read-ahead of sequence images.
+
+The sequence loop spends a large share of its time waiting on image decoding,
+especially when images live on a network share. ``FramePrefetcher`` decodes the
+images of the next few frames on a small thread pool while the caller works on
+the current frame. Frames are handed out strictly in order, and the decoded
+arrays are exactly what the loader returns, so results do not change.
+
+Example:
+    >>> with FramePrefetcher(range(10000, 10005), paths_for_frame, loader, depth=2) as pf:
+    ...     for frame in range(10000, 10005):
+    ...         images = pf.get(frame)
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_PREFETCH_DEPTH = 2
+MAX_PREFETCH_WORKERS = 32
+
+
+class FramePrefetcher:
+    """Decode the images of upcoming frames in background threads.
+
+    Args:
+        frames: Frame numbers in the order they will be requested.
+        frame_paths: Callable returning the list of image paths of a frame
+            (one per camera).
+        loader: Callable decoding a single path into an array.
+        depth: Maximum number of frames decoded ahead of the consumer.
+        max_bytes: Optional cap on the memory held by decoded frames. Besides
+            the frames decoded ahead, two frames are alive while ``get``
+            hands out the next one: the returned frame and the previous one,
+            still held by the caller. The effective depth is reduced so that
+            ``(depth + 2) * frame_nbytes <= max_bytes``, but never below one
+            frame, so a cap below three frames is exceeded.
+        max_workers: Size of the decoding thread pool. Defaults to one thread
+            per image in the read-ahead window.
+    """
+
+    def __init__(
+        self,
+        frames: Iterable[int],
+        frame_paths: Callable[[int], Sequence],
+        loader: Callable[..., np.ndarray],
+        depth: int = DEFAULT_PREFETCH_DEPTH,
+        max_bytes: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ):
+        if depth < 1:
+            raise ValueError(f"Prefetch depth must be >= 1, got {depth}")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(f"Prefetch memory cap must be > 0, got {max_bytes}")
+
+        self._frames = list(frames)
+        self._frame_paths = frame_paths
+        self._loader = loader
+        self.depth = int(depth)
+        self.max_bytes = max_bytes
+        self.frame_nbytes: Optional[int] = None
+
+        if max_workers is None:
+            images_per_frame = len(frame_paths(self._frames[0])) if self._frames else 1
+            max_workers = min(MAX_PREFETCH_WORKERS, self.depth * max(images_per_frame, 1))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pyptv-prefetch"
+        )
+        self._pending: Dict[int, List[Future]] = OrderedDict()
+        self._next_index = 0
+
+    @property
+    def window(self) -> int:
+        """Number of frames currently allowed to be decoded ahead."""
+        if self.max_bytes is None:
+            return self.depth
+        if self.frame_nbytes is None:
+            # Size unknown until the first frame is decoded; stay conservative.
+            return 1
+        # The frame handed out and the previous one are held by the caller
+        held = 2
+        return max(1, min(self.depth, self.max_bytes // max(self.frame_nbytes, 1) - held))
+
+    def _fill(self) -> None:
+        while self._next_index < len(self._frames) and len(self._pending) < self.window:
+            frame = self._frames[self._next_index]
+            self._pending[frame] = [
+                self._executor.submit(self._loader, path)
+                for path in self._frame_paths(frame)
+            ]
+            self._next_index += 1
+
+    def get(self, frame: int) -> List[np.ndarray]:
+        """Return the decoded images of ``frame``, blocking until they are ready.
+
+        Frames must be requested in the order given to the constructor.
+        Exceptions raised by the loader (e.g. ``FileNotFoundError``) are
+        re-raised here, for the frame that caused them.
+        """
+        self._fill()
+        if frame not in self._pending:
+            raise KeyError(f"Frame {frame} was not scheduled or was already consumed")
+
+        futures = self._pending.pop(frame)
+        images = [future.result() for future in futures]
+
+        if self.frame_nbytes is None:
+            self.frame_nbytes = int(sum(np.asarray(img).nbytes for img in images))
+
+        self._fill()
+        return images
+
+    def close(self) -> None:
+        """Cancel outstanding work and stop the thread pool."""
+        for futures in self._pending.values():
+            for future in futures:
+                future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "FramePrefetcher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,52 +1,306 @@
-#!/usr/bin/env python
-# coding: utf-8
+"""Static background images of a sequence, for the ``masking`` section.
 
-# prepare static background images for the series using Python
-# this works with the branch called remove_static_background on pyptv github
-# https://github.com/alexlib/pyptv/
+``compute_backgrounds`` estimates a per-pixel percentile (by default the
+median) of the images of every camera over a whole sequence, or over every
+``step``-th frame of it, and ``main`` writes one background image per camera
+under the names that ``masking.mask_base_name`` expects.
+
+The percentile is estimated with a remedian (Rousseeuw & Bassett, 1990): the
+images go into a buffer of ``chunk_frames`` images; the percentile of a full
+buffer goes into the buffer of the next level, and so on. Every level holds at
+most ``chunk_frames`` images, and ``L`` levels cover ``chunk_frames ** L``
+frames: with 64-frame chunks, 100 000 frames need three levels, i.e. memory
+for 192 images. The result is the percentile of the images left in the
+levels, each weighted by the number of frames it stands for. It is exact when
+all frames fit in one chunk, and approximate otherwise.
+
+The cameras are processed in parallel worker processes (the cameras of a
+splitter image in one, because they share the decoded composite). The images
+are the ones detection sees: with ``ptv.negative`` the backgrounds are those
+of the negative images.
+
+Example:
+    python -m pyptv.prepare_static_background tests/test_cavity/parameters_Run1.yaml --step 10
+    python -m pyptv.prepare_static_background parameters_Run1.yaml --output background_#.tif --update-yaml
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
 
 import numpy as np
-import matplotlib.pyplot as plt
-import skimage.io as skio
-import pathlib
-
-# Create static median background and store for PyPTV use as a mask
-# How to use in PyPTV:
-# 1) checkmark Subtract mask
-# 2) insert the name of the file as background_mask_# ( will replaced by camera id, 0...N-1)
-
-# We can create any length, for large series, 10 images shall be sufficient
-
-N = 10
-
-# Read N images per camera
-for cam_num in range(4):
-    filelist = list(
-        pathlib.Path(f"img/Camera_{cam_num + 1}/").rglob("*.tif")
-    )  # in some sets we use Camera_1, 2, 3, 4
-    filelist.sort()
-    print(filelist[:3], filelist[-3:])
-
-    # Preallocate array for better performance
-    first_img = skio.imread(filelist[0])
-    image_array = np.empty((N, *first_img.shape), dtype=first_img.dtype)
-    image_array[0] = first_img
-    
-    for i, file in enumerate(filelist[1:N], start=1):
-        image_array[i] = skio.imread(file)
-
-    # Create median using axis parameter for clarity
-    median_image = np.median(image_array, axis=0)
-    plt.figure()
-    plt.imshow(median_image, cmap="gray")
-    plt.show()
-
-    plt.figure()
-    plt.imshow(
-        np.clip(image_array[0] - median_image, 0, 255).astype(np.uint8),
-        cmap="gray",
+from imageio.v3 import imwrite
+
+from pyptv import ptv
+from pyptv.image_source import open_image_source
+from pyptv.parameter_manager import ParameterManager
+from pyptv.preprocessing import background_filename
+
+DEFAULT_CHUNK_FRAMES = 64
+DEFAULT_PERCENTILE = 50.0
+DEFAULT_OUTPUT = "background_#.tif"
+
+
+def weighted_percentile(
+    stack: np.ndarray, weights: Sequence[int], q: float
+) -> np.ndarray:
+    """Per-pixel weighted percentile of a stack of uint8 images.
+
+    The result is, for every pixel, the smallest value ``v`` of the pixel
+    whose images with values ``<= v`` hold at least the fraction ``q`` of the
+    total weight (the inverted CDF, so a value of the stack).
+
+    Args:
+        stack: (n, height, width) uint8 images.
+        weights: Positive weight of every image.
+        q: Fraction in (0, 1].
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    target = q * weights.sum()
+    if np.all(weights == weights[0]):
+        # Equal weights: a selection, see np.quantile(method="inverted_cdf")
+        k = max(math.ceil(target / weights[0]) - 1, 0)
+        return np.partition(stack, k, axis=0)[k]
+
+    # Bisection over the 256 grey values, 8 passes over the stack
+    lo = np.zeros(stack.shape[1:], np.uint8)
+    hi = np.full(stack.shape[1:], 255, np.uint8)
+    cumulative = np.empty(stack.shape[1:], np.int64)
+    below = np.empty(stack.shape[1:], bool)
+    while np.any(lo < hi):
+        mid = lo + (hi - lo) // 2
+        cumulative.fill(0)
+        for image, weight in zip(stack, weights):
+            np.less_equal(image, mid, out=below)
+            np.add(cumulative, weight, out=cumulative, where=below)
+        enough = cumulative >= target
+        hi = np.where(enough, mid, hi)
+        lo = np.where(enough, lo, mid + 1)
+    return lo
+
+
+class RunningPercentile:
+    """Approximate per-pixel percentile of a stream of uint8 images (remedian).
+
+    Args:
+        q: Fraction in (0, 1], e.g. 0.5 for the median.
+        chunk_frames: Images per level buffer.
+    """
+
+    def __init__(self, q: float = 0.5, chunk_frames: int = DEFAULT_CHUNK_FRAMES):
+        if not 0 < q <= 1:
+            raise ValueError(f"The percentile fraction must be in (0, 1], got {q}")
+        if chunk_frames < 2:
+            raise ValueError(f"Chunks must hold at least 2 frames, got {chunk_frames}")
+        self.q = q
+        self.chunk_frames = chunk_frames
+        self.frames = 0
+        self._levels: List[np.ndarray] = []
+        self._counts: List[int] = []
+
+    def add(self, image: np.ndarray) -> None:
+        """Add the next image of the stream."""
+        if self._levels and image.shape != self._levels[0].shape[1:]:
+            raise ValueError(
+                f"Image shape {image.shape} differs from the first image's {self._levels[0].shape[1:]}"
+            )
+        level = 0
+        while True:
+            if level == len(self._levels):
+                self._levels.append(np.empty((self.chunk_frames, *image.shape), np.uint8))
+                self._counts.append(0)
+            self._levels[level][self._counts[level]] = image
+            self._counts[level] += 1
+            if self._counts[level] < self.chunk_frames:
+                break
+            image = weighted_percentile(self._levels[level], [1] * self.chunk_frames, self.q)
+            self._counts[level] = 0
+            level += 1
+        self.frames += 1
+
+    def result(self) -> np.ndarray:
+        """The percentile of the images added so far.
+
+        Raises:
+            ValueError: If no image was added.
+        """
+        if self.frames == 0:
+            raise ValueError("No images were added")
+        stack = np.concatenate(
+            [buffer[:count] for buffer, count in zip(self._levels, self._counts)]
+        )
+        weights = [
+            self.chunk_frames ** level
+            for level, count in enumerate(self._counts)
+            for _ in range(count)
+        ]
+        return weighted_percentile(stack, weights, self.q)
+
+
+def _camera_backgrounds(
+    yaml_file: str,
+    cams: Sequence[int],
+    frames: Sequence[int],
+    q: float,
+    chunk_frames: int,
+) -> Dict[int, tuple]:
+    """Backgrounds of some cameras: ``{cam: (background, frames used)}``."""
+    pm = ParameterManager()
+    pm.from_yaml(yaml_file)
+    ptv_params = pm.get_parameter('ptv')
+    seq_params = pm.get_parameter('sequence')
+    invert = ptv_params.get('negative', False)
+
+    root = Path(yaml_file).resolve().parent
+    base_names = [
+        str(ptv.resolve_path(root, name)) for name in seq_params['base_name'][: pm.num_cams]
+    ]
+    estimates = {cam: RunningPercentile(q, chunk_frames) for cam in cams}
+    with open_image_source(
+        base_names, seq_params, ptv_params, ptv.read_sequence_image
+    ) as source:
+        for frame in frames:
+            for cam in cams:
+                try:
+                    img = source.read(cam, frame)
+                except FileNotFoundError:
+                    continue
+                estimates[cam].add(ptv.negative(img) if invert else img)
+
+    results = {}
+    for cam, estimate in estimates.items():
+        if estimate.frames == 0:
+            raise ValueError(f"No images of camera {cam + 1} were found")
+        results[cam] = (estimate.result(), estimate.frames)
+    return results
+
+
+def compute_backgrounds(
+    yaml_file: Union[str, Path],
+    first: Optional[int] = None,
+    last: Optional[int] = None,
+    step: int = 1,
+    percentile: float = DEFAULT_PERCENTILE,
+    chunk_frames: int = DEFAULT_CHUNK_FRAMES,
+    workers: Optional[int] = None,
+) -> List[np.ndarray]:
+    """Per-camera percentile of the sequence images of an experiment.
+
+    Args:
+        yaml_file: YAML parameter file of the experiment
+        first, last: Frame range (default: sequence.first..sequence.last)
+        step: Use every ``step``-th frame of the range
+        percentile: Percentile in (0, 100], 50 for the median
+        chunk_frames: Images per remedian level, see the module documentation
+        workers: Worker processes (default: one per camera, at most the
+            number of CPUs); 1 computes in this process
+
+    Returns:
+        One uint8 background per camera. Missing images are skipped.
+
+    Raises:
+        ValueError: If the arguments are invalid or a camera has no images.
+    """
+    yaml_file = Path(yaml_file).resolve()
+    pm = ParameterManager()
+    pm.from_yaml(yaml_file)
+    sequence = pm.get_parameter('sequence')
+    first = sequence['first'] if first is None else first
+    last = sequence['last'] if last is None else last
+    if step < 1:
+        raise ValueError(f"Frame step must be >= 1, got {step}")
+    if not 0 < percentile <= 100:
+        raise ValueError(f"Percentile must be in (0, 100], got {percentile}")
+    frames = range(first, last + 1, step)
+    num_cams = pm.num_cams
+
+    # The cameras of a splitter image share its decoding
+    if pm.get_parameter('ptv').get('splitter', False):
+        groups = [list(range(num_cams))]
+    else:
+        groups = [[cam] for cam in range(num_cams)]
+    if workers is None:
+        workers = min(len(groups), os.cpu_count() or 1)
+
+    args = (percentile / 100, chunk_frames)
+    results: Dict[int, tuple] = {}
+    if workers <= 1:
+        for cams in groups:
+            results.update(_camera_backgrounds(str(yaml_file), cams, frames, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+            futures = [
+                executor.submit(_camera_backgrounds, str(yaml_file), cams, frames, *args)
+                for cams in groups
+            ]
+            for future in futures:
+                results.update(future.result())
+
+    for cam in range(num_cams):
+        used = results[cam][1]
+        if used < len(frames):
+            print(f"Camera {cam + 1}: {len(frames) - used} of {len(frames)} images missing")
+    return [results[cam][0] for cam in range(num_cams)]
+
+
+def write_backgrounds(
+    backgrounds: Sequence[np.ndarray], base_name: str, directory: Union[str, Path] = "."
+) -> List[Path]:
+    """Write the backgrounds under ``base_name``, as ``masking.mask_base_name``
+    names them (``#``: 0-based, ``%d``: 1-based camera number)."""
+    paths = []
+    for cam, background in enumerate(backgrounds):
+        path = Path(directory) / background_filename(base_name, cam)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        imwrite(path, background)
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
-    plt.show()
+    parser.add_argument("yaml_file", type=Path, help="YAML parameter file")
+    parser.add_argument("first_frame", type=int, nargs="?", help="First frame (default: sequence.first)")
+    parser.add_argument("last_frame", type=int, nargs="?", help="Last frame (default: sequence.last)")
+    parser.add_argument("--step", type=int, default=1, help="Use every n-th frame (default: 1)")
+    parser.add_argument("--percentile", type=float, default=DEFAULT_PERCENTILE, help=f"Per-pixel percentile (default: {DEFAULT_PERCENTILE:g}, the median)")
+    parser.add_argument("--chunk-frames", type=int, default=DEFAULT_CHUNK_FRAMES, help=f"Frames per memory chunk (default: {DEFAULT_CHUNK_FRAMES})")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per camera)")
+    parser.add_argument("--output", default=None, help=f"Background file names, relative to the experiment (default: masking.mask_base_name or {DEFAULT_OUTPUT})")
+    parser.add_argument("--update-yaml", action="store_true", help="Enable masking with the written backgrounds in the YAML file")
+    args = parser.parse_args(argv)
+
+    yaml_file = args.yaml_file.resolve()
+    pm = ParameterManager()
+    pm.from_yaml(yaml_file)
+    masking = pm.parameters.setdefault('masking', {})
+    output = args.output or masking.get('mask_base_name') or DEFAULT_OUTPUT
+
+    try:
+        backgrounds = compute_backgrounds(
+            yaml_file, args.first_frame, args.last_frame, args.step,
+            args.percentile, args.chunk_frames, args.workers,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Background estimation failed: {e}")
+        return 1
+    for path in write_backgrounds(backgrounds, output, yaml_file.parent):
+        print(f"Wrote {path}")
+
+    if args.update_yaml:
+        masking.update({'mask_flag': True, 'mask_base_name': output})
+        pm.to_yaml(yaml_file)
+        print(f"Enabled masking with {output} in {yaml_file}")
+    return 0
+
 
-    # Store median image in the top directory
-    skio.imsave(f"background_mask_{cam_num}.tif", median_image)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Image pre-processing helpers shared by the sequence loop and the GUI.
+
+``as_uint8_gray`` converts every image pyptv reads to the single-channel
+``uint8`` array the processing expects, with integer fast paths for the
+common 8-bit and 16-bit inputs.
+
+Static background subtraction (the ``masking`` section) uses the same few
+background images for every frame. ``BackgroundCache`` reads each background
+once, converts it to a contiguous ``uint8`` array and keeps it until the file's
+modification time changes. The subtraction itself is a saturating ``uint8``
+operation, ``max(img - background, 0)``, done without integer promotion or
+temporary arrays.
+
+Mask polygons (``masking.polygon_base_name``, drawn and saved by the mask
+GUI) limit the detection to a region of interest: ``polygon_roi`` rasterizes
+a polygon once into the bounding box to crop and the pixels of the box
+outside the polygon, which are zeroed.
+
+For slowly changing illumination, ``RollingBackground`` keeps the per-pixel
+minimum or mean of the last ``masking.rolling_frames`` images of a camera,
+updated incrementally with every frame, to subtract after the static
+background.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from imageio.v3 import imread
+from skimage.color import rgb2gray
+from skimage.draw import polygon2mask
+from skimage.util import img_as_ubyte
+
+PathLike = Union[str, os.PathLike]
+
+# Luminance weights of skimage's rgb2gray (0.2125, 0.7154, 0.0721) in 1/10000
+GRAY_WEIGHTS = (2125, 7154, 721)
+GRAY_SCALE = 10000
+
+
+def as_uint8_gray(image: np.ndarray) -> np.ndarray:
+    """Convert an image to a single-channel uint8 array.
+
+    Same result as ``img_as_ubyte(rgb2gray(image[..., :3]))`` for colour
+    images and ``img_as_ubyte(image)`` for grey ones, with integer fast paths:
+
+    - uint8 grey images are returned as they are, without a copy;
+    - uint16 grey images keep their high byte (``image >> 8``), exactly as
+      ``img_as_ubyte``;
+    - uint8 RGB/RGBA images get the luminance ``(2125 R + 7154 G + 721 B) /
+      10000`` rounded half up, in integer arithmetic. This is the exact value
+      that the float computation approximates; the results are identical
+      except at exact half grey-level ties (0.01% of all colours), where the
+      float rounding error makes skimage pick either neighbour.
+
+    Other inputs (floats, 16-bit colour, signed integers) go through skimage.
+    """
+    if image.ndim == 2:
+        if image.dtype == np.uint8:
+            return image
+        if image.dtype == np.uint16:
+            return (image >> 8).astype(np.uint8)
+        return img_as_ubyte(image)
+
+    rgb = image[..., :3]
+    if image.dtype != np.uint8:
+        return img_as_ubyte(rgb2gray(rgb))
+    gray = rgb[..., 0] * np.uint32(GRAY_WEIGHTS[0])
+    gray += rgb[..., 1] * np.uint32(GRAY_WEIGHTS[1])
+    gray += rgb[..., 2] * np.uint32(GRAY_WEIGHTS[2])
+    gray += GRAY_SCALE // 2
+    gray //= GRAY_SCALE
+    return gray.astype(np.uint8)
+
+
+def background_filename(mask_base_name: str, i_cam: int) -> str:
+    """Return the background image (or mask polygon) file name of a camera.
+
+    ``%d`` style placeholders are filled with the 1-based camera number (as
+    in the sequence loop), ``#`` with the 0-based camera index (as in the GUI).
+    A name without placeholder is used for all cameras.
+    """
+    if "%" in mask_base_name:
+        return mask_base_name % (i_cam + 1)
+    if "#" in mask_base_name:
+        return mask_base_name.replace("#", str(i_cam))
+    return mask_base_name
+
+
+def as_background(image: np.ndarray) -> np.ndarray:
+    """Convert a background image to the contiguous uint8 form used for subtraction.
+
+    Float backgrounds (e.g. a median saved as float) are rounded up, so that
+    the saturating subtraction equals ``np.clip(img - background, 0, 255)``
+    truncated to uint8, as computed with the original float image.
+    """
+    if image.ndim > 2:
+        image = as_uint8_gray(image)
+    elif image.dtype.kind == "f":
+        image = np.clip(np.ceil(image), 0, 255)
+    elif image.dtype != np.uint8:
+        image = np.clip(image, 0, 255)
+    background = np.ascontiguousarray(image, dtype=np.uint8)
+    background.setflags(write=False)
+    return background
+
+
+def subtract_background(
+    img: np.ndarray, background: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Saturating uint8 subtraction ``max(img - background, 0)``.
+
+    ``out`` may be ``img`` itself for an in-place update; otherwise a single
+    uint8 output array is allocated.
+    """
+    if img.shape != background.shape:
+        raise ValueError(
+            f"Background shape {background.shape} does not match image shape {img.shape}"
+        )
+    out = np.maximum(img, background, out=out)
+    return np.subtract(out, background, out=out)
+
+
+class BackgroundCache:
+    """Per-file cache of background images, refreshed when the file changes."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: PathLike) -> np.ndarray:
+        """Return the background stored in ``filename`` as read-only uint8.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        key = str(Path(filename).resolve())
+        mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+        background = as_background(imread(key))
+        with self._lock:
+            self._entries[key] = (mtime, background)
+        return background
+
+    def subtract(
+        self, img: np.ndarray, filename: PathLike, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Subtract the background stored in ``filename`` from ``img``."""
+        return subtract_background(img, self.get(filename), out=out)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared by the sequence loop and the GUI, so a background is decoded once per process
+background_cache = BackgroundCache()
+
+
+ROLLING_STATISTICS = ("min", "mean")
+
+
+class RollingBackground:
+    """Per-pixel minimum or mean of the last ``frames`` images of a camera.
+
+    ``update`` adds the next image and returns the statistic of the window of
+    the last ``frames`` images, the new one included (fewer after a
+    ``reset``), in a reused buffer. Both statistics cost O(1) per pixel and
+    frame:
+
+    - ``min``: the van Herk/Gil-Werman scheme. The stream is cut into blocks
+      of ``frames`` images; the window minimum is the minimum of the running
+      minimum of the current block and a suffix minimum of the previous
+      block, computed once per block. Memory: two blocks of images.
+    - ``mean``: a ring buffer of the window and the running sum of its
+      images; the mean is rounded down.
+
+    Args:
+        frames: Window length in frames.
+        statistic: "min" or "mean".
+    """
+
+    def __init__(self, frames: int, statistic: str = "min"):
+        if frames < 1:
+            raise ValueError(f"The rolling background needs a window of >= 1 frames, got {frames}")
+        if statistic not in ROLLING_STATISTICS:
+            raise ValueError(
+                f"Unknown rolling background statistic: {statistic}. "
+                f"Use one of {', '.join(ROLLING_STATISTICS)}"
+            )
+        self.frames = frames
+        self.statistic = statistic
+        self._shape: Optional[Tuple[int, ...]] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the images added so far."""
+        self._position = 0
+        self._count = 0
+        self._previous_block = False
+
+    def _allocate(self, shape: Tuple[int, ...]) -> None:
+        self._shape = shape
+        self._block = np.empty((self.frames, *shape), np.uint8)
+        self._result = np.empty(shape, np.uint8)
+        if self.statistic == "min":
+            self._suffix = np.empty((self.frames, *shape), np.uint8)
+            self._prefix = np.empty(shape, np.uint8)
+        else:
+            self._sum = np.zeros(shape, np.int64)
+            self._quotient = np.empty(shape, np.int64)
+        self.reset()
+
+    def update(self, img: np.ndarray) -> np.ndarray:
+        """Add the next image and return the background of the current window."""
+        if img.shape != self._shape:
+            self._allocate(img.shape)
+        if self.statistic == "min":
+            return self._update_min(img)
+        return self._update_mean(img)
+
+    def _update_min(self, img: np.ndarray) -> np.ndarray:
+        j = self._position
+        self._block[j] = img
+        if j == 0:
+            np.copyto(self._prefix, img)
+        else:
+            np.minimum(self._prefix, img, out=self._prefix)
+
+        if self._previous_block and j < self.frames - 1:
+            # The window: images j+1.. of the previous block and 0..j of this one
+            np.minimum(self._suffix[j + 1], self._prefix, out=self._result)
+        else:
+            np.copyto(self._result, self._prefix)
+
+        if j == self.frames - 1:
+            # Suffix minima of the completed block, in place
+            for i in range(self.frames - 2, -1, -1):
+                np.minimum(self._block[i], self._block[i + 1], out=self._block[i])
+            self._block, self._suffix = self._suffix, self._block
+            self._previous_block = True
+            self._position = 0
+        else:
+            self._position = j + 1
+        return self._result
+
+    def _update_mean(self, img: np.ndarray) -> np.ndarray:
+        j = self._position
+        if self._count == self.frames:
+            np.subtract(self._sum, self._block[j], out=self._sum)
+        else:
+            if self._count == 0:
+                self._sum.fill(0)
+            self._count += 1
+        self._block[j] = img
+        np.add(self._sum, img, out=self._sum)
+        self._position = (j + 1) % self.frames
+        np.floor_divide(self._sum, self._count, out=self._quotient)
+        np.copyto(self._result, self._quotient, casting="unsafe")
+        return self._result
+
+
+def read_polygon(filename: PathLike) -> np.ndarray:
+    """Read a mask polygon: one ``x y`` pixel position per line, as saved by the mask GUI.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file does not hold at least 3 vertices.
+    """
+    polygon = np.loadtxt(filename, ndmin=2)
+    if polygon.shape[1] != 2 or len(polygon) < 3:
+        raise ValueError(f"{filename} must hold at least 3 'x y' vertices, one per line")
+    return polygon
+
+
+@dataclass(frozen=True)
+class PolygonROI:
+    """Region of interest of an image: the box to crop and the pixels to zero in it.
+
+    ``box`` is the bounding box of the polygon, grown by a margin and
+    clipped to the image, as (rows, columns) slices; ``outside`` is True for
+    the pixels of the box outside the polygon.
+    """
+
+    box: Tuple[slice, slice]
+    outside: np.ndarray
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        """(x, y) position of the box in the image."""
+        return self.box[1].start, self.box[0].start
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.outside.shape
+
+
+def polygon_roi(polygon: np.ndarray, shape: Tuple[int, int], margin: int = 0) -> PolygonROI:
+    """Rasterize a polygon of (x, y) vertices into the region of interest of an image.
+
+    Args:
+        polygon: (N, 2) array of pixel positions, see ``read_polygon``.
+        shape: (height, width) of the image.
+        margin: Pixels added around the bounding box of the polygon, e.g.
+            the reach of a filter that must see the zeroed surroundings.
+
+    Raises:
+        ValueError: If the polygon covers no pixel of the image.
+    """
+    inside = polygon2mask(shape, np.asarray(polygon)[:, ::-1])
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+    if rows.size == 0:
+        raise ValueError(f"The mask polygon covers no pixel of the {shape[1]}x{shape[0]} image")
+    box = (
+        slice(int(max(rows[0] - margin, 0)), int(min(rows[-1] + 1 + margin, shape[0]))),
+        slice(int(max(cols[0] - margin, 0)), int(min(cols[-1] + 1 + margin, shape[1]))),
+    )
+    outside = ~inside[box]
+    outside.setflags(write=False)
+    return PolygonROI(box=box, outside=outside)
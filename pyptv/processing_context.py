@@ -0,0 +1,96 @@
+"""Processing context of a batch run, with its paths resolved explicitly.
+
+A ``ProcessingContext`` holds what the functions of ``pyptv.ptv`` need to
+process an experiment: the ``ParameterManager``, the optv parameter objects
+built by ``py_start_proc_c``, the calibrations and the ``_targets`` file
+bases. It also carries ``root``, the experiment directory, against which
+every relative path of the experiment is resolved: the images, the
+calibration and background files, the ``res/`` files, the run store and
+manifest, and the ``plugins`` directory (see ``ptv.experiment_root`` and
+``ptv.resolve_path``). Given an ``output_dir``, the output -- the ``res/``
+files, the run store and the ``_targets`` files -- goes there instead, so
+several parameter sets of one experiment can be run side by side (see
+``ptv.output_root`` and ``pyptv.pyptv_batch_paramsets``).
+
+Nothing depends on the working directory, so several contexts -- of
+different experiments, or of different frame ranges of one experiment --
+can be processed by threads of the same process::
+
+    context = ProcessingContext("tests/test_cavity/parameters_Run1.yaml", 10000, 10004)
+    py_sequence_loop(context)
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+from pyptv.parameter_manager import ParameterManager
+from pyptv.ptv import py_start_proc_c, resolve_path
+
+PathLike = Union[str, os.PathLike]
+
+
+class ProcessingContext:
+    """Parameters, calibration and experiment directory of one run.
+
+    The image base names in ``spar`` are absolute paths under ``root`` and
+    the ``target_filenames`` absolute paths under ``output_root``, so plugins
+    reading them work from any working directory.
+
+    Args:
+        yaml_file: YAML parameter file; its directory is the experiment root
+        first: First frame to process (default: ``sequence.first``)
+        last: Last frame to process (default: ``sequence.last``)
+        output_dir: Directory the output is written under, relative to the
+            experiment root (default: the experiment root)
+    """
+
+    def __init__(
+        self,
+        yaml_file: PathLike,
+        first: Optional[int] = None,
+        last: Optional[int] = None,
+        output_dir: Optional[PathLike] = None,
+    ):
+        self.yaml_file = Path(yaml_file).resolve()
+        self.root = self.yaml_file.parent
+        self.output_root = self.root if output_dir is None else self.path(output_dir)
+        self.pm = ParameterManager()
+        self.pm.from_yaml(self.yaml_file)
+        self.num_cams = self.pm.num_cams
+
+        (
+            self.cpar,
+            self.spar,
+            self.vpar,
+            self.track_par,
+            self.tpar,
+            self.cals,
+            self.epar,
+        ) = py_start_proc_c(self.pm, root=self.root)
+        for i_cam in range(self.num_cams):
+            self.spar.set_img_base_name(
+                i_cam, str(self.path(self.spar.get_img_base_name(i_cam)))
+            )
+        if first is not None:
+            self.spar.set_first(first)
+        if last is not None:
+            self.spar.set_last(last)
+
+        self.target_filenames = [
+            resolve_path(self.output_root, base) for base in self.pm.get_target_filenames()
+        ]
+        # Set during processing by ptv.py and the plugins
+        self.detections = []
+        self.corrected = []
+
+    @property
+    def exp_path(self) -> str:
+        """The experiment directory, as a string, for plugins."""
+        return str(self.root)
+
+    def path(self, path: PathLike) -> Path:
+        """``path`` resolved against the experiment directory."""
+        return resolve_path(self.root, path)
@@ -0,0 +1,184 @@
+"""Profiling of batch runs.
+
+``--profile`` of ``pyptv_batch``, ``pyptv_batch_parallel`` and
+``pyptv_batch_plugins`` runs the batch (every worker, for the parallel
+batch) under ``cProfile``. The per-worker profiles are merged, and the
+experiment's ``profile`` directory, next to ``res``, receives
+
+- ``<name>.pstats``: the profile of every worker;
+- ``profile.pstats``: all workers merged, for ``pstats``, snakeviz etc.;
+- ``profile.txt``: a flat summary splitting the time into optv C calls,
+  other C calls and Python, followed by the optv calls and the functions
+  with the most own time.
+
+optv is compiled with Cython and its functions are invisible to
+``cProfile``, which only sees built-in C functions: their time counts as
+own time of the Python function calling them. pyptv therefore calls the
+optv entry points it uses through ``optv_call``, which goes through a thin
+function named after the call, in the pseudo file ``OPTV_FILENAME``. The
+own time of that function is the time spent in the C call. Calls that
+plugins make to optv directly still count as Python time of the plugin.
+
+Example:
+    python -m pyptv.profiling tests/test_cavity/profile
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import functools
+import io
+import os
+import pstats
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+PROFILE_DIR = Path("profile")
+MERGED_PROFILE = "profile.pstats"
+PROFILE_SUMMARY = "profile.txt"
+OPTV_FILENAME = "<optv>"
+TOP_FUNCTIONS = 30
+
+PathLike = Union[str, os.PathLike]
+
+
+@functools.lru_cache(maxsize=None)
+def _named_call(name: str) -> Callable:
+    """Function calling its first argument, listed by cProfile as ``<optv>:0(name)``."""
+
+    def call(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    call.__code__ = call.__code__.replace(
+        co_name=name, co_filename=OPTV_FILENAME, co_firstlineno=0
+    )
+    call.__name__ = call.__qualname__ = name
+    return call
+
+
+def optv_call(name: str, func: Callable, *args, **kwargs):
+    """Call the optv function or method ``func`` under the profile entry ``name``.
+
+    Example:
+        targs = optv_call("target_recognition", target_recognition, img, tpar, i_cam, cpar)
+    """
+    return _named_call(name)(func, *args, **kwargs)
+
+
+@contextmanager
+def profiled(path: Optional[PathLike]) -> Iterator[Optional[cProfile.Profile]]:
+    """Profile the ``with`` block and dump the statistics to ``path``.
+
+    Does nothing if ``path`` is None.
+    """
+    if path is None:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(path))
+
+
+def clear_profiles(directory: PathLike) -> None:
+    """Remove the profiles of a previous run."""
+    directory = Path(directory)
+    if directory.is_dir():
+        for path in directory.glob("*.pstats"):
+            path.unlink()
+        (directory / PROFILE_SUMMARY).unlink(missing_ok=True)
+
+
+def split_time(stats: pstats.Stats) -> Dict[str, float]:
+    """Own time of optv C calls, other C calls and Python functions, in seconds."""
+    split = {"optv": 0.0, "other C": 0.0, "Python": 0.0}
+    for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+        if filename == OPTV_FILENAME:
+            split["optv"] += tottime
+        elif filename == "~":
+            split["other C"] += tottime
+        else:
+            split["Python"] += tottime
+    return split
+
+
+def format_report(stats: pstats.Stats, sources: Sequence[PathLike] = ()) -> str:
+    """Flat text summary of a (merged) profile."""
+    split = split_time(stats)
+    total = sum(split.values())
+    lines = []
+    if sources:
+        lines.append(f"Profile of {len(sources)} run(s): " + ", ".join(Path(s).name for s in sources))
+    lines.append(
+        f"Total {total:.3f} s: "
+        + ", ".join(
+            f"{kind} {seconds:.3f} s ({100.0 * seconds / total if total else 0.0:.1f}%)"
+            for kind, seconds in split.items()
+        )
+    )
+
+    optv_calls = sorted(
+        (
+            (tottime, calls, name)
+            for (filename, _, name), (_, calls, tottime, _, _) in stats.stats.items()
+            if filename == OPTV_FILENAME
+        ),
+        reverse=True,
+    )
+    if optv_calls:
+        lines += ["", "optv calls:", f"{'function':<28} {'calls':>8} {'total s':>10} {'mean ms':>9}"]
+        for tottime, calls, name in optv_calls:
+            lines.append(
+                f"{name:<28} {calls:>8} {tottime:>10.3f} {1000 * tottime / calls:>9.2f}"
+            )
+
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+    lines += ["", f"Top {TOP_FUNCTIONS} functions by own time:", buffer.getvalue().strip()]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(directory: PathLike) -> Optional[Path]:
+    """Merge the worker profiles in ``directory`` and write the summary.
+
+    Returns:
+        Path of the summary, or None if there are no profiles.
+    """
+    directory = Path(directory)
+    sources = sorted(
+        path for path in directory.glob("*.pstats") if path.name != MERGED_PROFILE
+    )
+    if not sources:
+        return None
+    stats = pstats.Stats(*[str(path) for path in sources], stream=io.StringIO())
+    stats.dump_stats(str(directory / MERGED_PROFILE))
+    summary = directory / PROFILE_SUMMARY
+    summary.write_text(format_report(stats, sources), encoding="utf-8")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Merge the profiles written with --profile and print the summary."
+    )
+    parser.add_argument("directory", nargs="?", default=str(PROFILE_DIR))
+    args = parser.parse_args(argv)
+    summary = write_report(args.directory)
+    if summary is None:
+        print(f"No profiles in {args.directory}")
+        return 1
+    print(summary.read_text(encoding="utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,20 +5,23 @@ image processing, calibration, tracking, and other utilities.
 """
 
 # Standard library imports
+import functools
+import hashlib
 import importlib
+import importlib.machinery
+import importlib.util
 import os
 import sys
 import re
+import threading
 from pathlib import Path
-from typing import List, Sequence, Tuple
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 # Third-party imports
 import numpy as np
 from scipy.optimize import least_squares, minimize
 from scipy import sparse
 from imageio.v3 import imread
-from skimage.util import img_as_ubyte
-from skimage.color import rgb2gray
 
 # OptV imports
 from optv.calibration import Calibration
@@ -53,6 +56,30 @@ example from Tracker documentation:
 
 # PyPTV imports
 from pyptv.parameter_manager import ParameterManager
+from pyptv.manifest import RunManifest
+from pyptv.prefetch import FramePrefetcher
+from pyptv.profiling import optv_call
+from pyptv.image_source import (
+    FileImageSource,
+    ImageSource,
+    SplitterImageSource,
+    image_paths,
+    image_split,
+    open_image_source,
+    sequence_base_names,
+)
+from pyptv.rt_is import rt_is_array, write_rt_is
+from pyptv.preprocessing import (
+    PolygonROI,
+    RollingBackground,
+    as_uint8_gray,
+    background_cache,
+    background_filename,
+    polygon_roi,
+    read_polygon,
+    subtract_background,
+)
+from pyptv.timing import NULL_TIMER, StageTimer
 
 # Constants
 NAMES = ["cc", "xh", "yh", "k1", "k2", "k3", "p1", "p2", "scale", "shear"]
@@ -61,6 +88,23 @@ DEFAULT_HIGHPASS_FILTER_SIZE = 25
 DEFAULT_NO_FILTER = 0
 SHORT_BASE = "cam"  # Use this as the short base for camera file naming
 
+# Plain-data layout of a target, as written to the _targets files
+TARGET_DTYPE = np.dtype(
+    [
+        ("pnr", np.int32),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("n", np.int32),
+        ("nx", np.int32),
+        ("ny", np.int32),
+        ("sumg", np.int32),
+        ("tnr", np.int32),
+    ]
+)
+# Formats of the per-frame _targets files: the text files read by liboptv's
+# tracker, or one TARGET_DTYPE .npy array per camera and frame
+TARGET_FORMATS = ("text", "npy")
+
 
 def _prepare_output_path(filename: str) -> Path:
     """Return a writable output path, creating parent directories when needed."""
@@ -128,28 +172,21 @@ def _ensure_target_output_writable(short_file_bases: List[str]) -> None:
 
 
 
-def image_split(img: np.ndarray, order = [0,1,3,2]) -> List[np.ndarray]:
-    """Split image into four quadrants.
-    """
-    list_of_images = [
-        img[: img.shape[0] // 2, : img.shape[1] // 2],
-        img[: img.shape[0] // 2, img.shape[1] // 2:],
-        img[img.shape[0] // 2:, : img.shape[1] // 2],
-        img[img.shape[0] // 2:, img.shape[1] // 2:],
-    ]
-    list_of_images = [list_of_images[i] for i in order]
-    return list_of_images
-    
-def negative(img: np.ndarray) -> np.ndarray:
-    """Convert an 8-bit image to its negative.
+def negative(img: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """Convert an 8-bit image to its negative, into ``out`` if given.
     """
-    return 255 - img
+    if out is None:
+        return 255 - img
+    return np.subtract(255, img, out=out)
 
 
 def simple_highpass(img: np.ndarray, cpar: ControlParams) -> np.ndarray:
     """Apply a simple highpass filter to an image using liboptv preprocess_image.
     """
-    return preprocess_image(img, DEFAULT_NO_FILTER, cpar, DEFAULT_HIGHPASS_FILTER_SIZE)
+    return optv_call(
+        "preprocess_image", preprocess_image,
+        img, DEFAULT_NO_FILTER, cpar, DEFAULT_HIGHPASS_FILTER_SIZE,
+    )
 
 
 def _populate_cpar(ptv_params: dict, num_cams: int) -> ControlParams:
@@ -301,11 +338,14 @@ def _populate_tpar(targ_params: dict, num_cams: int) -> TargetParams:
         raise ValueError("Target parameters must contain either 'targ_rec' or 'detect_plate' section.")
     return tpar
 
-def _read_calibrations(cpar: ControlParams, num_cams: int) -> List[Calibration]:
+def _read_calibrations(
+    cpar: ControlParams, num_cams: int, root: Path | None = None
+) -> List[Calibration]:
     """Read calibration files for all cameras.
     
     Returns empty/default calibrations if files don't exist, which is normal
-    for the calibration GUI before calibrations have been created.
+    for the calibration GUI before calibrations have been created. Relative
+    file names are resolved against ``root`` (see ``resolve_path``).
     """
     cals = []
     for i_cam in range(num_cams):
@@ -319,8 +359,8 @@ def _read_calibrations(cpar: ControlParams, num_cams: int) -> List[Calibration]:
             cals.append(cal)
             continue
 
-        ori_file = base_name + ".ori"
-        addpar_file = base_name + ".addpar"
+        ori_file = str(resolve_path(root, base_name + ".ori"))
+        addpar_file = str(resolve_path(root, base_name + ".addpar"))
 
         # Check if calibration files exist and are readable
         ori_exists = os.path.isfile(ori_file) and os.access(ori_file, os.R_OK)
@@ -343,6 +383,7 @@ def _read_calibrations(cpar: ControlParams, num_cams: int) -> List[Calibration]:
 
 def py_start_proc_c(
     pm: ParameterManager,
+    root: Path | None = None,
 ) -> Tuple[
     ControlParams,
     SequenceParams,
@@ -352,7 +393,11 @@ def py_start_proc_c(
     List[Calibration],
     dict,
 ]:
-    """Read all parameters needed for processing using ParameterManager."""
+    """Read all parameters needed for processing using ParameterManager.
+
+    The calibration files are read relative to ``root``, the experiment
+    directory, or to the current directory if it is None.
+    """
     try:
         params = pm.parameters
         num_cams = pm.num_cams
@@ -369,7 +414,7 @@ def py_start_proc_c(
 
         epar = params.get('examine')
         
-        cals = _read_calibrations(cpar, num_cams)
+        cals = _read_calibrations(cpar, num_cams, root)
 
         return cpar, spar, vpar, track_par, tpar, cals, epar
 
@@ -387,9 +432,9 @@ def py_pre_processing_c(
     # num_cams = len(list_of_images)
     cpar = _populate_cpar(ptv_params, num_cams)
     processed_images = []
-    for i, img in enumerate(list_of_images):
-        img_lp = img.copy() 
-        processed_images.append(simple_highpass(img_lp, cpar))
+    for img in list_of_images:
+        # preprocess_image reads the raw buffer; copy only strided views
+        processed_images.append(simple_highpass(np.ascontiguousarray(img), cpar))
 
     return processed_images
 
@@ -423,12 +468,12 @@ def py_detection_proc_c(
             raise NotImplementedError("Existing targets are not implemented")
         else:
             im = img.copy()
-            targs = target_recognition(im, tpar, i_cam, cpar)
+            targs = optv_call("target_recognition", target_recognition, im, tpar, i_cam, cpar)
 
         targs.sort_y()
         # print(f"Camera {i_cam} detected {len(targs)} targets.")
         detections.append(targs)
-        mc = MatchedCoords(targs, cpar, cals[i_cam])
+        mc = optv_call("MatchedCoords", MatchedCoords, targs, cpar, cals[i_cam])
         corrected.append(mc)
 
     return detections, corrected
@@ -441,8 +486,9 @@ def py_correspondences_proc_c(exp):
 
 
 
-    sorted_pos, sorted_corresp, num_targs = correspondences(
-        exp.detections, exp.corrected, exp.cals, exp.vpar, exp.cpar
+    sorted_pos, sorted_corresp, num_targs = optv_call(
+        "correspondences", correspondences,
+        exp.detections, exp.corrected, exp.cals, exp.vpar, exp.cpar,
     )
 
     # img_base_names = [exp.spar.get_img_base_name(i) for i in range(exp.num_cams)]
@@ -475,10 +521,15 @@ def py_determination_proc_c(
     concatenated_corresp = np.concatenate(sorted_corresp, axis=1)
 
     flat = np.array(
-        [corr.get_by_pnrs(corresp) for corr, corresp in zip(corrected, concatenated_corresp)]
+        [
+            optv_call("MatchedCoords.get_by_pnrs", corr.get_by_pnrs, corresp)
+            for corr, corresp in zip(corrected, concatenated_corresp)
+        ]
     )
 
-    pos, _ = point_positions(flat.transpose(1, 0, 2), cpar, cals, vpar)
+    pos, _ = optv_call(
+        "point_positions", point_positions, flat.transpose(1, 0, 2), cpar, cals, vpar
+    )
 
     if num_cams < 4:
         print_corresp = -1 * np.ones((4, concatenated_corresp.shape[1]))
@@ -493,36 +544,67 @@ def py_determination_proc_c(
     print(f"Prepared {output_path} to write positions")
 
     try:
-        with open(output_path, "w", encoding="utf-8") as rt_is:
-            print(f"Opened {output_path}")
-            rt_is.write(f"{pos.shape[0]}\n")
-            for pix, pt in enumerate(pos):
-                pt_args = (pix + 1,) + tuple(pt) + tuple(print_corresp[:, pix])
-                rt_is.write("%4d %9.3f %9.3f %9.3f %4d %4d %4d %4d\n" % pt_args)
+        write_rt_is(output_path, pos, print_corresp)
     except OSError as exc:
         _raise_output_write_error(output_path, exc)
 
 
+# Serializes the loading of plugin modules by threads of one process
+_plugin_lock = threading.Lock()
+
+
+def load_plugin(plugin_dir: Path, plugin_name: str):
+    """Import the plugin module ``plugin_name`` from ``plugin_dir``.
+
+    The plugin directory is registered as a package under a name unique to
+    its path, ``pyptv_plugins_<hash>``, instead of being added to
+    ``sys.path``, so plugins of the same name in different experiments do
+    not shadow each other. Plugins import their sibling modules relative to
+    that package (``from . import helpers``); an absolute ``import helpers``
+    is not resolved. A plugin is loaded once per process.
+
+    Raises:
+        ImportError: If the plugin file does not exist or fails to import.
+    """
+    plugin_dir = Path(plugin_dir).resolve()
+    path = plugin_dir / f"{plugin_name}.py"
+    if not path.is_file():
+        raise ImportError(f"No plugin {plugin_name} in {plugin_dir}")
+    digest = hashlib.sha1(str(plugin_dir).encode()).hexdigest()[:12]
+    package_name = f"pyptv_plugins_{digest}"
+    with _plugin_lock:
+        if package_name not in sys.modules:
+            spec = importlib.machinery.ModuleSpec(package_name, None, is_package=True)
+            spec.submodule_search_locations = [str(plugin_dir)]
+            sys.modules[package_name] = importlib.util.module_from_spec(spec)
+        try:
+            return importlib.import_module(f"{package_name}.{plugin_name}")
+        except BaseException as exc:
+            raise ImportError(f"Failed to import plugin {path}: {exc}") from exc
+
+
+def plugin_directory(exp) -> Path:
+    """The ``plugins`` directory of an experiment."""
+    return (experiment_root(exp) or Path(os.getcwd())) / "plugins"
+
+
 def run_sequence_plugin(exp) -> None:
     """Load and run plugins for sequence processing.
     """
-    plugin_dir = Path(os.getcwd()) / "plugins"
+    plugin_dir = plugin_directory(exp)
     print(f"Plugin directory: {plugin_dir}")
 
     # Check if plugin directory exists
     if not plugin_dir.exists():
         raise FileNotFoundError(f"Plugin directory not found: {plugin_dir}")
 
-    if str(plugin_dir) not in sys.path:
-        sys.path.append(str(plugin_dir))
-
     for filename in os.listdir(plugin_dir):
         if filename.endswith(".py") and filename != "__init__.py":
             plugin_name = filename[:-3]
             if plugin_name == exp.plugins.sequence_alg:
                 try:
                     print(f"Loading plugin: {plugin_name}")
-                    plugin = importlib.import_module(plugin_name)
+                    plugin = load_plugin(plugin_dir, plugin_name)
                 except ImportError as e:
                     print(f"Error loading {plugin_name}: {e}")
                     return
@@ -539,23 +621,20 @@ def run_sequence_plugin(exp) -> None:
 def run_tracking_plugin(exp) -> None:
     """Load and run plugins for sequence processing.
     """
-    plugin_dir = Path(os.getcwd()) / "plugins"
+    plugin_dir = plugin_directory(exp)
     print(f"Plugin directory: {plugin_dir}")
 
     # Check if plugin directory exists
     if not plugin_dir.exists():
         raise FileNotFoundError(f"Plugin directory not found: {plugin_dir}")
 
-    if str(plugin_dir) not in sys.path:
-        sys.path.append(str(plugin_dir))
-
     for filename in os.listdir(plugin_dir):
         if filename.endswith(".py") and filename != "__init__.py":
             plugin_name = filename[:-3]
             if plugin_name == exp.plugins.track_alg:
                 try:
                     print(f"Loading plugin: {plugin_name}")
-                    plugin = importlib.import_module(plugin_name)
+                    plugin = load_plugin(plugin_dir, plugin_name)
                 except ImportError as e:
                     print(f"Error loading {plugin_name}: {e}")
                     return
@@ -570,120 +649,708 @@ def run_tracking_plugin(exp) -> None:
 
 
 
-def py_sequence_loop(exp) -> None:
+def read_sequence_image(imname) -> np.ndarray:
+    """Read a sequence image and convert it to a single-channel 8-bit array.
+
+    Raises:
+        FileNotFoundError: If the image file does not exist.
+    """
+    imname = Path(imname)
+    if not imname.exists():
+        raise FileNotFoundError(f"{imname} does not exist")
+    return as_uint8_gray(imread(imname))
+
+
+def sequence_image_source(exp) -> ImageSource:
+    """Open the sequence images of an experiment, see ``pyptv.image_source``.
+
+    ``sequence.base_name`` names one file per frame or one image stack per
+    camera, or, with ``ptv.splitter``, the composite image of all cameras.
+    """
+    pm, num_cams, _, spar, _, _, _ = _processing_params(exp)
+    root = experiment_root(exp)
+    return open_image_source(
+        [str(resolve_path(root, spar.get_img_base_name(i))) for i in range(num_cams)],
+        pm.get_parameter('sequence') or {},
+        pm.get_parameter('ptv'),
+        read_sequence_image,
+    )
+
+
+def _cropped_cpar(cpar: ControlParams, shape: Tuple[int, int]) -> ControlParams:
+    """Copy of ``cpar`` for images of ``shape`` (height, width)."""
+    cropped = ControlParams(cpar.get_num_cams())
+    cropped.set_image_size((shape[1], shape[0]))
+    cropped.set_pixel_size(cpar.get_pixel_size())
+    cropped.set_hp_flag(cpar.get_hp_flag())
+    cropped.set_allCam_flag(cpar.get_allCam_flag())
+    cropped.set_tiff_flag(cpar.get_tiff_flag())
+    cropped.set_chfield(cpar.get_chfield())
+    mm_params, cropped_mm = cpar.get_multimedia_params(), cropped.get_multimedia_params()
+    cropped_mm.set_n1(mm_params.get_n1())
+    cropped_mm.set_layers(list(mm_params.get_n2()), list(mm_params.get_d()))
+    cropped_mm.set_n3(mm_params.get_n3())
+    return cropped
+
+
+class FramePreprocessor:
+    """Pre-processing of sequence images (negative, mask, highpass) in a reused buffer.
+
+    Built once per run from the ``ptv`` and ``masking`` sections, it keeps a
+    uint8 work buffer per camera. The negative is written into it and the
+    background is subtracted from it in place, so these steps allocate
+    nothing after the first frame of a camera; the only per-frame array is
+    the highpass output of liboptv. The input image is never modified, so it
+    may be a read-only view into an image stack.
+
+    With ``masking.polygon_base_name`` the mask polygon of every camera is
+    rasterized once into a ``PolygonROI``. Only the bounding box of the
+    polygon is then processed, with the pixels outside the polygon zeroed,
+    and ``detect`` shifts the targets back to image coordinates. The box
+    keeps a margin of the highpass filter size around the polygon, so the
+    targets are those of the whole image with the outside zeroed.
+
+    With ``masking.rolling_frames`` > 0, a ``RollingBackground`` of the last
+    ``rolling_frames`` images of every camera (``masking.rolling_statistic``:
+    "min", the default, or "mean") is subtracted after the static background.
+    It depends on the preceding frames: feed them in order, and call
+    ``warm_up`` with the frames before the first processed one (``reset``
+    first after a gap in the frame numbers). ``last_frame`` is the last
+    frame the sequence loop processed with it, so a preprocessor reused for
+    the next frames continues its rolling backgrounds without a warm-up.
+
+    Different cameras may be processed concurrently, one frame of a camera
+    at a time.
+
+    Args:
+        cpar: Control parameters of the highpass filter.
+        ptv_params: The ``ptv`` section, for ``negative``.
+        masking_params: The ``masking`` section, for ``mask_flag``,
+            ``mask_base_name``, ``polygon_base_name``, ``rolling_frames`` and
+            ``rolling_statistic``.
+    """
+
+    def __init__(
+        self, cpar: ControlParams, ptv_params: dict, masking_params: dict | None
+    ):
+        self.cpar = cpar
+        self.negative = bool(ptv_params.get('negative', False))
+        self.mask_base_name = None
+        if masking_params and masking_params.get('mask_flag', False):
+            self.mask_base_name = masking_params['mask_base_name']
+        self.polygon_base_name = (masking_params or {}).get('polygon_base_name') or None
+        self.rolling_frames = int((masking_params or {}).get('rolling_frames') or 0)
+        self.rolling_statistic = (masking_params or {}).get('rolling_statistic', 'min')
+        if self.rolling_frames:
+            # Validates the window and the statistic
+            RollingBackground(self.rolling_frames, self.rolling_statistic)
+        self._rolling: dict = {}
+        self.last_frame: Optional[int] = None
+        self._buffers: dict = {}
+        # Per camera: image shape, and PolygonROI with its ControlParams or None
+        self._regions: dict = {}
+
+    def region(
+        self, i_cam: int, shape: Tuple[int, int]
+    ) -> Tuple[PolygonROI, ControlParams] | None:
+        """Region of interest of camera ``i_cam`` and the control parameters of
+        its crop, or None to process the whole image."""
+        cached = self._regions.get(i_cam)
+        if cached is not None and cached[0] == shape:
+            return cached[1]
+        region = None
+        if self.polygon_base_name is not None:
+            polygon_name = background_filename(self.polygon_base_name, i_cam)
+            try:
+                roi = polygon_roi(
+                    read_polygon(polygon_name), shape, margin=DEFAULT_HIGHPASS_FILTER_SIZE
+                )
+                region = (roi, _cropped_cpar(self.cpar, roi.shape))
+            except (ValueError, OSError) as exc:
+                print(f"failed to read the mask polygon {polygon_name}: {exc}")
+        self._regions[i_cam] = (shape, region)
+        return region
+
+    def buffer(self, i_cam: int, shape: Tuple[int, ...]) -> np.ndarray:
+        """Work buffer of a camera, reallocated if the image shape changes."""
+        work = self._buffers.get(i_cam)
+        if work is None or work.shape != shape:
+            work = np.empty(shape, np.uint8)
+            self._buffers[i_cam] = work
+        return work
+
+    def reset(self, i_cam: Optional[int] = None) -> None:
+        """Forget the frames in the rolling background of camera ``i_cam``,
+        or of all cameras."""
+        for cam, rolling in self._rolling.items():
+            if i_cam is None or cam == i_cam:
+                rolling.reset()
+
+    def warm_up(self, img: np.ndarray, i_cam: int, timer: StageTimer = NULL_TIMER) -> None:
+        """Add a frame preceding the processed ones to the rolling background."""
+        if self.rolling_frames:
+            self._prepare(img, i_cam, timer)
+
+    def __call__(
+        self, img: np.ndarray, i_cam: int, timer: StageTimer = NULL_TIMER
+    ) -> np.ndarray:
+        """Return the highpass image of camera ``i_cam``'s pre-processed ``img``.
+
+        With a mask polygon, the highpass image of the region of interest.
+        Every step is timed as a stage of camera ``i_cam`` by ``timer``.
+        """
+        img, cpar = self._prepare(img, i_cam, timer)
+        with timer.stage("highpass", cam=i_cam):
+            return simple_highpass(img, cpar)
+
+    def _prepare(
+        self, img: np.ndarray, i_cam: int, timer: StageTimer
+    ) -> Tuple[np.ndarray, ControlParams]:
+        """Image ready for the highpass filter, and its control parameters."""
+        shape = img.shape
+        region = self.region(i_cam, shape)
+        cpar = self.cpar
+        if region is not None:
+            roi, cpar = region
+            img = img[roi.box]
+        work = self.buffer(i_cam, img.shape)
+        if self.negative:
+            print("Negative image")
+            with timer.stage("negative", cam=i_cam):
+                img = negative(img, out=work)
+        if self.mask_base_name is not None:
+            with timer.stage("mask", cam=i_cam):
+                try:
+                    background_name = background_filename(self.mask_base_name, i_cam)
+                    background = background_cache.get(background_name)
+                    if region is not None and background.shape == shape:
+                        background = background[roi.box]
+                    img = subtract_background(img, background, out=work)
+                except (ValueError, FileNotFoundError):
+                    print("failed to read the mask")
+        if self.rolling_frames:
+            with timer.stage("rolling_background", cam=i_cam):
+                rolling = self._rolling.get(i_cam)
+                if rolling is None:
+                    rolling = RollingBackground(self.rolling_frames, self.rolling_statistic)
+                    self._rolling[i_cam] = rolling
+                img = subtract_background(img, rolling.update(img), out=work)
+        if region is not None:
+            with timer.stage("roi", cam=i_cam):
+                if img is not work:
+                    np.copyto(work, img)
+                    img = work
+                np.copyto(work, 0, where=roi.outside)
+        if not img.flags.c_contiguous:
+            # preprocess_image reads the raw buffer of its input
+            np.copyto(work, img)
+            img = work
+        return img, cpar
+
+    def detect(
+        self,
+        img: np.ndarray,
+        i_cam: int,
+        tpar: TargetParams,
+        timer: StageTimer = NULL_TIMER,
+    ) -> TargetArray:
+        """Pre-process ``img`` of camera ``i_cam`` and detect its targets, in
+        image coordinates."""
+        high_pass = self(img, i_cam, timer)
+        region = self.region(i_cam, img.shape)
+        with timer.stage("target_recognition", cam=i_cam) as stage:
+            if region is None:
+                targs = optv_call(
+                    "target_recognition", target_recognition, high_pass, tpar, i_cam, self.cpar
+                )
+            else:
+                roi, cpar = region
+                targs = optv_call(
+                    "target_recognition", target_recognition, high_pass, tpar, i_cam, cpar
+                )
+                x0, y0 = roi.offset
+                for targ in targs:
+                    x, y = targ.pos()
+                    targ.set_pos((x + x0, y + y0))
+            stage.count = len(targs)
+        return targs
+
+
+def detect_camera_targets(
+    img: np.ndarray,
+    i_cam: int,
+    cpar: ControlParams,
+    tpar: TargetParams,
+    ptv_params: dict,
+    masking_params: dict | None,
+    timer: StageTimer = NULL_TIMER,
+    preprocessor: FramePreprocessor | None = None,
+) -> TargetArray:
+    """Pre-process one camera image (negative, mask, highpass) and detect targets.
+
+    Pass the run's ``preprocessor`` to reuse its buffers; without one, a
+    preprocessor is built for this image from ``cpar``, ``ptv_params`` and
+    ``masking_params``. Every step is timed as a stage of camera ``i_cam``
+    by ``timer``.
+    """
+    if preprocessor is None:
+        preprocessor = FramePreprocessor(cpar, ptv_params, masking_params)
+    return preprocessor.detect(img, i_cam, tpar, timer)
+
+
+def correspond_and_write_frame(
+    frame: int,
+    detections: List[TargetArray],
+    cpar: ControlParams,
+    vpar: VolumeParams,
+    cals: List[Calibration],
+    short_file_bases: Sequence[str],
+    targets_format: str = "text",
+    run_store=None,
+    corres_file_base: str | None = None,
+    timer: StageTimer = NULL_TIMER,
+) -> int:
+    """Find correspondences of one frame's targets and write its output files.
+
+    Writes the ``_targets`` file of every camera, in ``targets_format``, and
+    ``res/rt_is.<frame>`` (``<corres_file_base>.<frame>`` if given), or
+    appends both to ``run_store`` (a ``pyptv.run_store.RunStore``) if given.
+    The targets are sorted by y in place. Every step is timed by ``timer``.
+
+    Returns:
+        Number of 3D positions written to rt_is.
+    """
+    num_cams = len(detections)
+    corrected = []
+    with timer.stage("matched_coords", frame=frame):
+        for i_cam, targs in enumerate(detections):
+            if len(targs) > 0:
+                targs.sort_y()
+            corrected.append(
+                optv_call("MatchedCoords", MatchedCoords, targs, cpar, cals[i_cam])
+            )
+
+    # AFter we finished all targs, we can move to correspondences
+    with timer.stage("correspondences", frame=frame) as stage:
+        sorted_pos, sorted_corresp, _ = optv_call(
+            "correspondences", correspondences, detections, corrected, cals, vpar, cpar
+        )
+        stage.count = sum(s.shape[1] for s in sorted_pos)
+    if run_store is None:
+        with timer.stage("write_targets", frame=frame):
+            for i_cam in range(num_cams):
+                write_targets(
+                    detections[i_cam], short_file_bases[i_cam], frame, targets_format
+                )
+    print(
+        "Frame "
+        + str(frame)
+        + " had "
+        + repr([s.shape[1] for s in sorted_pos])
+        + " correspondences."
+    )
+    with timer.stage("point_positions", frame=frame) as stage:
+        sorted_pos = np.concatenate(sorted_pos, axis=1)
+        sorted_corresp = np.concatenate(sorted_corresp, axis=1)
+        flat = np.array(
+            [
+                optv_call("MatchedCoords.get_by_pnrs", corr.get_by_pnrs, corresp)
+                for corr, corresp in zip(corrected, sorted_corresp)
+            ]
+        )
+        pos, _ = optv_call(
+            "point_positions", point_positions, flat.transpose(1, 0, 2), cpar, cals, vpar
+        )
+        stage.count = pos.shape[0]
+    if len(cals) < 4:
+        print_corresp = -1 * np.ones((4, sorted_corresp.shape[1]))
+        print_corresp[: len(cals), :] = sorted_corresp
+    else:
+        print_corresp = sorted_corresp
+
+    if run_store is not None:
+        with timer.stage("write_store", frame=frame):
+            run_store.write_frame(
+                frame,
+                [targets_to_array(targs) for targs in detections],
+                rt_is_array(pos, print_corresp),
+            )
+        return pos.shape[0]
+
+    if corres_file_base is None:
+        corres_file_base = default_naming['corres'].decode()
+    with timer.stage("write_rt_is", frame=frame):
+        output_path = _prepare_output_path(f"{corres_file_base}.{frame}")
+        try:
+            write_rt_is(output_path, pos, print_corresp)
+        except OSError as exc:
+            _raise_output_write_error(output_path, exc)
+    return pos.shape[0]
+
+
+def py_sequence_loop(
+    exp,
+    prefetch_depth: int = 0,
+    prefetch_max_bytes: int | None = None,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    manifest: RunManifest | None = None,
+    resume: bool = False,
+    timer: StageTimer = NULL_TIMER,
+    preprocessor: FramePreprocessor | None = None,
+    image_source: ImageSource | None = None,
+) -> None:
     """Run a sequence of detection, stereo-correspondence, and determination.
     
     Args:
         exp: Either an Experiment object with pm attribute,
              or a MainGUI object with exp1.pm and cached parameter objects
+        prefetch_depth: Number of frames whose images are decoded ahead, in
+             background threads, while the current frame is processed.
+             0 (default) reads every image synchronously.
+        prefetch_max_bytes: Optional memory cap for the decoded frames held
+             by the prefetcher.
+        camera_workers: Number of workers running the per-camera
+             pre-processing and detection of a frame concurrently. 0 (default)
+             processes the cameras one after the other.
+        camera_pool: Worker type for camera_workers, "process" or "thread".
+             liboptv holds the GIL, so only processes speed up detection.
+        manifest: Optional run manifest recording every processed frame.
+        resume: Skip the frames whose output is up to date according to
+             the manifest.
+        timer: Optional ``pyptv.timing.StageTimer`` recording the time of
+             every stage of every frame and camera.
+        preprocessor: Optional ``FramePreprocessor`` kept by the caller and
+             reused over several calls, with its buffers, regions of interest
+             and rolling backgrounds; by default one is built for the call.
+        image_source: Optional source of the sequence images kept by the
+             caller, such as a ``pyptv.shared_frames.SharedFrameSource``;
+             by default the ``sequence.base_name`` images are opened. It is
+             not closed.
+
+    With ``pft_version.run_store: true`` the targets and correspondences are
+    appended to ``res/run.ptvstore`` instead of being written to files, see
+    ``pyptv.run_store``.
     """
     
     # Handle both Experiment objects and MainGUI objects
-    if hasattr(exp, 'pm'):
-        # Traditional experiment object
-        pm = exp.pm
-        num_cams = pm.num_cams
-        cpar = exp.cpar
-        spar = exp.spar
-        vpar = exp.vpar
-        tpar = exp.tpar
-        cals = exp.cals
-    elif hasattr(exp, 'exp1') and hasattr(exp.exp1, 'pm'):
-        # MainGUI object - ensure parameter objects are initialized
-        pm = exp.exp1.pm
-        num_cams = exp.num_cams
-        cpar = exp.cpar
-        spar = exp.spar
-        vpar = exp.vpar
-        tpar = exp.tpar
-        cals = exp.cals
-    else:
-        raise ValueError("Object must have either pm or exp1.pm attribute")
+    pm, num_cams, cpar, spar, vpar, tpar, cals = _processing_params(exp)
 
-    existing_target = pm.get_parameter('pft_version').get('Existing_Target', False)
+    pft_version = pm.get_parameter('pft_version')
+    existing_target = pft_version.get('Existing_Target', False)
+    targets_format = configured_targets_format(pft_version)
+
+    root = experiment_root(exp)
+    corres_file_base = result_naming(output_root(exp))['corres'].decode()
+    run_store = None
+    if pft_version.get('run_store', False):
+        from pyptv.run_store import STORE_FILE, RunStore
+
+        run_store = RunStore(resolve_path(output_root(exp), STORE_FILE), "a")
 
     first_frame = spar.get_first()
     last_frame = spar.get_last()
     # Generate short_file_bases once per experiment
-    img_base_names = [spar.get_img_base_name(i) for i in range(num_cams)]
+    img_base_names = sequence_base_names(
+        [str(resolve_path(root, spar.get_img_base_name(i))) for i in range(num_cams)],
+        pm.get_parameter('ptv'),
+    )
     short_file_bases = exp.target_filenames
     _ensure_target_output_writable(short_file_bases)
 
-    for frame in range(first_frame, last_frame + 1):
-        detections = []
-        corrected = []
-        for i_cam in range(num_cams):
-            if existing_target:
-                targs = read_targets(short_file_bases[i_cam], frame)
-            else:
-                imname = Path(img_base_names[i_cam] % frame)
-                if not imname.exists():
-                    raise FileNotFoundError(f"{imname} does not exist")
-                else:
-                    img = imread(imname)
-                    if img.ndim > 2:
-                        img = rgb2gray(img)
-                    if img.dtype != np.uint8:
-                        img = img_as_ubyte(img)
-                if pm.get_parameter('ptv').get('negative', False):
-                    print("Negative image")
-                    img = negative(img)
-                masking_params = pm.get_parameter('masking')
-                if masking_params and masking_params.get('mask_flag', False):
-                    try:
-                        background_name = (
-                            masking_params['mask_base_name']
-                            % (i_cam + 1)
-                        )
-                        background = imread(background_name)
-                        img = np.clip(img - background, 0, 255).astype(np.uint8)
-                    except (ValueError, FileNotFoundError):
-                        print("failed to read the mask")
-                high_pass = simple_highpass(img, cpar)
-                targs = target_recognition(high_pass, tpar, i_cam, cpar)
+    def frame_paths(frame):
+        return image_paths(img_base_names, frame)
 
-            if len(targs) > 0:
-                targs.sort_y()
+    def output_paths(frame):
+        if run_store is not None:
+            # The store changes with every frame; has_frame checks it instead
+            return []
+        return [
+            target_filename(base, frame, targets_format) for base in short_file_bases
+        ] + [f"{corres_file_base}.{frame}"]
 
-            detections.append(targs)
-            matched_coords = MatchedCoords(targs, cpar, cals[i_cam])
-            pos, _ = matched_coords.as_arrays()
-            corrected.append(matched_coords)
+    def input_paths(frame):
+        if existing_target:
+            return [
+                target_filename(base, frame, stored_target_format(base, frame) or "text")
+                for base in short_file_bases
+            ]
+        return frame_paths(frame)
+
+    frame_range = range(first_frame, last_frame + 1)
+    if manifest is not None and resume:
+        frame_range = manifest.pending(frame_range, input_paths, output_paths)
+        if run_store is not None:
+            pending = set(frame_range)
+            frame_range = [
+                frame for frame in range(first_frame, last_frame + 1)
+                if frame in pending or not run_store.has_frame(frame, num_cams)
+            ]
+        skipped = last_frame - first_frame + 1 - len(frame_range)
+        if skipped:
+            print(f"Skipping {skipped} up-to-date frames, processing {len(frame_range)}")
+
+    detections_iter = iter_frame_detections(
+        exp,
+        frame_range,
+        prefetch_depth=prefetch_depth,
+        prefetch_max_bytes=prefetch_max_bytes,
+        camera_workers=camera_workers,
+        camera_pool=camera_pool,
+        run_store=run_store,
+        timer=timer,
+        preprocessor=preprocessor,
+        image_source=image_source,
+    )
+    try:
+        for frame, detections in detections_iter:
+            correspond_and_write_frame(
+                frame, detections, cpar, vpar, cals, short_file_bases,
+                targets_format, run_store, corres_file_base=corres_file_base,
+                timer=timer,
+            )
+            if manifest is not None:
+                manifest.record(frame, input_paths(frame), output_paths(frame))
+    finally:
+        detections_iter.close()
+        if run_store is not None:
+            run_store.close()
+
+
+def iter_frame_detections(
+    exp,
+    frames: Sequence[int],
+    prefetch_depth: int = 0,
+    prefetch_max_bytes: int | None = None,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    run_store=None,
+    timer: StageTimer = NULL_TIMER,
+    preprocessor: FramePreprocessor | None = None,
+    image_source: ImageSource | None = None,
+) -> Iterator[Tuple[int, List[TargetArray]]]:
+    """Yield ``(frame, targets of every camera)`` for each of the frames.
+
+    The targets are detected in the sequence images or, with
+    ``pft_version.Existing_Target``, read from the run store or the
+    _targets files. The options are those of py_sequence_loop. Close the
+    generator to shut down the prefetcher and the detection pool early.
+    """
+    pm, num_cams, cpar, spar, _, tpar, _ = _processing_params(exp)
+    existing_target = pm.get_parameter('pft_version').get('Existing_Target', False)
+    ptv_params = pm.get_parameter('ptv')
+    masking_params = resolved_masking(pm.parameters.get('masking'), experiment_root(exp))
+    short_file_bases = exp.target_filenames
 
-        # AFter we finished all targs, we can move to correspondences    
-        sorted_pos, sorted_corresp, _ = correspondences(
-            detections, corrected, cals, vpar, cpar
-        )
-        for i_cam in range(num_cams):
-            write_targets(detections[i_cam], short_file_bases[i_cam], frame)
-        print(
-            "Frame "
-            + str(frame)
-            + " had "
-            + repr([s.shape[1] for s in sorted_pos])
-            + " correspondences."
+    source = None
+    if not existing_target:
+        source = image_source if image_source is not None else sequence_image_source(exp)
+    # Splitter cameras are views of one composite image, decoded once per frame
+    splitter = isinstance(source, SplitterImageSource)
+    reader = source.composite if splitter else source
+    # Frames of image stacks are views into mapped memory, nothing to prefetch
+    files = isinstance(reader, FileImageSource)
+
+    prefetcher = None
+    if prefetch_depth > 0 and files:
+        prefetcher = FramePrefetcher(
+            frames,
+            reader.paths,
+            read_sequence_image,
+            depth=prefetch_depth,
+            max_bytes=prefetch_max_bytes,
         )
-        sorted_pos = np.concatenate(sorted_pos, axis=1)
-        sorted_corresp = np.concatenate(sorted_corresp, axis=1)
-        flat = np.array(
-            [corr.get_by_pnrs(corresp) for corr, corresp in zip(corrected, sorted_corresp)]
+
+    if preprocessor is None:
+        preprocessor = FramePreprocessor(cpar, ptv_params, masking_params)
+    detection_pool = None
+    if camera_workers > 0 and not existing_target:
+        from pyptv.camera_pool import CameraDetectionPool
+
+        detection_pool = CameraDetectionPool(
+            camera_workers,
+            kind=camera_pool,
+            cpar=cpar,
+            tpar=tpar,
+            ptv_params=ptv_params,
+            targ_rec_params=pm.get_parameter('targ_rec'),
+            masking_params=masking_params,
+            num_cams=num_cams,
         )
-        pos, _ = point_positions(flat.transpose(1, 0, 2), exp.cpar, exp.cals, exp.vpar)
-        if len(exp.cals) < 4:
-            print_corresp = -1 * np.ones((4, sorted_corresp.shape[1]))
-            print_corresp[: len(exp.cals), :] = sorted_corresp
+
+    # The rolling background of a frame depends on the frames before it. The
+    # first frame, and any frame after a gap (a chunk of a parallel batch,
+    # frames skipped on resume), starts from a background rebuilt from the
+    # preceding frames of the sequence, so the result does not depend on
+    # where processing started. A reused preprocessor continues from the
+    # last frame it processed; the detection pool holds its own backgrounds.
+    rolling_frames = 0 if existing_target else preprocessor.rolling_frames
+    sequence_first = pm.get_parameter('sequence').get('first')
+    previous_frame = preprocessor.last_frame if detection_pool is None else None
+
+    try:
+        for frame in frames:
+            timer.frame = frame
+            if rolling_frames and previous_frame != frame - 1:
+                warm_up_first = frame - rolling_frames + 1
+                if sequence_first is not None:
+                    warm_up_first = max(warm_up_first, sequence_first)
+                with timer.stage("warm_up"):
+                    _warm_up_rolling(
+                        source, range(warm_up_first, frame), num_cams, preprocessor,
+                        detection_pool,
+                    )
+            previous_frame = frame
+            # Unset while the frame is half way through the backgrounds
+            preprocessor.last_frame = None
+            frame_images = None
+            if prefetcher is not None:
+                with timer.stage("prefetch_wait"):
+                    frame_images = prefetcher.get(frame)
+                if splitter:
+                    frame_images = source.split(frame_images[0])
+            if detection_pool is not None:
+                if frame_images is None and files and not splitter:
+                    frame_images = source.paths(frame)
+                elif frame_images is None:
+                    with timer.stage("imread"):
+                        frame_images = source.frame_images(frame)
+                with timer.stage("detect_wait"):
+                    frame_targets = detection_pool.detect(frame_images, timer)
+            detections = []
+            for i_cam in range(num_cams):
+                if existing_target and run_store is not None and run_store.has(
+                    "targets", frame, i_cam
+                ):
+                    with timer.stage("read_targets", cam=i_cam):
+                        targs = array_to_targets(run_store.read("targets", frame, i_cam))
+                elif existing_target:
+                    with timer.stage("read_targets", cam=i_cam):
+                        targs = read_targets(short_file_bases[i_cam], frame)
+                elif detection_pool is not None:
+                    targs = frame_targets[i_cam]
+                else:
+                    if frame_images is not None:
+                        img = frame_images[i_cam]
+                    else:
+                        with timer.stage("imread", cam=i_cam):
+                            img = source.read(i_cam, frame)
+                    targs = detect_camera_targets(
+                        img, i_cam, cpar, tpar, ptv_params, masking_params, timer,
+                        preprocessor,
+                    )
+
+                detections.append(targs)
+
+            if detection_pool is None:
+                preprocessor.last_frame = frame
+            yield frame, detections
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        if detection_pool is not None:
+            detection_pool.close()
+        if source is not None and source is not image_source:
+            source.close()
+
+
+def _warm_up_rolling(
+    source: ImageSource,
+    frames: Sequence[int],
+    num_cams: int,
+    preprocessor: FramePreprocessor,
+    detection_pool=None,
+) -> None:
+    """Restart the rolling backgrounds of all cameras from ``frames``."""
+    if detection_pool is not None:
+        detection_pool.warm_up([None] * num_cams, reset=True)
+    else:
+        preprocessor.reset()
+    for frame in frames:
+        images = source.frame_images(frame)
+        if detection_pool is not None:
+            detection_pool.warm_up(images)
         else:
-            print_corresp = sorted_corresp
+            for i_cam, img in enumerate(images):
+                preprocessor.warm_up(img, i_cam)
+
+
+def experiment_root(exp) -> Path | None:
+    """Directory the relative paths of an experiment are resolved against.
+
+    Processing contexts (``pyptv.processing_context.ProcessingContext``)
+    carry their experiment directory as ``root``. Objects without one, such
+    as the GUI, which works in the experiment directory, get None: their
+    paths stay relative to the current directory.
+    """
+    root = getattr(exp, 'root', None)
+    return Path(root) if isinstance(root, (str, os.PathLike)) else None
 
-        output_path = _prepare_output_path(f"{default_naming['corres'].decode()}.{frame}")
-        try:
-            with open(output_path, "w", encoding="utf8") as rt_is:
-                rt_is.write(f"{pos.shape[0]}\n")
-                for pix, pt in enumerate(pos):
-                    pt_args = (pix + 1,) + tuple(pt) + tuple(print_corresp[:, pix])
-                    rt_is.write("%4d %9.3f %9.3f %9.3f %4d %4d %4d %4d\n" % pt_args)
-        except OSError as exc:
-            _raise_output_write_error(output_path, exc)
+
+def output_root(exp) -> Path | None:
+    """Directory the output of an experiment is written under.
+
+    The res/ files and the run store go under the ``output_root`` of a
+    processing context, which differs from its ``root`` when it was given an
+    ``output_dir``, and under experiment_root(exp) otherwise.
+    """
+    root = getattr(exp, 'output_root', None)
+    return Path(root) if isinstance(root, (str, os.PathLike)) else experiment_root(exp)
+
+
+def resolve_path(root: Path | None, path) -> Path:
+    """``path`` relative to ``root``; absolute paths and a None root leave it as is."""
+    path = Path(path)
+    if root is None or path.is_absolute():
+        return path
+    return Path(root) / path
+
+
+def resolved_masking(masking_params: dict | None, root: Path | None) -> dict | None:
+    """Copy of the ``masking`` section with its file names resolved against ``root``."""
+    if root is None or not masking_params:
+        return masking_params
+    masking_params = dict(masking_params)
+    for key in ('mask_base_name', 'polygon_base_name'):
+        if masking_params.get(key):
+            masking_params[key] = str(resolve_path(root, masking_params[key]))
+    return masking_params
+
+
+@functools.lru_cache(maxsize=None)
+def result_naming(root: Path | None) -> dict:
+    """File bases of the rt_is, ptv_is and added files of an experiment.
+
+    Same keys as ``optv.tracker.default_naming``, with the ``res/`` paths
+    resolved against ``root``. Cached: the Tracker keeps pointers into the
+    bytes, so they must outlive it.
+    """
+    if root is None:
+        return default_naming
+    return {
+        key: str(resolve_path(root, value.decode())).encode()
+        for key, value in default_naming.items()
+    }
+
+
+def _processing_params(exp):
+    """Return pm, num_cams, cpar, spar, vpar, tpar and cals of an experiment.
+
+    Args:
+        exp: Either an Experiment object with pm attribute,
+             or a MainGUI object with exp1.pm and cached parameter objects
+    """
+    if hasattr(exp, 'pm'):
+        # Traditional experiment object
+        pm = exp.pm
+        num_cams = pm.num_cams
+    elif hasattr(exp, 'exp1') and hasattr(exp.exp1, 'pm'):
+        # MainGUI object - ensure parameter objects are initialized
+        pm = exp.exp1.pm
+        num_cams = exp.num_cams
+    else:
+        raise ValueError("Object must have either pm or exp1.pm attribute")
+    return pm, num_cams, exp.cpar, exp.spar, exp.vpar, exp.tpar, exp.cals
 
 def py_trackcorr_init(exp):
     """Reads all the necessary stuff into Tracker"""
@@ -691,6 +1358,7 @@ def py_trackcorr_init(exp):
     # Generate short_file_bases once per experiment
     # img_base_names = [exp.spar.get_img_base_name(i) for i in range(exp.cpar.get_num_cams())]
     # exp.short_file_bases = exp.target_filenames
+    root = output_root(exp)
     target_filenames = getattr(exp, "target_filenames", None)
     if target_filenames is None:
         target_filenames = []
@@ -704,12 +1372,31 @@ def py_trackcorr_init(exp):
         img_base_names = [
             exp.spar.get_img_base_name(i) for i in range(exp.cpar.get_num_cams())
         ]
-        target_filenames = generate_short_file_bases(img_base_names)
+        target_filenames = [
+            resolve_path(root, base) if root is not None else base
+            for base in generate_short_file_bases(img_base_names)
+        ]
         exp.target_filenames = target_filenames
 
+    # The tracker reads text targets; generate them for frames stored as .npy
+    ensure_text_targets(target_filenames, exp.spar.get_first(), exp.spar.get_last())
+
+    # ... and for frames in the run store, together with their rt_is files
+    pm = _experiment_pm(exp)
+    if pm is not None:
+        from pyptv.run_store import STORE_FILE, RunStore, materialize, run_store_enabled
+
+        store_file = resolve_path(root, STORE_FILE)
+        if run_store_enabled(pm) and store_file.exists():
+            with RunStore(store_file) as store:
+                materialize(
+                    store, target_filenames, exp.spar.get_first(), exp.spar.get_last(),
+                    root=root,
+                )
+
     for cam_id, short_name in enumerate(target_filenames):
         # print(f"Setting tracker image base name for cam {cam_id+1}: {Path(short_name).resolve()}")
-        exp.spar.set_img_base_name(cam_id, str(Path(short_name).resolve())+'.')
+        exp.spar.set_img_base_name(cam_id, str(resolve_path(root, short_name).resolve())+'.')
 
     # print("exp.spar.img_base_names:", [exp.spar.get_img_base_name(i) for i in range(exp.cpar.get_num_cams())])
 
@@ -722,12 +1409,54 @@ def py_trackcorr_init(exp):
     # )
     
     print("Initializing Tracker with parameters:")
-    tracker = Tracker(
-        exp.cpar, exp.vpar, exp.track_par, exp.spar, exp.cals, default_naming
+    tracker = optv_call(
+        "Tracker", Tracker,
+        exp.cpar, exp.vpar, exp.track_par, exp.spar, exp.cals, result_naming(root),
     )
 
     return tracker
 
+
+def py_trackcorr_finish(exp, remove_files: bool = False) -> int:
+    """Pack the tracker's output files into the run store, if one is used.
+
+    The targets, rt_is, ptv_is and added files of the frames first..last
+    are appended to ``res/run.ptvstore`` when ``pft_version.run_store`` is
+    set; otherwise nothing is done.
+
+    Args:
+        remove_files: Delete the files once they are in the store
+
+    Returns:
+        Number of files packed.
+    """
+    pm = _experiment_pm(exp)
+    if pm is None:
+        return 0
+    from pyptv.run_store import STORE_FILE, RunStore, pack, run_store_enabled
+
+    if not run_store_enabled(pm):
+        return 0
+    root = output_root(exp)
+    with RunStore(resolve_path(root, STORE_FILE), "a") as store:
+        return pack(
+            store,
+            exp.target_filenames,
+            exp.spar.get_first(),
+            exp.spar.get_last(),
+            remove_files=remove_files,
+            root=root,
+        )
+
+
+def _experiment_pm(exp):
+    """ParameterManager of an Experiment-like or MainGUI object, or None."""
+    if hasattr(exp, 'pm'):
+        return exp.pm
+    if hasattr(exp, 'exp1') and hasattr(exp.exp1, 'pm'):
+        return exp.exp1.pm
+    return None
+
 # ------- Utilities ----------#
 
 
@@ -766,41 +1495,71 @@ def py_calibration(selection, exp):
         return calib_particles(exp)
 
 
-def write_targets(targets: TargetArray, short_file_base: str, frame: int) -> bool:
-    """Write targets to a file."""
-    output_path = _prepare_output_path(f"{short_file_base}.{frame:04d}_targets")
-    num_targets = len(targets)
-    success = False
-    if num_targets == 0:
-        try:
-            with open(output_path, "w", encoding="utf-8") as file:
-                file.write("0\n")
-        except OSError as exc:
-            _raise_output_write_error(output_path, exc)
-        return True  # No targets to write, but file created successfully
+def configured_targets_format(pft_version: dict) -> str:
+    """Return pft_version.targets_format ("text" by default), validated."""
+    targets_format = pft_version.get('targets_format', 'text')
+    if targets_format not in TARGET_FORMATS:
+        raise ValueError(
+            f"Unknown pft_version.targets_format '{targets_format}', "
+            f"use one of {TARGET_FORMATS}"
+        )
+    return targets_format
+
+
+def target_filename(short_file_base: str, frame: int, fmt: str = "text") -> str:
+    """Return the name of a camera's targets file for a frame."""
+    if fmt not in TARGET_FORMATS:
+        raise ValueError(f"Unknown targets format '{fmt}', use one of {TARGET_FORMATS}")
+    filename = f"{short_file_base}.{frame:04d}_targets"
+    return filename + ".npy" if fmt == "npy" else filename
+
 
+def stored_target_format(short_file_base: str, frame: int) -> str | None:
+    """Return the format of the stored targets of a frame, None if there are none.
+
+    If both formats exist, the more recently written file wins: liboptv's
+    tracker updates the text files in place.
+    """
     try:
-        target_arr = np.array(
-            [
-                ([t.pnr(), *t.pos(), *t.count_pixels(), t.sum_grey_value(), t.tnr()])
-                for t in targets
-            ]
-        )
-        np.savetxt(
-            output_path,
-            target_arr,
-            fmt="%4d %9.4f %9.4f %5d %5d %5d %5d %5d",
-            header=f"{num_targets}",
-            comments="",
-        )
-        success = True
-    except OSError as exc:
-        _raise_output_write_error(output_path, exc)
-    return success
+        npy_mtime = os.stat(target_filename(short_file_base, frame, "npy")).st_mtime_ns
+    except FileNotFoundError:
+        npy_mtime = None
+    try:
+        text_mtime = os.stat(target_filename(short_file_base, frame)).st_mtime_ns
+    except FileNotFoundError:
+        text_mtime = None
+    if npy_mtime is None:
+        return None if text_mtime is None else "text"
+    if text_mtime is None or npy_mtime >= text_mtime:
+        return "npy"
+    return "text"
+
+
+def _remove_file(filename: str) -> None:
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def write_targets(
+    targets: TargetArray, short_file_base: str, frame: int, fmt: str = "text"
+) -> bool:
+    """Write targets to a file.
+
+    With ``fmt="npy"`` the targets are stored as a TARGET_DTYPE array. A
+    targets file of the other format for the same frame is removed, so that
+    readers never see stale targets.
+    """
+    write_target_array(targets_to_array(targets), short_file_base, frame, fmt)
+    return True
 
 def read_targets(short_file_base: str, frame: int) -> TargetArray:
-    """Read targets from a file."""
-    filename = f"{short_file_base}.{frame:04d}_targets"
+    """Read targets from a file, in whichever format is stored."""
+    if stored_target_format(short_file_base, frame) == "npy":
+        return array_to_targets(read_target_array(short_file_base, frame, "npy"))
+
+    filename = target_filename(short_file_base, frame)
     print(f" Reading targets from: filename: {filename}")
 
     if not os.path.exists(filename):
@@ -831,6 +1590,119 @@ def read_targets(short_file_base: str, frame: int) -> TargetArray:
     return targs
 
 
+def read_target_array(
+    short_file_base: str, frame: int, fmt: str | None = None
+) -> np.ndarray:
+    """Read the targets of a frame as a TARGET_DTYPE array.
+
+    Args:
+        fmt: "text" or "npy"; None picks the stored format (see
+            stored_target_format)
+    """
+    if fmt is None:
+        fmt = stored_target_format(short_file_base, frame) or "text"
+    filename = target_filename(short_file_base, frame, fmt)
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"Targets file does not exist: {filename}")
+
+    if fmt == "npy":
+        arr = np.load(filename, allow_pickle=False)
+        if arr.dtype != TARGET_DTYPE:
+            raise ValueError(f"Bad format for file: {filename}")
+        return arr
+
+    with open(filename, "r", encoding="utf-8") as file:
+        num_targets = int(file.readline().strip())
+        if num_targets == 0:
+            return np.empty(0, dtype=TARGET_DTYPE)
+        try:
+            return np.loadtxt(file, dtype=TARGET_DTYPE, max_rows=num_targets, ndmin=1)
+        except ValueError as exc:
+            raise ValueError(f"Bad format for file: {filename}") from exc
+
+
+def _save_target_array(output_path: Path, arr: np.ndarray, fmt: str) -> None:
+    try:
+        if fmt == "npy":
+            with open(output_path, "wb") as file:
+                np.save(file, np.ascontiguousarray(arr, dtype=TARGET_DTYPE))
+        elif len(arr) == 0:
+            with open(output_path, "w", encoding="utf-8") as file:
+                file.write("0\n")
+        else:
+            np.savetxt(
+                output_path,
+                arr,
+                fmt="%4d %9.4f %9.4f %5d %5d %5d %5d %5d",
+                header=f"{len(arr)}",
+                comments="",
+            )
+    except OSError as exc:
+        _raise_output_write_error(output_path, exc)
+
+
+def write_target_array(
+    arr: np.ndarray,
+    short_file_base: str,
+    frame: int,
+    fmt: str = "text",
+    keep_other: bool = False,
+) -> None:
+    """Write a TARGET_DTYPE array as the targets file of a frame.
+
+    The file of the other format for the same frame is removed unless
+    ``keep_other`` is set.
+    """
+    output_path = _prepare_output_path(target_filename(short_file_base, frame, fmt))
+    _save_target_array(output_path, arr, fmt)
+    if not keep_other:
+        other = "text" if fmt == "npy" else "npy"
+        _remove_file(target_filename(short_file_base, frame, other))
+
+
+def ensure_text_targets(
+    short_file_bases: Sequence[str], first_frame: int, last_frame: int
+) -> int:
+    """Write text targets files for frames whose newest targets are .npy.
+
+    liboptv's tracker reads the text format; this generates it on demand.
+    The .npy files are kept.
+
+    Returns:
+        Number of files written.
+    """
+    written = 0
+    for frame in range(first_frame, last_frame + 1):
+        for short_file_base in short_file_bases:
+            if stored_target_format(short_file_base, frame) != "npy":
+                continue
+            arr = read_target_array(short_file_base, frame, "npy")
+            write_target_array(arr, short_file_base, frame, "text", keep_other=True)
+            written += 1
+    return written
+
+
+def targets_to_array(targets: TargetArray) -> np.ndarray:
+    """Copy targets into a structured array with TARGET_DTYPE fields."""
+    arr = np.empty(len(targets), dtype=TARGET_DTYPE)
+    for tix, t in enumerate(targets):
+        arr[tix] = (t.pnr(), *t.pos(), *t.count_pixels(), t.sum_grey_value(), t.tnr())
+    return arr
+
+
+def array_to_targets(arr: np.ndarray) -> TargetArray:
+    """Build a TargetArray from a structured array with TARGET_DTYPE fields."""
+    targs = TargetArray(len(arr))
+    for tix, row in enumerate(arr):
+        targ = targs[tix]
+        targ.set_pnr(int(row["pnr"]))
+        targ.set_pos([float(row["x"]), float(row["y"])])
+        targ.set_pixel_counts(int(row["n"]), int(row["nx"]), int(row["ny"]))
+        targ.set_sum_grey_value(int(row["sumg"]))
+        targ.set_tnr(int(row["tnr"]))
+    return targs
+
+
 def extract_cam_ids(file_bases: list[str]) -> list[int]:
     """
     Given a list of file base strings, extract the camera identification number from each.
@@ -1373,11 +2245,15 @@ def calib_dumbbell(cal_gui)-> None:
     Args:
         exp: Either an Experiment object with pm attribute,
              or a MainGUI object with exp1.pm and cached parameter objects
+
+    The target and calibration files are resolved against the experiment
+    root of ``cal_gui.experiment`` (see ``experiment_root``).
     """
     pm = cal_gui.experiment.pm
-    cpar, spar, vpar, track_par, tpar, cals, epar = py_start_proc_c(pm)
+    root = experiment_root(cal_gui.experiment)
+    cpar, spar, vpar, track_par, tpar, cals, epar = py_start_proc_c(pm, root=root)
     num_cams = cpar.get_num_cams()
-    target_filenames = pm.get_target_filenames()
+    target_filenames = [str(resolve_path(root, base)) for base in pm.get_target_filenames()]
 
     # Get dumbbell length from parameters (or set default)
     dumbbell_params = pm.get_parameter('dumbbell') or {}
@@ -1427,7 +2303,9 @@ def calib_dumbbell(cal_gui)-> None:
     metric_by_cam = []
     for cam in range(num_cams):
         cam_pixels = all_targs[:, cam, :, :].reshape(num_frames * num_targs, num_pos)
-        cam_metric = convert_arr_pixel_to_metric(cam_pixels, cpar)
+        cam_metric = optv_call(
+            "convert_arr_pixel_to_metric", convert_arr_pixel_to_metric, cam_pixels, cpar
+        )
         metric_by_cam.append(cam_metric.reshape(num_frames, num_targs, num_pos))
     metric_by_cam = np.array(metric_by_cam)
 
@@ -1632,7 +2510,7 @@ def calib_dumbbell(cal_gui)-> None:
 
 
         # Write the calibration results to files:
-        ori_filename = cpar.get_cal_img_base_name(cam)
+        ori_filename = str(resolve_path(root, cpar.get_cal_img_base_name(cam)))
         addpar_filename = ori_filename + ".addpar"
         ori_filename = ori_filename + ".ori"
         cal.write(ori_filename.encode('utf-8'), addpar_filename.encode('utf-8'))
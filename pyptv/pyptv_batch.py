@@ -22,13 +22,17 @@ Example:
 """
 
 from pathlib import Path
-import os
 import sys
 import time
-from typing import Union
+from typing import Optional, Union
 
-from pyptv.ptv import py_start_proc_c, py_trackcorr_init, py_sequence_loop, generate_short_file_bases
-from pyptv.experiment import Experiment
+from pyptv.ptv import py_trackcorr_init, py_trackcorr_finish, py_sequence_loop, generate_short_file_bases
+from pyptv.manifest import RunManifest, compact_manifest
+from pyptv.processing_context import ProcessingContext
+from pyptv.pipeline import run_pipeline
+from pyptv.streaming import DEFAULT_IDLE_TIMEOUT, DEFAULT_POLL_INTERVAL, stream_sequence
+from pyptv.profiling import PROFILE_DIR, clear_profiles, optv_call, profiled, write_report
+from pyptv.timing import TIMING_FILE, make_timer
 
 
 
@@ -40,6 +44,13 @@ class ProcessingError(Exception):
 # AttrDict removed - using direct dictionary access with Experiment object
 
 
+def _megabytes_to_bytes(megabytes: Optional[float]) -> Optional[int]:
+    """Convert an optional size in MB to bytes."""
+    if megabytes is None:
+        return None
+    return int(float(megabytes) * 1024 * 1024)
+
+
 def validate_experiment_setup(yaml_file: Path) -> Path:
     """Validate that the YAML file exists and required directories are available.
     
@@ -82,13 +93,55 @@ def validate_experiment_setup(yaml_file: Path) -> Path:
     return exp_path
 
 
-def run_batch(yaml_file: Path, seq_first: int, seq_last: int, mode: str = "both") -> None:
+def run_batch(
+    yaml_file: Path,
+    seq_first: int,
+    seq_last: int,
+    mode: str = "both",
+    prefetch_depth: int = 0,
+    prefetch_max_mb: Optional[float] = None,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    stream: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    resume: bool = False,
+    pipeline: bool = False,
+    buffer_dir: Optional[str] = None,
+    timing: Optional[Union[str, Path]] = None,
+    profile: bool = False,
+) -> None:
     """Run batch processing for a sequence of frames.
     
     Args:
         seq_first: First frame number in the sequence
         seq_last: Last frame number in the sequence  
         yaml_file: Path to the YAML parameter file
+        prefetch_depth: Number of frames decoded ahead in background threads
+            (0 disables prefetching)
+        prefetch_max_mb: Optional memory cap for prefetched images, in MB
+        camera_workers: Number of workers detecting the cameras of a frame
+            concurrently (0 processes cameras one after the other)
+        camera_pool: Worker type for camera_workers, 'process' or 'thread'
+        stream: Process each frame as soon as the image files of all cameras
+            are complete, waiting for frames that are still being recorded
+        poll_interval: Seconds between two polls of the image directories
+            in stream mode
+        idle_timeout: Seconds to wait for the next frame in stream mode
+            before stopping (None waits forever)
+        resume: Skip frames whose sequence output is up to date according
+            to res/sequence_manifest.jsonl
+        pipeline: With mode 'both', hand every frame to the tracker as soon
+            as its correspondences are found, through a frame buffer on
+            tmpfs, instead of writing all frames first (see pyptv.pipeline)
+        buffer_dir: Directory for the pipeline's frame buffer (default:
+            /dev/shm if available)
+        timing: Record the time of every stage of every frame and camera
+            to this JSON lines file (relative to the experiment directory)
+            and print a summary table (see pyptv.timing)
+        profile: Run under cProfile and write the profile, with the time
+            in optv C calls split out, to the experiment's profile directory
+            (see pyptv.profiling)
         
     Raises:
         ProcessingError: If processing fails
@@ -97,76 +150,99 @@ def run_batch(yaml_file: Path, seq_first: int, seq_last: int, mode: str = "both"
     print(f"Using parameter file: {yaml_file}")
 
     # Validate experiment setup and get experiment directory
+    yaml_file = Path(yaml_file).resolve()
     exp_path = validate_experiment_setup(yaml_file)
 
-    # Store original working directory
-    original_cwd = Path.cwd()
+    # Every path is resolved against exp_path, the working directory is
+    # left alone
+    timer = make_timer(timing is not None)
+    start_time = time.perf_counter()
 
     try:
-        # Change to experiment directory
-        os.chdir(exp_path)
-
-        # Create experiment and load YAML parameters
-        experiment = Experiment()
-
-        # Load parameters from YAML file
+        # Load YAML parameters and calibration
         print(f"Loading parameters from: {yaml_file}")
-        experiment.pm.from_yaml(yaml_file)
-
-        print(f"Initializing processing with num_cams = {experiment.pm.num_cams}")
-        cpar, spar, vpar, track_par, tpar, cals, epar = py_start_proc_c(experiment.pm)
-
-        # Set sequence parameters
-        spar.set_first(seq_first)
-        spar.set_last(seq_last)
-
-        # Create a simple object to hold processing parameters for ptv.py functions
-        class ProcessingExperiment:
-            def __init__(self, experiment, cpar, spar, vpar, track_par, tpar, cals, epar):
-                self.pm = experiment.pm
-                self.cpar = cpar
-                self.spar = spar
-                self.vpar = vpar
-                self.track_par = track_par
-                self.tpar = tpar
-                self.cals = cals
-                self.epar = epar
-                self.num_cams = experiment.pm.num_cams  # Global number of cameras
-                # Initialize attributes that may be set during processing
-                self.detections = []
-                self.corrected = []
-
-        proc_exp = ProcessingExperiment(experiment, cpar, spar, vpar, track_par, tpar, cals, epar)
-
-        # Centralized: get target_filenames from ParameterManager
-        proc_exp.target_filenames = experiment.pm.get_target_filenames()
-
-        # Run processing according to mode
-        if mode == "both":
-            print("Running sequence loop...")
-            py_sequence_loop(proc_exp)
+        proc_exp = ProcessingContext(yaml_file, seq_first, seq_last)
+        print(f"Initialized processing with num_cams = {proc_exp.num_cams}")
+
+        manifest = RunManifest.for_experiment(proc_exp.pm, root=exp_path)
+        if not resume:
+            compact_manifest(manifest.path)
+        sequence_options = {
+            "prefetch_depth": prefetch_depth,
+            "prefetch_max_bytes": _megabytes_to_bytes(prefetch_max_mb),
+            "camera_workers": camera_workers,
+            "camera_pool": camera_pool,
+            "manifest": manifest,
+            "resume": resume,
+            "timer": timer,
+        }
+
+        def run_sequence():
+            if stream:
+                stream_sequence(
+                    proc_exp,
+                    poll_interval=poll_interval,
+                    idle_timeout=idle_timeout,
+                    camera_workers=camera_workers,
+                    camera_pool=camera_pool,
+                    timer=timer,
+                )
+            else:
+                py_sequence_loop(proc_exp, **sequence_options)
+
+        def run_tracking():
             print("Initializing tracker...")
             tracker = py_trackcorr_init(proc_exp)
             print("Running tracking...")
-            tracker.full_forward()
-        elif mode == "sequence":
-            print("Running sequence loop only...")
-            py_sequence_loop(proc_exp)
-        elif mode == "tracking":
-            print("Initializing tracker only (skipping sequence)...")
-            tracker = py_trackcorr_init(proc_exp)
-            print("Running tracking only...")
-            tracker.full_forward()
-        else:
-            raise ProcessingError(f"Unknown mode: {mode}. Use 'both', 'sequence', or 'tracking'.")
+            with timer.stage("tracking"):
+                optv_call("Tracker.full_forward", tracker.full_forward)
+            # With a run store, the tracker's files are moved into it
+            py_trackcorr_finish(proc_exp, remove_files=True)
+
+        profile_dir = exp_path / PROFILE_DIR if profile else None
+        if profile_dir is not None:
+            clear_profiles(profile_dir)
+
+        # Run processing according to mode
+        with profiled(profile_dir / "batch.pstats" if profile_dir else None):
+            if mode == "both" and pipeline:
+                print("Running sequence and tracking in one pass...")
+                run_pipeline(
+                    proc_exp,
+                    prefetch_depth=prefetch_depth,
+                    prefetch_max_bytes=_megabytes_to_bytes(prefetch_max_mb),
+                    camera_workers=camera_workers,
+                    camera_pool=camera_pool,
+                    buffer_root=buffer_dir,
+                    timer=timer,
+                )
+            elif mode == "both":
+                print("Running sequence loop...")
+                run_sequence()
+                run_tracking()
+            elif mode == "sequence":
+                print("Running sequence loop only...")
+                run_sequence()
+            elif mode == "tracking":
+                print("Tracking only (skipping sequence)...")
+                run_tracking()
+            else:
+                raise ProcessingError(f"Unknown mode: {mode}. Use 'both', 'sequence', or 'tracking'.")
 
         print("Batch processing completed successfully")
 
+        if timer.enabled:
+            timer.write(exp_path / timing)
+            print(timer.summary(time.perf_counter() - start_time))
+            print(f"Timing records written to {exp_path / timing}")
+
+        if profile_dir is not None:
+            summary = write_report(profile_dir)
+            print(summary.read_text(encoding="utf-8"))
+            print(f"Profile written to {profile_dir}")
+
     except Exception as e:
         raise ProcessingError(f"Batch processing failed: {e}")
-    finally:
-        # Restore original working directory
-        os.chdir(original_cwd)
 
 
 def main(
@@ -174,7 +250,19 @@ def main(
     first: Union[str, int], 
     last: Union[str, int], 
     repetitions: int = 1,
-    mode: str = "both"
+    mode: str = "both",
+    prefetch_depth: int = 0,
+    prefetch_max_mb: Optional[float] = None,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    stream: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    resume: bool = False,
+    pipeline: bool = False,
+    buffer_dir: Optional[str] = None,
+    timing: Optional[Union[str, Path]] = None,
+    profile: bool = False,
 ) -> None:
     """Run PyPTV batch processing.
     
@@ -183,6 +271,23 @@ def main(
         first: First frame number in the sequence
         last: Last frame number in the sequence  
         repetitions: Number of times to repeat the processing (default: 1)
+        mode: Which steps to run: 'both', 'sequence', or 'tracking'
+        prefetch_depth: Number of frames decoded ahead in background threads
+            (0 disables prefetching)
+        prefetch_max_mb: Optional memory cap for prefetched images, in MB
+        camera_workers: Number of workers detecting the cameras of a frame
+            concurrently (0 processes cameras one after the other)
+        camera_pool: Worker type for camera_workers, 'process' or 'thread'
+        stream: Process frames while they are being recorded (see run_batch)
+        poll_interval: Seconds between two polls of the image directories
+            in stream mode
+        idle_timeout: Seconds to wait for the next frame in stream mode
+            before stopping (None waits forever)
+        resume: Skip frames whose sequence output is still up to date
+        pipeline: Run sequence and tracking in one pass (see run_batch)
+        buffer_dir: Directory for the pipeline's frame buffer
+        timing: JSON lines file receiving per-stage timing (see run_batch)
+        profile: Profile the run (see run_batch)
         
     Raises:
         ProcessingError: If processing fails
@@ -207,6 +312,21 @@ def main(
         
         if repetitions < 1:
             raise ValueError(f"Repetitions must be >= 1, got {repetitions}")
+
+        if prefetch_depth < 0:
+            raise ValueError(f"Prefetch depth must be >= 0, got {prefetch_depth}")
+
+        if camera_workers < 0:
+            raise ValueError(f"Camera workers must be >= 0, got {camera_workers}")
+
+        if stream and poll_interval <= 0:
+            raise ValueError(f"Poll interval must be > 0, got {poll_interval}")
+
+        if pipeline and (mode != "both" or stream or resume):
+            raise ValueError(
+                "Pipeline mode runs sequence and tracking together; "
+                "it cannot be combined with --mode sequence/tracking, --stream or --resume"
+            )
             
         print(f"Starting batch processing with YAML file: {yaml_file}")
         print(f"Frame range: {seq_first} to {seq_last}")
@@ -224,7 +344,24 @@ def main(
         for i in range(repetitions):
             if repetitions > 1:
                 print(f"Starting repetition {i + 1} of {repetitions}")
-            run_batch(yaml_file, seq_first, seq_last, mode=mode)
+            run_batch(
+                yaml_file,
+                seq_first,
+                seq_last,
+                mode=mode,
+                prefetch_depth=prefetch_depth,
+                prefetch_max_mb=prefetch_max_mb,
+                camera_workers=camera_workers,
+                camera_pool=camera_pool,
+                stream=stream,
+                poll_interval=poll_interval,
+                idle_timeout=idle_timeout,
+                resume=resume,
+                pipeline=pipeline,
+                buffer_dir=buffer_dir,
+                timing=timing,
+                profile=profile,
+            )
         elapsed_time = time.time() - start_time
         print(f"Total processing time: {elapsed_time:.2f} seconds")
         
@@ -236,11 +373,12 @@ def main(
         raise ProcessingError(f"Unexpected error: {e}")
 
 
-def parse_command_line_args() -> tuple[Path, int, int]:
+def parse_command_line_args() -> tuple[Path, int, int, str, dict]:
     """Parse and validate command line arguments.
     
     Returns:
-        Tuple of (yaml_file_path, first_frame, last_frame)
+        Tuple of (yaml_file_path, first_frame, last_frame, mode, options),
+        where options holds the keyword arguments forwarded to main()
         
     Raises:
         ValueError: If arguments are invalid
@@ -251,6 +389,18 @@ def parse_command_line_args() -> tuple[Path, int, int]:
     parser.add_argument("first_frame", type=int, nargs="?", help="First frame number")
     parser.add_argument("last_frame", type=int, nargs="?", help="Last frame number")
     parser.add_argument("--mode", choices=["both", "sequence", "tracking"], default="both", help="Which steps to run: both (default), sequence, or tracking")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="N", help="Decode the images of the next N frames in background threads (default: 0, disabled)")
+    parser.add_argument("--prefetch-max-mb", type=float, default=None, metavar="MB", help="Memory cap for prefetched images in MB")
+    parser.add_argument("--camera-workers", type=int, default=0, metavar="N", help="Detect the cameras of each frame concurrently on N workers (default: 0, sequential)")
+    parser.add_argument("--camera-pool", choices=["process", "thread"], default="process", help="Worker type for --camera-workers (default: process)")
+    parser.add_argument("--stream", action="store_true", help="Process each frame as soon as the images of all cameras are complete (live acquisition)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, metavar="S", help=f"Seconds between polls of the image directories with --stream (default: {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT, metavar="S", help=f"Stop --stream after waiting this many seconds for the next frame; 0 or less waits forever (default: {DEFAULT_IDLE_TIMEOUT})")
+    parser.add_argument("--pipeline", action="store_true", help="Hand every frame to the tracker as soon as its correspondences are found, through a frame buffer on tmpfs (--mode both only)")
+    parser.add_argument("--buffer-dir", default=None, metavar="DIR", help="Directory for the --pipeline frame buffer (default: /dev/shm if available)")
+    parser.add_argument("--timing", nargs="?", const=str(TIMING_FILE), default=None, metavar="FILE", help=f"Record the time of every stage of every frame and camera to FILE, relative to the experiment directory (default: {TIMING_FILE}), and print a summary")
+    parser.add_argument("--profile", action="store_true", help=f"Profile the run with cProfile; writes {PROFILE_DIR}/profile.pstats and a summary splitting Python from optv C time to the experiment directory")
+    parser.add_argument("--resume", action="store_true", help="Skip frames whose sequence output is up to date with the current parameters and calibration (see res/sequence_manifest.jsonl)")
     args = parser.parse_args()
 
     yaml_file = Path(args.yaml_file).resolve()
@@ -269,8 +419,22 @@ def parse_command_line_args() -> tuple[Path, int, int]:
         last_frame = pm.parameters.get("sequence").get("last")
 
     mode = args.mode
-
-    return yaml_file, first_frame, last_frame, mode
+    options = {
+        "prefetch_depth": args.prefetch,
+        "prefetch_max_mb": args.prefetch_max_mb,
+        "camera_workers": args.camera_workers,
+        "camera_pool": args.camera_pool,
+        "stream": args.stream,
+        "poll_interval": args.poll_interval,
+        "idle_timeout": args.idle_timeout if args.idle_timeout > 0 else None,
+        "resume": args.resume,
+        "pipeline": args.pipeline,
+        "buffer_dir": args.buffer_dir,
+        "timing": args.timing,
+        "profile": args.profile,
+    }
+
+    return yaml_file, first_frame, last_frame, mode, options
 
 
 if __name__ == "__main__":
@@ -290,8 +454,8 @@ if __name__ == "__main__":
         print("Starting batch processing")
         print(f"Command line arguments: {sys.argv}")
         
-        yaml_file, first_frame, last_frame, mode = parse_command_line_args()
-        main(yaml_file, first_frame, last_frame, mode=mode)
+        yaml_file, first_frame, last_frame, mode, options = parse_command_line_args()
+        main(yaml_file, first_frame, last_frame, mode=mode, **options)
         
         print("Batch processing completed successfully")
         
@@ -2,7 +2,9 @@
 
 This module provides parallel batch processing capabilities for PyPTV, allowing users to
 process sequences of images without the GUI interface using multiple CPU cores for improved
-performance. The frame range is split into chunks that are processed concurrently.
+performance. The frame range is handed out to the worker processes in small
+blocks: a worker that finishes its block pulls the next one, so a slow stretch
+of frames does not leave the other cores idle (see BlockScheduler).
 
 Example:
     Command line usage:
@@ -16,10 +18,17 @@ The script expects the experiment directory to contain the standard OpenPTV
 folder structure with /parameters, /img, /cal, and /res directories.
 
 Notes:
-    - Only the sequence step (detection/correspondence) is parallelized
-    - Tracking is not parallelized in this implementation
+    - The sequence step (detection/correspondence) is parallelized; tracking
+      runs serially unless parallel_tracking is set, which tracks
+      overlapping frame windows in parallel and stitches them (see
+      pyptv.parallel_tracking)
     - Choose n_processes based on available CPU cores
-    - Each process operates on a separate chunk of frames
+    - Each block of frames is processed by one worker; the block size adapts
+      to the measured cost per frame
+    - Every worker process loads the parameters and calibration once, in a
+      pool initializer, and reuses them for all its blocks
+    - The utilization and startup time of every worker are reported at the
+      end of the run
 """
 
 import logging
@@ -28,11 +37,17 @@ import os
 import sys
 import time
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from typing import Union, List, Tuple
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, NamedTuple, Optional, Sequence, Union, List, Tuple
 
-from pyptv.ptv import py_start_proc_c, py_sequence_loop, generate_short_file_bases
-from pyptv.experiment import Experiment
+from pyptv.ptv import FramePreprocessor, py_sequence_loop, resolved_masking, generate_short_file_bases
+from pyptv.processing_context import ProcessingContext
+from pyptv.manifest import MANIFEST_FILE, RunManifest, compact_manifest
+from pyptv.parallel_tracking import DEFAULT_OVERLAP, run_parallel_tracking
+from pyptv.profiling import PROFILE_DIR, clear_profiles, profiled, write_report
+from pyptv.pyptv_batch import _megabytes_to_bytes
+from pyptv.timing import TIMING_FILE, StageTimer, format_summary, make_timer, read_timing
 
 # Configure logging
 logging.basicConfig(
@@ -47,83 +62,169 @@ class ProcessingError(Exception):
     pass
 
 
-# AttrDict removed - using direct dictionary access with Experiment object
+class BlockResult(NamedTuple):
+    """Frame block processed by one worker, as returned by run_sequence_chunk.
 
-def run_sequence_chunk(yaml_file: Union[str, Path], seq_first: int, seq_last: int) -> Tuple[int, int]:
-    """Run sequence processing for a chunk of frames in a separate process.
+    ``seconds`` is the processing time of the block; ``startup_seconds`` is
+    the time the worker spent building its context before it, non-zero only
+    for the first block of every worker. ``warm_up_seconds`` is the part of
+    ``seconds`` spent warming up the rolling background on the frames before
+    the block (see ``masking.rolling_frames``).
+    """
+
+    first: int
+    last: int
+    pid: int
+    seconds: float
+    startup_seconds: float = 0.0
+    warm_up_seconds: float = 0.0
+
+    @property
+    def n_frames(self) -> int:
+        return self.last - self.first + 1
+
+
+class WorkerContext:
+    """Processing context of a worker process, built once for all its blocks.
+
+    Building it loads the YAML into a ``ProcessingContext``, which runs
+    ``py_start_proc_c`` (reading every .ori and .addpar file), and creates
+    the run manifest and the frame pre-processor, whose buffers and rolling
+    backgrounds carry over from one block to the next. ``startup_seconds`` is
+    the time this took. All paths are resolved against the experiment
+    directory, so the working directory of the worker does not matter.
+
+    Args:
+        yaml_file: Path to the YAML parameter file
+    """
+
+    def __init__(self, yaml_file: Union[str, Path]):
+        start = time.perf_counter()
+        self.proc_exp = ProcessingContext(yaml_file)
+        self.yaml_file = self.proc_exp.yaml_file
+        self.exp_path = self.proc_exp.root
+        pm = self.proc_exp.pm
+        self.manifest = RunManifest.for_experiment(pm, root=self.exp_path)
+        self.preprocessor = FramePreprocessor(
+            self.proc_exp.cpar,
+            pm.get_parameter('ptv'),
+            resolved_masking(pm.parameters.get('masking'), self.exp_path),
+        )
+        self.startup_seconds = time.perf_counter() - start
+        self.startup_reported = False
+
+
+# Context of this worker process, built by init_worker
+_worker_context: Optional[WorkerContext] = None
+
+
+def init_worker(yaml_file: Union[str, Path]) -> None:
+    """Pool initializer building the processing context of a worker process.
+
+    A failure is only logged here: run_sequence_chunk then builds the
+    context again and reports the error for its block.
+    """
+    try:
+        worker_context(yaml_file)
+    except Exception as e:
+        logger.error(f"Worker {os.getpid()} failed to initialize: {e}")
+
+
+def worker_context(yaml_file: Union[str, Path]) -> WorkerContext:
+    """Return the context of this process for yaml_file, building it if needed."""
+    global _worker_context
+    yaml_file = Path(yaml_file).resolve()
+    if _worker_context is None or _worker_context.yaml_file != yaml_file:
+        _worker_context = WorkerContext(yaml_file)
+    return _worker_context
+
+
+def run_sequence_chunk(
+    yaml_file: Union[str, Path],
+    seq_first: int,
+    seq_last: int,
+    prefetch_depth: int = 0,
+    prefetch_max_bytes: Optional[int] = None,
+    resume: bool = False,
+    timing: Optional[Union[str, Path]] = None,
+    profile_dir: Optional[Union[str, Path]] = None,
+) -> BlockResult:
+    """Run sequence processing for a block of frames in a worker process.
+
+    The processing context is built once per process (see init_worker) and
+    reused for every block.
     
     Args:
         yaml_file: Path to the YAML parameter file
-        seq_first: First frame number in the chunk
-        seq_last: Last frame number in the chunk
+        seq_first: First frame number in the block
+        seq_last: Last frame number in the block
+        prefetch_depth: Number of frames decoded ahead in background threads
+        prefetch_max_bytes: Optional memory cap for prefetched images
+        resume: Skip frames whose output is up to date according to the
+            run manifest shared by all workers
+        timing: Absolute path of the JSON lines file the worker appends its
+            per-stage timing to, or None
+        profile_dir: Absolute path of the directory receiving the worker's
+            profile, or None
         
     Returns:
-        Tuple of (seq_first, seq_last) indicating the processed range
+        BlockResult with the processed range, the worker's pid, the time
+        the worker spent on it and its startup time
         
     Raises:
         ProcessingError: If processing fails
     """
-    logger.info(f"Worker process starting: frames {seq_first} to {seq_last}")
+    logger.debug(f"Worker process starting: frames {seq_first} to {seq_last}")
     
     try:
-        yaml_file = Path(yaml_file).resolve()
-        exp_path = yaml_file.parent
-        
-        # Store original working directory
-        original_cwd = Path.cwd()
-        
-        # Change to experiment directory
-        os.chdir(exp_path)
-        
-        # Create experiment and load YAML parameters
-        experiment = Experiment()
-        
-        # Load parameters from YAML file
-        experiment.pm.from_yaml(yaml_file)
-        
-        # Initialize processing parameters using the experiment
-        cpar, spar, vpar, track_par, tpar, cals, epar = py_start_proc_c(experiment.pm)
-        
-        # Set sequence parameters
-        spar.set_first(seq_first)
-        spar.set_last(seq_last)
-        
-        # Create a simple object to hold processing parameters for ptv.py functions
-        class ProcessingExperiment:
-            def __init__(self, experiment, cpar, spar, vpar, track_par, tpar, cals, epar):
-                self.pm = experiment.pm
-                self.cpar = cpar
-                self.spar = spar
-                self.vpar = vpar
-                self.track_par = track_par
-                self.tpar = tpar
-                self.cals = cals
-                self.epar = epar
-                self.num_cams = experiment.pm.num_cams
-                self.detections = []
-                self.corrected = []
-        
-        proc_exp = ProcessingExperiment(experiment, cpar, spar, vpar, track_par, tpar, cals, epar)
-        
-        
-        # Centralized: get target_filenames from ParameterManager
-        proc_exp.target_filenames = experiment.pm.get_target_filenames()
+        context = worker_context(yaml_file)
+        startup_seconds = 0.0
+        if not context.startup_reported:
+            startup_seconds = context.startup_seconds
+            context.startup_reported = True
+        block_start = time.perf_counter()
+
+        proc_exp = context.proc_exp
+        proc_exp.spar.set_first(seq_first)
+        proc_exp.spar.set_last(seq_last)
 
-        # Run sequence processing
-        py_sequence_loop(proc_exp)
+        # Run sequence processing. The warm-up of a rolling background is
+        # timed even without --timing, so the scheduler can leave it out of
+        # the cost per frame
+        timer = make_timer(timing is not None or context.preprocessor.rolling_frames > 0)
+        profile_path = None
+        if profile_dir is not None:
+            profile_path = Path(profile_dir) / f"worker-{seq_first}-{seq_last}.pstats"
+        try:
+            with profiled(profile_path):
+                py_sequence_loop(
+                    proc_exp,
+                    prefetch_depth=prefetch_depth,
+                    prefetch_max_bytes=prefetch_max_bytes,
+                    manifest=context.manifest,
+                    resume=resume,
+                    timer=timer,
+                    preprocessor=context.preprocessor,
+                )
+        finally:
+            if timing is not None:
+                timer.write(timing, append=True)
         
         # Only run sequence processing in parallel batch
-        logger.info(f"Worker process completed: frames {seq_first} to {seq_last}")
-        return (seq_first, seq_last)
+        logger.debug(f"Worker process completed: frames {seq_first} to {seq_last}")
+        return BlockResult(
+            seq_first,
+            seq_last,
+            os.getpid(),
+            time.perf_counter() - block_start,
+            startup_seconds,
+            timer.total("warm_up"),
+        )
         
     except Exception as e:
         error_msg = f"Chunk processing failed for frames {seq_first}-{seq_last}: {e}"
         logger.error(error_msg)
         raise ProcessingError(error_msg)
-    finally:
-        # Restore original working directory
-        if 'original_cwd' in locals():
-            os.chdir(original_cwd)
 
 def validate_experiment_directory(exp_path: Path) -> None:
     """Validate that the experiment directory has the required structure.
@@ -200,57 +301,142 @@ def validate_experiment_setup(yaml_file: Path) -> Path:
     
     return exp_path
 
-def chunk_ranges(first: int, last: int, n_chunks: int) -> List[Tuple[int, int]]:
-    """Split the frame range into n_chunks as evenly as possible.
-    
+
+class BlockScheduler:
+    """Hand out blocks of consecutive frames to the workers of a parallel run.
+
+    The frame range is consumed block by block from the front, and a worker
+    gets its next block as soon as it finishes one, so fast workers keep
+    pulling work while a slow block holds up only its own worker. The block
+    size is adaptive: it is chosen so that a block takes about
+    ``target_seconds`` at the measured cost per frame (an exponential moving
+    average over the finished blocks, without the workers' startup), and
+    capped at a ``1 / (2 * n_workers)`` share of the frames still to
+    hand out, so the blocks shrink towards the end of the run and the workers
+    finish together. Until the first block is measured, blocks of
+    ``INITIAL_BLOCK_SIZE`` frames are handed out.
+
     Args:
         first: First frame number
         last: Last frame number
-        n_chunks: Number of chunks to create
-        
-    Returns:
-        List of tuples containing (start_frame, end_frame) for each chunk
-        
-    Raises:
-        ValueError: If parameters are invalid
+        n_workers: Number of worker processes
+        target_seconds: Wanted processing time of one block
+        block_size: Fixed block size; disables the adaptation (the end of
+            run cap still applies)
     """
-    if first > last:
-        raise ValueError(f"First frame ({first}) must be <= last frame ({last})")
-    
-    if n_chunks < 1:
-        raise ValueError(f"Number of chunks must be >= 1, got {n_chunks}")
-    
-    total_frames = last - first + 1
-    
-    if n_chunks > total_frames:
-        logger.warning(
-            f"Number of chunks ({n_chunks}) is greater than total frames ({total_frames}). "
-            f"Using {total_frames} chunks instead."
+
+    INITIAL_BLOCK_SIZE = 4
+    # Weight of the newest block in the moving average of the frame cost
+    SMOOTHING = 0.3
+
+    def __init__(
+        self,
+        first: int,
+        last: int,
+        n_workers: int,
+        target_seconds: float = 2.0,
+        block_size: Optional[int] = None,
+    ):
+        if first > last:
+            raise ValueError(f"First frame ({first}) must be <= last frame ({last})")
+        if n_workers < 1:
+            raise ValueError(f"Number of workers must be >= 1, got {n_workers}")
+        if target_seconds <= 0:
+            raise ValueError(f"Block target time must be > 0, got {target_seconds}")
+        if block_size is not None and block_size < 1:
+            raise ValueError(f"Block size must be >= 1, got {block_size}")
+        self.next_frame = first
+        self.last = last
+        self.n_workers = n_workers
+        self.target_seconds = target_seconds
+        self.fixed_block_size = block_size
+        self.frame_seconds: Optional[float] = None
+
+    @property
+    def remaining(self) -> int:
+        """Number of frames not handed out yet."""
+        return self.last - self.next_frame + 1
+
+    def block_size(self) -> int:
+        """Size of the next block."""
+        cap = max(1, -(-self.remaining // (2 * self.n_workers)))
+        if self.fixed_block_size is not None:
+            return min(self.fixed_block_size, cap)
+        if self.frame_seconds is None:
+            size = self.INITIAL_BLOCK_SIZE
+        elif self.frame_seconds > 0:
+            size = max(1, int(self.target_seconds / self.frame_seconds))
+        else:
+            size = cap
+        return min(size, cap)
+
+    def next_block(self) -> Optional[Tuple[int, int]]:
+        """Return the (first, last) frames of the next block, None when done."""
+        if self.remaining <= 0:
+            return None
+        size = self.block_size()
+        block = (self.next_frame, self.next_frame + size - 1)
+        self.next_frame += size
+        return block
+
+    def record(self, n_frames: int, seconds: float, warm_up_seconds: float = 0.0) -> None:
+        """Update the cost per frame with a block that took ``seconds``.
+
+        ``warm_up_seconds`` of them, spent on the frames before the block, are
+        not counted: they do not grow with the block, so counting them would
+        shrink the blocks and make the warm-ups more frequent.
+        """
+        frame_seconds = max(0.0, seconds - warm_up_seconds) / n_frames
+        if self.frame_seconds is None:
+            self.frame_seconds = frame_seconds
+        else:
+            self.frame_seconds += self.SMOOTHING * (frame_seconds - self.frame_seconds)
+
+
+def format_utilization(results: Sequence[BlockResult], wall_time: float) -> str:
+    """Table of the blocks, frames, startup and busy time of every worker.
+
+    Utilization is the share of ``wall_time`` (the wall time of the parallel
+    step) the worker spent processing blocks; its one-time startup is listed
+    separately.
+    """
+    by_worker: Dict[int, List[BlockResult]] = defaultdict(list)
+    for result in results:
+        by_worker[result.pid].append(result)
+    lines = [
+        f"Utilization of {len(by_worker)} workers, wall time {wall_time:.2f} s",
+        f"{'worker pid':>10} {'blocks':>7} {'frames':>7} {'startup s':>9} {'busy s':>9} "
+        f"{'ms/frame':>9} {'utilization':>11}",
+    ]
+    for pid in sorted(by_worker):
+        blocks = by_worker[pid]
+        frames = sum(block.n_frames for block in blocks)
+        startup = sum(block.startup_seconds for block in blocks)
+        busy = sum(block.seconds for block in blocks)
+        share = 100.0 * busy / wall_time if wall_time > 0 else 0.0
+        lines.append(
+            f"{pid:>10} {len(blocks):>7} {frames:>7} {startup:>9.2f} {busy:>9.2f} "
+            f"{1000 * busy / frames:>9.1f} {share:>10.1f}%"
         )
-        n_chunks = total_frames
-    
-    chunk_size = total_frames // n_chunks
-    remainder = total_frames % n_chunks
-    
-    ranges = []
-    current_start = first
-    
-    for i in range(n_chunks):
-        # Add an extra frame to the first 'remainder' chunks to distribute frames evenly
-        current_chunk_size = chunk_size + (1 if i < remainder else 0)
-        current_end = current_start + current_chunk_size - 1
-        
-        ranges.append((current_start, current_end))
-        current_start = current_end + 1
-    
-    return ranges
+    return "\n".join(lines)
+
 
 def main(
     yaml_file: Union[str, Path],
     first: Union[str, int],
     last: Union[str, int],
     n_processes: int = 2,
-    mode: str = "both"
+    mode: str = "both",
+    prefetch_depth: int = 0,
+    prefetch_max_mb: Optional[float] = None,
+    resume: bool = False,
+    timing: Optional[Union[str, Path]] = None,
+    profile: bool = False,
+    block_size: Optional[int] = None,
+    block_seconds: float = 2.0,
+    parallel_tracking: bool = False,
+    tracking_window: Optional[int] = None,
+    tracking_overlap: int = DEFAULT_OVERLAP,
 ) -> None:
     """Run PyPTV parallel batch processing with modular mode support.
     
@@ -260,6 +446,26 @@ def main(
         last: Last frame number in the sequence
         n_processes: Number of parallel processes to use
         mode: Which steps to run: 'both', 'sequence', or 'tracking'
+        prefetch_depth: Number of frames each worker decodes ahead in
+            background threads (0 disables prefetching)
+        prefetch_max_mb: Optional per-worker memory cap for prefetched images, in MB
+        resume: Skip frames whose sequence output is up to date; a rerun after
+            a failure only redoes the frames that were not completed
+        timing: JSON lines file, relative to the experiment directory, that
+            all workers write their per-stage timing to; a summary table of
+            all workers is printed at the end (see pyptv.timing)
+        profile: Profile every worker and the tracking step and merge the
+            profiles in the experiment's profile directory (see
+            pyptv.profiling)
+        block_size: Fixed number of frames per work block; by default the
+            block size adapts to the measured cost per frame
+        block_seconds: Wanted processing time of one adaptive block
+        parallel_tracking: Track overlapping frame windows in parallel
+            processes and stitch them, instead of one serial tracking run
+        tracking_window: Frames owned by every tracking window (default:
+            the range split evenly over the processes)
+        tracking_overlap: Frames tracked before and after the owned ones of
+            every window
     Raises:
         ProcessingError: If processing fails
         ValueError: If parameters are invalid
@@ -283,6 +489,12 @@ def main(
             n_processes = int(n_processes)
         if n_processes < 1:
             raise ValueError(f"Number of processes must be >= 1, got {n_processes}")
+        if prefetch_depth < 0:
+            raise ValueError(f"Prefetch depth must be >= 0, got {prefetch_depth}")
+        scheduler = BlockScheduler(
+            seq_first, seq_last, n_processes, target_seconds=block_seconds, block_size=block_size
+        )
+        prefetch_max_bytes = _megabytes_to_bytes(prefetch_max_mb)
         max_processes = multiprocessing.cpu_count()
         if n_processes > max_processes:
             logger.warning(
@@ -301,45 +513,122 @@ def main(
         if not res_path.exists():
             logger.info("Creating 'res' directory")
             res_path.mkdir(parents=True, exist_ok=True)
+        timing_path = None
+        if timing is not None:
+            timing_path = exp_path / timing
+            timing_path.unlink(missing_ok=True)
+        profile_dir = exp_path / PROFILE_DIR if profile else None
+        if profile_dir is not None:
+            clear_profiles(profile_dir)
         # Run sequence step in parallel if requested
         if mode in ("both", "sequence"):
-            ranges = chunk_ranges(seq_first, seq_last, n_processes)
-            logger.info(f"Frame chunks: {ranges}")
-            successful_chunks = 0
-            failed_chunks = 0
-            with ProcessPoolExecutor(max_workers=n_processes) as executor:
-                future_to_range = {
-                    executor.submit(run_sequence_chunk, yaml_file, chunk_first, chunk_last): (chunk_first, chunk_last)
-                    for chunk_first, chunk_last in ranges
-                }
-                for future in as_completed(future_to_range):
-                    chunk_range = future_to_range[future]
-                    try:
-                        result = future.result()
-                        logger.info(f"✓ Completed chunk: frames {result[0]} to {result[1]}")
-                        successful_chunks += 1
-                    except Exception as e:
-                        logger.error(f"✗ Failed chunk: frames {chunk_range[0]} to {chunk_range[1]} - {e}")
-                        failed_chunks += 1
-            total_chunks = len(ranges)
+            if not resume:
+                # Before the workers start appending to it
+                compact_manifest(exp_path / MANIFEST_FILE)
+            results: List[BlockResult] = []
+            failed_blocks = 0
+            sequence_start = time.perf_counter()
+            # Every worker builds its processing context once, up front
+            with ProcessPoolExecutor(
+                max_workers=n_processes, initializer=init_worker, initargs=(yaml_file,)
+            ) as executor:
+                pending = {}
+
+                def submit_next_block() -> None:
+                    block = scheduler.next_block()
+                    if block is not None:
+                        future = executor.submit(
+                            run_sequence_chunk,
+                            yaml_file,
+                            block[0],
+                            block[1],
+                            prefetch_depth,
+                            prefetch_max_bytes,
+                            resume,
+                            timing_path,
+                            profile_dir,
+                        )
+                        pending[future] = block
+
+                # Two blocks per worker in flight: a worker finishing one
+                # picks up the queued one without waiting for this loop
+                for _ in range(2 * n_processes):
+                    submit_next_block()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        block = pending.pop(future)
+                        try:
+                            result = future.result()
+                            scheduler.record(
+                                result.n_frames, result.seconds, result.warm_up_seconds
+                            )
+                            results.append(result)
+                            logger.debug(
+                                f"✓ Completed block: frames {result.first} to {result.last} "
+                                f"in {result.seconds:.2f} s (worker {result.pid})"
+                            )
+                        except Exception as e:
+                            logger.error(f"✗ Failed block: frames {block[0]} to {block[1]} - {e}")
+                            failed_blocks += 1
+                        submit_next_block()
+            sequence_time = time.perf_counter() - sequence_start
+            total_blocks = len(results) + failed_blocks
             elapsed_time = time.time() - start_time
             logger.info("Parallel sequence processing completed:")
-            logger.info(f"  Total chunks: {total_chunks}")
-            logger.info(f"  Successful: {successful_chunks}")
-            logger.info(f"  Failed: {failed_chunks}")
+            logger.info(f"  Total blocks: {total_blocks}")
+            logger.info(f"  Successful: {len(results)}")
+            logger.info(f"  Failed: {failed_blocks}")
             logger.info(f"  Total processing time: {elapsed_time:.2f} seconds")
-            if failed_chunks > 0:
-                raise ProcessingError(f"{failed_chunks} out of {total_chunks} chunks failed")
-        # Run tracking step if requested (serial, for now)
+            if results:
+                startup_time = sum(result.startup_seconds for result in results)
+                logger.info(f"  Worker startup time: {startup_time:.2f} seconds (all workers)")
+                logger.info("%s", format_utilization(results, sequence_time))
+            if failed_blocks > 0:
+                raise ProcessingError(f"{failed_blocks} out of {total_blocks} blocks failed")
+        # Run tracking step if requested
         if mode in ("both", "tracking"):
-            logger.info("Starting tracking step (serial, not parallelized)")
             try:
-                from pyptv.pyptv_batch import run_batch
-                run_batch(yaml_file, seq_first, seq_last, mode="tracking")
+                tracking_start = time.perf_counter()
+                if parallel_tracking:
+                    logger.info("Starting tracking step in overlapping frame windows")
+                    windows = run_parallel_tracking(
+                        yaml_file,
+                        seq_first,
+                        seq_last,
+                        n_processes,
+                        window_size=tracking_window,
+                        overlap=tracking_overlap,
+                        profile_dir=profile_dir,
+                    )
+                    for result in windows:
+                        logger.info(
+                            f"  Window {result.window.own_first}-{result.window.own_last} "
+                            f"(tracked {result.window.first}-{result.window.last}): "
+                            f"{result.seconds:.2f} s (worker {result.pid})"
+                        )
+                else:
+                    logger.info("Starting tracking step (serial)")
+                    from pyptv.pyptv_batch import run_batch
+                    with profiled(profile_dir / "tracking.pstats" if profile_dir else None):
+                        run_batch(yaml_file, seq_first, seq_last, mode="tracking")
+                if timing_path is not None:
+                    timer = StageTimer()
+                    timer.add("tracking", time.perf_counter() - tracking_start)
+                    timer.write(timing_path, append=True)
                 logger.info("Tracking step completed successfully.")
             except Exception as e:
                 logger.error(f"Tracking step failed: {e}")
                 raise ProcessingError(f"Tracking step failed: {e}")
+        if timing_path is not None and timing_path.exists():
+            # Stage times of all workers; they overlap, so no wall time share
+            logger.info("Per-stage timing of all workers:\n%s", format_summary(read_timing(timing_path)))
+            logger.info(f"Timing records written to {timing_path}")
+        if profile_dir is not None:
+            summary = write_report(profile_dir)
+            if summary is not None:
+                logger.info("Merged profile of all workers:\n%s", summary.read_text(encoding="utf-8"))
+                logger.info(f"Profile written to {profile_dir}")
     except (ValueError, ProcessingError) as e:
         logger.error(f"Parallel processing failed: {e}")
         raise
@@ -350,7 +639,8 @@ def main(
 def parse_command_line_args():
     """Parse and validate command line arguments for pyptv_batch_parallel.py.
     Returns:
-        Tuple of (yaml_file_path, first_frame, last_frame, n_processes, mode)
+        Tuple of (yaml_file_path, first_frame, last_frame, n_processes, mode, options),
+        where options holds the keyword arguments forwarded to main()
     Raises:
         ValueError: If arguments are invalid
     """
@@ -366,13 +656,65 @@ def parse_command_line_args():
         "--mode", type=str, default="both", choices=["both", "sequence", "tracking"],
         help="Which steps to run: both (default), sequence, or tracking."
     )
+    parser.add_argument(
+        "--prefetch", type=int, default=0, metavar="N",
+        help="Decode the images of the next N frames in background threads in each worker (default: 0, disabled)."
+    )
+    parser.add_argument(
+        "--prefetch-max-mb", type=float, default=None, metavar="MB",
+        help="Per-worker memory cap for prefetched images in MB."
+    )
+    parser.add_argument(
+        "--timing", nargs="?", const=str(TIMING_FILE), default=None, metavar="FILE",
+        help=f"Record the time of every stage of every frame and camera in all workers to FILE, relative to the experiment directory (default: {TIMING_FILE}), and print a summary."
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"Profile every worker with cProfile; writes the merged {PROFILE_DIR}/profile.pstats and a summary splitting Python from optv C time to the experiment directory."
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip frames whose sequence output is up to date with the current parameters and calibration."
+    )
+    parser.add_argument(
+        "--block-size", type=int, default=None, metavar="N",
+        help="Hand out work in fixed blocks of N frames (default: adapt the block size to the measured cost per frame)."
+    )
+    parser.add_argument(
+        "--block-seconds", type=float, default=2.0, metavar="S",
+        help="Wanted processing time of one adaptive work block in seconds (default: 2.0)."
+    )
+    parser.add_argument(
+        "--parallel-tracking", action="store_true",
+        help="Track overlapping frame windows in parallel and stitch the trajectories instead of tracking serially."
+    )
+    parser.add_argument(
+        "--tracking-window", type=int, default=None, metavar="N",
+        help="Frames owned by every tracking window (default: the frame range split evenly over the processes)."
+    )
+    parser.add_argument(
+        "--tracking-overlap", type=int, default=DEFAULT_OVERLAP, metavar="N",
+        help=f"Frames tracked before and after the owned frames of every window (default: {DEFAULT_OVERLAP})."
+    )
     args = parser.parse_args()
     yaml_file = Path(args.yaml_file).resolve()
     first_frame = args.first_frame
     last_frame = args.last_frame
     n_processes = args.n_processes
     mode = args.mode
-    return yaml_file, first_frame, last_frame, n_processes, mode
+    options = {
+        "prefetch_depth": args.prefetch,
+        "prefetch_max_mb": args.prefetch_max_mb,
+        "resume": args.resume,
+        "timing": args.timing,
+        "profile": args.profile,
+        "block_size": args.block_size,
+        "block_seconds": args.block_seconds,
+        "parallel_tracking": args.parallel_tracking,
+        "tracking_window": args.tracking_window,
+        "tracking_overlap": args.tracking_overlap,
+    }
+    return yaml_file, first_frame, last_frame, n_processes, mode, options
 
 if __name__ == "__main__":
     """Entry point for command line execution.
@@ -390,8 +732,8 @@ if __name__ == "__main__":
     try:
         logger.info("Starting PyPTV parallel batch processing")
         logger.info(f"Command line arguments: {sys.argv}")
-        yaml_file, first_frame, last_frame, n_processes, mode = parse_command_line_args()
-        main(yaml_file, first_frame, last_frame, n_processes, mode)
+        yaml_file, first_frame, last_frame, n_processes, mode, options = parse_command_line_args()
+        main(yaml_file, first_frame, last_frame, n_processes, mode, **options)
         logger.info("Parallel batch processing completed successfully")
     except (ValueError, ProcessingError) as e:
         logger.error(f"Parallel batch processing failed: {e}")
@@ -0,0 +1,346 @@
+"""PyPTV_BATCH_PARAMSETS: Run several parameter sets of an experiment over one frame range
+
+The parameter sets of an experiment (parameters_Run1.yaml,
+parameters_Run1_1.yaml, ...) usually differ in their detection and
+correspondence parameters but read the same images. This script runs them
+concurrently, one worker process per parameter set, and decodes every image
+only once: the main process reads the images of each frame into a ring of
+shared memory slots (see ``pyptv.shared_frames``) that all workers read.
+
+Every parameter set writes its output -- the res/ files, the run store and
+the _targets files -- to its own directory, runs/<name>/ in the experiment
+directory, where <name> is the name of the parameter set (Run1_1 for
+parameters_Run1_1.yaml).
+
+All parameter sets must read the same images: the same sequence.base_name
+entries, image size and splitter setting, and none may use existing
+targets.
+
+Example:
+    Command line usage:
+    >>> python pyptv_batch_paramsets.py tests/test_cavity 10000 10004 --runs Run1 Run1_1
+
+    Python API usage:
+    >>> from pyptv.pyptv_batch_paramsets import main
+    >>> main("tests/test_cavity", 10000, 10004, runs=["Run1", "Run1_1"])
+"""
+
+from pathlib import Path
+import multiprocessing
+import queue
+import sys
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from pyptv.experiment import Experiment
+from pyptv.image_source import sequence_base_names
+from pyptv.processing_context import ProcessingContext
+from pyptv.profiling import optv_call
+from pyptv.ptv import py_sequence_loop, py_trackcorr_finish, py_trackcorr_init, sequence_image_source
+from pyptv.pyptv_batch import ProcessingError
+from pyptv.shared_frames import DEFAULT_SLOTS, SharedFrameRing, SharedFrameSource
+
+# Output directory of every parameter set, relative to the experiment directory
+RUNS_DIR = Path("runs")
+
+
+class ParamsetResult(NamedTuple):
+    """Outcome of one parameter set."""
+
+    name: str
+    output_dir: Path
+    seconds: float
+    error: Optional[str] = None
+
+
+def experiment_paramsets(
+    exp_path: Union[str, Path], runs: Optional[Sequence[str]] = None
+) -> List[Tuple[str, Path]]:
+    """The (name, YAML file) of the parameter sets of an experiment directory.
+
+    Args:
+        runs: Names of the parameter sets to keep (default: all)
+
+    Raises:
+        ProcessingError: If a requested parameter set does not exist, or
+            fewer than one is found
+    """
+    exp = Experiment()
+    exp.populate_runs(Path(exp_path).resolve())
+    paramsets = [(paramset.name, Path(paramset.yaml_path)) for paramset in exp.paramsets]
+    if runs is not None:
+        by_name = dict(paramsets)
+        missing = [name for name in runs if name not in by_name]
+        if missing:
+            raise ProcessingError(
+                f"No parameter set {', '.join(missing)} in {exp_path}; "
+                f"found {', '.join(by_name) or 'none'}"
+            )
+        paramsets = [(name, by_name[name]) for name in runs]
+    if not paramsets:
+        raise ProcessingError(f"No parameter sets found in {exp_path}")
+    return paramsets
+
+
+def _image_setup(context: ProcessingContext) -> tuple:
+    """What decides which images a parameter set reads, and how they are decoded."""
+    ptv_params = context.pm.get_parameter("ptv")
+    seq_params = context.pm.get_parameter("sequence") or {}
+    base_names = [context.spar.get_img_base_name(i) for i in range(context.num_cams)]
+    return (
+        context.num_cams,
+        tuple(sequence_base_names(base_names, ptv_params)),
+        ptv_params["imx"],
+        ptv_params["imy"],
+        bool(ptv_params.get("splitter", False)),
+        seq_params.get("stack_first_frame", 0),
+        seq_params.get("raw_header_bytes", 0),
+    )
+
+
+def check_shared_images(names: Sequence[str], contexts: Sequence[ProcessingContext]) -> None:
+    """Check that all parameter sets read the same images.
+
+    Raises:
+        ProcessingError: If two parameter sets read different images, or one
+            reads existing targets instead of images
+    """
+    for name, context in zip(names, contexts):
+        if context.pm.get_parameter("pft_version").get("Existing_Target", False):
+            raise ProcessingError(f"Parameter set {name} reads existing targets, not images")
+    reference = _image_setup(contexts[0])
+    for name, context in zip(names[1:], contexts[1:]):
+        if _image_setup(context) != reference:
+            raise ProcessingError(
+                f"Parameter sets {names[0]} and {name} do not read the same images "
+                "(sequence.base_name, ptv.imx/imy and ptv.splitter must match)"
+            )
+
+
+def run_paramset(
+    yaml_file: Path,
+    output_dir: Path,
+    handle,
+    index: int,
+    first: int,
+    last: int,
+    mode: str,
+    results,
+) -> None:
+    """Worker process: run one parameter set on the images of the shared ring.
+
+    Puts a ParamsetResult on ``results`` (its name left to the caller).
+    """
+    start_time = time.perf_counter()
+    error = None
+    try:
+        context = ProcessingContext(yaml_file, first, last, output_dir=output_dir)
+        (context.output_root / "res").mkdir(parents=True, exist_ok=True)
+        source = SharedFrameSource(handle, index, fallback=sequence_image_source(context))
+        try:
+            py_sequence_loop(context, image_source=source)
+        finally:
+            source.close()
+        if mode == "both":
+            tracker = py_trackcorr_init(context)
+            optv_call("Tracker.full_forward", tracker.full_forward)
+            py_trackcorr_finish(context, remove_files=True)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        # The ring no longer waits for this worker, even if it failed early
+        handle.detached[index] = 1
+    results.put((index, time.perf_counter() - start_time, error))
+
+
+def _collect_results(results, processes) -> dict:
+    """Drain the result queue of the workers until all have reported or died."""
+    collected = {}
+    while len(collected) < len(processes):
+        try:
+            index, seconds, error = results.get(timeout=0.5)
+            collected[index] = (seconds, error)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                try:
+                    while True:
+                        index, seconds, error = results.get_nowait()
+                        collected[index] = (seconds, error)
+                except queue.Empty:
+                    break
+    return collected
+
+
+def run_paramsets(
+    paramsets: Sequence[Tuple[str, Path]],
+    seq_first: int,
+    seq_last: int,
+    mode: str = "both",
+    slots: int = DEFAULT_SLOTS,
+) -> List[ParamsetResult]:
+    """Run the parameter sets concurrently over frames seq_first..seq_last.
+
+    Args:
+        paramsets: (name, YAML file) of every parameter set, all of one
+            experiment
+        mode: 'both' (sequence and tracking) or 'sequence'
+        slots: Number of decoded frames held in shared memory at a time
+
+    Returns:
+        A ParamsetResult per parameter set, in the order given
+
+    Raises:
+        ProcessingError: If the parameter sets do not read the same images,
+            an image cannot be decoded, or a parameter set fails
+    """
+    if mode not in ("both", "sequence"):
+        raise ProcessingError(f"Unknown mode: {mode}. Use 'both' or 'sequence'.")
+    names = [name for name, _ in paramsets]
+    contexts = [ProcessingContext(yaml_file, seq_first, seq_last) for _, yaml_file in paramsets]
+    check_shared_images(names, contexts)
+    exp_path = contexts[0].root
+    output_dirs = [exp_path / RUNS_DIR / name for name in names]
+
+    ptv_params = contexts[0].pm.get_parameter("ptv")
+    decoder = sequence_image_source(contexts[0])
+    ring = SharedFrameRing(
+        len(paramsets),
+        contexts[0].num_cams,
+        (ptv_params["imy"], ptv_params["imx"]),
+        seq_first,
+        seq_last,
+        slots=slots,
+    )
+    print(f"Sharing {slots} decoded frames ({ring.nbytes / 2**20:.1f} MB) between {len(paramsets)} parameter sets")
+
+    mp_context = multiprocessing.get_context()
+    results = mp_context.Queue()
+    processes = [
+        mp_context.Process(
+            target=run_paramset,
+            args=(yaml_file, output_dir, ring.handle, index, seq_first, seq_last, mode, results),
+            name=f"paramset-{name}",
+        )
+        for index, ((name, yaml_file), output_dir) in enumerate(zip(paramsets, output_dirs))
+    ]
+
+    def alive(index: int) -> bool:
+        return processes[index].is_alive()
+
+    decode_error = None
+    decode_seconds = 0.0
+    try:
+        for process in processes:
+            process.start()
+        try:
+            for frame in range(seq_first, seq_last + 1):
+                start_time = time.perf_counter()
+                images = decoder.frame_images(frame)
+                decode_seconds += time.perf_counter() - start_time
+                ring.put(frame, images, alive)
+        except Exception as e:
+            decode_error = f"Decoding frame {frame} failed: {e}"
+        # On a decode error the workers waiting for the frame fail
+        ring.finish(alive)
+        collected = _collect_results(results, processes)
+    finally:
+        for process in processes:
+            process.join()
+        decoder.close()
+        ring.close()
+    print(f"Decoded frames {seq_first}-{seq_last} once in {decode_seconds:.2f} s")
+
+    paramset_results = []
+    for index, name in enumerate(names):
+        seconds, error = collected.get(index, (0.0, "worker process died"))
+        paramset_results.append(ParamsetResult(name, output_dirs[index], seconds, error))
+        status = f"failed: {error}" if error else "done"
+        print(f"  {name}: {status} in {seconds:.2f} s, output in {output_dirs[index]}")
+
+    if decode_error is not None:
+        raise ProcessingError(decode_error)
+    failed = [result.name for result in paramset_results if result.error]
+    if failed:
+        raise ProcessingError(f"Parameter sets failed: {', '.join(failed)}")
+    return paramset_results
+
+
+def main(
+    exp_path: Union[str, Path],
+    first: Union[str, int],
+    last: Union[str, int],
+    runs: Optional[Sequence[str]] = None,
+    mode: str = "both",
+    slots: int = DEFAULT_SLOTS,
+) -> List[ParamsetResult]:
+    """Run the parameter sets of an experiment over one frame range.
+
+    Args:
+        exp_path: Experiment directory holding the parameters_*.yaml files
+        first: First frame number
+        last: Last frame number
+        runs: Names of the parameter sets to run (default: all)
+        mode: 'both' (sequence and tracking) or 'sequence'
+        slots: Number of decoded frames held in shared memory at a time
+
+    Raises:
+        ValueError: If the arguments are invalid
+        ProcessingError: If processing fails
+    """
+    start_time = time.time()
+
+    exp_path = Path(exp_path)
+    if not exp_path.is_dir():
+        raise ValueError(f"Experiment directory does not exist: {exp_path}")
+    try:
+        seq_first = int(first)
+        seq_last = int(last)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid frame numbers: first={first}, last={last}. {e}")
+    if seq_first > seq_last:
+        raise ValueError(f"First frame ({seq_first}) must be <= last frame ({seq_last})")
+    if slots < 1:
+        raise ValueError(f"Number of slots must be >= 1, got {slots}")
+
+    paramsets = experiment_paramsets(exp_path, runs)
+    print(f"Running {len(paramsets)} parameter sets on frames {seq_first}-{seq_last}")
+    results = run_paramsets(paramsets, seq_first, seq_last, mode=mode, slots=slots)
+
+    elapsed_time = time.time() - start_time
+    print(f"Total processing time: {elapsed_time:.2f} seconds")
+    return results
+
+
+def parse_command_line_args() -> tuple[Path, int, int, dict]:
+    """Parse and validate command line arguments.
+
+    Returns:
+        Tuple of (experiment_path, first_frame, last_frame, options), where
+        options holds the keyword arguments forwarded to main()
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Run several PyPTV parameter sets over one frame range, decoding every image once")
+    parser.add_argument("exp_path", type=str, help="Experiment directory with the parameters_*.yaml files")
+    parser.add_argument("first_frame", type=int, help="First frame number")
+    parser.add_argument("last_frame", type=int, help="Last frame number")
+    parser.add_argument("--runs", nargs="+", default=None, metavar="NAME", help="Parameter sets to run, e.g. Run1 Run1_1 (default: all)")
+    parser.add_argument("--mode", choices=["both", "sequence"], default="both", help="Which steps to run: both (default) or sequence")
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, metavar="N", help=f"Number of decoded frames held in shared memory (default: {DEFAULT_SLOTS})")
+    args = parser.parse_args()
+
+    options = {"runs": args.runs, "mode": args.mode, "slots": args.slots}
+    return Path(args.exp_path).resolve(), args.first_frame, args.last_frame, options
+
+
+if __name__ == "__main__":
+    try:
+        print("Starting parameter set batch processing")
+        exp_path, first_frame, last_frame, options = parse_command_line_args()
+        main(exp_path, first_frame, last_frame, **options)
+        print("Parameter set batch processing completed successfully")
+    except (ValueError, ProcessingError) as e:
+        print(f"Batch processing failed: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("Processing interrupted by user")
+        sys.exit(1)
@@ -8,13 +8,13 @@ Example:
 """
 
 from pathlib import Path
-import os
-import sys
 import json
-import importlib
+import time
 
-from pyptv.ptv import generate_short_file_bases, py_start_proc_c
-from pyptv.experiment import Experiment
+from pyptv.ptv import load_plugin, plugin_directory
+from pyptv.processing_context import ProcessingContext
+from pyptv.profiling import PROFILE_DIR, clear_profiles, profiled, write_report
+from pyptv.timing import TIMING_FILE, make_timer
 
 
 def load_plugins_config(exp_path: Path):
@@ -40,76 +40,75 @@ def load_plugins_config(exp_path: Path):
     return {"tracking": ["default"], "sequence": ["default"]}
 
 def run_batch(yaml_file: Path, seq_first: int, seq_last: int, 
-              tracking_plugin: str = "default", sequence_plugin: str = "default", mode: str = "both"):
-    """Run batch processing with plugins, supporting modular mode (both, sequence, tracking)"""
-    original_cwd = Path.cwd()
-    exp_path = yaml_file.parent
-    os.chdir(exp_path)
-    experiment = Experiment()
-    experiment.pm.from_yaml(yaml_file)
-    print(f"Processing frames {seq_first}-{seq_last} with {experiment.pm.num_cams} cameras")
+              tracking_plugin: str = "default", sequence_plugin: str = "default", mode: str = "both",
+              timing: str | Path | None = None, profile: bool = False):
+    """Run batch processing with plugins, supporting modular mode (both, sequence, tracking)
+
+    The plugins are loaded from the ``plugins`` directory of the experiment
+    and get a ``ProcessingContext`` as ``exp``, whose ``root`` is the
+    experiment directory; the working directory is not changed.
+
+    With ``timing`` (a JSON lines file relative to the experiment directory)
+    the sequence and tracking plugins are timed, see pyptv.timing. Plugins
+    can record their own stages with ``exp.timer``. With ``profile`` the
+    plugins run under cProfile, see pyptv.profiling.
+    """
+    timer = make_timer(timing is not None)
+    start_time = time.perf_counter()
+    exp_config = ProcessingContext(yaml_file, seq_first, seq_last)
+    exp_path = exp_config.root
+    timing_path = exp_path / timing if timing is not None else None
+    profile_dir = exp_path / PROFILE_DIR if profile else None
+    if profile_dir is not None:
+        clear_profiles(profile_dir)
+    print(f"Processing frames {seq_first}-{seq_last} with {exp_config.num_cams} cameras")
     print(f"Using plugins: tracking={tracking_plugin}, sequence={sequence_plugin}")
     print(f"Mode: {mode}")
-    cpar, spar, vpar, track_par, tpar, cals, epar = py_start_proc_c(experiment.pm)
-    spar.set_first(seq_first)
-    spar.set_last(seq_last)
-    class ProcessingExperiment:
-        def __init__(self, experiment, cpar, spar, vpar, track_par, tpar, cals, epar):
-            self.pm = experiment.pm
-            self.cpar = cpar
-            self.spar = spar
-            self.vpar = vpar
-            self.track_par = track_par
-            self.tpar = tpar
-            self.cals = cals
-            self.epar = epar
-            self.num_cams = experiment.pm.num_cams
-            self.exp_path = str(exp_path.absolute())
-            self.detections = []
-            self.corrected = []
-    exp_config = ProcessingExperiment(experiment, cpar, spar, vpar, track_par, tpar, cals, epar)
+    exp_config.timer = timer
 
-    # Centralized: get target_filenames from ParameterManager
-    exp_config.target_filenames = experiment.pm.get_target_filenames()
-
-    plugins_dir = Path.cwd() / "plugins"
+    plugins_dir = plugin_directory(exp_config)
     print(f"[DEBUG] Plugins directory: {plugins_dir}")
-    if str(plugins_dir) not in sys.path:
-        sys.path.insert(0, str(plugins_dir.absolute()))
-        print(f"[DEBUG] Added plugins directory to sys.path: {plugins_dir}")
     # Patch: Ensure output files are written to 'res' directory for test_splitter
-    res_dir = Path("res")
-    if not res_dir.exists():
-        res_dir.mkdir(exist_ok=True)
+    (exp_path / "res").mkdir(exist_ok=True)
     try:
         if mode in ("both", "sequence"):
-            seq_plugin = importlib.import_module(sequence_plugin)
+            seq_plugin = load_plugin(plugins_dir, sequence_plugin)
             if hasattr(seq_plugin, "Sequence"):
                 print(f"Running sequence plugin: {sequence_plugin}")
                 try:
                     sequence = seq_plugin.Sequence(exp=exp_config)
-                    sequence.do_sequence()
+                    with timer.stage("sequence_plugin"), profiled(
+                        profile_dir / "sequence_plugin.pstats" if profile_dir else None
+                    ):
+                        sequence.do_sequence()
                 except Exception as e:
                     print(f"Error running sequence plugin: {e}")
-                    os.chdir(original_cwd)
                     return
         if mode in ("both", "tracking"):
             try:
-                track_plugin = importlib.import_module(tracking_plugin)
+                track_plugin = load_plugin(plugins_dir, tracking_plugin)
                 print(f"[DEBUG] Loaded tracking plugin: {track_plugin}")
                 print(f"Running tracking plugin: {tracking_plugin}")
                 tracker = track_plugin.Tracking(exp=exp_config)
-                tracker.do_tracking()
+                with timer.stage("tracking_plugin"), profiled(
+                    profile_dir / "tracking_plugin.pstats" if profile_dir else None
+                ):
+                    tracker.do_tracking()
             except Exception as e:
                 print(f"ERROR: Tracking plugin {tracking_plugin} not found or not implemented. Exception: {e}")
-                os.chdir(original_cwd)
                 return
         print("Batch processing completed successfully")
     except ImportError as e:
         print(f"Error loading plugin: {e}")
         print("Check for missing packages or syntax errors.")
     finally:
-        os.chdir(original_cwd)
+        if timer.enabled:
+            timer.write(timing_path)
+            print(timer.summary(time.perf_counter() - start_time))
+        if profile_dir is not None:
+            summary = write_report(profile_dir)
+            if summary is not None:
+                print(summary.read_text(encoding="utf-8"))
 
 
 def main():
@@ -125,6 +124,14 @@ def main():
         "--mode", type=str, default="both", choices=["both", "sequence", "tracking"],
         help="Which steps to run: both (default), sequence, or tracking."
     )
+    parser.add_argument(
+        "--timing", nargs="?", const=str(TIMING_FILE), default=None, metavar="FILE",
+        help=f"Time the plugins and record it to FILE, relative to the experiment directory (default: {TIMING_FILE})."
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"Profile the plugins with cProfile; writes {PROFILE_DIR}/profile.pstats and a summary to the experiment directory."
+    )
     args = parser.parse_args()
     yaml_file = Path(args.yaml_file).resolve()
     first_frame = args.first_frame
@@ -136,7 +143,8 @@ def main():
     print(f"Available sequence plugins: {plugins_config.get('sequence', ['default'])}")
     tracking_plugin = plugins_config.get('tracking', ['default'])[0]
     sequence_plugin = plugins_config.get('sequence', ['default'])[0]
-    run_batch(yaml_file, first_frame, last_frame, tracking_plugin, sequence_plugin, mode)
+    run_batch(yaml_file, first_frame, last_frame, tracking_plugin, sequence_plugin, mode,
+              timing=args.timing, profile=args.profile)
 
 
 if __name__ == "__main__":
@@ -14,19 +14,20 @@ from chaco.api import ArrayDataSource, ArrayPlotData, LinearMapper, Plot, gray
 from chaco.tools.api import PanTool, ZoomTool
 from chaco.tools.image_inspector_tool import ImageInspectorTool
 from enable.component_editor import ComponentEditor
-from skimage.util import img_as_ubyte
 from skimage.io import imread
-from skimage.color import rgb2gray
 from pyptv.experiment import Experiment, Paramset
 from pyptv.quiverplot import QuiverPlot
 from pyptv.detection_gui import DetectionGUI
 from pyptv.mask_gui import MaskGUI
 from pyptv.parameter_gui import Main_Params, Calib_Params, Tracking_Params
 from pyptv import __version__, ptv
+from pyptv.preprocessing import as_uint8_gray
 from optv.epipolar import epipolar_curve
 from optv.imgcoord import image_coordinates
 from optv.transforms import convert_arr_metric_to_pixel
 from pyptv.calibration_gui import CalibrationGUI
+from pyptv.preprocessing import background_cache, background_filename
+from pyptv.run_store import STORE_FILE, RunStore, run_store_enabled
 
 """PyPTV_GUI is the GUI for the OpenPTV (www.openptv.net) written in
 Python with Traits, TraitsUI, Numpy, Scipy and Chaco
@@ -555,26 +556,22 @@ class TreeMenuHandler(Handler):
             print("Using Splitter mode")
             imname = ptv_params['img_name'][0]
             if Path(imname).exists():
-                temp_img = imread(imname)
-                if temp_img.ndim > 2:
-                    temp_img = rgb2gray(temp_img)                
+                temp_img = as_uint8_gray(imread(imname))
                 splitted_images = ptv.image_split(temp_img)
                 for i, split_img in enumerate(splitted_images):
-                    mainGui.orig_images[i] = img_as_ubyte(split_img)
+                    mainGui.orig_images[i] = split_img
         else:
             for i, imname in enumerate(ptv_params['img_name']):
                 if Path(imname).exists():
                     print(f"Reading image {imname}")
-                    im = imread(imname)
-                    if im.ndim > 2:
-                        im = rgb2gray(im)
+                    im = as_uint8_gray(imread(imname))
                 else:
                     print(f"Image {imname} does not exist, setting zero image")
                     h_img = ptv_params['imx']
                     v_img = ptv_params['imy']
                     im = np.zeros((v_img, h_img), dtype=np.uint8)
                     
-                mainGui.orig_images[i] = img_as_ubyte(im)
+                mainGui.orig_images[i] = im
 
         
         # Reload YAML and Cython
@@ -631,12 +628,13 @@ class TreeMenuHandler(Handler):
             print("Subtracting mask")
             try:
                 for i, im in enumerate(mainGui.orig_images):
-                    background_name = masking_params['mask_base_name'].replace("#", str(i))
+                    background_name = background_filename(
+                        masking_params['mask_base_name'], i
+                    )
                     print(f"Subtracting {background_name}")
-                    background = imread(background_name)
-                    mainGui.orig_images[i] = np.clip(
-                        mainGui.orig_images[i] - background, 0, 255
-                    ).astype(np.uint8)
+                    mainGui.orig_images[i] = background_cache.subtract(
+                        im, background_name
+                    )
             except ValueError as exc:
                 raise ValueError("Failed subtracting mask") from exc
 
@@ -754,6 +752,7 @@ class TreeMenuHandler(Handler):
             print("Using default liboptv tracker")
             mainGui.tracker = ptv.py_trackcorr_init(mainGui)
             mainGui.tracker.full_forward()
+            ptv.py_trackcorr_finish(mainGui)
             print("tracking without display finished")
 
     def track_disp_action(self, info):
@@ -766,6 +765,7 @@ class TreeMenuHandler(Handler):
         print("Starting back tracking")
         if hasattr(mainGui, 'tracker') and mainGui.tracker is not None:
             mainGui.tracker.full_backward()
+            ptv.py_trackcorr_finish(mainGui)
         else:
             print("No tracker initialized. Please run forward tracking first.")
 
@@ -796,6 +796,10 @@ class TreeMenuHandler(Handler):
         info.object.overlay_set_images(base_names, seq_first, seq_last)
         
         print("Starting detect_part_track")
+        run_store = None
+        if run_store_enabled(info.object.exp1.pm) and STORE_FILE.exists():
+            run_store = RunStore(STORE_FILE)
+
         x1_a, x2_a, y1_a, y2_a = [], [], [], []
         for i in range(info.object.num_cams):
             x1_a.append([])
@@ -810,15 +814,23 @@ class TreeMenuHandler(Handler):
 
                 # print('Inside detected particles plot', short_base_names[i_cam])
 
-                targets = ptv.read_targets(short_base_names[i_cam], i_seq)
+                if run_store is not None and run_store.has("targets", i_seq, i_cam):
+                    targets = run_store.read("targets", i_seq, i_cam)
+                    tracked = targets["tnr"] > -1
+                    intx_green.extend(targets["x"][tracked].tolist())
+                    inty_green.extend(targets["y"][tracked].tolist())
+                    intx_blue.extend(targets["x"][~tracked].tolist())
+                    inty_blue.extend(targets["y"][~tracked].tolist())
+                else:
+                    targets = ptv.read_targets(short_base_names[i_cam], i_seq)
 
-                for t in targets:
-                    if t.tnr() > -1:
-                        intx_green.append(t.pos()[0])
-                        inty_green.append(t.pos()[1])
-                    else:
-                        intx_blue.append(t.pos()[0])
-                        inty_blue.append(t.pos()[1])
+                    for t in targets:
+                        if t.tnr() > -1:
+                            intx_green.append(t.pos()[0])
+                            inty_green.append(t.pos()[1])
+                        else:
+                            intx_blue.append(t.pos()[0])
+                            inty_blue.append(t.pos()[1])
 
                 x1_a[i_cam] = x1_a[i_cam] + intx_green
                 x2_a[i_cam] = x2_a[i_cam] + intx_blue
@@ -834,6 +846,8 @@ class TreeMenuHandler(Handler):
             )
             info.object.camera_list[i_cam]._plot.request_redraw()
 
+        if run_store is not None:
+            run_store.close()
         print("Finished detect_part_track")
 
     def traject_action_flowtracks(self, info):
@@ -873,7 +887,11 @@ class TreeMenuHandler(Handler):
         seq_first = seq_params['first']
         info.object.load_set_seq_image(seq_first, display_only=True)
         from pyptv.flowtracks_utils import export_ptv_is_to_paraview
-        export_ptv_is_to_paraview()
+        if run_store_enabled(info.object.exp1.pm) and STORE_FILE.exists():
+            with RunStore(STORE_FILE) as run_store:
+                export_ptv_is_to_paraview(run_store=run_store)
+        else:
+            export_ptv_is_to_paraview()
 
 
 # ----------------------------------------------------------------
@@ -1210,7 +1228,7 @@ class MainGUI(HasTraits):
         self.num_cams = self.exp1.get_n_cam()
         self.orig_names = ptv_params['img_name']
         self.orig_images = [
-                img_as_ubyte(np.zeros((ptv_params['imy'], ptv_params['imx'])))
+                np.zeros((ptv_params['imy'], ptv_params['imx']), dtype=np.uint8)
                 for _ in range(self.num_cams)
             ]
         
@@ -1398,21 +1416,19 @@ class MainGUI(HasTraits):
         v_img = ptv_params['imy'] # type: ignore
 
         if ptv_params.get('splitter', False):
-            temp_img = img_as_ubyte(np.zeros((v_img*2, h_img*2)))
+            temp_img = np.zeros((v_img*2, h_img*2), dtype=np.uint8)
             for seq in range(seq_first, seq_last):
                 imname = Path(base_names[0] % seq) # type: ignore
                 if imname.exists():
-                    _ = imread(imname)
-                    if _.ndim > 2:
-                        _ = rgb2gray(_)
+                    _ = as_uint8_gray(imread(imname))
                     temp_img = np.max([temp_img, _], axis=0)
 
             list_of_images = ptv.image_split(temp_img)
             for cam_id in range(self.num_cams):
-                self.camera_list[cam_id].update_image(img_as_ubyte(list_of_images[cam_id])) # type: ignore
+                self.camera_list[cam_id].update_image(list_of_images[cam_id]) # type: ignore
         else: 
             for cam_id in range(self.num_cams):
-                temp_img = img_as_ubyte(np.zeros((v_img, h_img)))
+                temp_img = np.zeros((v_img, h_img), dtype=np.uint8)
                 for seq in range(seq_first, seq_last):
                     base_name = base_names[cam_id]
                     if base_name in ("--", "---", None):
@@ -1422,25 +1438,20 @@ class MainGUI(HasTraits):
                     else:
                         imname = Path(base_name)
                     if imname.exists():
-                        _ = imread(imname)
-                        if _.ndim > 2:
-                            _ = rgb2gray(_)
+                        _ = as_uint8_gray(imread(imname))
                         temp_img = np.max([temp_img, _], axis=0)
                 self.camera_list[cam_id].update_image(temp_img) # type: ignore
 
     def load_disp_image(self, img_name: str, j: int, display_only: bool = False):
         """Load and display single image"""
         try:
-            temp_img = imread(img_name)
-            if temp_img.ndim > 2:
-                temp_img = rgb2gray(temp_img)
-            temp_img = img_as_ubyte(temp_img)
+            temp_img = as_uint8_gray(imread(img_name))
         except IOError:
             print("Error reading file, setting zero image")
             ptv_params = self.get_parameter('ptv')
             h_img = ptv_params['imx']
             v_img = ptv_params['imy']
-            temp_img = img_as_ubyte(np.zeros((v_img, h_img)))
+            temp_img = np.zeros((v_img, h_img), dtype=np.uint8)
 
         if len(temp_img) > 0:
             self.camera_list[j].update_image(temp_img)
@@ -1459,12 +1470,10 @@ class MainGUI(HasTraits):
             # Splitter mode - load one image and split it
             imname = base_names[0] % seq_num
             if Path(imname).exists():
-                temp_img = imread(imname)
-                if temp_img.ndim > 2:
-                    temp_img = rgb2gray(temp_img)
+                temp_img = as_uint8_gray(imread(imname))
                 splitted_images = ptv.image_split(temp_img)
                 for i in range(self.num_cams):
-                    self.camera_list[i].update_image(img_as_ubyte(splitted_images[i]))
+                    self.camera_list[i].update_image(splitted_images[i])
             else:
                 print(f"Image {imname} does not exist")
         else:
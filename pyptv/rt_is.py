@@ -0,0 +1,197 @@
+"""Reading and writing of the res/rt_is.<frame> files.
+
+An rt_is file holds the 3D positions determined for one frame::
+
+    <number of points>
+    pnr x y z p1 p2 p3 p4
+
+where ``pnr`` counts from 1 and ``p1..p4`` are the target numbers of the
+point in each camera (-1 if unused). Lines are written with the format
+``RT_IS_LINE_FORMAT``.
+
+``format_rt_is`` builds the text with NumPy: every field is converted to
+right-aligned ASCII digits column by column, and the padding that ``%`` would
+not produce is dropped with one boolean mask. The result is byte-identical to
+formatting each line with ``RT_IS_LINE_FORMAT``. Positions whose rounding to
+three decimals cannot be decided from ``x * 1000`` alone are rounded by
+Python's formatting, and data that does not fit the fast path (non-finite or
+huge values) is formatted line by line.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import List, Tuple, Union
+
+import numpy as np
+
+RT_IS_DTYPE = np.dtype(
+    [
+        ("pnr", np.int32),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("z", np.float64),
+        ("p1", np.int32),
+        ("p2", np.int32),
+        ("p3", np.int32),
+        ("p4", np.int32),
+    ]
+)
+RT_IS_LINE_FORMAT = "%4d %9.3f %9.3f %9.3f %4d %4d %4d %4d\n"
+
+_INT_WIDTH = 4
+_FLOAT_WIDTH = 9
+_DECIMALS = 3
+# Largest magnitude handled by the integer fast path
+_MAX_FAST_INT = 10**15
+_POWERS_OF_TEN = 10 ** np.arange(17, dtype=np.int64)
+
+PathLike = Union[str, os.PathLike]
+
+
+def _num_digits(values: np.ndarray) -> np.ndarray:
+    """Number of decimal digits of non-negative integers (1 for 0)."""
+    return 1 + (values[:, None] >= _POWERS_OF_TEN[1:]).sum(axis=1)
+
+
+def _ascii_field(
+    magnitude: np.ndarray,
+    negative: np.ndarray,
+    num_digits: np.ndarray,
+    min_width: int,
+    decimals: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Right-aligned ASCII of ``sign * magnitude / 10**decimals``.
+
+    Returns:
+        (N, W) uint8 array of characters, W being the widest row, and the
+        width ``%`` formatting gives each row.
+    """
+    length = num_digits + negative + (1 if decimals else 0)
+    width = np.maximum(length, min_width)
+    total = int(width.max()) if len(width) else min_width
+    field = np.full((len(magnitude), total), ord(" "), dtype=np.uint8)
+
+    col = total - 1
+    for digit in range(int(num_digits.max()) if len(num_digits) else 0):
+        if decimals and digit == decimals:
+            field[:, col] = ord(".")
+            col -= 1
+        rows = num_digits > digit
+        field[rows, col] = ord("0") + (magnitude[rows] // _POWERS_OF_TEN[digit]) % 10
+        col -= 1
+
+    sign_rows = np.flatnonzero(negative)
+    field[sign_rows, total - length[sign_rows]] = ord("-")
+    return field, width
+
+
+def _int_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Format a column with ``%4d`` (floats are truncated, as ``%d`` does)."""
+    ints = np.trunc(values).astype(np.int64)
+    magnitude = np.abs(ints)
+    return _ascii_field(magnitude, ints < 0, _num_digits(magnitude), _INT_WIDTH)
+
+
+def _float_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Format a column with ``%9.3f``."""
+    scaled = values * 10.0**_DECIMALS
+    rounded = np.rint(scaled)
+    # fl(x * 1000) is off from the exact product by at most half an ulp;
+    # if that could move it across a .5 boundary, let Python round exactly.
+    margin = np.maximum(np.abs(scaled), 1.0) * 4e-16
+    ambiguous = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) <= margin)
+    magnitude = np.abs(rounded).astype(np.int64)
+    for i in ambiguous:
+        magnitude[i] = int(("%.*f" % (_DECIMALS, abs(values[i]))).replace(".", ""))
+    num_digits = np.maximum(_num_digits(magnitude), _DECIMALS + 1)
+    return _ascii_field(
+        magnitude, np.signbit(values), num_digits, _FLOAT_WIDTH, _DECIMALS
+    )
+
+
+def _format_lines(pos: np.ndarray, corresp: np.ndarray) -> str:
+    """Reference implementation: one ``%`` operation per line."""
+    return "".join(
+        RT_IS_LINE_FORMAT % ((pix + 1,) + tuple(pt) + tuple(corresp[:, pix]))
+        for pix, pt in enumerate(pos)
+    )
+
+
+def format_rt_is(pos: np.ndarray, corresp: np.ndarray) -> str:
+    """Format 3D positions and their correspondences as rt_is file content.
+
+    Args:
+        pos: (N, 3) array of 3D positions
+        corresp: (4, N) array of the target number in each camera, -1 if unused
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    corresp = np.asarray(corresp)
+    num_points = len(pos)
+    if num_points == 0:
+        return "0\n"
+
+    if not (
+        np.isfinite(pos).all()
+        and np.isfinite(corresp).all()
+        and np.abs(pos).max() < _MAX_FAST_INT / 10**_DECIMALS
+        and np.abs(corresp).max() < _MAX_FAST_INT
+    ):
+        return f"{num_points}\n" + _format_lines(pos, corresp)
+
+    fields = [_int_column(np.arange(1, num_points + 1))]
+    fields += [_float_column(pos[:, dim]) for dim in range(3)]
+    fields += [_int_column(corresp[cam]) for cam in range(4)]
+
+    # Lay out all fields at their widest, separated by spaces; then keep, per
+    # row, only the trailing characters of each field that % would produce.
+    pieces: List[np.ndarray] = []
+    keep: List[np.ndarray] = []
+    for i, (field, width) in enumerate(fields):
+        separator = np.full((num_points, 1), ord(" " if i < len(fields) - 1 else "\n"), np.uint8)
+        pieces += [field, separator]
+        padding = field.shape[1] - width
+        keep += [
+            np.arange(field.shape[1])[None, :] >= padding[:, None],
+            np.ones((num_points, 1), dtype=bool),
+        ]
+    text = np.hstack(pieces)[np.hstack(keep)]
+    return f"{num_points}\n" + text.tobytes().decode("ascii")
+
+
+def rt_is_array(pos: np.ndarray, corresp: np.ndarray) -> np.ndarray:
+    """Build the RT_IS_DTYPE array of the rt_is content, see format_rt_is."""
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 3)
+    corresp = np.asarray(corresp)
+    arr = np.empty(len(pos), dtype=RT_IS_DTYPE)
+    arr["pnr"] = np.arange(1, len(pos) + 1)
+    for dim, name in enumerate("xyz"):
+        arr[name] = pos[:, dim]
+    for cam in range(4):
+        arr[f"p{cam + 1}"] = np.trunc(corresp[cam])
+    return arr
+
+
+def write_rt_is(output_path: PathLike, pos: np.ndarray, corresp: np.ndarray) -> None:
+    """Write an rt_is file, see format_rt_is."""
+    content = format_rt_is(pos, corresp)
+    with open(output_path, "w", encoding="utf-8") as rt_is:
+        rt_is.write(content)
+
+
+def read_rt_is(filename: PathLike) -> np.ndarray:
+    """Read an rt_is file into an RT_IS_DTYPE structured array.
+
+    A file with zero points gives an empty array.
+
+    Raises:
+        ValueError: If the file is not in the rt_is format.
+    """
+    with open(filename, "r", encoding="utf-8") as file:
+        num_rows = int(file.readline().strip())
+        if num_rows == 0:
+            return np.empty(0, dtype=RT_IS_DTYPE)
+        try:
+            return np.loadtxt(file, dtype=RT_IS_DTYPE, max_rows=num_rows, ndmin=1)
+        except ValueError as exc:
+            raise ValueError(f"Bad format for file: {filename}") from exc
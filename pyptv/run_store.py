@@ -0,0 +1,591 @@
+"""Single-file run store for the per-frame output of an experiment.
+
+A run of N frames with C cameras writes N*C ``_targets`` files and N
+``rt_is``, ``ptv_is`` and ``added`` files each. With ``pft_version.run_store:
+true`` in the YAML file the sequence step writes its output into one
+container per run, ``res/run.ptvstore``, and the batch tracking step packs
+the tracker's output into it as well.
+
+The container is append-only: a 32-byte file header followed by one record
+per array::
+
+    record header (24 bytes): b"PTVR", kind, camera, frame, number of rows
+    payload: the rows in the dtype of the kind, padded to 8 bytes
+
+The kinds are ``targets`` (``ptv.TARGET_DTYPE``, one record per camera),
+``correspondences`` (the rt_is content, ``RT_IS_DTYPE``), ``linkage``
+(ptv_is, ``LINKAGE_DTYPE``) and ``added`` (``ADDED_DTYPE``). Writing a frame
+again appends new records; the latest one wins and ``RunStore.compact``
+drops the superseded ones. Arrays are returned as read-only views of a
+memory map of the file.
+
+The frame index is rebuilt by walking the record headers and is cached in
+``run.ptvstore.idx`` when a writer is closed. Appends are serialized with a
+lock file, so the workers of ``pyptv_batch_parallel`` can share one store.
+
+liboptv's tracker reads and writes the legacy files: ``materialize`` writes
+them from the store and ``pack`` moves them into it. The same is available
+from the command line::
+
+    python -m pyptv.run_store info parameters_Run1.yaml
+    python -m pyptv.run_store materialize parameters_Run1.yaml 10000 10004
+    python -m pyptv.run_store pack parameters_Run1.yaml --remove
+    python -m pyptv.run_store compact parameters_Run1.yaml
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from pyptv import ptv
+from pyptv.rt_is import RT_IS_DTYPE, read_rt_is, write_rt_is
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_FILE = Path("res") / "run.ptvstore"
+
+LINKAGE_DTYPE = np.dtype(
+    [
+        ("prev", np.int32),
+        ("next", np.int32),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("z", np.float64),
+    ]
+)
+ADDED_DTYPE = np.dtype(LINKAGE_DTYPE.descr + [("prio", np.int32)])
+KIND_DTYPES = {
+    "targets": ptv.TARGET_DTYPE,
+    "correspondences": RT_IS_DTYPE,
+    "linkage": LINKAGE_DTYPE,
+    "added": ADDED_DTYPE,
+}
+KINDS = tuple(KIND_DTYPES)
+# Camera number of the records that belong to the whole frame
+NO_CAMERA = -1
+
+_LEGACY_NAMING = {
+    "correspondences": "corres",
+    "linkage": "linkage",
+    "added": "prio",
+}
+_LEGACY_LINE_FORMATS = {
+    "linkage": "%4d %4d %10.3f %10.3f %10.3f",
+    "added": "%4d %4d %10.3f %10.3f %10.3f %d",
+}
+
+_FILE_MAGIC = b"PTVSTORE"
+_FILE_VERSION = 1
+_FILE_HEADER_SIZE = 32  # magic, version, reserved, 16-byte run id
+_RECORD_MAGIC = b"PTVR"
+_RECORD_HEADER = np.dtype(
+    [
+        ("magic", "S4"),
+        ("kind", "u1"),
+        ("cam", "i1"),
+        ("reserved", "<u2"),
+        ("frame", "<i4"),
+        ("reserved2", "<i4"),
+        ("count", "<i8"),
+    ]
+)
+_INDEX_DTYPE = np.dtype(
+    [("kind", "u1"), ("cam", "i1"), ("frame", "<i4"), ("offset", "<i8"), ("count", "<i8")]
+)
+_ALIGN = 8
+
+PathLike = Union[str, os.PathLike]
+_Key = Tuple[int, int, int]  # kind, camera, frame
+
+
+def _padded(nbytes: int) -> int:
+    return nbytes + (-nbytes % _ALIGN)
+
+
+def _kind_id(kind: str) -> int:
+    try:
+        return KINDS.index(kind)
+    except ValueError:
+        raise ValueError(f"Unknown run store kind '{kind}', use one of {KINDS}") from None
+
+
+class RunStore:
+    """Append-only container of the per-frame arrays of a run.
+
+    Args:
+        path: Store file, usually ``res/run.ptvstore``
+        mode: "r" to read an existing store, "a" to read and append
+            (the file is created if needed)
+    """
+
+    def __init__(self, path: PathLike = STORE_FILE, mode: str = "r"):
+        if mode not in ("r", "a"):
+            raise ValueError(f"Unknown run store mode '{mode}', use 'r' or 'a'")
+        self.path = Path(path)
+        self.mode = mode
+        self._index: Dict[_Key, Tuple[int, int]] = {}
+        self._scanned = 0
+        self._map: Optional[np.memmap] = None
+        self._file = None
+        self._lock_file = None
+
+        if mode == "a":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self._sidecar(".lock"), "a+b")
+            with self._locked():
+                if not self.path.exists() or self.path.stat().st_size == 0:
+                    with open(self.path, "wb") as f:
+                        f.write(self._new_header())
+                self._open()
+                self._scan(truncate=True)
+        else:
+            if not self.path.exists():
+                raise FileNotFoundError(f"Run store does not exist: {self.path}")
+            self._open()
+            self._scan()
+
+    def __enter__(self) -> "RunStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"RunStore({str(self.path)!r}, mode={self.mode!r})"
+
+    # -- file handling --------------------------------------------------------
+
+    def _sidecar(self, suffix: str) -> Path:
+        return self.path.with_name(self.path.name + suffix)
+
+    @staticmethod
+    def _new_header() -> bytes:
+        header = _FILE_MAGIC + np.array([_FILE_VERSION, 0], "<u4").tobytes()
+        return header + uuid.uuid4().bytes
+
+    def _open(self) -> None:
+        """Read the file header and the cached index."""
+        with open(self.path, "rb") as f:
+            header = f.read(_FILE_HEADER_SIZE)
+        if len(header) < _FILE_HEADER_SIZE or not header.startswith(_FILE_MAGIC):
+            raise ValueError(f"Not a run store: {self.path}")
+        version = int(np.frombuffer(header, "<u4", count=1, offset=len(_FILE_MAGIC))[0])
+        if version != _FILE_VERSION:
+            raise ValueError(f"Unsupported run store version {version}: {self.path}")
+        self._header = header
+        self._index = {}
+        self._scanned = _FILE_HEADER_SIZE
+        self._map = None
+        self._load_index()
+        if self.mode == "a":
+            self._file = open(self.path, "ab")
+
+    def _load_index(self) -> None:
+        """Use the cached index if it was written for this file."""
+        try:
+            with open(self._sidecar(".idx"), "rb") as f:
+                if f.read(_FILE_HEADER_SIZE) != self._header:
+                    return
+                scanned = int(np.frombuffer(f.read(8), "<i8")[0])
+                index = np.load(f, allow_pickle=False)
+        except (OSError, ValueError, IndexError, EOFError):
+            return
+        if index.dtype != _INDEX_DTYPE or scanned > self.path.stat().st_size:
+            return
+        keys = zip(index["kind"].tolist(), index["cam"].tolist(), index["frame"].tolist())
+        self._index = dict(zip(keys, zip(index["offset"].tolist(), index["count"].tolist())))
+        self._scanned = scanned
+
+    def _write_index(self) -> None:
+        index = np.array(
+            [(*key, offset, count) for key, (offset, count) in self._index.items()],
+            dtype=_INDEX_DTYPE,
+        )
+        tmp_path = self._sidecar(".idx.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self._header)
+            f.write(np.int64(self._scanned).tobytes())
+            np.save(f, index)
+        os.replace(tmp_path, self._sidecar(".idx"))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the lock that serializes the writers of the store."""
+        fd = self._lock_file.fileno()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _scan(self, truncate: bool = False) -> None:
+        """Index the records appended since the last scan.
+
+        A record cut short by a killed writer ends the scan; with
+        ``truncate`` (only under the writer lock) it is removed.
+        """
+        size = self.path.stat().st_size
+        if size <= self._scanned:
+            return
+        pos = self._scanned
+        with open(self.path, "rb") as f:
+            while pos + _RECORD_HEADER.itemsize <= size:
+                f.seek(pos)
+                header = np.frombuffer(f.read(_RECORD_HEADER.itemsize), _RECORD_HEADER)[0]
+                if header["magic"] != _RECORD_MAGIC or header["kind"] >= len(KINDS):
+                    break
+                kind = int(header["kind"])
+                count = int(header["count"])
+                payload = pos + _RECORD_HEADER.itemsize
+                end = payload + _padded(count * KIND_DTYPES[KINDS[kind]].itemsize)
+                if end > size:
+                    break
+                self._index[(kind, int(header["cam"]), int(header["frame"]))] = (payload, count)
+                pos = end
+        self._scanned = pos
+        if truncate and pos < size:
+            print(f"Run store {self.path}: dropping {size - pos} bytes of an incomplete record")
+            self._map = None
+            self._file.truncate(pos)
+
+    def close(self) -> None:
+        """Close the store; a writer also saves the frame index."""
+        if self._file is not None:
+            with self._locked():
+                self._scan()
+                self._write_index()
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._map = None
+
+    # -- records --------------------------------------------------------------
+
+    def append(self, kind: str, frame: int, arr: np.ndarray, cam: int = NO_CAMERA) -> None:
+        """Append the array of one kind, frame and camera.
+
+        Args:
+            kind: One of KINDS
+            frame: Frame number
+            arr: Structured array with the dtype of the kind (KIND_DTYPES)
+            cam: Camera index for targets, NO_CAMERA otherwise
+        """
+        if self._file is None:
+            raise ValueError(f"Run store is not open for writing: {self.path}")
+        kind_id = _kind_id(kind)
+        arr = np.asarray(arr)
+        if arr.dtype != KIND_DTYPES[kind]:
+            raise ValueError(f"Expected {kind} array of dtype {KIND_DTYPES[kind]}, got {arr.dtype}")
+        header = np.zeros(1, dtype=_RECORD_HEADER)
+        header[0] = (_RECORD_MAGIC, kind_id, cam, 0, frame, 0, len(arr))
+        payload = np.ascontiguousarray(arr).tobytes()
+        record = header.tobytes() + payload + bytes(_padded(len(payload)) - len(payload))
+
+        with self._locked():
+            self._scan(truncate=True)
+            offset = self._scanned
+            self._file.write(record)
+            self._file.flush()
+            self._index[(kind_id, cam, frame)] = (offset + _RECORD_HEADER.itemsize, len(arr))
+            self._scanned = offset + len(record)
+
+    def write_frame(
+        self, frame: int, targets: Sequence[np.ndarray], correspondences: np.ndarray
+    ) -> None:
+        """Append the sequence output of a frame: targets of every camera and rt_is."""
+        for cam, arr in enumerate(targets):
+            self.append("targets", frame, arr, cam)
+        self.append("correspondences", frame, correspondences)
+
+    def _entry(self, kind: str, frame: int, cam: int) -> Optional[Tuple[int, int]]:
+        key = (_kind_id(kind), cam, frame)
+        if key not in self._index:
+            self._scan()
+        return self._index.get(key)
+
+    def has(self, kind: str, frame: int, cam: int = NO_CAMERA) -> bool:
+        return self._entry(kind, frame, cam) is not None
+
+    def has_frame(self, frame: int, num_cams: int) -> bool:
+        """Whether the complete sequence output of a frame is stored."""
+        return self.has("correspondences", frame) and all(
+            self.has("targets", frame, cam) for cam in range(num_cams)
+        )
+
+    def read(self, kind: str, frame: int, cam: int = NO_CAMERA) -> np.ndarray:
+        """Return the latest array of a kind, frame and camera (read-only view).
+
+        Raises:
+            KeyError: If the store holds no such array.
+        """
+        entry = self._entry(kind, frame, cam)
+        if entry is None:
+            camera = f" camera {cam}" if cam != NO_CAMERA else ""
+            raise KeyError(f"No {kind} of frame {frame}{camera} in {self.path}")
+        offset, count = entry
+        dtype = KIND_DTYPES[kind]
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        end = offset + count * dtype.itemsize
+        if self._map is None or len(self._map) < end:
+            self._map = np.memmap(self.path, dtype=np.uint8, mode="r")
+        return self._map[offset:end].view(dtype)
+
+    def frames(self, kind: str, cam: int = NO_CAMERA) -> List[int]:
+        """Sorted frame numbers stored for a kind and camera."""
+        self._scan()
+        kind_id = _kind_id(kind)
+        return sorted(f for k, c, f in self._index if k == kind_id and c == cam)
+
+    def keys(self) -> List[Tuple[str, int, int]]:
+        """(kind, frame, camera) of every stored array."""
+        self._scan()
+        return [(KINDS[k], f, c) for k, c, f in sorted(self._index)]
+
+    def compact(self) -> int:
+        """Rewrite the store without superseded records.
+
+        Other processes must not use the store while it is compacted.
+
+        Returns:
+            Number of bytes freed.
+        """
+        if self._file is None:
+            raise ValueError(f"Run store is not open for writing: {self.path}")
+        tmp_path = self._sidecar(".tmp")
+        with self._locked():
+            self._scan(truncate=True)
+            size = self._scanned
+            for suffix in ("", ".idx", ".lock"):
+                Path(str(tmp_path) + suffix).unlink(missing_ok=True)
+            with RunStore(tmp_path, "a") as compacted:
+                for kind, frame, cam in self.keys():
+                    compacted.append(kind, frame, self.read(kind, frame, cam), cam)
+            self._map = None
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            os.replace(Path(str(tmp_path) + ".idx"), self._sidecar(".idx"))
+            Path(str(tmp_path) + ".lock").unlink(missing_ok=True)
+            self._open()
+            self._scan()
+        return size - self._scanned
+
+
+def run_store_enabled(pm) -> bool:
+    """Whether the experiment writes its output to a run store (pft_version.run_store)."""
+    pft_version = getattr(pm, "parameters", {}).get("pft_version")
+    return isinstance(pft_version, dict) and bool(pft_version.get("run_store", False))
+
+
+def legacy_filename(
+    kind: str,
+    frame: int,
+    short_file_base: Optional[str] = None,
+    root: Optional[Path] = None,
+) -> str:
+    """Name of the file liboptv uses for an array: a _targets or res/ file.
+
+    res/ files are resolved against the experiment directory ``root``, if given.
+    """
+    if kind == "targets":
+        return ptv.target_filename(short_file_base, frame)
+    _kind_id(kind)
+    return f"{ptv.result_naming(root)[_LEGACY_NAMING[kind]].decode()}.{frame}"
+
+
+def read_legacy_file(kind: str, filename: str) -> np.ndarray:
+    if kind == "correspondences":
+        return read_rt_is(filename)
+    with open(filename, "r", encoding="utf-8") as file:
+        num_rows = int(file.readline().strip())
+        if num_rows == 0:
+            return np.empty(0, dtype=KIND_DTYPES[kind])
+        try:
+            return np.loadtxt(file, dtype=KIND_DTYPES[kind], max_rows=num_rows, ndmin=1)
+        except ValueError as exc:
+            raise ValueError(f"Bad format for file: {filename}") from exc
+
+
+def write_legacy_file(kind: str, filename: str, arr: np.ndarray) -> None:
+    output_path = ptv._prepare_output_path(filename)
+    try:
+        if kind == "correspondences":
+            pos = np.column_stack([arr["x"], arr["y"], arr["z"]])
+            corresp = np.stack([arr[f"p{cam}"] for cam in range(1, 5)])
+            write_rt_is(output_path, pos, corresp)
+        elif len(arr) == 0:
+            with open(output_path, "w", encoding="utf-8") as file:
+                file.write("0\n")
+        else:
+            np.savetxt(
+                output_path,
+                arr,
+                fmt=_LEGACY_LINE_FORMATS[kind],
+                header=f"{len(arr)}",
+                comments="",
+            )
+    except OSError as exc:
+        ptv._raise_output_write_error(output_path, exc)
+
+
+def materialize(
+    store: RunStore,
+    short_file_bases: Sequence[str],
+    first_frame: int,
+    last_frame: int,
+    kinds: Sequence[str] = ("targets", "correspondences"),
+    root: Optional[Path] = None,
+) -> int:
+    """Write the legacy files of a frame range from the store.
+
+    The default kinds are what liboptv's Tracker reads. Frames that are not
+    in the store are skipped. res/ files are written under ``root``, if given.
+
+    Returns:
+        Number of files written.
+    """
+    written = 0
+    for frame in range(first_frame, last_frame + 1):
+        for kind in kinds:
+            if kind == "targets":
+                for cam, short_file_base in enumerate(short_file_bases):
+                    if store.has(kind, frame, cam):
+                        ptv.write_target_array(
+                            store.read(kind, frame, cam), short_file_base, frame,
+                            keep_other=True,
+                        )
+                        written += 1
+            elif store.has(kind, frame):
+                write_legacy_file(
+                    kind, legacy_filename(kind, frame, root=root), store.read(kind, frame)
+                )
+                written += 1
+    return written
+
+
+def pack(
+    store: RunStore,
+    short_file_bases: Sequence[str],
+    first_frame: int,
+    last_frame: int,
+    kinds: Sequence[str] = KINDS,
+    remove_files: bool = False,
+    root: Optional[Path] = None,
+) -> int:
+    """Append the legacy files of a frame range to the store.
+
+    Targets are read in whichever format is stored (text or .npy).
+
+    Args:
+        remove_files: Delete every file once it is in the store
+        root: Experiment directory the res/ files are read from
+
+    Returns:
+        Number of files packed.
+    """
+    packed = 0
+    for frame in range(first_frame, last_frame + 1):
+        for kind in kinds:
+            if kind == "targets":
+                for cam, short_file_base in enumerate(short_file_bases):
+                    fmt = ptv.stored_target_format(short_file_base, frame)
+                    if fmt is None:
+                        continue
+                    store.append(kind, frame, ptv.read_target_array(short_file_base, frame, fmt), cam)
+                    if remove_files:
+                        ptv._remove_file(ptv.target_filename(short_file_base, frame, fmt))
+                    packed += 1
+            else:
+                filename = legacy_filename(kind, frame, root=root)
+                if not os.path.exists(filename):
+                    continue
+                store.append(kind, frame, read_legacy_file(kind, filename))
+                if remove_files:
+                    ptv._remove_file(filename)
+                packed += 1
+    return packed
+
+
+def _print_info(store: RunStore) -> None:
+    print(f"{store.path}: {store.path.stat().st_size / 1e6:.1f} MB")
+    for kind in KINDS:
+        cams = sorted({cam for k, _, cam in store.keys() if k == kind})
+        for cam in cams:
+            frames = store.frames(kind, cam)
+            camera = f" camera {cam}" if cam != NO_CAMERA else ""
+            print(f"  {kind}{camera}: {len(frames)} frames ({frames[0]}..{frames[-1]})")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=["info", "materialize", "pack", "compact"])
+    parser.add_argument("yaml_file", type=Path, help="YAML parameter file")
+    parser.add_argument("first_frame", type=int, nargs="?", help="First frame (default: sequence.first)")
+    parser.add_argument("last_frame", type=int, nargs="?", help="Last frame (default: sequence.last)")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, help="Kinds to materialize or pack (default: targets and correspondences / all)")
+    parser.add_argument("--remove", action="store_true", help="pack: delete the files once they are in the store")
+    args = parser.parse_args(argv)
+
+    from pyptv.parameter_manager import ParameterManager
+
+    yaml_file = args.yaml_file.resolve()
+    root = yaml_file.parent
+    store_file = root / STORE_FILE
+    try:
+        pm = ParameterManager()
+        pm.from_yaml(yaml_file)
+        sequence = pm.get_parameter('sequence')
+        first = sequence['first'] if args.first_frame is None else args.first_frame
+        last = sequence['last'] if args.last_frame is None else args.last_frame
+        bases = [str(root / base) for base in pm.get_target_filenames()]
+
+        if args.command == "info":
+            with RunStore(store_file) as store:
+                _print_info(store)
+        elif args.command == "materialize":
+            with RunStore(store_file) as store:
+                kinds = args.kinds or ("targets", "correspondences")
+                count = materialize(store, bases, first, last, kinds, root=root)
+            print(f"Wrote {count} files")
+        elif args.command == "pack":
+            with RunStore(store_file, "a") as store:
+                count = pack(
+                    store, bases, first, last, args.kinds or KINDS, args.remove, root=root
+                )
+            print(f"Packed {count} files into {store_file}")
+        else:
+            with RunStore(store_file, "a") as store:
+                freed = store.compact()
+            print(f"Compacted {store_file}, freed {freed / 1e6:.1f} MB")
+    except (OSError, ValueError) as e:
+        print(f"Run store {args.command} failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""Sequence images decoded once and shared by several processes.
+
+When several parameter sets process the same images, every image would
+be read and decoded once per parameter set. A ``SharedFrameRing`` holds the
+decoded images of a few consecutive frames in one block of shared memory
+(``multiprocessing.shared_memory``): one process decodes every frame into
+the next slot of the ring, and each consumer process reads it through a
+``SharedFrameSource``, an ``ImageSource`` serving read-only views of the
+slot.
+
+Every consumer has two semaphores: ``ready`` counts the frames written and
+not yet taken, ``free`` the slots it has released. A slot is overwritten
+only once every consumer has released it, so the decoder runs at most
+``slots`` frames ahead of the slowest consumer. A consumer holds the slot
+of the frame it is processing and releases it when it asks for the next
+frame, or when it is closed; a closed (or dead) consumer is not waited for.
+
+Frames outside the stream, such as the frames before the first one that
+``masking.rolling_frames`` warms up with, are read from a fallback source.
+
+Example:
+    >>> ring = SharedFrameRing(2, 4, (1024, 1024), 10000, 10004)
+    >>> # in consumer process i: source = SharedFrameSource(ring.handle, i, fallback)
+    >>> for frame in range(10000, 10005):
+    ...     ring.put(frame, decoder.frame_images(frame))
+    >>> ring.finish()
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pyptv.image_source import ImageSource
+
+DEFAULT_SLOTS = 8
+# Frame number of the slot written by SharedFrameRing.finish
+END_OF_STREAM = -(2**62)
+_POLL_SECONDS = 0.1
+
+
+class RingHandle(NamedTuple):
+    """What a consumer process needs to attach to a SharedFrameRing."""
+
+    name: str
+    shape: Tuple[int, int, int, int]  # slots, cameras, height, width
+    first: int
+    last: int
+    frames: Sequence[int]  # frame number held by every slot
+    detached: Sequence[int]  # per consumer, set once it no longer reads
+    ready: Sequence
+    free: Sequence
+
+
+class SharedFrameRing:
+    """Decoded images of frames first..last, written in order into a ring of slots.
+
+    Create it before starting the consumer processes and pass them
+    ``handle``; only the creating process calls ``put`` and ``finish``.
+
+    Args:
+        num_consumers: Number of consumer processes, each reading every frame
+        num_cams: Number of cameras
+        image_shape: (height, width) of the images of all cameras
+        first, last: Frames that will be written
+        slots: Number of frames held at a time
+    """
+
+    def __init__(
+        self,
+        num_consumers: int,
+        num_cams: int,
+        image_shape: Tuple[int, int],
+        first: int,
+        last: int,
+        slots: int = DEFAULT_SLOTS,
+    ):
+        if slots < 1:
+            raise ValueError(f"A frame ring needs >= 1 slots, got {slots}")
+        ctx = multiprocessing.get_context()
+        shape = (slots, num_cams, *image_shape)
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))))
+        self._images = np.ndarray(shape, dtype=np.uint8, buffer=self._memory.buf)
+        self._written = 0
+        self.handle = RingHandle(
+            name=self._memory.name,
+            shape=shape,
+            first=first,
+            last=last,
+            frames=ctx.RawArray("q", slots),
+            detached=ctx.RawArray("b", num_consumers),
+            ready=[ctx.Semaphore(0) for _ in range(num_consumers)],
+            free=[ctx.Semaphore(slots) for _ in range(num_consumers)],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self._images.nbytes
+
+    def _next_slot(self, alive: Optional[Callable[[int], bool]]) -> int:
+        """Wait until every attached consumer has released the next slot."""
+        for index, free in enumerate(self.handle.free):
+            while not self.handle.detached[index] and not free.acquire(timeout=_POLL_SECONDS):
+                if alive is not None and not alive(index):
+                    self.handle.detached[index] = 1
+        return self._written % self._images.shape[0]
+
+    def _publish(self, slot: int, frame: int) -> None:
+        self.handle.frames[slot] = frame
+        self._written += 1
+        for ready in self.handle.ready:
+            ready.release()
+
+    def put(
+        self,
+        frame: int,
+        images: Sequence[np.ndarray],
+        alive: Optional[Callable[[int], bool]] = None,
+    ) -> None:
+        """Copy the images of ``frame`` into the next slot.
+
+        Args:
+            alive: Optional callable telling whether consumer ``index`` is
+                still running; dead consumers are no longer waited for.
+
+        Raises:
+            ValueError: If the images do not match the ring's shape.
+        """
+        num_cams, image_shape = self._images.shape[1], self._images.shape[2:]
+        if len(images) != num_cams:
+            raise ValueError(f"Expected {num_cams} camera images, got {len(images)}")
+        for cam, image in enumerate(images):
+            if image.shape != image_shape:
+                raise ValueError(
+                    f"Image of camera {cam + 1} in frame {frame} has shape {image.shape}, "
+                    f"expected {image_shape}"
+                )
+        # Checked before a slot is reserved: a rejected frame holds no slot
+        slot = self._next_slot(alive)
+        for cam, image in enumerate(images):
+            np.copyto(self._images[slot, cam], image)
+        self._publish(slot, frame)
+
+    def finish(self, alive: Optional[Callable[[int], bool]] = None) -> None:
+        """Mark the end of the stream; consumers asking for more frames get an error."""
+        self._publish(self._next_slot(alive), END_OF_STREAM)
+
+    def close(self) -> None:
+        """Free the shared memory, once the consumers are done."""
+        self._images = None
+        self._memory.close()
+        self._memory.unlink()
+
+
+class SharedFrameSource(ImageSource):
+    """Images of a SharedFrameRing, read by consumer ``index`` in another process.
+
+    Frames first..last are taken from the ring in increasing order; any
+    other frame, or a frame before the current one, is read from
+    ``fallback``. The images are read-only views of the ring, valid until the
+    next frame is asked for.
+
+    Args:
+        handle: The ring's ``handle``
+        index: Number of this consumer, 0..num_consumers - 1
+        fallback: Source of the frames outside the stream
+    """
+
+    def __init__(self, handle: RingHandle, index: int, fallback: Optional[ImageSource] = None):
+        self.handle = handle
+        self.index = index
+        self.fallback = fallback
+        self.num_cams = handle.shape[1]
+        # Consumers are children of the ring's creator and share its resource
+        # tracker, so attaching does not make them unlink the segment
+        self._memory = shared_memory.SharedMemory(name=handle.name)
+        self._images = np.ndarray(handle.shape, dtype=np.uint8, buffer=self._memory.buf)
+        self._images.flags.writeable = False
+        self._taken = 0
+        self._slot: Optional[int] = None
+        self._frame: Optional[int] = None
+
+    def _release(self) -> None:
+        if self._slot is not None:
+            self.handle.free[self.index].release()
+            self._slot, self._frame = None, None
+
+    def _advance(self, frame: int) -> None:
+        """Take frames from the ring until ``frame``."""
+        while self._frame != frame:
+            self._release()
+            self.handle.ready[self.index].acquire()
+            slot = self._taken % self.handle.shape[0]
+            self._taken += 1
+            self._slot, self._frame = slot, self.handle.frames[slot]
+            if self._frame == END_OF_STREAM or self._frame > frame:
+                raise RuntimeError(f"Frame {frame} was not decoded into the shared frame ring")
+
+    def _in_stream(self, frame: int) -> bool:
+        if not self.handle.first <= frame <= self.handle.last:
+            return False
+        return self._frame is None or frame >= self._frame
+
+    def paths(self, frame: int) -> List[str]:
+        """Files of ``frame`` according to the fallback.
+
+        Raises:
+            ValueError: Without a fallback, as shared frames have no files.
+        """
+        if self.fallback is None:
+            raise ValueError("Shared frames have no files")
+        return self.fallback.paths(frame)
+
+    def frame_images(self, frame: int) -> List[np.ndarray]:
+        if not self._in_stream(frame):
+            if self.fallback is None:
+                raise ValueError(f"Frame {frame} is not in the shared frame ring")
+            return self.fallback.frame_images(frame)
+        self._advance(frame)
+        return list(self._images[self._slot])
+
+    def read(self, cam: int, frame: int) -> np.ndarray:
+        return self.frame_images(frame)[cam]
+
+    def close(self) -> None:
+        """Release the current slot and stop reading: the ring no longer waits for us."""
+        if self._images is None:
+            return
+        self.handle.detached[self.index] = 1
+        self._release()
+        self._images = None
+        try:
+            self._memory.close()
+        except BufferError:
+            # The caller still holds views of the last frame; the mapping
+            # goes away with them
+            pass
+        if self.fallback is not None:
+            self.fallback.close()
@@ -0,0 +1,292 @@
+"""Directory-watch streaming mode for live acquisition.
+
+``stream_sequence`` processes the frames of a sequence while they are being
+recorded: it polls the image files of the next frame and, as soon as the files
+of all cameras are complete, runs detection and correspondences and writes the
+``_targets`` and ``res/rt_is`` files of that frame. Frames are processed in
+order, so the output is the same as that of ``ptv.py_sequence_loop``.
+
+A file counts as complete when it is not empty and its size and modification
+time did not change between two polls. Cameras that write to a temporary name
+and rename the finished file are therefore picked up one poll after the rename,
+and cameras that write in place are picked up once they stop writing. In
+splitter mode (``ptv.splitter``) the watched file of a frame is the composite
+image of all cameras.
+
+The per-frame latency (time from the newest image file of the frame to the end
+of its output) is printed and written to ``res/stream_latency.csv``.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import time
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pyptv import ptv
+from pyptv.image_source import image_split, is_stack, sequence_base_names
+from pyptv.timing import NULL_TIMER, StageTimer
+
+DEFAULT_POLL_INTERVAL = 0.1
+DEFAULT_IDLE_TIMEOUT = 30.0
+LATENCY_FILE = Path("res") / "stream_latency.csv"
+
+
+@dataclass
+class FrameLatency:
+    """Timing of one streamed frame, in seconds."""
+
+    frame: int
+    wait: float  # waiting for the frame's files to be complete
+    processing: float  # detection, correspondences and writing
+    latency: float  # newest image file modification -> output written
+
+
+class FrameWatcher:
+    """Poll the image files of consecutive frames until they are complete.
+
+    Args:
+        frame_paths: Callable returning the image paths of a frame, one per camera
+        poll_interval: Seconds between two polls of the file system
+        idle_timeout: Give up waiting for a frame after this many seconds
+            (None waits forever)
+    """
+
+    def __init__(
+        self,
+        frame_paths: Callable[[int], Sequence[str]],
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    ):
+        if poll_interval <= 0:
+            raise ValueError(f"Poll interval must be > 0, got {poll_interval}")
+        if idle_timeout is not None and idle_timeout < 0:
+            raise ValueError(f"Idle timeout must be >= 0, got {idle_timeout}")
+        self.frame_paths = frame_paths
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self._last_seen: Dict[str, Tuple[int, int]] = {}
+
+    def _stable(self, path: str) -> Optional[float]:
+        """Return the modification time of a complete file, None otherwise."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._last_seen.pop(path, None)
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = self._last_seen.get(path)
+        self._last_seen[path] = signature
+        if stat.st_size == 0 or previous != signature:
+            return None
+        return stat.st_mtime
+
+    def poll(self, frame: int) -> Optional[float]:
+        """Check once whether all files of a frame are complete.
+
+        Returns:
+            The newest modification time of the frame's files if they are
+            complete, None otherwise.
+        """
+        mtimes = [self._stable(path) for path in self.frame_paths(frame)]
+        if any(mtime is None for mtime in mtimes):
+            return None
+        for path in self.frame_paths(frame):
+            self._last_seen.pop(path, None)
+        return max(mtimes)
+
+    def wait_for(self, frame: int) -> Optional[float]:
+        """Block until all files of a frame are complete.
+
+        Returns:
+            The newest modification time of the frame's files, or None if the
+            idle timeout expired first.
+        """
+        start = time.monotonic()
+        while True:
+            mtime = self.poll(frame)
+            if mtime is not None:
+                return mtime
+            if (
+                self.idle_timeout is not None
+                and time.monotonic() - start >= self.idle_timeout
+            ):
+                return None
+            time.sleep(self.poll_interval)
+
+
+def _write_latency_row(path: Path, record: FrameLatency) -> None:
+    new_file = not path.exists()
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow([field.name for field in fields(FrameLatency)])
+        writer.writerow(astuple(record))
+
+
+def print_latency_summary(records: Sequence[FrameLatency]) -> None:
+    """Print a short summary of the per-frame latencies."""
+    if not records:
+        print("Streaming: no frames processed")
+        return
+    latency = np.array([r.latency for r in records])
+    processing = np.array([r.processing for r in records])
+    print(
+        f"Streaming: {len(records)} frames, latency "
+        f"mean {1000 * latency.mean():.1f} ms, "
+        f"median {1000 * np.median(latency):.1f} ms, "
+        f"max {1000 * latency.max():.1f} ms; "
+        f"processing mean {1000 * processing.mean():.1f} ms"
+    )
+
+
+def stream_sequence(
+    exp,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    camera_workers: int = 0,
+    camera_pool: str = "process",
+    latency_file: Optional[Path] = LATENCY_FILE,
+    timer: StageTimer = NULL_TIMER,
+) -> List[FrameLatency]:
+    """Process frames first..last of ``exp.spar`` as their images appear.
+
+    Stops after the last frame, or when the next frame does not become
+    complete within ``idle_timeout`` seconds.
+
+    Args:
+        exp: Experiment-like object with pm, cpar, spar, vpar, tpar, cals,
+            num_cams and target_filenames, as for ``ptv.py_sequence_loop``
+        poll_interval: Seconds between two polls of the image directories
+        idle_timeout: Seconds to wait for the next frame before stopping
+            (None waits forever)
+        camera_workers: Number of workers detecting the cameras of a frame
+            concurrently (0 processes cameras one after the other)
+        camera_pool: Worker type for camera_workers, "process" or "thread"
+        latency_file: CSV file receiving one latency row per frame, relative
+            to the experiment directory, or None
+        timer: Optional ``pyptv.timing.StageTimer`` recording the time of
+            every stage of every frame and camera
+
+    Returns:
+        Timing of every processed frame.
+    """
+    pm = exp.pm
+    num_cams = exp.num_cams
+    cpar, spar, vpar, tpar, cals = exp.cpar, exp.spar, exp.vpar, exp.tpar, exp.cals
+    root = ptv.experiment_root(exp)
+    ptv_params = pm.get_parameter('ptv')
+    masking_params = ptv.resolved_masking(pm.parameters.get('masking'), root)
+    pft_version = pm.get_parameter('pft_version')
+    targets_format = ptv.configured_targets_format(pft_version)
+
+    splitter = bool(ptv_params.get('splitter', False))
+    img_base_names = sequence_base_names(
+        [str(ptv.resolve_path(root, spar.get_img_base_name(i))) for i in range(num_cams)],
+        ptv_params,
+    )
+    if any(is_stack(name) for name in img_base_names):
+        raise ValueError("Streaming mode waits for per-frame image files; image stacks are not supported")
+    short_file_bases = exp.target_filenames
+    ptv._ensure_target_output_writable(short_file_bases)
+
+    def frame_paths(frame: int) -> List[str]:
+        return [img_base_name % frame for img_base_name in img_base_names]
+
+    def frame_images(paths: List[str]) -> List:
+        """The images of a frame, or their paths for the detection pool."""
+        if not splitter:
+            return paths
+        with timer.stage("imread"):
+            composite = ptv.read_sequence_image(paths[0])
+        return image_split(composite)[:num_cams]
+
+    watcher = FrameWatcher(frame_paths, poll_interval, idle_timeout)
+
+    preprocessor = ptv.FramePreprocessor(cpar, ptv_params, masking_params)
+    detection_pool = None
+    if camera_workers > 0:
+        from pyptv.camera_pool import CameraDetectionPool
+
+        detection_pool = CameraDetectionPool(
+            camera_workers,
+            kind=camera_pool,
+            cpar=cpar,
+            tpar=tpar,
+            ptv_params=ptv_params,
+            targ_rec_params=pm.get_parameter('targ_rec'),
+            masking_params=masking_params,
+            num_cams=num_cams,
+        )
+
+    if latency_file is not None:
+        latency_file = ptv.resolve_path(ptv.output_root(exp), latency_file)
+        latency_file.parent.mkdir(parents=True, exist_ok=True)
+        latency_file.unlink(missing_ok=True)
+
+    run_store = None
+    if pft_version.get('run_store', False):
+        from pyptv.run_store import STORE_FILE, RunStore
+
+        run_store = RunStore(ptv.resolve_path(ptv.output_root(exp), STORE_FILE), "a")
+
+    records: List[FrameLatency] = []
+    try:
+        for frame in range(spar.get_first(), spar.get_last() + 1):
+            wait_start = time.perf_counter()
+            newest_mtime = watcher.wait_for(frame)
+            if newest_mtime is None:
+                print(f"Streaming: no complete images of frame {frame} "
+                      f"after {idle_timeout} s, stopping")
+                break
+            start = time.perf_counter()
+            timer.frame = frame
+
+            images = frame_images(frame_paths(frame))
+            if detection_pool is not None:
+                with timer.stage("detect_wait"):
+                    detections = detection_pool.detect(images, timer)
+            else:
+                detections = []
+                for i_cam, img in enumerate(images):
+                    if not isinstance(img, np.ndarray):
+                        with timer.stage("imread", cam=i_cam):
+                            img = ptv.read_sequence_image(img)
+                    detections.append(ptv.detect_camera_targets(
+                        img, i_cam, cpar, tpar, ptv_params, masking_params, timer,
+                        preprocessor,
+                    ))
+            ptv.correspond_and_write_frame(
+                frame, detections, cpar, vpar, cals, short_file_bases,
+                targets_format, run_store,
+                corres_file_base=ptv.result_naming(ptv.output_root(exp))['corres'].decode(),
+                timer=timer,
+            )
+
+            end = time.perf_counter()
+            # File times of network shares may be skewed; never report less
+            # than the processing time.
+            record = FrameLatency(
+                frame=frame,
+                wait=start - wait_start,
+                processing=end - start,
+                latency=max(time.time() - newest_mtime, end - start),
+            )
+            records.append(record)
+            print(f"Frame {frame} latency {1000 * record.latency:.1f} ms "
+                  f"(processing {1000 * record.processing:.1f} ms)")
+            if latency_file is not None:
+                _write_latency_row(latency_file, record)
+    finally:
+        if detection_pool is not None:
+            detection_pool.close()
+        if run_store is not None:
+            run_store.close()
+
+    print_latency_summary(records)
+    return records
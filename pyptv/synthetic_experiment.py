@@ -0,0 +1,400 @@
+"""Synthetic experiments for benchmarking detection, correspondences and tracking.
+
+``generate_synthetic_experiment`` builds a complete experiment directory from
+the calibration of an existing one:
+
+- ``parameters_Run1.yaml``: the source parameters with the requested number
+  of cameras, image size and frame range;
+- ``cal/``: the ``.ori``/``.addpar`` files of the cameras used;
+- ``img/cam<n>.<frame>``: 8-bit TIFF images with one Gaussian spot per
+  particle, named like the images of ``tests/test_cavity``;
+- ``ground_truth.npz``: the true trajectories, ``frames`` (F,), ``ids``
+  (F,N), ``xyz`` (F,N,3) and their image positions ``xy`` (F,C,N,2).
+
+Particles start at random positions in the observation volume
+(``criteria.X_lay``/``Zmin_lay``/``Zmax_lay``) that are seen by all cameras,
+and move with a seeded random velocity that changes slowly from frame to
+frame. A particle leaving the volume or the view of a camera is replaced by a
+new one with a new id, so every frame has the same number of particles.
+Positions are projected with ``pyptv.ground_truth``.
+
+``evaluate_positions`` compares the ``res/rt_is`` files of a processed
+synthetic experiment with the ground truth.
+
+Example:
+    python -m pyptv.synthetic_experiment generate tests/test_cavity/parameters_Run1.yaml /tmp/synth --particles 10000 --frames 5
+    python -m pyptv.pyptv_batch /tmp/synth/parameters_Run1.yaml 10000 10004
+    python -m pyptv.synthetic_experiment evaluate /tmp/synth
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from imageio.v3 import imwrite
+from scipy.spatial import cKDTree
+
+from pyptv.ground_truth import load_ground_truth_cameras, project_points
+from pyptv.parameter_manager import ParameterManager
+from pyptv.rt_is import read_rt_is
+
+YAML_NAME = "parameters_Run1.yaml"
+GROUND_TRUTH_FILE = "ground_truth.npz"
+# Rounds of rejection sampling for visible particle positions
+MAX_SAMPLING_ROUNDS = 100
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """What to generate.
+
+    Attributes:
+        num_particles: Particles in every frame
+        num_frames: Number of frames
+        first_frame: Number of the first frame
+        num_cams: Cameras to use, the first ones of the source (None: all)
+        image_size: (width, height) in pixels (None: ptv.imx/imy of the source)
+        step: RMS displacement of a particle per frame and axis, in mm
+        acceleration: RMS change of the displacement per frame, in mm
+        particle_sigma: Standard deviation of the Gaussian spots, in pixels
+        peak_grey: Grey value of a spot centered on a pixel
+        noise_grey: Standard deviation of the image noise, in grey values
+        seed: Seed of the positions, motion and noise
+    """
+
+    num_particles: int = 1000
+    num_frames: int = 5
+    first_frame: int = 10000
+    num_cams: Optional[int] = None
+    image_size: Optional[Tuple[int, int]] = None
+    step: float = 0.3
+    acceleration: float = 0.03
+    particle_sigma: float = 1.2
+    peak_grey: float = 200.0
+    noise_grey: float = 0.0
+    seed: int = 0
+
+
+def _volume_bounds(criteria: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """Box around the observation volume; y gets the extent of x."""
+    x_lay = [float(x) for x in criteria["X_lay"]]
+    z_min = min(float(z) for z in criteria["Zmin_lay"])
+    z_max = max(float(z) for z in criteria["Zmax_lay"])
+    low = np.array([min(x_lay), min(x_lay), z_min])
+    high = np.array([max(x_lay), max(x_lay), z_max])
+    return low, high
+
+
+def _visible(xy: np.ndarray, image_size: Tuple[int, int]) -> np.ndarray:
+    """Whether each particle of (C,N,2) positions is inside all images."""
+    width, height = image_size
+    inside = (
+        np.isfinite(xy).all(axis=2)
+        & (xy[..., 0] >= 0)
+        & (xy[..., 0] <= width - 1)
+        & (xy[..., 1] >= 0)
+        & (xy[..., 1] <= height - 1)
+    )
+    return inside.all(axis=0)
+
+
+def _sample_visible(
+    num: int, low: np.ndarray, high: np.ndarray, cpar, cals, image_size, rng
+) -> np.ndarray:
+    """Random positions in the box that all cameras see."""
+    found: List[np.ndarray] = []
+    num_found = 0
+    for _ in range(MAX_SAMPLING_ROUNDS):
+        if num_found >= num:
+            break
+        candidates = rng.uniform(low, high, size=(2 * (num - num_found) + 16, 3))
+        visible = candidates[_visible(project_points(candidates, cpar, cals), image_size)]
+        found.append(visible)
+        num_found += len(visible)
+    if num_found < num:
+        raise RuntimeError(
+            "Could not place particles seen by all cameras; check criteria.X_lay/Zmin_lay/Zmax_lay"
+        )
+    return np.concatenate(found)[:num]
+
+
+def render_particles(
+    xy: np.ndarray,
+    image_size: Tuple[int, int],
+    sigma: float,
+    peak: float,
+    noise: float = 0.0,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Render Gaussian spots at (N,2) pixel positions into an 8-bit image.
+
+    Pixel (row, col) has its center at x = col + 0.5, y = row + 0.5, the
+    convention of the target positions of optv. Overlapping spots add up and
+    saturate at 255.
+    """
+    width, height = image_size
+    radius = int(np.ceil(3 * sigma))
+    offsets = np.arange(-radius, radius + 1)
+    # Positions in pixel index units
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2) - 0.5
+
+    px = np.rint(xy[:, 0]).astype(np.int64)[:, None, None] + offsets[None, None, :]
+    py = np.rint(xy[:, 1]).astype(np.int64)[:, None, None] + offsets[None, :, None]
+    dist2 = (px - xy[:, 0, None, None]) ** 2 + (py - xy[:, 1, None, None]) ** 2
+    values = peak * np.exp(-dist2 / (2 * sigma**2))
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    inside = np.broadcast_to(inside, values.shape)
+    flat = np.broadcast_to(py * width + px, values.shape)
+
+    img = np.bincount(flat[inside], weights=values[inside], minlength=width * height)
+    if noise > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        img = img + rng.normal(0.0, noise, size=img.shape)
+    return np.clip(np.rint(img), 0, 255).astype(np.uint8).reshape(height, width)
+
+
+def _synthetic_parameters(
+    source: ParameterManager, num_cams: int, image_size: Tuple[int, int], spec: SyntheticSpec
+) -> dict:
+    """Parameters of the synthetic experiment, derived from the source."""
+    params = copy.deepcopy(source.parameters)
+    cam_names = [f"cam{cam + 1}" for cam in range(num_cams)]
+    last_frame = spec.first_frame + spec.num_frames - 1
+
+    params["num_cams"] = num_cams
+    ptv_params = params["ptv"]
+    ptv_params["imx"], ptv_params["imy"] = int(image_size[0]), int(image_size[1])
+    ptv_params["img_cal"] = [f"cal/{name}" for name in cam_names]
+    ptv_params["img_name"] = [f"img/{name}.{spec.first_frame}" for name in cam_names]
+    ptv_params["splitter"] = False
+    params["cal_ori"]["img_cal_name"] = [f"cal/{name}" for name in cam_names]
+    params["cal_ori"]["img_ori"] = [f"cal/{name}.ori" for name in cam_names]
+    params["sequence"] = {
+        "base_name": [f"img/{name}.%d" for name in cam_names],
+        "first": spec.first_frame,
+        "last": last_frame,
+    }
+    params.setdefault("pft_version", {})["Existing_Target"] = 0
+    params["masking"] = {"mask_flag": False, "mask_base_name": ""}
+    gvthres = list(params["targ_rec"]["gvthres"])
+    params["targ_rec"]["gvthres"] = (gvthres + gvthres[-1:] * num_cams)[:num_cams]
+    return params
+
+
+def generate_synthetic_experiment(
+    source_yaml: Path, out_dir: Path, spec: Optional[SyntheticSpec] = None
+) -> dict:
+    """Generate a synthetic experiment with the calibration of ``source_yaml``.
+
+    Args:
+        source_yaml: Parameters of an experiment whose calibration is used
+        out_dir: Directory of the new experiment (created)
+        spec: What to generate; None uses SyntheticSpec()
+
+    Returns:
+        Summary with the YAML path, frame range, image size and particle counts.
+    """
+    spec = spec if spec is not None else SyntheticSpec()
+    source_yaml = Path(source_yaml).resolve()
+    out_dir = Path(out_dir)
+    if spec.num_particles < 1 or spec.num_frames < 1:
+        raise ValueError("num_particles and num_frames must be >= 1")
+
+    source = ParameterManager()
+    source.from_yaml(source_yaml)
+    num_cams = spec.num_cams if spec.num_cams is not None else int(source.num_cams)
+    if not 1 <= num_cams <= source.num_cams:
+        raise ValueError(f"num_cams must be between 1 and {source.num_cams}, got {num_cams}")
+    image_size = spec.image_size or (
+        int(source.parameters["ptv"]["imx"]),
+        int(source.parameters["ptv"]["imy"]),
+    )
+
+    for sub in ("cal", "img", "res"):
+        (out_dir / sub).mkdir(parents=True, exist_ok=True)
+    img_ori = source.parameters["cal_ori"]["img_ori"]
+    for cam in range(num_cams):
+        ori = Path(img_ori[cam])
+        if not ori.is_absolute():
+            ori = source_yaml.parent / ori
+        shutil.copyfile(ori, out_dir / "cal" / f"cam{cam + 1}.ori")
+        shutil.copyfile(
+            str(ori).replace(".ori", ".addpar"), out_dir / "cal" / f"cam{cam + 1}.addpar"
+        )
+
+    pm = ParameterManager()
+    pm.parameters = _synthetic_parameters(source, num_cams, image_size, spec)
+    pm.num_cams = num_cams
+    yaml_path = out_dir / YAML_NAME
+    pm.to_yaml(yaml_path)
+    pm.from_yaml(yaml_path)
+    cpar, cals = load_ground_truth_cameras(yaml_path, pm)
+
+    rng = np.random.default_rng(spec.seed)
+    low, high = _volume_bounds(pm.parameters["criteria"])
+    num = spec.num_particles
+    xyz = _sample_visible(num, low, high, cpar, cals, image_size, rng)
+    velocity = rng.normal(0.0, spec.step, size=(num, 3))
+    ids = np.arange(num)
+    next_id = num
+
+    frames = np.arange(spec.first_frame, spec.first_frame + spec.num_frames)
+    all_ids = np.empty((spec.num_frames, num), dtype=np.int64)
+    all_xyz = np.empty((spec.num_frames, num, 3))
+    all_xy = np.empty((spec.num_frames, num_cams, num, 2))
+    replaced = 0
+    for i, frame in enumerate(frames):
+        if i > 0:
+            velocity += rng.normal(0.0, spec.acceleration, size=velocity.shape)
+            xyz = xyz + velocity
+        xy = project_points(xyz, cpar, cals)
+        lost = ~(_visible(xy, image_size) & (xyz >= low).all(axis=1) & (xyz <= high).all(axis=1))
+        num_lost = int(lost.sum())
+        if num_lost:
+            xyz[lost] = _sample_visible(num_lost, low, high, cpar, cals, image_size, rng)
+            velocity[lost] = rng.normal(0.0, spec.step, size=(num_lost, 3))
+            ids[lost] = np.arange(next_id, next_id + num_lost)
+            next_id += num_lost
+            replaced += num_lost
+            xy[:, lost] = project_points(xyz[lost], cpar, cals)
+
+        all_ids[i], all_xyz[i], all_xy[i] = ids, xyz, xy
+        for cam in range(num_cams):
+            img = render_particles(
+                xy[cam], image_size, spec.particle_sigma, spec.peak_grey, spec.noise_grey, rng
+            )
+            imwrite(out_dir / "img" / f"cam{cam + 1}.{frame}", img, extension=".tif")
+
+    np.savez_compressed(
+        out_dir / GROUND_TRUTH_FILE, frames=frames, ids=all_ids, xyz=all_xyz, xy=all_xy
+    )
+    return {
+        "yaml": str(yaml_path),
+        "first": int(frames[0]),
+        "last": int(frames[-1]),
+        "num_cams": num_cams,
+        "image_size": tuple(image_size),
+        "num_particles": num,
+        "replaced_particles": replaced,
+    }
+
+
+def load_ground_truth(exp_dir: Path) -> dict:
+    """Arrays of ``ground_truth.npz``: frames, ids, xyz and xy."""
+    with np.load(Path(exp_dir) / GROUND_TRUTH_FILE) as data:
+        return {key: data[key] for key in data.files}
+
+
+def evaluate_positions(
+    exp_dir: Path, tolerance: float = 0.2, frames: Optional[Sequence[int]] = None
+) -> List[dict]:
+    """Compare ``res/rt_is.<frame>`` with the true particle positions.
+
+    A true particle is found if a 3D position lies within ``tolerance`` mm.
+
+    Returns:
+        Per frame: number of true and reconstructed particles, recall (found
+        / true), precision (reconstructed near a true particle /
+        reconstructed) and RMS error of the found particles in mm.
+    """
+    exp_dir = Path(exp_dir)
+    truth = load_ground_truth(exp_dir)
+    results = []
+    for i, frame in enumerate(truth["frames"]):
+        if frames is not None and frame not in frames:
+            continue
+        rt_is = exp_dir / "res" / f"rt_is.{frame}"
+        if not rt_is.exists():
+            continue
+        data = read_rt_is(rt_is)
+        positions = np.column_stack([data["x"], data["y"], data["z"]])
+        true_xyz = truth["xyz"][i]
+        found = np.zeros(len(true_xyz), dtype=bool)
+        errors = np.empty(0)
+        precise = 0
+        if len(positions):
+            dist, _ = cKDTree(positions).query(true_xyz, distance_upper_bound=tolerance)
+            found = np.isfinite(dist)
+            errors = dist[found]
+            dist_back, _ = cKDTree(true_xyz).query(positions, distance_upper_bound=tolerance)
+            precise = int(np.isfinite(dist_back).sum())
+        results.append(
+            {
+                "frame": int(frame),
+                "true": len(true_xyz),
+                "reconstructed": len(positions),
+                "recall": float(found.mean()),
+                "precision": precise / len(positions) if len(positions) else 0.0,
+                "rms_error": float(np.sqrt(np.mean(errors**2))) if len(errors) else float("nan"),
+            }
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic experiments and evaluate their processing."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Generate a synthetic experiment")
+    generate.add_argument("source_yaml", type=Path, help="Parameters of the experiment whose calibration is used")
+    generate.add_argument("out_dir", type=Path, help="Directory of the new experiment")
+    generate.add_argument("--particles", type=int, default=1000, help="Particles per frame (default: 1000)")
+    generate.add_argument("--frames", type=int, default=5, help="Number of frames (default: 5)")
+    generate.add_argument("--first", type=int, default=10000, help="First frame number (default: 10000)")
+    generate.add_argument("--cams", type=int, default=None, help="Number of cameras (default: all of the source)")
+    generate.add_argument("--image-size", type=int, nargs=2, default=None, metavar=("W", "H"), help="Image size in pixels (default: that of the source)")
+    generate.add_argument("--step", type=float, default=0.3, help="RMS displacement per frame and axis in mm (default: 0.3)")
+    generate.add_argument("--sigma", type=float, default=1.2, help="Size of the particle spots in pixels (default: 1.2)")
+    generate.add_argument("--noise", type=float, default=0.0, help="Image noise in grey values (default: 0)")
+    generate.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+    evaluate = commands.add_parser("evaluate", help="Compare res/rt_is files with the ground truth")
+    evaluate.add_argument("exp_dir", type=Path)
+    evaluate.add_argument("--tolerance", type=float, default=0.2, help="Match distance in mm (default: 0.2)")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        spec = SyntheticSpec(
+            num_particles=args.particles,
+            num_frames=args.frames,
+            first_frame=args.first,
+            num_cams=args.cams,
+            image_size=tuple(args.image_size) if args.image_size else None,
+            step=args.step,
+            acceleration=0.1 * args.step,
+            particle_sigma=args.sigma,
+            noise_grey=args.noise,
+            seed=args.seed,
+        )
+        summary = generate_synthetic_experiment(args.source_yaml, args.out_dir, spec)
+        print(
+            f"Wrote {summary['num_particles']} particles x {args.frames} frames x "
+            f"{summary['num_cams']} cameras ({summary['image_size'][0]}x{summary['image_size'][1]}) "
+            f"to {args.out_dir}; process with: python -m pyptv.pyptv_batch {summary['yaml']} "
+            f"{summary['first']} {summary['last']}"
+        )
+        return 0
+
+    results = evaluate_positions(args.exp_dir, args.tolerance)
+    if not results:
+        print(f"No res/rt_is files in {args.exp_dir}")
+        return 1
+    print(f"{'frame':>8} {'true':>7} {'found':>7} {'recall':>7} {'precision':>9} {'rms mm':>8}")
+    for r in results:
+        print(
+            f"{r['frame']:>8} {r['true']:>7} {r['reconstructed']:>7} {r['recall']:>7.3f} "
+            f"{r['precision']:>9.3f} {r['rms_error']:>8.4f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,260 @@
+"""Per-stage timing of batch runs.
+
+With timing enabled (``--timing`` of ``pyptv_batch``, ``pyptv_batch_parallel``
+and ``pyptv_batch_plugins``) the wall time of every processing stage of every
+frame and camera is recorded and written to ``res/timing.jsonl``, one JSON
+line per stage::
+
+    {"frame": 10000, "cam": 0, "stage": "target_recognition", "seconds": 0.0121, "count": 1021, "pid": 4242}
+
+``cam`` is null for stages that work on the whole frame, ``frame`` is null for
+stages of the whole run (tracking, plugins), and ``count`` is the number of
+targets, correspondences or particles the stage produced, where that
+applies. ``pid`` tells the workers of a parallel run apart. At the end of the
+run a summary table is printed; ``python -m pyptv.timing res/timing.jsonl``
+prints it again from the file.
+
+Timing is off unless asked for: the processing functions then get
+``NULL_TIMER``, whose ``stage()`` returns one shared context manager that does
+nothing, so no clock is read and nothing is stored.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+TIMING_FILE = Path("res") / "timing.jsonl"
+
+# Stages in processing order, for the summary table
+STAGES = (
+    "imread",  # decoding one camera image
+    "prefetch_wait",  # waiting for the prefetched images of a frame
+    "warm_up",  # rolling background over the frames before a gap
+    "read_targets",  # reading existing _targets (Existing_Target)
+    "negative",
+    "mask",  # background subtraction
+    "highpass",
+    "target_recognition",
+    "detect_wait",  # waiting for the camera pool to detect a frame
+    "matched_coords",
+    "correspondences",
+    "point_positions",
+    "write_targets",
+    "write_rt_is",
+    "write_store",
+    "tracking",
+    "sequence_plugin",
+    "tracking_plugin",
+)
+
+PathLike = Union[str, os.PathLike]
+
+
+class _Stage:
+    """Context manager timing one stage; set ``count`` inside the block."""
+
+    __slots__ = ("_timer", "_name", "_frame", "_cam", "_start", "count")
+
+    def __init__(self, timer: "StageTimer", name: str, frame: Optional[int], cam: Optional[int]):
+        self._timer = timer
+        self._name = name
+        self._frame = frame
+        self._cam = cam
+        self.count: Optional[int] = None
+
+    def __enter__(self) -> "_Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._timer.add(
+            self._name, time.perf_counter() - self._start, self._frame, self._cam, self.count
+        )
+
+
+class _NullStage:
+    """Stage of NULL_TIMER: times and stores nothing."""
+
+    __slots__ = ()
+
+    @property
+    def count(self) -> None:
+        return None
+
+    @count.setter
+    def count(self, value) -> None:
+        pass
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageTimer:
+    """Collect the wall time of processing stages.
+
+    Example:
+        >>> timer = StageTimer()
+        >>> timer.frame = 10000
+        >>> with timer.stage("target_recognition", cam=0) as stage:
+        ...     targs = target_recognition(img, tpar, 0, cpar)
+        ...     stage.count = len(targs)
+
+    Attributes:
+        frame: Frame of the stages that are not given one explicitly
+        records: Timing records, see the module docstring
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.frame: Optional[int] = None
+        self.records: List[dict] = []
+        self._pid = os.getpid()
+
+    def stage(self, name: str, frame: Optional[int] = None, cam: Optional[int] = None) -> _Stage:
+        """Time the ``with`` block as stage ``name``."""
+        return _Stage(self, name, self.frame if frame is None else frame, cam)
+
+    def add(
+        self,
+        name: str,
+        seconds: float,
+        frame: Optional[int] = None,
+        cam: Optional[int] = None,
+        count: Optional[int] = None,
+    ) -> None:
+        """Record a stage timed by the caller."""
+        self.records.append(
+            {
+                "frame": self.frame if frame is None else frame,
+                "cam": cam,
+                "stage": name,
+                "seconds": seconds,
+                "count": count,
+                "pid": self._pid,
+            }
+        )
+
+    def extend(self, records: Iterable[dict]) -> None:
+        """Add records of another timer, e.g. of a worker, to the current frame."""
+        for record in records:
+            if record["frame"] is None:
+                record = dict(record, frame=self.frame)
+            self.records.append(record)
+
+    def write(self, path: PathLike = TIMING_FILE, append: bool = False) -> None:
+        """Write the records as JSON lines.
+
+        With ``append`` the records are added in a single write, so that the
+        workers of a parallel run can share one file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(json.dumps(record) + "\n" for record in self.records)
+        with open(path, "a" if append else "w", encoding="utf-8") as f:
+            f.write(lines)
+
+    def total(self, name: str) -> float:
+        """Seconds recorded for stage ``name``, over all frames and cameras."""
+        return sum(record["seconds"] for record in self.records if record["stage"] == name)
+
+    def summary(self, wall_time: Optional[float] = None) -> str:
+        return format_summary(self.records, wall_time)
+
+
+class _NullTimer(StageTimer):
+    """Timer that records nothing, see NULL_TIMER."""
+
+    enabled = False
+
+    def stage(self, name: str, frame: Optional[int] = None, cam: Optional[int] = None) -> _NullStage:
+        return _NULL_STAGE
+
+    def add(self, name, seconds, frame=None, cam=None, count=None) -> None:
+        pass
+
+    def extend(self, records: Iterable[dict]) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def make_timer(enabled: bool) -> StageTimer:
+    """A new StageTimer, or NULL_TIMER if timing is disabled."""
+    return StageTimer() if enabled else NULL_TIMER
+
+
+def read_timing(path: PathLike = TIMING_FILE) -> List[dict]:
+    """Read the records of a timing file."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A worker killed mid-write may leave a truncated line
+                continue
+    return records
+
+
+def format_summary(records: Sequence[dict], wall_time: Optional[float] = None) -> str:
+    """Table of the calls, time and counts of every stage.
+
+    The share column is relative to ``wall_time`` if given, otherwise to the
+    time of all stages together.
+    """
+    seconds: Dict[str, List[float]] = defaultdict(list)
+    counts: Dict[str, int] = defaultdict(int)
+    for record in records:
+        seconds[record["stage"]].append(record["seconds"])
+        if record.get("count") is not None:
+            counts[record["stage"]] += record["count"]
+
+    frames = {record["frame"] for record in records if record["frame"] is not None}
+    stages = [stage for stage in STAGES if stage in seconds]
+    stages += sorted(stage for stage in seconds if stage not in STAGES)
+    total = wall_time if wall_time else sum(sum(times) for times in seconds.values())
+
+    lines = [
+        f"Timing of {len(frames)} frames"
+        + (f", wall time {wall_time:.3f} s" if wall_time else ""),
+        f"{'stage':<20} {'calls':>7} {'total s':>10} {'mean ms':>9} {'max ms':>9} {'share':>7} {'count':>9}",
+    ]
+    for stage in stages:
+        times = seconds[stage]
+        stage_total = sum(times)
+        share = 100.0 * stage_total / total if total else 0.0
+        count = str(counts[stage]) if stage in counts else ""
+        lines.append(
+            f"{stage:<20} {len(times):>7} {stage_total:>10.3f} "
+            f"{1000 * stage_total / len(times):>9.2f} {1000 * max(times):>9.2f} "
+            f"{share:>6.1f}% {count:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Print the per-stage summary of a timing file written with --timing."
+    )
+    parser.add_argument("timing_file", nargs="?", default=str(TIMING_FILE))
+    args = parser.parse_args(argv)
+    print(format_summary(read_timing(args.timing_file)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
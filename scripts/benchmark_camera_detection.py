@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Benchmark per-camera concurrent detection in the sequence loop.
+
+Runs `ptv.py_sequence_loop` on a temporary copy of an experiment (by default
+`tests/test_cavity`) sequentially and with `camera_workers` on thread and
+process pools, and prints the per-frame wall time and speedup of each mode.
+
+Example:
+  python scripts/benchmark_camera_detection.py --workers 4 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from pyptv import ptv
+from pyptv.experiment import Experiment
+
+DEFAULT_YAML = Path(__file__).resolve().parent.parent / "tests" / "test_cavity" / "parameters_Run1.yaml"
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("yaml", type=Path, nargs="?", default=DEFAULT_YAML, help="Path to parameters_*.yaml")
+    p.add_argument("--workers", type=int, default=None, help="Camera workers (default: num_cams)")
+    p.add_argument("--repeat", type=int, default=3, help="Repetitions per mode; the best time is reported")
+    return p.parse_args()
+
+
+def _processing_experiment(yaml_file: Path) -> Experiment:
+    experiment = Experiment()
+    experiment.pm.from_yaml(yaml_file)
+    (experiment.cpar, experiment.spar, experiment.vpar, experiment.track_par,
+     experiment.tpar, experiment.cals, experiment.epar) = ptv.py_start_proc_c(experiment.pm)
+    experiment.num_cams = experiment.pm.num_cams
+    experiment.target_filenames = experiment.pm.get_target_filenames()
+    return experiment
+
+
+def _time_sequence(yaml_file: Path, repeat: int, **options) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        experiment = _processing_experiment(yaml_file)
+        start = time.perf_counter()
+        ptv.py_sequence_loop(experiment, **options)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    ns = _parse_args()
+    source = ns.yaml.resolve()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exp_dir = Path(tmp) / source.parent.name
+        shutil.copytree(source.parent, exp_dir, ignore=shutil.ignore_patterns("res", "*_targets"))
+        yaml_file = exp_dir / source.name
+        original_cwd = Path.cwd()
+        os.chdir(exp_dir)
+        try:
+            experiment = _processing_experiment(yaml_file)
+            num_frames = experiment.spar.get_last() - experiment.spar.get_first() + 1
+            workers = ns.workers or experiment.num_cams
+
+            modes = {
+                "sequential": {},
+                f"thread x{workers}": {"camera_workers": workers, "camera_pool": "thread"},
+                f"process x{workers}": {"camera_workers": workers, "camera_pool": "process"},
+            }
+            results = {
+                name: _time_sequence(yaml_file, ns.repeat, **options)
+                for name, options in modes.items()
+            }
+        finally:
+            os.chdir(original_cwd)
+
+    baseline = results["sequential"]
+    print(f"\n{num_frames} frames, {experiment.num_cams} cameras, {os.cpu_count()} CPUs")
+    print(f"{'mode':<16} {'total [s]':>10} {'per frame [ms]':>15} {'speedup':>8}")
+    for name, elapsed in results.items():
+        print(
+            f"{name:<16} {elapsed:>10.3f} {1000 * elapsed / num_frames:>15.1f} "
+            f"{baseline / elapsed:>8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark writing and reading rt_is files.
+
+Compares the per-line writer (one ``%`` operation per point) and
+`ptv.read_rt_is_file` with the vectorized `rt_is.write_rt_is` and
+`rt_is.read_rt_is` on random points, and checks that both writers produce
+identical files.
+
+Example:
+  python scripts/benchmark_rt_is_io.py --points 20000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pyptv import ptv
+from pyptv.rt_is import RT_IS_LINE_FORMAT, read_rt_is, write_rt_is
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--points", type=int, default=20000, help="Number of 3D points")
+    p.add_argument("--repeat", type=int, default=5, help="Repetitions; the best time is reported")
+    return p.parse_args()
+
+
+def _write_per_line(path: Path, pos: np.ndarray, corresp: np.ndarray) -> None:
+    with open(path, "w", encoding="utf-8") as rt_is:
+        rt_is.write(str(pos.shape[0]) + "\n")
+        for pix, pt in enumerate(pos):
+            pt_args = (pix + 1,) + tuple(pt) + tuple(corresp[:, pix])
+            rt_is.write(RT_IS_LINE_FORMAT % pt_args)
+
+
+def _best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    ns = _parse_args()
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(-100.0, 100.0, (ns.points, 3))
+    corresp = rng.integers(-1, 5000, (4, ns.points))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_file = Path(tmp) / "rt_is.legacy"
+        new_file = Path(tmp) / "rt_is.new"
+        results = {
+            "write per line": _best_time(lambda: _write_per_line(legacy_file, pos, corresp), ns.repeat),
+            "write_rt_is": _best_time(lambda: write_rt_is(new_file, pos, corresp), ns.repeat),
+            "read_rt_is_file": _best_time(lambda: ptv.read_rt_is_file(legacy_file), ns.repeat),
+            "read_rt_is": _best_time(lambda: read_rt_is(new_file), ns.repeat),
+        }
+        identical = legacy_file.read_bytes() == new_file.read_bytes()
+
+    print(f"\n{ns.points} points, files identical: {identical}")
+    print(f"{'operation':<16} {'time [ms]':>10} {'speedup':>8}")
+    for name, baseline in (("write_rt_is", "write per line"), ("read_rt_is", "read_rt_is_file")):
+        for label in (baseline, name):
+            print(f"{label:<16} {1000 * results[label]:>10.1f} {results[baseline] / results[label]:>8.2f}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
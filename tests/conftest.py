@@ -31,6 +31,14 @@ def clean_test_environment(test_data_dir):
         shutil.rmtree(results_dir)
 
 
+@pytest.fixture
+def cavity_copy(tmp_path, test_data_dir):
+    """Copy of test_cavity in a temporary directory"""
+    exp_dir = tmp_path / "test_cavity"
+    shutil.copytree(test_data_dir, exp_dir, ignore=shutil.ignore_patterns("res", "*_targets"))
+    return exp_dir
+
+
 def pytest_runtest_setup(item):
     if 'qt' in item.keywords:
         try:
@@ -15,7 +15,7 @@ import logging
 
 # Import our improved pyptv_batch_parallel components
 from pyptv.pyptv_batch_parallel import (
-    chunk_ranges,
+    BlockScheduler,
     validate_experiment_directory, 
     ProcessingError,
     logger
@@ -38,6 +38,14 @@ def create_test_experiment_directory():
     logger.info(f"Created test experiment directory: {exp_path}")
     return exp_path, temp_dir
 
+def chunk_ranges(first, last, n_processes):
+    """All the blocks a BlockScheduler hands out before any block is timed."""
+    scheduler = BlockScheduler(first, last, n_processes)
+    ranges = []
+    while (block := scheduler.next_block()) is not None:
+        ranges.append(block)
+    return ranges
+
 def demonstrate_chunk_ranges():
     """Demonstrate frame range chunking functionality."""
     logger.info("=== Demonstrating Frame Range Chunking ===")
@@ -51,13 +59,13 @@ def demonstrate_chunk_ranges():
     
     for first, last, n_processes in test_cases:
         total_frames = last - first + 1
-        logger.info(f"Chunking {total_frames} frames ({first}-{last}) into {n_processes} processes:")
+        logger.info(f"Blocks of {total_frames} frames ({first}-{last}) for {n_processes} processes:")
         
         try:
             ranges = chunk_ranges(first, last, n_processes)
             for i, (chunk_first, chunk_last) in enumerate(ranges):
                 chunk_size = chunk_last - chunk_first + 1
-                logger.info(f"  Process {i+1}: frames {chunk_first}-{chunk_last} ({chunk_size} frames)")
+                logger.info(f"  Block {i+1}: frames {chunk_first}-{chunk_last} ({chunk_size} frames)")
         except Exception as e:
             logger.error(f"  Error: {e}")
         
@@ -141,11 +149,11 @@ def simulate_parallel_processing():
             ranges = chunk_ranges(seq_first, seq_last, n_processes)
             logger.info(f"  Total frames: {total_frames}")
             logger.info(f"  Processes: {n_processes}")
-            logger.info(f"  Chunks: {len(ranges)}")
+            logger.info(f"  Blocks: {len(ranges)}")
             
             for i, (chunk_first, chunk_last) in enumerate(ranges):
                 chunk_size = chunk_last - chunk_first + 1
-                logger.info(f"    Process {i+1}: {chunk_first}-{chunk_last} ({chunk_size} frames)")
+                logger.info(f"    Block {i+1}: {chunk_first}-{chunk_last} ({chunk_size} frames)")
         
         logger.info("\n✓ Simulated processing setup completed")
         
@@ -0,0 +1,51 @@
+"""Tests for the stage-level benchmark suite"""
+
+from pyptv.benchmark import (
+    compare_results,
+    format_comparison,
+    load_results,
+    main,
+    run_benchmarks,
+    save_results,
+)
+
+
+def _results(**medians):
+    return {
+        "environment": {},
+        "results": {name: {"median": m, "min": m, "repeat": 1} for name, m in medians.items()},
+    }
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = _results(a=1.0, b=1.0, c=1.0)
+    current = _results(a=1.1, b=1.5, d=2.0)
+    rows = compare_results(baseline, current, threshold=0.2)
+    assert [(r["name"], r["regression"]) for r in rows] == [("a", False), ("b", True)]
+    assert format_comparison(rows, 0.2).splitlines()[-1].startswith("1 of 2 benchmarks")
+
+    save_results(tmp_path / "baseline.json", baseline)
+    save_results(tmp_path / "current.json", current)
+    assert load_results(tmp_path / "current.json") == current
+    assert main(["compare", str(tmp_path / "baseline.json"), str(tmp_path / "current.json")]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert main(["compare", str(tmp_path / "baseline.json"), str(tmp_path / "baseline.json")]) == 0
+
+
+def test_run_benchmarks(test_data_dir, tmp_path):
+    results = run_benchmarks(
+        test_data_dir / "parameters_Run1.yaml",
+        particles=[100],
+        repeat=1,
+        only=["*/target_recognition", "*/tracking", "test_cavity/full_scipy_calibration"],
+        work_dir=tmp_path,
+    )
+    assert sorted(results["results"]) == [
+        "synthetic-100/target_recognition",
+        "synthetic-100/tracking",
+        "test_cavity/full_scipy_calibration",
+        "test_cavity/target_recognition",
+        "test_cavity/tracking",
+    ]
+    assert all(r["median"] > 0 and r["repeat"] == 1 for r in results["results"].values())
+    assert results["environment"]["cpu_count"]
@@ -0,0 +1,88 @@
+"""Tests for concurrent per-camera detection"""
+
+import shutil
+
+import numpy as np
+import pytest
+
+from optv.tracking_framebuf import TargetArray
+
+from pyptv import ptv
+from pyptv.camera_pool import CameraDetectionPool
+from pyptv.processing_context import ProcessingContext
+
+
+def _processing_experiment(exp_dir):
+    return ProcessingContext(exp_dir / "parameters_Run1.yaml", 10000, 10002)
+
+
+def _collect_outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("rt_is.*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    outputs = {f.name: f.read_bytes() for f in files}
+    shutil.rmtree(exp_dir / "res")
+    for f in files:
+        f.unlink(missing_ok=True)
+    return outputs
+
+
+def test_targets_array_roundtrip():
+    targs = TargetArray(2)
+    for tix, (x, y) in enumerate([(10.25, 20.5), (30.0, 40.75)]):
+        targs[tix].set_pnr(tix)
+        targs[tix].set_pos([x, y])
+        targs[tix].set_pixel_counts(12 + tix, 4, 5)
+        targs[tix].set_sum_grey_value(300 + tix)
+        targs[tix].set_tnr(-1)
+
+    arr = ptv.targets_to_array(targs)
+    assert arr.dtype == ptv.TARGET_DTYPE
+    np.testing.assert_array_equal(arr["x"], [10.25, 30.0])
+
+    restored = ptv.array_to_targets(arr)
+    assert len(restored) == 2
+    for orig, new in zip(targs, restored):
+        assert orig.pnr() == new.pnr()
+        assert orig.pos() == new.pos()
+        assert orig.count_pixels() == new.count_pixels()
+        assert orig.sum_grey_value() == new.sum_grey_value()
+        assert orig.tnr() == new.tnr()
+
+    assert len(ptv.array_to_targets(ptv.targets_to_array(TargetArray(0)))) == 0
+
+
+def test_camera_pool_invalid_arguments():
+    kwargs = dict(
+        cpar=None, tpar=None, ptv_params={}, targ_rec_params={},
+        masking_params=None, num_cams=4,
+    )
+    with pytest.raises(ValueError, match="camera workers"):
+        CameraDetectionPool(0, **kwargs)
+    with pytest.raises(ValueError, match="Unknown camera pool kind"):
+        CameraDetectionPool(2, kind="gpu", **kwargs)
+
+
+@pytest.mark.parametrize("camera_pool", ["thread", "process"])
+def test_sequence_loop_camera_workers_match_serial(cavity_copy, camera_pool):
+    """Detection fanned out over cameras must give identical files"""
+    ptv.py_sequence_loop(_processing_experiment(cavity_copy))
+    serial = _collect_outputs(cavity_copy)
+    assert len(serial) == 3 + 3 * 4
+
+    ptv.py_sequence_loop(
+        _processing_experiment(cavity_copy),
+        camera_workers=2,
+        camera_pool=camera_pool,
+    )
+    assert _collect_outputs(cavity_copy) == serial
+
+
+def test_sequence_loop_camera_workers_with_prefetch(cavity_copy):
+    ptv.py_sequence_loop(_processing_experiment(cavity_copy))
+    serial = _collect_outputs(cavity_copy)
+
+    ptv.py_sequence_loop(
+        _processing_experiment(cavity_copy), prefetch_depth=2, camera_workers=4
+    )
+    assert _collect_outputs(cavity_copy) == serial
@@ -5,12 +5,12 @@ from pathlib import Path
 
 from skimage import img_as_ubyte
 from skimage import filters, measure, morphology
-from skimage.color import rgb2gray, label2rgb
+from skimage.color import label2rgb
 from skimage.morphology import binary_erosion, binary_dilation, disk
 
 from optv.correspondences import correspondences, MatchedCoords
-from optv.tracker import default_naming
 from optv.orientation import point_positions
+from pyptv.preprocessing import as_uint8_gray
 
 import matplotlib.pyplot as plt
 
@@ -29,12 +29,7 @@ def mask_image(imname: Path, display: bool = False) -> np.ndarray:
         The masked image.
     """
 
-    img = imread(imname)
-    if img.ndim > 2:
-        img = rgb2gray(img)
-
-    if img.dtype != np.uint8:
-        img = img_as_ubyte(img)
+    img = as_uint8_gray(imread(imname))
 
     # Apply Gaussian filter to smooth the image
     smoothed_frame = filters.gaussian(img, sigma=5)
@@ -290,7 +285,9 @@ class Sequence:
                 print_corresp = sorted_corresp
 
             # Save rt_is
-            rt_is_filename = default_naming["corres"]
+            rt_is_filename = self.ptv.result_naming(
+                self.ptv.experiment_root(self.exp)
+            )["corres"].decode()
             rt_is_filename = rt_is_filename + f".{frame}"
             with open(rt_is_filename, "w", encoding="utf8") as rt_is:
                 rt_is.write(str(pos.shape[0]) + "\n")
@@ -5,7 +5,6 @@ from pathlib import Path
 
 
 from optv.correspondences import correspondences, MatchedCoords
-from optv.tracker import default_naming
 from optv.orientation import point_positions
 
 import matplotlib.pyplot as plt
@@ -203,7 +202,9 @@ class Sequence:
                 print_corresp = sorted_corresp
 
             # Save rt_is
-            rt_is_filename = default_naming["corres"]
+            rt_is_filename = self.ptv.result_naming(
+                self.ptv.experiment_root(self.exp)
+            )["corres"].decode()
             rt_is_filename = rt_is_filename + f".{frame}"
             with open(rt_is_filename, "w", encoding="utf8") as rt_is:
                 rt_is.write(str(pos.shape[0]) + "\n")
@@ -212,6 +213,8 @@ class Sequence:
                     rt_is.write("%4d %9.3f %9.3f %9.3f %4d %4d %4d %4d\n" % pt_args)
 
         # After processing all frames, save the areas data
-        output_file = Path("res/mask_areas.csv")
+        output_file = self.ptv.resolve_path(
+            self.ptv.experiment_root(self.exp), "res/mask_areas.csv"
+        )
         save_mask_areas(self.areas_data, output_file)
         print(f"Mask areas saved to {output_file}")
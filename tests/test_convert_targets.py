@@ -0,0 +1,121 @@
+"""Tests for the binary targets format and its converter"""
+
+import os
+
+import pytest
+import yaml
+
+from optv.tracking_framebuf import TargetArray
+
+from pyptv import ptv
+from pyptv.convert_targets import convert_experiment_targets, main as convert_main
+
+
+def _targets(positions):
+    targs = TargetArray(len(positions))
+    for tix, (x, y) in enumerate(positions):
+        targs[tix].set_pnr(tix)
+        targs[tix].set_pos([x, y])
+        targs[tix].set_pixel_counts(10 + tix, 3, 4)
+        targs[tix].set_sum_grey_value(500 + tix)
+        targs[tix].set_tnr(-1)
+    return targs
+
+
+def test_npy_roundtrip_replaces_text(tmp_path):
+    base = str(tmp_path / "cam1")
+    ptv.write_targets(_targets([(1.5, 2.25)]), base, 7)
+    assert ptv.stored_target_format(base, 7) == "text"
+
+    ptv.write_targets(_targets([(10.123456789, 20.5), (30.0, 40.0)]), base, 7, "npy")
+    assert not os.path.exists(ptv.target_filename(base, 7))
+    assert ptv.stored_target_format(base, 7) == "npy"
+
+    targs = ptv.read_targets(base, 7)
+    assert len(targs) == 2
+    assert targs[0].pos() == (10.123456789, 20.5)  # full precision
+    assert targs[1].sum_grey_value() == 501
+
+    ptv.write_targets(TargetArray(0), base, 8, "npy")
+    assert len(ptv.read_targets(base, 8)) == 0
+
+
+def test_text_array_writer_matches_write_targets(tmp_path):
+    base = str(tmp_path / "cam1")
+    ptv.write_targets(_targets([(1.23456, 2.5), (100.0, 0.00004)]), base, 3)
+    text = (tmp_path / "cam1.0003_targets").read_bytes()
+
+    arr = ptv.read_target_array(base, 3)
+    assert arr.dtype == ptv.TARGET_DTYPE
+    ptv.write_target_array(arr, str(tmp_path / "cam2"), 3)
+    assert (tmp_path / "cam2.0003_targets").read_bytes() == text
+
+
+def test_newer_format_wins_and_text_on_demand(tmp_path):
+    base = str(tmp_path / "cam1")
+    ptv.write_targets(_targets([(1.0, 2.0)]), base, 1, "npy")
+    assert ptv.ensure_text_targets([base], 1, 2) == 1
+    assert os.path.exists(ptv.target_filename(base, 1, "npy"))
+    targs = ptv.read_targets(base, 1)  # keep the array alive while using its targets
+    assert targs[0].pos() == (1.0, 2.0)
+
+    # The tracker rewrites the text file: it is newer and is read instead
+    text_file = ptv.target_filename(base, 1)
+    with open(text_file, "w", encoding="utf-8") as f:
+        f.write("1\n   0    5.0000    6.0000    10     3     4   500     3\n")
+    npy_stat = os.stat(ptv.target_filename(base, 1, "npy"))
+    os.utime(text_file, ns=(npy_stat.st_atime_ns, npy_stat.st_mtime_ns + 10**6))
+    assert ptv.stored_target_format(base, 1) == "text"
+    targs = ptv.read_targets(base, 1)
+    assert targs[0].tnr() == 3
+    assert ptv.ensure_text_targets([base], 1, 1) == 0
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match="Unknown targets format"):
+        ptv.write_targets(_targets([]), str(tmp_path / "cam1"), 1, "hdf5")
+
+
+def test_convert_experiment_both_ways(cavity_copy):
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    from pyptv.pyptv_batch import main
+
+    main(yaml_file, 10000, 10002, mode="sequence")
+    text_files = sorted((cavity_copy / "img").glob("*_targets"))
+    original = {f.name: f.read_bytes() for f in text_files}
+
+    assert convert_experiment_targets(yaml_file, "npy", 10000, 10002) == (12, 0)
+    assert not list((cavity_copy / "img").glob("*_targets"))
+    assert len(list((cavity_copy / "img").glob("*_targets.npy"))) == 12
+
+    assert convert_main([str(yaml_file), "10000", "10002", "--to", "text", "--keep"]) == 0
+    assert {f.name: f.read_bytes() for f in text_files} == original
+    assert len(list((cavity_copy / "img").glob("*_targets.npy"))) == 12
+
+
+def test_sequence_and_tracking_with_npy_targets(cavity_copy):
+    """Binary targets give the same correspondences and tracks as text ones"""
+    from pyptv.pyptv_batch import main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="both")
+    reference = {
+        f.name: f.read_bytes() for f in sorted((cavity_copy / "res").glob("*.1000*"))
+    }
+    for f in list((cavity_copy / "res").iterdir()) + list((cavity_copy / "img").glob("*_targets")):
+        f.unlink()
+
+    params = yaml.safe_load(yaml_file.read_text())
+    params["pft_version"]["targets_format"] = "npy"
+    yaml_file.write_text(yaml.safe_dump(params))
+    main(yaml_file, 10000, 10004, mode="sequence")
+    assert not list((cavity_copy / "img").glob("*_targets"))
+    assert len(list((cavity_copy / "img").glob("*_targets.npy"))) == 20
+
+    main(yaml_file, 10000, 10004, mode="tracking")
+    assert len(list((cavity_copy / "img").glob("*_targets"))) == 20
+    results = {
+        f.name: f.read_bytes() for f in sorted((cavity_copy / "res").glob("*.1000*"))
+    }
+    # The tracker reads text generated from the .npy files, identical to the text run
+    assert results == reference
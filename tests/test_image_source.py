@@ -0,0 +1,179 @@
+"""Tests for image stacks as sequence image sources"""
+
+import importlib.util
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tifffile
+
+from pyptv import ptv
+from pyptv.image_source import (
+    FileImageSource,
+    ImageSource,
+    SplitterImageSource,
+    StackImageSource,
+    image_paths,
+    image_split,
+    open_image_source,
+    open_stack,
+)
+from pyptv.parameter_manager import ParameterManager
+from pyptv.processing_context import ProcessingContext
+
+FRAMES = range(10000, 10005)
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(3, 6, 8), dtype=np.uint8)
+
+
+def test_stack_formats_are_mapped(tmp_path, frames):
+    np.save(tmp_path / "cam1.npy", frames)
+    (tmp_path / "cam1.raw").write_bytes(b"HEADER" + frames.tobytes())
+    tifffile.imwrite(tmp_path / "cam1.tif", frames)
+
+    for name, options in [
+        ("cam1.npy", {}),
+        ("cam1.raw", {"image_size": (8, 6), "header_bytes": 6}),
+        ("cam1.tif", {}),
+    ]:
+        source = StackImageSource([tmp_path / name], first_frame=100, **options)
+        img = source.read(0, 101)
+        np.testing.assert_array_equal(img, frames[1])
+        # A view into the mapped file, not a copy
+        assert isinstance(img.base, np.memmap) or isinstance(img, np.memmap)
+        assert source.paths(101) == [str(tmp_path / name)]
+        with pytest.raises(FileNotFoundError, match="holds frames 100 to 102"):
+            source.read(0, 103)
+
+
+def test_image_source_subclasses_must_read():
+    class NoReader(ImageSource):
+        num_cams = 1
+
+        def paths(self, frame):
+            return [f"cam1.{frame}"]
+
+    with pytest.raises(TypeError):
+        NoReader()
+
+
+def test_invalid_stacks(tmp_path, frames):
+    (tmp_path / "cam1.raw").write_bytes(frames.tobytes()[:-1])
+    with pytest.raises(ValueError, match="whole number"):
+        open_stack(tmp_path / "cam1.raw", image_size=(8, 6))
+    np.save(tmp_path / "cam1.npy", frames.astype(np.uint16))
+    with pytest.raises(ValueError, match="8-bit"):
+        open_stack(tmp_path / "cam1.npy")
+    with pytest.raises(FileNotFoundError):
+        open_stack(tmp_path / "cam2.npy")
+
+    with pytest.raises(ValueError, match="for all cameras or for none"):
+        open_image_source(["img/cam1.%d", "img/cam2.npy"], {}, {}, ptv.read_sequence_image)
+    source = open_image_source(["img/cam1.%d"], {}, {}, ptv.read_sequence_image)
+    assert isinstance(source, FileImageSource)
+    assert source.paths(7) == image_paths(["img/cam1.%d"], 7) == ["img/cam1.7"]
+
+
+def _processing_experiment(exp_dir, stacks=None):
+    yaml_file = exp_dir / "parameters_Run1.yaml"
+    if stacks is not None:
+        pm = ParameterManager()
+        pm.from_yaml(yaml_file)
+        seq = pm.parameters["sequence"]
+        seq["base_name"] = stacks
+        seq["stack_first_frame"] = FRAMES[0]
+        yaml_file = exp_dir / "parameters_stacks.yaml"
+        pm.to_yaml(yaml_file)
+    return ProcessingContext(yaml_file, FRAMES[0], FRAMES[-1])
+
+
+def _outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("rt_is.*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.name: f.read_bytes() for f in files}
+
+
+@pytest.mark.parametrize("suffix", [".npy", ".tif", ".raw"])
+def test_sequence_from_stacks_matches_files(cavity_copy, suffix):
+    ptv.py_sequence_loop(_processing_experiment(cavity_copy))
+    expected = _outputs(cavity_copy)
+    shutil.rmtree(cavity_copy / "res")
+    for f in (cavity_copy / "img").glob("*_targets"):
+        f.unlink()
+
+    stacks = []
+    for cam in range(4):
+        frames = np.stack(
+            [ptv.read_sequence_image(cavity_copy / "img" / f"cam{cam + 1}.{frame}") for frame in FRAMES]
+        )
+        path = f"img/cam{cam + 1}{suffix}"
+        if suffix == ".npy":
+            np.save(cavity_copy / path, frames)
+        elif suffix == ".tif":
+            tifffile.imwrite(cavity_copy / path, frames)
+        else:
+            (cavity_copy / path).write_bytes(frames.tobytes())
+        stacks.append(path)
+    # The per-frame files are not needed any more
+    for f in (cavity_copy / "img").glob("cam?.1000?"):
+        f.unlink()
+
+    ptv.py_sequence_loop(
+        _processing_experiment(cavity_copy, stacks), camera_workers=2, camera_pool="thread"
+    )
+    assert _outputs(cavity_copy) == expected
+
+
+def test_splitter_source_serves_quadrant_views(tmp_path):
+    composite = np.arange(8 * 6, dtype=np.uint8).reshape(6, 8)
+    np.save(tmp_path / "split.npy", composite[np.newaxis])
+    source = open_image_source(
+        [str(tmp_path / "split.npy"), "--", "--"], {}, {"imx": 4, "imy": 3, "splitter": True},
+        ptv.read_sequence_image,
+    )
+    assert isinstance(source, SplitterImageSource)
+    images = source.frame_images(0)
+    assert len(images) == 3
+    for img, quadrant in zip(images, image_split(composite)):
+        np.testing.assert_array_equal(img, quadrant)
+        assert np.shares_memory(img, source.composite.stacks[0])
+    # Cameras of the same frame share the decoded composite
+    assert source.read(2, 0) is images[2]
+    assert source.paths(0) == [str(tmp_path / "split.npy")] * 3
+
+
+@pytest.fixture
+def splitter_copy(tmp_path):
+    exp_dir = tmp_path / "test_splitter"
+    shutil.copytree(
+        Path(__file__).parent / "test_splitter", exp_dir,
+        ignore=shutil.ignore_patterns("res", "*_targets"),
+    )
+    (exp_dir / "res").mkdir()
+    return exp_dir
+
+
+def test_native_splitter_matches_plugin(splitter_copy):
+    experiment = ProcessingContext(splitter_copy / "parameters_Run1.yaml")
+    experiment.spar.set_last(experiment.spar.get_first() + 1)
+
+    spec = importlib.util.spec_from_file_location(
+        "ext_sequence_splitter", splitter_copy / "plugins" / "ext_sequence_splitter.py"
+    )
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    plugin.Sequence(ptv=ptv, exp=experiment).do_sequence()
+    expected = _outputs(splitter_copy)
+    assert len(expected) == 2 + 2 * 4
+
+    for options in ({}, {"camera_workers": 2, "camera_pool": "thread"}, {"prefetch_depth": 2}):
+        for name in expected:
+            next(splitter_copy.glob(f"*/{name}")).unlink()
+        ptv.py_sequence_loop(experiment, **options)
+        assert _outputs(splitter_copy) == expected
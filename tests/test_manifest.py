@@ -0,0 +1,192 @@
+"""Tests for the resumable-run manifest"""
+
+import json
+
+import numpy as np
+import pytest
+
+from pyptv import ptv
+from pyptv.manifest import (
+    RunManifest,
+    compact_manifest,
+    output_signature,
+    sequence_parameter_hash,
+)
+from pyptv.parameter_manager import ParameterManager
+
+
+def _output_mtimes(exp_dir):
+    files = sorted((exp_dir / "res").glob("rt_is.*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.name: f.stat().st_mtime_ns for f in files}
+
+
+def test_parameter_hash_covers_sequence_inputs_only(cavity_copy):
+    pm = ParameterManager()
+    pm.from_yaml(cavity_copy / "parameters_Run1.yaml")
+    reference = sequence_parameter_hash(pm, cavity_copy)
+    assert sequence_parameter_hash(pm, cavity_copy) == reference
+
+    pm.parameters["track"]["dvxmin"] = -100.0
+    pm.parameters["ptv"]["img_name"] = ["img/cam1.10000"] * 4
+    assert sequence_parameter_hash(pm, cavity_copy) == reference
+
+    pm.parameters["targ_rec"]["gvthres"][0] += 1
+    assert sequence_parameter_hash(pm, cavity_copy) != reference
+    pm.parameters["targ_rec"]["gvthres"][0] -= 1
+
+    # Which stack page or byte offset a frame number reads
+    for key in ("stack_first_frame", "raw_header_bytes"):
+        pm.parameters["sequence"][key] = 7
+        assert sequence_parameter_hash(pm, cavity_copy) != reference
+        del pm.parameters["sequence"][key]
+    assert sequence_parameter_hash(pm, cavity_copy) == reference
+
+    with open(cavity_copy / "cal" / "cam2.tif.ori", "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert sequence_parameter_hash(pm, cavity_copy) != reference
+
+
+def test_parameter_hash_covers_mask_polygons(cavity_copy):
+    pm = ParameterManager()
+    pm.from_yaml(cavity_copy / "parameters_Run1.yaml")
+    pm.parameters["masking"]["polygon_base_name"] = "mask_#.txt"
+    for i_cam in range(pm.num_cams):
+        (cavity_copy / f"mask_{i_cam}.txt").write_text("0 0\n10 0\n10 10\n")
+    reference = sequence_parameter_hash(pm, cavity_copy)
+
+    (cavity_copy / "mask_1.txt").write_text("0 0\n20 0\n20 20\n")
+    assert sequence_parameter_hash(pm, cavity_copy) != reference
+
+
+def test_manifest_validity(tmp_path):
+    inputs = [tmp_path / "cam1.1"]
+    outputs = [tmp_path / "cam1.1_targets"]
+    inputs[0].write_text("image")
+    outputs[0].write_text("1\n   0  10.0000  20.0000     4     2     2   100    -1\n")
+
+    manifest = RunManifest(tmp_path / "manifest.jsonl", "abc")
+    assert not manifest.is_valid(1, inputs, outputs)
+    manifest.record(1, inputs, outputs)
+    assert manifest.is_valid(1, inputs, outputs)
+
+    # A fresh manifest reads the records back, ignoring a truncated last line
+    with open(tmp_path / "manifest.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"frame": 2, "par')
+    reloaded = RunManifest(tmp_path / "manifest.jsonl", "abc")
+    assert reloaded.is_valid(1, inputs, outputs)
+    assert reloaded.pending([1, 2], lambda f: inputs, lambda f: outputs) == [2]
+
+    assert not RunManifest(tmp_path / "manifest.jsonl", "other").is_valid(1, inputs, outputs)
+
+    outputs[0].write_text("1\n   0  10.0000  20.5000     4     2     2   100    -1\n")
+    assert not reloaded.is_valid(1, inputs, outputs)
+
+
+def test_output_signature_ignores_tracking(tmp_path):
+    targets = tmp_path / "cam1.1_targets"
+    targets.write_text("2\n   0  10.0  20.0  4  2  2  100  -1\n   1  30.0  40.0  5  2  3  120  -1\n")
+    rt_is = tmp_path / "rt_is.1"
+    rt_is.write_text("1\n   1  0.1  0.2  0.3  0  -1  -1  -1\n")
+    signatures = [output_signature(targets), output_signature(rt_is)]
+    assert [signature[0] for signature in signatures] == [2, 1]
+
+    # Tracking links targets and appends the particles it adds
+    targets.write_text("2\n   0  10.0  20.0  4  2  2  100  7\n   1  30.0  40.0  5  2  3  120  -1\n")
+    rt_is.write_text("2\n   1  0.1  0.2  0.3  0  -1  -1  -1\n   2  0.4  0.5  0.6  1  -1  -1  -1\n")
+    assert output_signature(targets, 2) == signatures[0]
+    assert output_signature(rt_is, 1) == signatures[1]
+    assert output_signature(rt_is, 3) is None
+    assert output_signature(tmp_path / "missing_targets") is None
+
+    arr = np.zeros(2, dtype=ptv.TARGET_DTYPE)
+    arr["x"] = [10.0, 30.0]
+    np.save(tmp_path / "cam1.1_targets.npy", arr)
+    signature = output_signature(tmp_path / "cam1.1_targets.npy")
+    arr["tnr"] = [7, -1]
+    np.save(tmp_path / "cam1.1_targets.npy", arr)
+    assert output_signature(tmp_path / "cam1.1_targets.npy", 2) == signature
+
+
+def test_compact_manifest_keeps_latest_records(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    compact_manifest(path)
+    assert not path.exists()
+
+    for params in ("old", "new"):
+        manifest = RunManifest(path, params)
+        for frame in (2, 1):
+            manifest.record(frame, [], [])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"frame": 3, "par')
+
+    compact_manifest(path)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record["frame"], record["params"]) for record in records] == [(1, "new"), (2, "new")]
+
+
+def test_batch_resume_redoes_only_stale_frames(cavity_copy):
+    from pyptv.pyptv_batch import main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="sequence")
+    records = (cavity_copy / "res" / "sequence_manifest.jsonl").read_text().splitlines()
+    assert [json.loads(line)["frame"] for line in records] == list(range(10000, 10005))
+    first_run = _output_mtimes(cavity_copy)
+
+    main(yaml_file, 10000, 10004, mode="sequence", resume=True)
+    assert _output_mtimes(cavity_copy) == first_run
+
+    (cavity_copy / "res" / "rt_is.10002").unlink()
+    main(yaml_file, 10000, 10004, mode="sequence", resume=True)
+    second_run = _output_mtimes(cavity_copy)
+    changed = {name for name in second_run if second_run[name] != first_run.get(name)}
+    assert changed == {"rt_is.10002"} | {f"cam{cam}.10002_targets" for cam in range(1, 5)}
+
+    # Without --resume every frame is recomputed, after the manifest was
+    # compacted to one record per frame
+    main(yaml_file, 10000, 10004, mode="sequence")
+    third_run = _output_mtimes(cavity_copy)
+    assert all(third_run[name] != second_run[name] for name in third_run)
+    records = (cavity_copy / "res" / "sequence_manifest.jsonl").read_text().splitlines()
+    assert len(records) == 2 * 5
+
+
+def test_resume_after_tracking_keeps_sequence_output(cavity_copy, capsys):
+    from pyptv.pyptv_batch import main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="both")
+    tracked = _output_mtimes(cavity_copy)
+
+    capsys.readouterr()
+    main(yaml_file, 10000, 10004, mode="sequence", resume=True)
+    assert "Skipping 5 up-to-date frames, processing 0" in capsys.readouterr().out
+    assert _output_mtimes(cavity_copy) == tracked
+
+
+def test_parallel_resume_after_failed_frame(cavity_copy):
+    from pyptv.pyptv_batch_parallel import ProcessingError, main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    missing = cavity_copy / "img" / "cam3.10000"
+    missing.rename(cavity_copy / "cam3.10000.bak")
+    # Blocks 10000-10001, 10002, 10003 and 10004
+    options = dict(n_processes=2, mode="sequence", resume=True, block_size=2)
+    with pytest.raises(ProcessingError):
+        main(yaml_file, 10000, 10004, **options)
+    # The failed block stopped at its first frame, the other blocks were recorded
+    assert not (cavity_copy / "res" / "rt_is.10001").exists()
+    assert (cavity_copy / "res" / "rt_is.10002").exists()
+    before = _output_mtimes(cavity_copy)
+
+    (cavity_copy / "cam3.10000.bak").rename(missing)
+    main(yaml_file, 10000, 10004, **options)
+    after = _output_mtimes(cavity_copy)
+    assert {name for name in before if after[name] != before[name]} == set()
+    assert set(after) - set(before) == {
+        name
+        for frame in (10000, 10001)
+        for name in [f"rt_is.{frame}"] + [f"cam{cam}.{frame}_targets" for cam in range(1, 5)]
+    }
@@ -0,0 +1,141 @@
+"""Tests for parallel tracking of overlapping frame windows"""
+
+import numpy as np
+import pytest
+
+from pyptv.parallel_tracking import (
+    DEFAULT_OVERLAP,
+    NEXT_NONE,
+    PREV_NONE,
+    TrackedFrame,
+    TrackingWindow,
+    compare_tracking,
+    link_frames,
+    run_parallel_tracking,
+    track_parallel,
+    track_serial,
+    tracking_windows,
+)
+from pyptv.pyptv_batch import run_batch
+from pyptv.rt_is import RT_IS_DTYPE
+from pyptv.run_store import ADDED_DTYPE, LINKAGE_DTYPE, read_legacy_file
+from pyptv.synthetic_experiment import SyntheticSpec, generate_synthetic_experiment
+
+
+def _frame(rows, links):
+    correspondences = np.zeros(len(rows), dtype=RT_IS_DTYPE)
+    linkage = np.zeros(len(rows), dtype=LINKAGE_DTYPE)
+    for index, (x, (prev, next_)) in enumerate(zip(rows, links)):
+        correspondences[index] = (index + 1, x, 0.0, 0.0, int(x), int(x), -1, -1)
+        linkage[index] = (prev, next_, x, 0.0, 0.0)
+    added = np.zeros(len(rows), dtype=ADDED_DTYPE)
+    for name in LINKAGE_DTYPE.names:
+        added[name] = linkage[name]
+    return TrackedFrame([None], correspondences, linkage, added)
+
+
+def test_tracking_windows():
+    windows = tracking_windows(10000, 10009, 4, overlap=2)
+    assert windows == [
+        TrackingWindow(10000, 10005, 10000, 10003),
+        TrackingWindow(10002, 10009, 10004, 10007),
+        TrackingWindow(10006, 10009, 10008, 10009),
+    ]
+    with pytest.raises(ValueError):
+        tracking_windows(10000, 10009, 4, overlap=1)
+    with pytest.raises(ValueError):
+        tracking_windows(10000, 10009, 0)
+
+
+def test_link_frames_maps_rows_of_the_next_window():
+    before = _frame([1.0, 2.0, 3.0], [(PREV_NONE, 0), (PREV_NONE, 1), (PREV_NONE, 2)])
+    # The first window added a particle (row 2) that the second one did not
+    seen_next = _frame([10.0, 20.0, 30.0], [(0, NEXT_NONE)] * 3).correspondences
+    after = _frame([20.0, 10.0], [(PREV_NONE, NEXT_NONE), (1, NEXT_NONE)])
+
+    before, after = link_frames(before, seen_next, after)
+
+    assert list(before.linkage["next"]) == [1, 0, NEXT_NONE]
+    assert list(after.linkage["prev"]) == [1, 0]
+    assert list(before.added["next"]) == list(before.linkage["next"])
+    assert list(after.added["prev"]) == list(after.linkage["prev"])
+
+
+def test_link_frames_drops_links_to_one_row():
+    before = _frame([1.0, 2.0, 3.0], [(PREV_NONE, 0), (PREV_NONE, 1), (PREV_NONE, 2)])
+    # Two particles of the first window match the same row of the second
+    seen_next = _frame([10.0, 10.0, 30.0], [(0, NEXT_NONE)] * 3).correspondences
+    after = _frame([10.0, 30.0], [(PREV_NONE, NEXT_NONE)] * 2)
+
+    before, after = link_frames(before, seen_next, after)
+
+    assert list(before.linkage["next"]) == [NEXT_NONE, NEXT_NONE, 1]
+    assert list(after.linkage["prev"]) == [PREV_NONE, 2]
+
+
+def _assert_links_consistent(frames):
+    for frame, tracked in frames.items():
+        following = frames.get(frame + 1)
+        if following is None:
+            continue
+        for index, next_ in enumerate(tracked.linkage["next"]):
+            if next_ >= 0:
+                assert following.linkage["prev"][next_] == index
+
+
+def test_stitched_tracking_matches_serial(cavity_copy):
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    (cavity_copy / "res").mkdir(exist_ok=True)
+    run_batch(yaml_file, 10000, 10004, mode="sequence")
+
+    serial = track_serial(yaml_file, 10000, 10004)
+    # Every window tracks all frames, so each one is a serial run
+    stitched = track_parallel(yaml_file, 10000, 10004, n_processes=2, window_size=2, overlap=5)
+    assert sorted(stitched) == list(range(10000, 10005))
+    _assert_links_consistent(stitched)
+    comparison = compare_tracking(serial, stitched)
+    assert comparison.agreement == 1.0
+    assert comparison.differing_frames == []
+
+    stitched = track_parallel(yaml_file, 10000, 10004, n_processes=2, window_size=2, overlap=2)
+    _assert_links_consistent(stitched)
+
+
+def test_split_tracking_matches_serial(test_data_dir, tmp_path):
+    spec = SyntheticSpec(num_particles=100, num_frames=30, num_cams=3, image_size=(640, 512), seed=2)
+    summary = generate_synthetic_experiment(
+        test_data_dir / "parameters_Run1.yaml", tmp_path / "synth", spec
+    )
+    yaml_file, first, last = summary["yaml"], summary["first"], summary["last"]
+    run_batch(yaml_file, first, last, mode="sequence")
+
+    windows = tracking_windows(first, last, 10, DEFAULT_OVERLAP)
+    # The first and last windows do not see the whole range
+    assert windows[0].last < last and windows[-1].first > first
+
+    serial = track_serial(yaml_file, first, last)
+    stitched = track_parallel(yaml_file, first, last, n_processes=2, window_size=10)
+    _assert_links_consistent(stitched)
+    comparison = compare_tracking(serial, stitched)
+    # Particles added by the tracker depend on the frames it has seen, so a
+    # window started later may link a few particles differently
+    assert comparison.agreement > 0.99
+    for window in windows[1:]:
+        assert window.own_first - 1 not in comparison.differing_frames
+        assert window.own_first not in comparison.differing_frames
+
+
+def test_run_parallel_tracking_writes_res_files(cavity_copy):
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    (cavity_copy / "res").mkdir(exist_ok=True)
+    run_batch(yaml_file, 10000, 10004, mode="sequence")
+
+    results = run_parallel_tracking(yaml_file, 10000, 10004, n_processes=2, window_size=3, overlap=2)
+    assert [result.window.own_first for result in results] == [10000, 10003]
+
+    frames = {}
+    for frame in range(10000, 10005):
+        linkage = read_legacy_file("linkage", str(cavity_copy / "res" / f"ptv_is.{frame}"))
+        frames[frame] = TrackedFrame([], None, linkage, None)
+        assert (cavity_copy / "res" / f"added.{frame}").exists()
+    _assert_links_consistent(frames)
@@ -0,0 +1,73 @@
+"""Tests for running sequence and tracking in one pass"""
+
+import pytest
+import yaml
+
+import pyptv.pipeline as pipeline
+from pyptv.pyptv_batch import main
+
+
+def _outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("*.1000*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.relative_to(exp_dir).as_posix(): f.read_bytes() for f in files}
+
+
+def _clear_outputs(exp_dir):
+    for f in list((exp_dir / "res").iterdir()) + list((exp_dir / "img").glob("*_targets")):
+        f.unlink()
+
+
+def test_pipeline_matches_sequence_then_tracking(cavity_copy, tmp_path, monkeypatch):
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="both")
+    reference = _outputs(cavity_copy)
+    _clear_outputs(cavity_copy)
+
+    buffer_sizes = []
+    export_frame = pipeline._export_frame
+
+    def record_export(buffer, *args):
+        buffer_sizes.append(len(list(buffer.path.iterdir())))
+        export_frame(buffer, *args)
+
+    monkeypatch.setattr(pipeline, "_export_frame", record_export)
+    buffer_root = tmp_path / "buffers"
+    buffer_root.mkdir()
+    main(yaml_file, 10000, 10004, pipeline=True, buffer_dir=str(buffer_root))
+
+    assert _outputs(cavity_copy) == reference
+    assert list(buffer_root.iterdir()) == []
+    # 4 cameras + rt_is, ptv_is, added per frame, at most lookahead + 2 frames
+    assert len(buffer_sizes) == 5
+    assert max(buffer_sizes) <= 7 * (pipeline.TRACKER_LOOKAHEAD + 2)
+
+
+def test_pipeline_with_run_store(cavity_copy):
+    from pyptv.run_store import main as run_store_main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="both")
+    reference = _outputs(cavity_copy)
+    _clear_outputs(cavity_copy)
+
+    params = yaml.safe_load(yaml_file.read_text())
+    params["pft_version"]["run_store"] = True
+    yaml_file.write_text(yaml.safe_dump(params))
+    main(yaml_file, 10000, 10004, pipeline=True)
+    assert _outputs(cavity_copy) == {}
+
+    assert run_store_main([
+        "materialize", str(yaml_file), "10000", "10004",
+        "--kinds", "targets", "correspondences", "linkage", "added",
+    ]) == 0
+    assert _outputs(cavity_copy) == reference
+
+
+@pytest.mark.parametrize(
+    "options", [{"mode": "sequence"}, {"stream": True}, {"resume": True}]
+)
+def test_pipeline_rejects_other_modes(cavity_copy, options):
+    with pytest.raises(ValueError, match="Pipeline mode"):
+        main(cavity_copy / "parameters_Run1.yaml", 10000, 10004, pipeline=True, **options)
@@ -0,0 +1,125 @@
+"""Tests for the image prefetch stage of the sequence loop"""
+
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from pyptv import ptv
+from pyptv.prefetch import FramePrefetcher
+from pyptv.processing_context import ProcessingContext
+
+
+def _frame_paths(frame):
+    return [f"cam{cam}.{frame}" for cam in range(1, 5)]
+
+
+class RecordingLoader:
+    """Fake loader returning small arrays and recording which paths were decoded."""
+
+    def __init__(self, shape=(8, 8)):
+        self.shape = shape
+        self.loaded = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        with self._lock:
+            self.loaded.append(path)
+        cam, frame = path[3:].split(".")
+        return np.full(self.shape, int(frame) % 256, dtype=np.uint8) + int(cam)
+
+
+class TestFramePrefetcher:
+    def test_returns_images_in_camera_order(self):
+        loader = RecordingLoader()
+        with FramePrefetcher(range(10, 15), _frame_paths, loader, depth=2) as prefetcher:
+            for frame in range(10, 15):
+                images = prefetcher.get(frame)
+                assert [img[0, 0] for img in images] == [frame + cam for cam in range(1, 5)]
+        assert sorted(loader.loaded) == sorted(
+            path for frame in range(10, 15) for path in _frame_paths(frame)
+        )
+
+    def test_depth_bounds_read_ahead(self):
+        loader = RecordingLoader()
+        with FramePrefetcher(range(100), _frame_paths, loader, depth=3) as prefetcher:
+            prefetcher.get(0)
+            # Frame 0 was consumed, frames 1..3 may be scheduled, nothing beyond.
+            assert len(prefetcher._pending) <= 3
+            assert max(prefetcher._pending) == 3
+
+    def test_memory_cap_limits_window(self):
+        loader = RecordingLoader(shape=(100, 100))
+        frame_nbytes = 4 * 100 * 100
+        with FramePrefetcher(
+            range(20), _frame_paths, loader, depth=8, max_bytes=4 * frame_nbytes
+        ) as prefetcher:
+            assert prefetcher.window == 1
+            prefetcher.get(0)
+            assert prefetcher.frame_nbytes == frame_nbytes
+            # Two frames of the cap go to the frames held by the caller
+            assert prefetcher.window == 2
+            prefetcher.get(1)
+            assert (len(prefetcher._pending) + 2) * frame_nbytes <= prefetcher.max_bytes
+
+    def test_loader_errors_are_raised_for_their_frame(self):
+        def loader(path):
+            if path.endswith(".3"):
+                raise FileNotFoundError(f"{path} does not exist")
+            return np.zeros((2, 2), dtype=np.uint8)
+
+        with FramePrefetcher(range(5), _frame_paths, loader, depth=4) as prefetcher:
+            for frame in range(3):
+                prefetcher.get(frame)
+            with pytest.raises(FileNotFoundError, match="cam1.3 does not exist"):
+                prefetcher.get(3)
+
+    def test_out_of_order_request_raises(self):
+        with FramePrefetcher(range(5), _frame_paths, RecordingLoader(), depth=1) as prefetcher:
+            with pytest.raises(KeyError):
+                prefetcher.get(4)
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError, match="depth"):
+            FramePrefetcher(range(5), _frame_paths, RecordingLoader(), depth=0)
+        with pytest.raises(ValueError, match="memory cap"):
+            FramePrefetcher(range(5), _frame_paths, RecordingLoader(), max_bytes=0)
+
+
+def _processing_experiment(exp_dir):
+    return ProcessingContext(exp_dir / "parameters_Run1.yaml", 10000, 10004)
+
+
+def _read_outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("rt_is.*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.name: f.read_bytes() for f in files}
+
+
+def test_sequence_loop_with_prefetch_matches_serial(cavity_copy):
+    """Prefetching must not change any output byte"""
+    ptv.py_sequence_loop(_processing_experiment(cavity_copy))
+    serial = _read_outputs(cavity_copy)
+    assert len(serial) == 5 + 5 * 4
+
+    shutil.rmtree(cavity_copy / "res")
+    for f in (cavity_copy / "img").glob("*_targets"):
+        f.unlink()
+
+    ptv.py_sequence_loop(
+        _processing_experiment(cavity_copy),
+        prefetch_depth=3,
+        prefetch_max_bytes=64 * 1024 * 1024,
+    )
+    assert _read_outputs(cavity_copy) == serial
+
+
+def test_sequence_loop_prefetch_missing_image(cavity_copy):
+    (cavity_copy / "img" / "cam2.10002").unlink()
+    with pytest.raises(FileNotFoundError, match="cam2.10002 does not exist"):
+        ptv.py_sequence_loop(_processing_experiment(cavity_copy), prefetch_depth=2)
+    # Frames before the missing one were fully processed
+    assert (cavity_copy / "res" / "rt_is.10001").exists()
+    assert not (cavity_copy / "res" / "rt_is.10002").exists()
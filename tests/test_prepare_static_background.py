@@ -0,0 +1,75 @@
+"""Tests for the streaming static background estimation"""
+
+import numpy as np
+import pytest
+import yaml
+from imageio.v3 import imread
+
+from pyptv import ptv
+from pyptv.prepare_static_background import (
+    RunningPercentile,
+    compute_backgrounds,
+    main,
+    weighted_percentile,
+)
+
+
+def test_running_percentile_is_exact_within_one_chunk():
+    rng = np.random.default_rng(0)
+    images = rng.integers(0, 256, size=(50, 6, 7), dtype=np.uint8)
+    for q in (0.1, 0.5, 1.0):
+        estimate = RunningPercentile(q, chunk_frames=64)
+        for image in images:
+            estimate.add(image)
+        np.testing.assert_array_equal(
+            estimate.result(), np.quantile(images, q, axis=0, method="inverted_cdf")
+        )
+
+    weights = [1, 3, 2, 5, 1]
+    np.testing.assert_array_equal(
+        weighted_percentile(images[:5], weights, 0.5),
+        np.quantile(np.repeat(images[:5], weights, axis=0), 0.5, axis=0, method="inverted_cdf"),
+    )
+
+    with pytest.raises(ValueError, match="No images"):
+        RunningPercentile().result()
+    with pytest.raises(ValueError, match=r"\(0, 1\]"):
+        RunningPercentile(0)
+
+
+def test_running_percentile_recovers_background_of_sparse_particles():
+    rng = np.random.default_rng(1)
+    background = rng.integers(10, 60, size=(40, 50), dtype=np.uint8)
+    estimate = RunningPercentile(0.5, chunk_frames=4)
+    for _ in range(300):
+        frame = background.copy()
+        frame[rng.random(frame.shape) < 0.05] = 250
+        estimate.add(frame)
+    # 4 ** 5 >= 300 > 4 ** 4: five levels of 4 frames
+    assert len(estimate._levels) == 5
+    np.testing.assert_array_equal(estimate.result(), background)
+
+
+def test_backgrounds_of_experiment(cavity_copy):
+    frames = range(10000, 10005)
+    images = [
+        np.stack([ptv.read_sequence_image(cavity_copy / "img" / f"cam{cam}.{f}") for f in frames])
+        for cam in range(1, 5)
+    ]
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    backgrounds = compute_backgrounds(yaml_file, 10000, 10004, workers=1)
+    for background, stack in zip(backgrounds, images):
+        np.testing.assert_array_equal(
+            background, np.quantile(stack, 0.5, axis=0, method="inverted_cdf")
+        )
+
+    assert main([str(yaml_file), "10000", "10004", "--step", "2", "--workers", "2",
+                 "--output", "bg/cam%d.tif", "--update-yaml"]) == 0
+    for cam, stack in enumerate(images):
+        np.testing.assert_array_equal(
+            imread(cavity_copy / "bg" / f"cam{cam + 1}.tif"),
+            np.quantile(stack[::2], 0.5, axis=0, method="inverted_cdf"),
+        )
+    masking = yaml.safe_load(yaml_file.read_text())["masking"]
+    assert masking["mask_flag"] is True
+    assert masking["mask_base_name"] == "bg/cam%d.tif"
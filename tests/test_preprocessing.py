@@ -0,0 +1,276 @@
+"""Tests for image normalization and cached background subtraction"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+from imageio.v3 import imread, imwrite
+from optv.parameters import ControlParams
+from skimage.color import rgb2gray
+from skimage.util import img_as_ubyte
+
+from pyptv import ptv
+from pyptv.preprocessing import (
+    GRAY_SCALE,
+    GRAY_WEIGHTS,
+    ROLLING_STATISTICS,
+    BackgroundCache,
+    RollingBackground,
+    as_background,
+    as_uint8_gray,
+    background_filename,
+    polygon_roi,
+    read_polygon,
+    subtract_background,
+)
+from pyptv.processing_context import ProcessingContext
+
+
+def test_as_uint8_gray_matches_skimage():
+    # Every 8-bit RGB colour
+    r, g, b = np.meshgrid(*[np.arange(256, dtype=np.uint8)] * 3, indexing="ij")
+    rgb = np.stack([r, g, b], axis=-1).reshape(4096, 4096, 3)
+    expected = img_as_ubyte(rgb2gray(rgb))
+    gray = as_uint8_gray(rgb)
+    diff = gray.astype(int) - expected
+    assert np.abs(diff).max() == 1
+    # Differences only at exact half grey-level ties
+    luminance = rgb.astype(np.int64) @ np.array(GRAY_WEIGHTS)
+    assert np.all(luminance[diff != 0] % GRAY_SCALE == GRAY_SCALE // 2)
+
+    rgba = np.concatenate([rgb[:64, :64], np.full((64, 64, 1), 7, np.uint8)], axis=-1)
+    np.testing.assert_array_equal(as_uint8_gray(rgba), gray[:64, :64])
+
+
+def test_as_uint8_gray_grey_images():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (32, 48), dtype=np.uint8)
+    assert as_uint8_gray(img) is img
+
+    img16 = rng.integers(0, 65536, (32, 48), dtype=np.uint16)
+    np.testing.assert_array_equal(as_uint8_gray(img16), img_as_ubyte(img16))
+
+    img_float = rng.random((32, 48))
+    np.testing.assert_array_equal(as_uint8_gray(img_float), img_as_ubyte(img_float))
+    rgb16 = rng.integers(0, 65536, (32, 48, 3), dtype=np.uint16)
+    np.testing.assert_array_equal(as_uint8_gray(rgb16), img_as_ubyte(rgb2gray(rgb16)))
+
+
+def test_background_filename_conventions():
+    assert background_filename("bg/cam%d.tif", 0) == "bg/cam1.tif"
+    assert background_filename("bg/cam#.tif", 0) == "bg/cam0.tif"
+    assert background_filename("bg/static.tif", 3) == "bg/static.tif"
+
+
+def test_subtract_background_saturates():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (32, 48), dtype=np.uint8)
+    background = rng.integers(0, 256, (32, 48), dtype=np.uint8)
+    expected = np.clip(img.astype(np.int16) - background, 0, 255).astype(np.uint8)
+
+    result = subtract_background(img, background)
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, expected)
+
+    subtract_background(img, background, out=img)
+    np.testing.assert_array_equal(img, expected)
+
+
+def test_float_background_matches_float_subtraction():
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (16, 16), dtype=np.uint8)
+    background = rng.uniform(0, 300, (16, 16))
+    expected = np.clip(img - background, 0, 255).astype(np.uint8)
+    np.testing.assert_array_equal(
+        subtract_background(img, as_background(background)), expected
+    )
+
+
+def test_subtract_background_shape_mismatch():
+    with pytest.raises(ValueError, match="does not match"):
+        subtract_background(
+            np.zeros((4, 4), np.uint8), np.zeros((4, 5), np.uint8)
+        )
+
+
+def test_cache_reads_once_and_reloads_on_change(tmp_path):
+    filename = tmp_path / "bg.tif"
+    imwrite(filename, np.full((8, 8), 10, dtype=np.uint8))
+    cache = BackgroundCache()
+
+    first = cache.get(filename)
+    assert cache.get(filename) is first
+    assert not first.flags.writeable
+    assert len(cache) == 1
+
+    imwrite(filename, np.full((8, 8), 20, dtype=np.uint8))
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    reloaded = cache.get(filename)
+    assert reloaded is not first
+    assert reloaded[0, 0] == 20
+
+    with pytest.raises(FileNotFoundError):
+        cache.get(tmp_path / "missing.tif")
+
+
+def _processing_experiment(exp_dir, mask_base_name):
+    experiment = ProcessingContext(exp_dir / "parameters_Run1.yaml", 10000, 10001)
+    experiment.pm.parameters["masking"] = {
+        "mask_flag": True,
+        "mask_base_name": mask_base_name,
+    }
+    return experiment
+
+
+def test_sequence_loop_subtracts_cached_background(cavity_copy):
+    """A background equal to the first frame removes the targets of that frame"""
+    for cam in range(1, 5):
+        shutil.copy(cavity_copy / "img" / f"cam{cam}.10000", cavity_copy / f"bg{cam}.tif")
+        assert imread(cavity_copy / f"bg{cam}.tif").dtype == np.uint8
+
+    ptv.py_sequence_loop(_processing_experiment(cavity_copy, "bg%d.tif"))
+
+    for cam in range(1, 5):
+        first = (cavity_copy / "img" / f"cam{cam}.10000_targets").read_text()
+        second = (cavity_copy / "img" / f"cam{cam}.10001_targets").read_text()
+        assert int(first.split()[0]) <= 1
+        assert int(second.split()[0]) > 100
+
+
+def test_frame_preprocessor_matches_allocating_chain(tmp_path):
+    rng = np.random.default_rng(1)
+    images = [rng.integers(0, 256, size=(64, 80), dtype=np.uint8) for _ in range(3)]
+    background = rng.integers(0, 64, size=(64, 80), dtype=np.uint8)
+    imwrite(tmp_path / "bg1.tif", background)
+    cpar = ControlParams(1)
+    cpar.set_image_size((80, 64))
+    cpar.set_pixel_size((0.01, 0.01))
+    preprocessor = ptv.FramePreprocessor(
+        cpar,
+        {"negative": True},
+        {"mask_flag": True, "mask_base_name": str(tmp_path / "bg%d.tif")},
+    )
+
+    buffers = []
+    for img in images:
+        original = img.copy()
+        img.setflags(write=False)
+        expected = ptv.simple_highpass(
+            np.clip(ptv.negative(img).astype(int) - background, 0, 255).astype(np.uint8),
+            cpar,
+        )
+        high_pass = preprocessor(img, 0)
+        np.testing.assert_array_equal(high_pass, expected)
+        np.testing.assert_array_equal(img, original)
+        buffers.append(preprocessor.buffer(0, img.shape))
+    # Every frame reuses the buffer of the camera
+    assert all(work is buffers[0] for work in buffers)
+
+    # Strided views are copied into the work buffer, not read as raw memory
+    plain = ptv.FramePreprocessor(cpar, {}, None)
+    wide = np.repeat(images[0], 2, axis=1)
+    np.testing.assert_array_equal(
+        plain(wide[:, ::2], 0), ptv.simple_highpass(images[0], cpar)
+    )
+
+
+def test_polygon_roi(tmp_path):
+    (tmp_path / "mask_0.txt").write_text("2 1\n7 1\n7 4\n2 4\n")
+    polygon = read_polygon(tmp_path / "mask_0.txt")
+    roi = polygon_roi(polygon, (8, 10), margin=1)
+    assert roi.box == (slice(0, 6), slice(1, 9))
+    assert roi.offset == (1, 0)
+    assert roi.shape == (6, 8)
+    # Rows 1-4 and columns 2-7 of the image are inside
+    assert roi.outside.sum() == 6 * 8 - 4 * 6
+    assert not roi.outside[1:5, 1:7].any()
+
+    with pytest.raises(ValueError, match="covers no pixel"):
+        polygon_roi(polygon + 100, (8, 10))
+    (tmp_path / "mask_1.txt").write_text("2 1\n7 1\n")
+    with pytest.raises(ValueError, match="at least 3"):
+        read_polygon(tmp_path / "mask_1.txt")
+
+
+def test_polygon_roi_detection_matches_masked_image(cavity_copy):
+    experiment = _processing_experiment(cavity_copy, "")
+    img = ptv.read_sequence_image(cavity_copy / "img" / "cam1.10000")
+    polygon = np.array([[100, 80], [900, 150], [1000, 900], [300, 1000], [150, 600]])
+    np.savetxt(cavity_copy / "mask_0.txt", polygon)
+    preprocessor = ptv.FramePreprocessor(
+        experiment.cpar, {}, {"mask_flag": False, "polygon_base_name": str(cavity_copy / "mask_#.txt")}
+    )
+    roi_targets = ptv.targets_to_array(preprocessor.detect(img, 0, experiment.tpar))
+    assert preprocessor(img, 0).shape == preprocessor.region(0, img.shape)[0].shape
+
+    roi = polygon_roi(polygon, img.shape)
+    outside = np.ones(img.shape, bool)
+    outside[roi.box] = roi.outside
+    masked = np.where(outside, 0, img).astype(np.uint8)
+    expected = ptv.targets_to_array(
+        ptv.target_recognition(
+            ptv.simple_highpass(masked, experiment.cpar), experiment.tpar, 0, experiment.cpar
+        )
+    )
+    assert 0 < len(roi_targets) == len(expected)
+    for field in ("x", "y"):
+        np.testing.assert_allclose(roi_targets[field], expected[field], atol=1e-9)
+    for field in ("pnr", "n", "nx", "ny", "sumg"):
+        np.testing.assert_array_equal(roi_targets[field], expected[field])
+
+
+@pytest.mark.parametrize("statistic", ROLLING_STATISTICS)
+def test_rolling_background_matches_window_statistic(statistic):
+    rng = np.random.default_rng(2)
+    images = rng.integers(0, 256, size=(20, 5, 6), dtype=np.uint8)
+    for frames in (1, 2, 3, 7):
+        rolling = RollingBackground(frames, statistic)
+        for start in (0, 9):
+            # After a reset the window restarts at frame ``start``
+            rolling.reset()
+            for i in range(start, len(images)):
+                window = images[max(start, i - frames + 1): i + 1]
+                if statistic == "min":
+                    expected = window.min(axis=0)
+                else:
+                    expected = window.sum(axis=0, dtype=np.int64) // len(window)
+                np.testing.assert_array_equal(rolling.update(images[i]), expected)
+
+    with pytest.raises(ValueError, match="statistic"):
+        RollingBackground(3, "median")
+    with pytest.raises(ValueError, match=">= 1"):
+        ptv.FramePreprocessor(ControlParams(1), {}, {"rolling_frames": -1})
+
+
+def _rolling_outputs(exp_dir, first, last, **options):
+    experiment = _processing_experiment(exp_dir, "")
+    experiment.pm.parameters["masking"].update(
+        {"mask_flag": False, "rolling_frames": 3, "rolling_statistic": "min"}
+    )
+    # Warm-up starts at the first frame of the sequence
+    experiment.pm.parameters["sequence"]["first"] = 10000
+    experiment.spar.set_first(first)
+    experiment.spar.set_last(last)
+    ptv.py_sequence_loop(experiment, **options)
+    return {
+        f.name: f.read_text() for f in sorted((exp_dir / "img").glob("*_targets"))
+    }
+
+
+def test_rolling_background_does_not_depend_on_chunks(cavity_copy):
+    expected = _rolling_outputs(cavity_copy, 10000, 10004)
+    assert len(expected) == 4 * 5
+    # The minimum of a single frame is the frame itself
+    assert all(
+        int(expected[f"cam{cam}.10000_targets"].split()[0]) <= 1 for cam in range(1, 5)
+    )
+    assert int(expected["cam1.10004_targets"].split()[0]) > 100
+
+    for f in (cavity_copy / "img").glob("*_targets"):
+        f.unlink()
+    _rolling_outputs(cavity_copy, 10000, 10001)
+    assert _rolling_outputs(cavity_copy, 10002, 10004) == expected
+    for options in ({"camera_workers": 3}, {"camera_workers": 2, "camera_pool": "thread"}):
+        assert _rolling_outputs(cavity_copy, 10003, 10004, **options) == expected
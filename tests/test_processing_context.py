@@ -0,0 +1,73 @@
+"""Tests for working-directory-independent processing contexts"""
+
+from pathlib import Path
+
+import pytest
+
+from pyptv import ptv
+from pyptv.processing_context import ProcessingContext
+from pyptv.pyptv_batch import run_batch
+
+
+def test_resolve_helpers(tmp_path):
+    assert ptv.resolve_path(tmp_path, "res/rt_is") == tmp_path / "res" / "rt_is"
+    assert ptv.resolve_path(tmp_path, "/abs/name") == Path("/abs/name")
+    assert ptv.resolve_path(None, "res/rt_is") == Path("res/rt_is")
+
+    assert ptv.experiment_root(object()) is None
+    masking = {"mask_flag": True, "mask_base_name": "masks/cam#.tif"}
+    resolved = ptv.resolved_masking(masking, tmp_path)
+    assert resolved["mask_base_name"] == str(tmp_path / "masks" / "cam#.tif")
+    assert masking["mask_base_name"] == "masks/cam#.tif"
+    assert ptv.resolved_masking(masking, None) is masking
+
+    naming = ptv.result_naming(tmp_path)
+    assert naming["corres"] == str(tmp_path / "res" / "rt_is").encode()
+    assert ptv.result_naming(tmp_path) is naming
+
+
+def test_context_paths_are_absolute(cavity_copy, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    context = ProcessingContext(cavity_copy / "parameters_Run1.yaml", 10000, 10001)
+    assert context.root == cavity_copy.resolve()
+    assert ptv.experiment_root(context) == context.root
+    assert context.spar.get_first() == 10000
+    assert context.spar.get_last() == 10001
+    for i_cam in range(context.num_cams):
+        assert Path(context.spar.get_img_base_name(i_cam)).is_absolute()
+    assert all(Path(name).is_absolute() for name in context.target_filenames)
+
+
+def test_run_batch_from_another_directory(cavity_copy, tmp_path, monkeypatch):
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    (cavity_copy / "res").mkdir(exist_ok=True)
+
+    run_batch(cavity_copy / "parameters_Run1.yaml", 10000, 10001, mode="sequence")
+
+    assert Path.cwd() == elsewhere
+    assert (cavity_copy / "res" / "rt_is.10000").exists()
+    assert (cavity_copy / "res" / "rt_is.10001").exists()
+    assert not (elsewhere / "res").exists()
+
+
+def test_plugins_import_their_siblings(tmp_path):
+    for name in ("exp1", "exp2"):
+        plugin_dir = tmp_path / name / "plugins"
+        plugin_dir.mkdir(parents=True)
+        (plugin_dir / "helpers.py").write_text(f"NAME = {name!r}\n")
+        (plugin_dir / "ext_sequence_two.py").write_text(
+            "from . import helpers\nfrom .helpers import NAME\n"
+        )
+    first = ptv.load_plugin(tmp_path / "exp1" / "plugins", "ext_sequence_two")
+    second = ptv.load_plugin(tmp_path / "exp2" / "plugins", "ext_sequence_two")
+    assert (first.NAME, second.NAME) == ("exp1", "exp2")
+    assert first.helpers is not second.helpers
+    assert ptv.load_plugin(tmp_path / "exp1" / "plugins", "ext_sequence_two") is first
+
+    (tmp_path / "exp1" / "plugins" / "ext_sequence_abs.py").write_text("import helpers\n")
+    with pytest.raises(ImportError, match="ext_sequence_abs"):
+        ptv.load_plugin(tmp_path / "exp1" / "plugins", "ext_sequence_abs")
+    with pytest.raises(ImportError, match="No plugin"):
+        ptv.load_plugin(tmp_path / "exp1" / "plugins", "missing")
@@ -0,0 +1,106 @@
+"""Tests for profiling of batch runs"""
+
+import cProfile
+import pstats
+
+from pyptv import ptv
+from pyptv.profiling import (
+    OPTV_FILENAME,
+    format_report,
+    main,
+    optv_call,
+    profiled,
+    split_time,
+    write_report,
+)
+
+
+def _optv_calls(stats):
+    return {name for (filename, _, name) in stats.stats if filename == OPTV_FILENAME}
+
+
+def test_optv_call_is_listed_under_its_name(tmp_path):
+    from optv.tracker import Tracker
+
+    with profiled(tmp_path / "call.pstats") as profiler:
+        assert isinstance(profiler, cProfile.Profile)
+        assert optv_call("sorted", sorted, [3, 1, 2], reverse=True) == [3, 2, 1]
+    stats = pstats.Stats(str(tmp_path / "call.pstats"))
+    assert _optv_calls(stats) == {"sorted"}
+    # Nothing is patched: the optv classes stay classes
+    assert ptv.Tracker is Tracker
+
+    with profiled(None) as profiler:
+        assert profiler is None
+    assert not tmp_path.joinpath("none.pstats").exists()
+
+
+def test_batch_profile_separates_optv(cavity_copy, capsys):
+    from pyptv.pyptv_batch import main as batch_main
+
+    batch_main(cavity_copy / "parameters_Run1.yaml", 10000, 10002, mode="both", profile=True)
+    profile_dir = cavity_copy / "profile"
+    assert sorted(p.name for p in profile_dir.iterdir()) == [
+        "batch.pstats", "profile.pstats", "profile.txt"
+    ]
+
+    stats = pstats.Stats(str(profile_dir / "profile.pstats"))
+    assert {"target_recognition", "correspondences", "Tracker.full_forward"} <= _optv_calls(stats)
+    split = split_time(stats)
+    assert split["optv"] > 0 and split["Python"] > 0
+
+    report = (profile_dir / "profile.txt").read_text()
+    assert report.splitlines()[1].startswith("Total")
+    assert "Tracker.full_forward" in report
+    assert "Top 30 functions by own time" in report
+
+    assert main([str(profile_dir)]) == 0
+    assert "optv calls:" in capsys.readouterr().out
+
+
+def test_parallel_profiles_are_merged(cavity_copy):
+    from pyptv.pyptv_batch_parallel import main as parallel_main
+
+    profile_dir = cavity_copy / "profile"
+    profile_dir.mkdir()
+    (profile_dir / "worker-1-2.pstats").write_text("stale")
+
+    parallel_main(
+        cavity_copy / "parameters_Run1.yaml", 10000, 10003, n_processes=2,
+        mode="sequence", profile=True,
+    )
+    # One profile per block; 4 frames on 2 workers are handed out one by one
+    assert sorted(p.name for p in profile_dir.glob("worker-*.pstats")) == [
+        f"worker-{frame}-{frame}.pstats" for frame in range(10000, 10004)
+    ]
+    stats = pstats.Stats(str(profile_dir / "profile.pstats"))
+    calls = {name: value[1] for (filename, _, name), value in stats.stats.items() if filename == OPTV_FILENAME}
+    # 4 frames of 4 cameras from both workers
+    assert calls["target_recognition"] == 16
+    assert "Profile of 2 run(s)" in format_report(stats, ["a", "b"])
+
+
+def test_parallel_tracking_profiles_tracker_calls(cavity_copy):
+    from pyptv.parallel_tracking import run_parallel_tracking
+    from pyptv.pyptv_batch import run_batch
+
+    (cavity_copy / "res").mkdir(exist_ok=True)
+    run_batch(cavity_copy / "parameters_Run1.yaml", 10000, 10004, mode="sequence")
+    profile_dir = cavity_copy / "profile"
+    profile_dir.mkdir()
+
+    run_parallel_tracking(
+        cavity_copy / "parameters_Run1.yaml", 10000, 10004, n_processes=2,
+        window_size=3, overlap=2, profile_dir=profile_dir,
+    )
+    profiles = sorted(profile_dir.glob("tracking-*.pstats"))
+    assert len(profiles) == 2
+    for path in profiles:
+        assert {"Tracker", "Tracker.restart", "Tracker.step_forward"} <= _optv_calls(
+            pstats.Stats(str(path))
+        )
+
+
+def test_write_report_without_profiles(tmp_path):
+    assert write_report(tmp_path) is None
+    assert main([str(tmp_path)]) == 1
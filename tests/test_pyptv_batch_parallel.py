@@ -58,5 +58,79 @@ def test_pyptv_batch_parallel_single_process(test_data_dir):
         pytest.fail(f"Single process parallel batch processing failed: {str(e)}")
 
 
+def test_block_scheduler_covers_range_and_adapts():
+    """Blocks cover every frame once, follow the frame cost and shrink at the end"""
+    from pyptv.pyptv_batch_parallel import BlockScheduler
+
+    scheduler = BlockScheduler(1, 1000, n_workers=2, target_seconds=1.0)
+    first = scheduler.next_block()
+    assert first == (1, BlockScheduler.INITIAL_BLOCK_SIZE)
+
+    # 10 ms per frame -> blocks of 100 frames
+    scheduler.record(first[1] - first[0] + 1, 0.04)
+    assert scheduler.block_size() == 100
+
+    blocks = [first]
+    while (block := scheduler.next_block()) is not None:
+        blocks.append(block)
+    frames = [frame for lo, hi in blocks for frame in range(lo, hi + 1)]
+    assert frames == list(range(1, 1001))
+    sizes = [hi - lo + 1 for lo, hi in blocks]
+    assert sizes[-1] == 1
+    assert sizes[1:] == sorted(sizes[1:], reverse=True)
+
+
+def test_block_scheduler_ignores_warm_up_cost():
+    """The rolling background warm-up before a block does not shrink the blocks"""
+    from pyptv.pyptv_batch_parallel import BlockScheduler
+
+    scheduler = BlockScheduler(1, 1000, n_workers=2, target_seconds=1.0)
+    first = scheduler.next_block()
+    # 1/64 s per frame, plus a warm-up on the frames before every block
+    scheduler.record(first[1] - first[0] + 1, 0.0625 + 0.5, warm_up_seconds=0.5)
+    assert scheduler.block_size() == 64
+    for _ in range(5):
+        scheduler.record(64, 1.0 + 0.5, warm_up_seconds=0.5)
+    assert scheduler.block_size() == 64
+
+
+def test_block_scheduler_fixed_size_and_utilization():
+    """A fixed block size disables adaptation; utilization is reported per worker"""
+    from pyptv.pyptv_batch_parallel import BlockResult, BlockScheduler, format_utilization
+
+    scheduler = BlockScheduler(0, 99, n_workers=1, block_size=10)
+    scheduler.record(10, 100.0)
+    assert scheduler.next_block() == (0, 9)
+
+    with pytest.raises(ValueError, match="Block size must be >= 1"):
+        BlockScheduler(0, 9, n_workers=1, block_size=0)
+
+    table = format_utilization(
+        [BlockResult(0, 9, 11, 1.0, 0.5), BlockResult(10, 19, 11, 1.0), BlockResult(20, 29, 12, 1.0)],
+        wall_time=2.0,
+    )
+    assert "Utilization of 2 workers" in table
+    assert "startup s" in table
+    assert "100.0%" in table
+    assert "50.0%" in table
+
+
+def test_run_sequence_chunk_reuses_worker_context(test_data_dir):
+    """The processing context is built once and reused for later blocks"""
+    from pyptv.pyptv_batch_parallel import run_sequence_chunk, worker_context
+
+    yaml_file = test_data_dir / "parameters_Run1.yaml"
+    cwd = Path.cwd()
+    first = run_sequence_chunk(yaml_file, 10000, 10001)
+    context = worker_context(yaml_file)
+    second = run_sequence_chunk(yaml_file, 10002, 10002)
+
+    assert worker_context(yaml_file) is context
+    assert first.startup_seconds == context.startup_seconds > 0
+    assert second.startup_seconds == 0.0
+    assert (second.first, second.last) == (10002, 10002)
+    assert Path.cwd() == cwd
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
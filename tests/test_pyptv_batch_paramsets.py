@@ -0,0 +1,35 @@
+"""Tests for running several parameter sets over shared decoded images"""
+
+import pytest
+
+from pyptv.parameter_manager import ParameterManager
+from pyptv.pyptv_batch import ProcessingError, run_batch
+from pyptv.pyptv_batch_paramsets import RUNS_DIR, main
+
+
+def test_paramsets_write_to_their_own_directories(cavity_copy):
+    pm = ParameterManager()
+    pm.from_yaml(cavity_copy / "parameters_Run1.yaml")
+    pm.parameters["targ_rec"]["gvthres"] = [value + 5 for value in pm.parameters["targ_rec"]["gvthres"]]
+    pm.to_yaml(cavity_copy / "parameters_Run2.yaml")
+
+    results = main(cavity_copy, 10000, 10002, runs=["Run1", "Run2"], mode="sequence", slots=2)
+    assert [result.name for result in results] == ["Run1", "Run2"]
+    assert all(result.error is None for result in results)
+
+    (cavity_copy / "res").mkdir(exist_ok=True)
+    run_batch(cavity_copy / "parameters_Run1.yaml", 10000, 10002, mode="sequence")
+    for frame in range(10000, 10003):
+        for name in ("Run1", "Run2"):
+            assert (cavity_copy / RUNS_DIR / name / "res" / f"rt_is.{frame}").exists()
+        # Shared decoding gives the result of a plain run
+        shared = (cavity_copy / RUNS_DIR / "Run1" / "res" / f"rt_is.{frame}").read_text()
+        assert shared == (cavity_copy / "res" / f"rt_is.{frame}").read_text()
+
+
+def test_paramsets_must_read_images(cavity_copy):
+    # Run1_1 reads existing targets
+    with pytest.raises(ProcessingError):
+        main(cavity_copy, 10000, 10002, runs=["Run1", "Run1_1"], mode="sequence")
+    with pytest.raises(ProcessingError):
+        main(cavity_copy, 10000, 10002, runs=["Run9"])
@@ -3,12 +3,10 @@ import numpy as np
 from imageio.v3 import imread
 from pathlib import Path
 
-from skimage import img_as_ubyte
-from skimage.color import rgb2gray
 
 from optv.correspondences import correspondences, MatchedCoords
-from optv.tracker import default_naming
 from optv.orientation import point_positions
+from pyptv.preprocessing import as_uint8_gray
 
 
 
@@ -33,7 +31,7 @@ def mask_image(imname: Path, display: bool = False) -> np.ndarray:
     # session = new_session('u2net')
     input_data = imread(imname)
     result = remove(input_data, session=session)
-    result = img_as_ubyte(rgb2gray(result[:, :, :3]))
+    result = as_uint8_gray(result)
 
     # plt.figure()
     # plt.imshow(result, cmap='gray')
@@ -157,7 +155,9 @@ class Sequence:
                 print_corresp = sorted_corresp
 
             # Save rt_is
-            rt_is_filename = default_naming["corres"].decode()
+            rt_is_filename = self.ptv.result_naming(
+                self.ptv.experiment_root(self.exp)
+            )["corres"].decode()
             rt_is_filename = rt_is_filename + f".{frame}"
             with open(rt_is_filename, "w", encoding="utf8") as rt_is:
                 rt_is.write(str(pos.shape[0]) + "\n")
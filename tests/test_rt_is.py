@@ -0,0 +1,81 @@
+"""Tests for the vectorized rt_is writer and reader"""
+
+import numpy as np
+import pytest
+
+from pyptv import ptv
+from pyptv.rt_is import (
+    RT_IS_DTYPE,
+    RT_IS_LINE_FORMAT,
+    format_rt_is,
+    read_rt_is,
+    write_rt_is,
+)
+
+
+def _reference(pos, corresp):
+    lines = [f"{len(pos)}\n"]
+    for pix, pt in enumerate(pos):
+        lines.append(RT_IS_LINE_FORMAT % ((pix + 1,) + tuple(pt) + tuple(corresp[:, pix])))
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("scale", [1e-3, 1.0, 100.0, 1e5, 1e8])
+def test_format_matches_per_line_formatting(scale):
+    rng = np.random.default_rng(int(scale * 1000) % 2**32)
+    pos = rng.uniform(-scale, scale, (2000, 3))
+    corresp = rng.integers(-1, 20000, (4, 2000))
+    assert format_rt_is(pos, corresp) == _reference(pos, corresp)
+
+
+def test_format_edge_cases():
+    pos = np.array(
+        [
+            [0.0, -0.0, -0.0004],  # negative zero and values rounding to it
+            [0.0005, 0.0015, 2.675],  # ties and values just off them
+            [-1.0005, 999999.9995, -12345.6785],
+            [np.nextafter(0.0005, 1), np.nextafter(0.0005, 0), 1.25e-3],
+        ]
+    )
+    corresp = np.array([[-1, 0, 9999, 123456], [1, -1, -1, -1], [0, 0, 0, 0], [5, 6, 7, 8]])
+    assert format_rt_is(pos, corresp) == _reference(pos, corresp)
+    # Float correspondences (as from the -1 filled arrays) are truncated like %d
+    assert format_rt_is(pos, corresp.astype(float)) == _reference(pos, corresp.astype(float))
+
+
+def test_format_falls_back_for_non_finite():
+    pos = np.array([[np.nan, 1.0, np.inf], [1e20, -2.0, 3.0]])
+    corresp = np.full((4, 2), -1)
+    assert format_rt_is(pos, corresp) == _reference(pos, corresp)
+    assert format_rt_is(np.empty((0, 3)), np.empty((4, 0))) == "0\n"
+
+
+def test_write_read_roundtrip(tmp_path):
+    rng = np.random.default_rng(1)
+    pos = rng.uniform(-50, 50, (100, 3))
+    corresp = rng.integers(-1, 1000, (4, 100))
+    path = tmp_path / "rt_is.10000"
+    write_rt_is(path, pos, corresp)
+
+    data = read_rt_is(path)
+    assert data.dtype == RT_IS_DTYPE
+    np.testing.assert_array_equal(data["pnr"], np.arange(1, 101))
+    np.testing.assert_allclose(data["x"], pos[:, 0], atol=5e-4)
+    np.testing.assert_array_equal(data["p3"], corresp[2])
+
+    # Same values as the list based reader
+    legacy = ptv.read_rt_is_file(path)
+    np.testing.assert_array_equal(
+        np.array(legacy)[:, :3], np.column_stack([data["x"], data["y"], data["z"]])
+    )
+
+
+def test_read_empty_and_bad_files(tmp_path):
+    empty = tmp_path / "rt_is.1"
+    write_rt_is(empty, np.empty((0, 3)), np.empty((4, 0)))
+    assert read_rt_is(empty).shape == (0,)
+
+    bad = tmp_path / "rt_is.2"
+    bad.write_text("1\n   1  1.000  2.000\n")
+    with pytest.raises(ValueError, match="Bad format"):
+        read_rt_is(bad)
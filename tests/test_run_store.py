@@ -0,0 +1,152 @@
+"""Tests for the single-file run store"""
+
+import threading
+
+import numpy as np
+import pytest
+import yaml
+
+from pyptv import ptv
+from pyptv.rt_is import RT_IS_DTYPE
+from pyptv.run_store import LINKAGE_DTYPE, RunStore, main as run_store_main
+
+
+def _targets(num, offset=0.0):
+    arr = np.zeros(num, dtype=ptv.TARGET_DTYPE)
+    arr["pnr"] = np.arange(num)
+    arr["x"] = np.arange(num) + offset
+    arr["tnr"] = -1
+    return arr
+
+
+def _enable_run_store(yaml_file):
+    params = yaml.safe_load(yaml_file.read_text())
+    params["pft_version"]["run_store"] = True
+    yaml_file.write_text(yaml.safe_dump(params))
+
+
+def _outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("*.1000*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.relative_to(exp_dir).as_posix(): f.read_bytes() for f in files}
+
+
+def test_append_read_latest_wins(tmp_path):
+    path = tmp_path / "run.ptvstore"
+    with RunStore(path, "a") as store:
+        store.append("targets", 1, _targets(3), cam=0)
+        store.append("targets", 1, _targets(2, 0.5), cam=1)
+        store.append("correspondences", 1, np.zeros(0, dtype=RT_IS_DTYPE))
+        store.append("targets", 1, _targets(4, 10.0), cam=0)
+        assert store.read("targets", 1, 0)["x"].tolist() == [10.0, 11.0, 12.0, 13.0]
+        with pytest.raises(ValueError, match="dtype"):
+            store.append("linkage", 1, _targets(1))
+
+    with RunStore(path) as store:
+        assert store.has_frame(1, num_cams=2)
+        assert not store.has_frame(1, num_cams=3)
+        assert store.frames("targets", 1) == [1]
+        assert len(store.read("correspondences", 1)) == 0
+        arr = store.read("targets", 1, 0)
+        assert not arr.flags.writeable
+        np.testing.assert_array_equal(arr, _targets(4, 10.0))
+        with pytest.raises(KeyError):
+            store.read("linkage", 1)
+        with pytest.raises(ValueError):
+            store.append("targets", 2, _targets(1), cam=0)
+
+
+def test_index_cache_and_incomplete_record(tmp_path):
+    path = tmp_path / "run.ptvstore"
+    with RunStore(path, "a") as store:
+        for frame in range(5):
+            store.append("targets", frame, _targets(frame + 1), cam=0)
+    assert (tmp_path / "run.ptvstore.idx").exists()
+
+    # A killed writer leaves half a record behind; it is ignored, then dropped
+    size = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b"PTVR\x00\x00")
+    assert RunStore(path).frames("targets", 0) == list(range(5))
+    with RunStore(path, "a") as store:
+        store.append("targets", 5, _targets(1), cam=0)
+    assert RunStore(path).frames("targets", 0) == list(range(6))
+    assert path.stat().st_size > size
+
+    # A stale index (e.g. from another file) is not used
+    other = tmp_path / "other.ptvstore"
+    with RunStore(other, "a") as store:
+        store.append("targets", 9, _targets(1), cam=0)
+    (tmp_path / "other.ptvstore.idx").replace(tmp_path / "run.ptvstore.idx")
+    assert RunStore(path).frames("targets", 0) == list(range(6))
+
+
+def test_concurrent_writers_and_compact(tmp_path):
+    path = tmp_path / "run.ptvstore"
+
+    def write(cam):
+        with RunStore(path, "a") as store:
+            for frame in range(20):
+                store.append("targets", frame, _targets(frame % 7, cam), cam=cam)
+
+    threads = [threading.Thread(target=write, args=(cam,)) for cam in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with RunStore(path, "a") as store:
+        for cam in range(4):
+            assert store.frames("targets", cam) == list(range(20))
+        store.append("targets", 3, _targets(2, 100.0), cam=0)
+        assert store.compact() > 0
+        assert store.read("targets", 3, 0)["x"].tolist() == [100.0, 101.0]
+    with RunStore(path) as store:
+        assert len(store.keys()) == 80
+        np.testing.assert_array_equal(store.read("targets", 19, 2), _targets(19 % 7, 2))
+
+
+def test_batch_with_run_store_matches_files(cavity_copy):
+    from pyptv.pyptv_batch import main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    main(yaml_file, 10000, 10004, mode="both")
+    reference = _outputs(cavity_copy)
+    for f in list((cavity_copy / "res").iterdir()) + list((cavity_copy / "img").glob("*_targets")):
+        f.unlink()
+
+    _enable_run_store(yaml_file)
+    main(yaml_file, 10000, 10004, mode="both")
+    # Only the store (and the manifest) is left after tracking
+    assert _outputs(cavity_copy) == {}
+    assert (cavity_copy / "res" / "run.ptvstore").exists()
+
+    with RunStore(cavity_copy / "res" / "run.ptvstore") as store:
+        assert store.frames("linkage") == list(range(10000, 10005))
+        assert store.read("linkage", 10001).dtype == LINKAGE_DTYPE
+        assert (store.read("targets", 10001, 0)["tnr"] > -1).any()
+
+    assert run_store_main([
+        "materialize", str(yaml_file), "10000", "10004",
+        "--kinds", "targets", "correspondences", "linkage", "added",
+    ]) == 0
+    assert _outputs(cavity_copy) == reference
+
+
+def test_sequence_resume_uses_store(cavity_copy):
+    from pyptv.pyptv_batch import main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    _enable_run_store(yaml_file)
+    main(yaml_file, 10000, 10002, mode="sequence")
+    store_file = cavity_copy / "res" / "run.ptvstore"
+    size = store_file.stat().st_size
+
+    main(yaml_file, 10000, 10002, mode="sequence", resume=True)
+    assert store_file.stat().st_size == size
+
+    main(yaml_file, 10000, 10003, mode="sequence", resume=True)
+    with RunStore(store_file) as store:
+        assert store.frames("correspondences") == list(range(10000, 10004))
+        assert store.frames("targets", 3) == list(range(10000, 10004))
@@ -0,0 +1,69 @@
+"""Tests for the shared memory ring of decoded frames"""
+
+import numpy as np
+import pytest
+
+from pyptv.image_source import ImageSource
+from pyptv.shared_frames import SharedFrameRing, SharedFrameSource
+
+
+class _Frames(ImageSource):
+    """Images whose pixels hold the frame number and camera, for checks."""
+
+    num_cams = 2
+
+    def paths(self, frame):
+        return [f"cam{cam + 1}.{frame}" for cam in range(self.num_cams)]
+
+    def read(self, cam, frame):
+        return np.full((4, 5), (frame + 10 * cam) % 256, dtype=np.uint8)
+
+
+def test_frames_are_shared_in_order():
+    frames = _Frames()
+    ring = SharedFrameRing(1, 2, (4, 5), 10, 12, slots=2)
+    source = SharedFrameSource(ring.handle, 0, fallback=_Frames())
+    try:
+        ring.put(10, frames.frame_images(10))
+        ring.put(11, frames.frame_images(11))
+        images = source.frame_images(10)
+        assert all(np.array_equal(a, b) for a, b in zip(images, frames.frame_images(10)))
+        assert not images[0].flags.writeable
+        # Asking for frame 11 releases the slot of frame 10
+        assert np.array_equal(source.read(1, 11), frames.read(1, 11))
+        ring.put(12, frames.frame_images(12))
+        assert np.array_equal(source.read(0, 12), frames.read(0, 12))
+        # Rejected images do not take the last free slot, which finish needs
+        with pytest.raises(ValueError):
+            ring.put(13, frames.frame_images(13)[:1])
+        with pytest.raises(ValueError):
+            ring.put(13, [image[1:] for image in frames.frame_images(13)])
+        ring.finish()
+        # Frames outside the stream, or already passed, come from the fallback
+        assert np.array_equal(source.read(0, 9), frames.read(0, 9))
+        assert np.array_equal(source.read(0, 11), frames.read(0, 11))
+    finally:
+        source.close()
+        ring.close()
+
+
+def test_missing_frame_and_detached_consumer():
+    frames = _Frames()
+    ring = SharedFrameRing(2, 2, (4, 5), 10, 12, slots=2)
+    reader = SharedFrameSource(ring.handle, 0)
+    idle = SharedFrameSource(ring.handle, 1)
+    try:
+        with pytest.raises(ValueError):
+            reader.paths(10)
+        ring.put(10, frames.frame_images(10))
+        ring.put(11, frames.frame_images(11))
+        # Consumer 1 never releases a slot, but once closed it is not waited for
+        idle.close()
+        reader.read(0, 10)
+        reader.read(0, 11)
+        ring.finish()
+        with pytest.raises(RuntimeError):
+            reader.read(0, 12)
+    finally:
+        reader.close()
+        ring.close()
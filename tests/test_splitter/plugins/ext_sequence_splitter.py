@@ -4,7 +4,6 @@ from imageio.v3 import imread
 from pathlib import Path
 
 from optv.correspondences import correspondences, MatchedCoords
-from optv.tracker import default_naming
 from optv.orientation import point_positions
 
 
@@ -107,10 +106,7 @@ class Sequence:
                 raise FileNotFoundError(f"{imname} does not exist")
             
             # now we read and split 
-            full_image = imread(imname)
-            if full_image.ndim > 2:
-                from skimage.color import rgb2gray
-                full_image = rgb2gray(full_image)
+            full_image = self.ptv.as_uint8_gray(imread(imname))
             
             # Apply inverse if needed
             if inverse_flag:
@@ -138,11 +134,13 @@ class Sequence:
                             mask_path = Path(mask_base_name)
                             background_name = str(mask_path.parent / f"{mask_path.stem}_cam{i_cam + 1}{mask_path.suffix}")
                         
-                        background = imread(background_name)
-                        if background.ndim > 2:
-                            from skimage.color import rgb2gray
-                            background = rgb2gray(background)
-                        masked_image = np.clip(masked_image - background, 0, 255).astype(np.uint8)
+                        background_name = self.ptv.resolve_path(
+                            self.ptv.experiment_root(self.exp), background_name
+                        )
+                        background = self.ptv.background_cache.get(background_name)
+                        masked_image = self.ptv.subtract_background(
+                            masked_image, background, out=masked_image
+                        )
                     except (ValueError, FileNotFoundError, TypeError) as e:
                         print(f"Failed to read/apply mask for camera {i_cam}: {e}")
 
@@ -197,7 +195,9 @@ class Sequence:
                 print_corresp = sorted_corresp
 
             # Save rt_is
-            rt_is_filename = default_naming["corres"].decode()
+            rt_is_filename = self.ptv.result_naming(
+                self.ptv.experiment_root(self.exp)
+            )["corres"].decode()
             rt_is_filename = rt_is_filename + f".{frame}"
             with open(rt_is_filename, "w", encoding="utf8") as rt_is:
                 rt_is.write(str(pos.shape[0]) + "\n")
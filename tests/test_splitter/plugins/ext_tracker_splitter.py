@@ -1,5 +1,4 @@
-from pathlib import Path
-from optv.tracker import Tracker, default_naming
+from optv.tracker import Tracker
 import sys
 
 class Tracking:
@@ -37,9 +36,12 @@ class Tracking:
         # img_base_names = [self.exp.spar.get_img_base_name(i) for i in range(self.exp.cpar.get_num_cams())]
         # self.exp.short_file_bases = self.exp.target_filenames
 
+        root = self.ptv.experiment_root(self.exp)
         for cam_id, short_name in enumerate(self.exp.target_filenames):
             # print(f"Setting tracker image base name for cam {cam_id+1}: {Path(short_name).resolve()}")
-            self.exp.spar.set_img_base_name(cam_id, str(Path(short_name).resolve())+'.')
+            self.exp.spar.set_img_base_name(
+                cam_id, str(self.ptv.resolve_path(root, short_name).resolve())+'.'
+            )
 
         try:
             tracker = Tracker(
@@ -48,7 +50,7 @@ class Tracking:
                 self.exp.track_par,
                 self.exp.spar,
                 self.exp.cals,
-                default_naming
+                self.ptv.result_naming(root)
             )
             
             tracker.full_forward()
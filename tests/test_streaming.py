@@ -0,0 +1,121 @@
+"""Tests for the directory-watch streaming mode"""
+
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from pyptv import ptv
+from pyptv.processing_context import ProcessingContext
+from pyptv.streaming import FrameWatcher, stream_sequence
+
+# Copies the images of each frame into the watched directory, camera by camera,
+# writing every file in two halves so that partially written files are seen.
+DROPPER = textwrap.dedent(
+    """
+    import sys, time
+    from pathlib import Path
+
+    src, dst = Path(sys.argv[1]), Path(sys.argv[2])
+    for frame in range(10000, 10003):
+        for cam in range(1, 5):
+            data = (src / f"cam{cam}.{frame}").read_bytes()
+            with open(dst / f"cam{cam}.{frame}", "wb") as f:
+                f.write(data[: len(data) // 2])
+                f.flush()
+                time.sleep(0.05)
+                f.write(data[len(data) // 2 :])
+        time.sleep(0.2)
+    """
+)
+
+
+def _frame_paths(directory):
+    return lambda frame: [str(directory / f"cam{cam}.{frame}") for cam in (1, 2)]
+
+
+def test_frame_watcher_waits_for_all_cameras(tmp_path):
+    watcher = FrameWatcher(_frame_paths(tmp_path), poll_interval=0.01, idle_timeout=0)
+    (tmp_path / "cam1.1").write_bytes(b"data")
+    assert watcher.poll(1) is None
+    assert watcher.poll(1) is None  # camera 2 still missing
+
+    (tmp_path / "cam2.1").write_bytes(b"")
+    assert watcher.poll(1) is None
+    assert watcher.poll(1) is None  # empty file is not complete
+
+    (tmp_path / "cam2.1").write_bytes(b"data")
+    assert watcher.poll(1) is None  # changed since the previous poll
+    assert watcher.poll(1) is not None
+
+
+def test_frame_watcher_idle_timeout(tmp_path):
+    watcher = FrameWatcher(_frame_paths(tmp_path), poll_interval=0.01, idle_timeout=0.05)
+    assert watcher.wait_for(7) is None
+
+
+def test_frame_watcher_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError, match="Poll interval"):
+        FrameWatcher(_frame_paths(tmp_path), poll_interval=0)
+    with pytest.raises(ValueError, match="Idle timeout"):
+        FrameWatcher(_frame_paths(tmp_path), idle_timeout=-1)
+
+
+def _processing_experiment(exp_dir):
+    return ProcessingContext(exp_dir / "parameters_Run1.yaml", 10000, 10004)
+
+
+def _read_outputs(exp_dir):
+    files = sorted((exp_dir / "res").glob("rt_is.*")) + sorted(
+        (exp_dir / "img").glob("*_targets")
+    )
+    return {f.name: f.read_bytes() for f in files}
+
+
+def test_stream_sequence_follows_dropped_files(cavity_copy):
+    """Frames written by another process are processed as they appear"""
+    experiment = _processing_experiment(cavity_copy)
+    experiment.spar.set_last(10002)
+    ptv.py_sequence_loop(experiment)
+    expected = _read_outputs(cavity_copy)
+    shutil.rmtree(cavity_copy / "res")
+    for f in (cavity_copy / "img").glob("*_targets"):
+        f.unlink()
+
+    source = cavity_copy / "source"
+    shutil.move(cavity_copy / "img", source)
+    (cavity_copy / "img").mkdir()
+
+    dropper = subprocess.Popen(
+        [sys.executable, "-c", DROPPER, str(source), str(cavity_copy / "img")]
+    )
+    try:
+        records = stream_sequence(
+            _processing_experiment(cavity_copy), poll_interval=0.02, idle_timeout=1.5
+        )
+    finally:
+        dropper.wait(timeout=30)
+
+    # Frames 10003 and 10004 never arrive: the idle timeout ends the stream
+    assert [r.frame for r in records] == [10000, 10001, 10002]
+    assert all(r.latency >= r.processing > 0 for r in records)
+    assert _read_outputs(cavity_copy) == expected
+
+    lines = (cavity_copy / "res" / "stream_latency.csv").read_text().splitlines()
+    assert lines[0] == "frame,wait,processing,latency"
+    assert len(lines) == 4
+
+
+def test_batch_stream_mode_with_recorded_images(cavity_copy):
+    from pyptv.pyptv_batch import main
+
+    main(
+        cavity_copy / "parameters_Run1.yaml", 10000, 10004,
+        mode="sequence", stream=True, poll_interval=0.01, idle_timeout=0.5,
+    )
+    assert len(list((cavity_copy / "res").glob("rt_is.*"))) == 5
+    assert len(
+        (cavity_copy / "res" / "stream_latency.csv").read_text().splitlines()
+    ) == 6
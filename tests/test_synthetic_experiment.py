@@ -0,0 +1,53 @@
+"""Tests for synthetic experiments"""
+
+import numpy as np
+import pytest
+
+from pyptv.synthetic_experiment import (
+    SyntheticSpec,
+    evaluate_positions,
+    generate_synthetic_experiment,
+    load_ground_truth,
+    main,
+    render_particles,
+)
+
+
+def test_render_particles_centroid():
+    img = render_particles(np.array([[10.3, 20.5], [-50.0, 5.0]]), (40, 30), sigma=1.2, peak=200)
+    assert img.shape == (30, 40) and img.dtype == np.uint8
+    rows, cols = np.nonzero(img)
+    weights = img[rows, cols].astype(float)
+    # Pixel centers at index + 0.5
+    assert np.average(cols + 0.5, weights=weights) == pytest.approx(10.3, abs=0.05)
+    assert np.average(rows + 0.5, weights=weights) == pytest.approx(20.5, abs=0.05)
+
+
+def test_generated_experiment_is_processed(test_data_dir, tmp_path):
+    from pyptv.pyptv_batch import main as batch_main
+
+    out_dir = tmp_path / "synth"
+    spec = SyntheticSpec(num_particles=100, num_frames=3, num_cams=3, image_size=(640, 512), seed=1)
+    summary = generate_synthetic_experiment(test_data_dir / "parameters_Run1.yaml", out_dir, spec)
+    assert (summary["first"], summary["last"], summary["num_cams"]) == (10000, 10002, 3)
+    assert sorted(p.name for p in (out_dir / "img").iterdir())[:3] == [
+        "cam1.10000", "cam1.10001", "cam1.10002"
+    ]
+
+    truth = load_ground_truth(out_dir)
+    assert truth["xyz"].shape == (3, 100, 3)
+    assert truth["xy"].shape == (3, 3, 100, 2)
+    # Seeded: the same spec gives the same experiment
+    generate_synthetic_experiment(test_data_dir / "parameters_Run1.yaml", tmp_path / "again", spec)
+    np.testing.assert_array_equal(load_ground_truth(tmp_path / "again")["xyz"], truth["xyz"])
+
+    batch_main(out_dir / "parameters_Run1.yaml", 10000, 10002, mode="sequence")
+    results = evaluate_positions(out_dir)
+    assert [r["frame"] for r in results] == [10000, 10001, 10002]
+    for r in results:
+        assert r["recall"] > 0.9
+        assert r["precision"] > 0.9
+        assert r["rms_error"] < 0.1
+
+    assert main(["evaluate", str(out_dir)]) == 0
+    assert main(["evaluate", str(tmp_path / "again")]) == 1
@@ -0,0 +1,115 @@
+"""Tests for per-stage timing of batch runs"""
+
+import json
+
+import pytest
+
+from pyptv.timing import NULL_TIMER, StageTimer, format_summary, main, read_timing
+
+
+def test_stage_timer_records():
+    timer = StageTimer()
+    timer.frame = 7
+    with timer.stage("target_recognition", cam=1) as stage:
+        stage.count = 12
+    with timer.stage("tracking", frame=9):
+        pass
+    worker = StageTimer()
+    with worker.stage("highpass", cam=2):
+        pass
+    timer.extend(worker.records)
+
+    assert [(r["frame"], r["cam"], r["stage"], r["count"]) for r in timer.records] == [
+        (7, 1, "target_recognition", 12),
+        (9, None, "tracking", None),
+        (7, 2, "highpass", None),
+    ]
+    assert all(r["seconds"] >= 0 for r in timer.records)
+
+
+def test_null_timer_records_nothing():
+    with NULL_TIMER.stage("imread", cam=0) as stage:
+        stage.count = 3
+    NULL_TIMER.add("imread", 1.0)
+    NULL_TIMER.extend([{"frame": 1, "stage": "imread", "seconds": 1.0}])
+    assert not NULL_TIMER.enabled
+    assert NULL_TIMER.records == []
+    assert stage.count is None
+
+
+def test_summary_and_file(tmp_path, capsys):
+    timer = StageTimer()
+    for frame in (1, 2):
+        timer.add("write_rt_is", 0.5, frame=frame)
+        timer.add("imread", 0.25, frame=frame, cam=0, count=None)
+        timer.add("correspondences", 0.25, frame=frame, count=10)
+    path = tmp_path / "res" / "timing.jsonl"
+    timer.write(path)
+    timer.write(path, append=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"frame": 3, "sta')
+
+    records = read_timing(path)
+    assert len(records) == 12
+    lines = format_summary(records, wall_time=4.0).splitlines()
+    assert lines[0] == "Timing of 2 frames, wall time 4.000 s"
+    # Stages in processing order, shares of the wall time
+    assert [line.split()[0] for line in lines[2:]] == ["imread", "correspondences", "write_rt_is"]
+    assert lines[3].split()[1:] == ["4", "1.000", "250.00", "250.00", "25.0%", "40"]
+
+    assert main([str(path)]) == 0
+    assert "write_rt_is" in capsys.readouterr().out
+
+
+def test_batch_timing_matches_output(cavity_copy):
+    from pyptv.pyptv_batch import main as batch_main
+
+    yaml_file = cavity_copy / "parameters_Run1.yaml"
+    batch_main(yaml_file, 10000, 10002, mode="sequence", timing="res/timing.jsonl")
+
+    records = read_timing(cavity_copy / "res" / "timing.jsonl")
+    by_stage = {}
+    for record in records:
+        by_stage.setdefault(record["stage"], []).append(record)
+
+    assert {r["frame"] for r in by_stage["imread"]} == {10000, 10001, 10002}
+    assert len(by_stage["target_recognition"]) == 3 * 4
+    assert len(by_stage["write_rt_is"]) == 3
+    assert "tracking" not in by_stage
+
+    # Counts are the numbers of targets and particles written
+    for record in by_stage["target_recognition"]:
+        targets_file = cavity_copy / "img" / f"cam{record['cam'] + 1}.{record['frame']}_targets"
+        assert int(targets_file.read_text().split()[0]) == record["count"]
+    for record in by_stage["point_positions"]:
+        rt_is = cavity_copy / "res" / f"rt_is.{record['frame']}"
+        assert int(rt_is.read_text().split()[0]) == record["count"]
+
+
+@pytest.mark.parametrize("camera_pool", ["thread", "process"])
+def test_camera_pool_sends_worker_stages(cavity_copy, camera_pool):
+    from pyptv.pyptv_batch import main as batch_main
+
+    batch_main(
+        cavity_copy / "parameters_Run1.yaml", 10000, 10000, mode="sequence",
+        camera_workers=2, camera_pool=camera_pool, timing="res/timing.jsonl",
+    )
+    records = read_timing(cavity_copy / "res" / "timing.jsonl")
+    recognition = [r for r in records if r["stage"] == "target_recognition"]
+    assert sorted(r["cam"] for r in recognition) == [0, 1, 2, 3]
+    assert {r["frame"] for r in recognition} == {10000}
+    assert [r["stage"] for r in records].count("detect_wait") == 1
+
+
+def test_parallel_workers_share_timing_file(cavity_copy):
+    from pyptv.pyptv_batch_parallel import main as parallel_main
+
+    parallel_main(
+        cavity_copy / "parameters_Run1.yaml", 10000, 10003, n_processes=2,
+        mode="sequence", timing="res/timing.jsonl",
+    )
+    lines = (cavity_copy / "res" / "timing.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    frames = {r["frame"] for r in records if r["stage"] == "correspondences"}
+    assert frames == {10000, 10001, 10002, 10003}
+    assert len({r["pid"] for r in records}) == 2